@@ -0,0 +1,131 @@
+"""micro-benchmark for the bar/pie figure builders, plotly.express ("px") vs the thin "go" engine.
+
+Builds the per-request product/category/ingredient page bar and pie charts on synthetic
+aggregated data with both engines, checks that the two figures carry the same traces and
+layout, and reports the build time of each. Serialization to json is included, as that
+is what a callback pays for before the response goes out.
+
+Run from the repository root:
+    python benchmarks/bench_figure_builders.py --rows 5 20 100 --repeat 50
+"""
+import argparse
+import os
+import sys
+import timeit
+
+import numpy as np
+import pandas as pd
+import plotly.graph_objs as go
+from plotly.utils import PlotlyJSONEncoder
+
+sys.path.insert(
+    0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "meiyume_trend_engine")
+)
+from bte_figure_builders import bar_figure, pie_figure  # noqa: E402
+
+# trace and layout properties the page figures and click handlers depend on.
+TRACE_KEYS = [
+    "type", "x", "y", "text", "orientation", "customdata", "hovertext",
+    "hovertemplate", "labels", "values", "hole", "marker", "opacity", "pull",
+]
+LAYOUT_KEYS = ["title", "width", "height", "xaxis", "yaxis", "margin", "barmode", "template"]
+
+
+def make_count_data(rows: int, name: str = "group") -> pd.DataFrame:
+    """make_count_data creates value_counts shaped data (a label and a count column)."""
+    return pd.DataFrame(
+        {
+            name: [f"{name}-{i}" for i in range(rows)],
+            "review_count": np.random.default_rng(rows).integers(1, 1000, rows),
+        }
+    )
+
+
+def figure_cases(rows: int) -> dict:
+    """figure_cases returns one builder call per page figure shape, keyed by a short name."""
+    data = make_count_data(rows)
+    return {
+        "bar h text": lambda engine: bar_figure(
+            data, x="review_count", y="group", orientation="h", height=400,
+            text="review_count", xaxis={"title": "Review Count"},
+            yaxis={"categoryorder": "total ascending", "title": "group"}, engine=engine,
+        ),
+        "bar hover": lambda engine: bar_figure(
+            data, x="group", y="review_count", width=1000, height=500, title="Products",
+            hover_data=["group"], hover_name="group", text="review_count",
+            xaxis={"categoryorder": "total descending"}, engine=engine,
+        ),
+        "bar styled": lambda engine: bar_figure(
+            data, x="review_count", y="group", orientation="h", title="Talking Points",
+            width=1000, height=600,
+            trace={"marker": {"color": "green", "line": {"color": "rgb(8,48,107)", "width": 1.5}},
+                   "opacity": 0.5},
+            layout={"margin": {"l": 200}}, engine=engine,
+        ),
+        "pie": lambda engine: pie_figure(
+            data.head(2), values="review_count", names="group", hole=0.4, width=450,
+            height=400, title="Breakdown",
+            trace={"marker": {"colors": ["green", "red"]}, "pull": [0, 0.2]}, engine=engine,
+        ),
+    }
+
+
+def _plain(fig) -> dict:
+    """_plain turns either engine's output into validated plain json for comparison."""
+    return go.Figure(fig).to_plotly_json()
+
+
+def _same(a, b) -> bool:
+    if isinstance(a, dict) and isinstance(b, dict):
+        return a.keys() == b.keys() and all(_same(a[k], b[k]) for k in a)
+    if isinstance(a, (list, tuple, np.ndarray)) or isinstance(b, (list, tuple, np.ndarray)):
+        return np.array_equal(np.asarray(a, dtype=object), np.asarray(b, dtype=object))
+    return a == b
+
+
+def differences(px_fig, go_fig) -> list:
+    """differences lists the trace/layout properties that differ between the two engines."""
+    px_json, go_json = _plain(px_fig), _plain(go_fig)
+    diffs = [
+        f"data[0].{key}"
+        for key in TRACE_KEYS
+        if not _same(px_json["data"][0].get(key), go_json["data"][0].get(key))
+    ]
+    diffs += [
+        f"layout.{key}"
+        for key in LAYOUT_KEYS
+        if not _same(px_json["layout"].get(key), go_json["layout"].get(key))
+    ]
+    return diffs
+
+
+def build_and_serialize(case, engine: str) -> str:
+    return PlotlyJSONEncoder().encode(case(engine))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, nargs="+", default=[5, 20, 100])
+    parser.add_argument("--repeat", type=int, default=30)
+    args = parser.parse_args()
+
+    print(f"{'figure':>12} {'rows':>6} {'px ms':>8} {'go ms':>8} {'speedup':>8}  equivalent")
+    for rows in args.rows:
+        for name, case in figure_cases(rows).items():
+            diffs = differences(case("px"), case("go"))
+            timings = {
+                engine: min(
+                    timeit.repeat(
+                        lambda: build_and_serialize(case, engine), number=1, repeat=args.repeat
+                    )
+                )
+                for engine in ("px", "go")
+            }
+            print(
+                f"{name:>12} {rows:>6} {timings['px'] * 1000:>8.2f} {timings['go'] * 1000:>8.2f}"
+                f" {timings['px'] / timings['go']:>7.1f}x  {'yes' if not diffs else diffs}"
+            )
+
+
+if __name__ == "__main__":
+    main()
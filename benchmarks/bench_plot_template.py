@@ -0,0 +1,128 @@
+"""micro-benchmark for figure build time with per-call styling vs the shared bte plotly template.
+
+Builds the product type review trend facet grid (the heaviest market trend figure) on
+synthetic monthly data, once with the styling calls the figure functions used to make
+and once relying on the registered template.
+
+Run from the repository root:
+    python benchmarks/bench_plot_template.py --product-types 60 --repeat 20
+"""
+import argparse
+import os
+import sys
+import timeit
+
+import numpy as np
+import pandas as pd
+import plotly.express as px
+import plotly.graph_objs as go
+import plotly.io as pio
+
+sys.path.insert(
+    0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "meiyume_trend_engine")
+)
+from bte_utils import register_bte_plotly_template  # noqa: E402
+
+
+def make_product_type_month_data(product_types: int, months: int = 36) -> pd.DataFrame:
+    """make_product_type_month_data creates review_trend_product_type_month shaped data.
+
+    Args:
+        product_types (int): number of product types (facets).
+        months (int, optional): number of months per product type. Defaults to 36.
+
+    Returns:
+        pd.DataFrame: synthetic review counts per product type and month.
+    """
+    month = pd.date_range("2018-01-01", periods=months, freq="MS").astype(str)
+    return pd.DataFrame(
+        {
+            "product_type": np.repeat([f"product-type-{i}" for i in range(product_types)], months),
+            "month": np.tile(month, product_types),
+            "review_text": np.random.default_rng(0).integers(0, 500, product_types * months),
+        }
+    )
+
+
+def build_facet_figure(data: pd.DataFrame) -> go.Figure:
+    return px.area(
+        data,
+        x="month",
+        y="review_text",
+        facet_col="product_type",
+        color="product_type",
+        facet_col_wrap=5,
+        height=2600,
+        facet_row_spacing=0.04,
+        facet_col_spacing=0.06,
+    )
+
+
+def per_call_styling(data: pd.DataFrame) -> go.Figure:
+    """per_call_styling reproduces the styling the figure functions did before the template."""
+    fig = build_facet_figure(data)
+    for axis in fig.layout:
+        if type(fig.layout[axis]) == go.layout.YAxis:
+            fig.layout[axis].title.text = ""
+        if type(fig.layout[axis]) == go.layout.XAxis:
+            fig.layout[axis].title.text = ""
+    fig.update_layout(
+        font_family="GothamLight",
+        font_color="#c09891",
+        title_font_family="GildaDisplay",
+        title_font_size=24,
+        title_font_color="#c09891",
+        legend_title_font_color="green",
+        hovermode="closest",
+    )
+    fig.update_xaxes(
+        tickfont=dict(family="GothamLight", color="crimson", size=14),
+        title_font=dict(size=20, family="GothamLight", color="crimson"),
+        showticklabels=True,
+    )
+    fig.update_yaxes(
+        tickfont=dict(family="GothamLight", color="crimson", size=14),
+        title_font=dict(size=20, family="GothamLight", color="crimson"),
+        showticklabels=True,
+        visible=True,
+        matches=None,
+    )
+    fig.update_layout(showlegend=False)
+    return fig
+
+
+def template_styling(data: pd.DataFrame) -> go.Figure:
+    """template_styling mirrors create_product_type_review_trend_figure with the bte template."""
+    fig = build_facet_figure(data)
+    fig.update_layout(showlegend=False)
+    fig.update_xaxes(title_text="", showticklabels=True)
+    fig.update_yaxes(title_text="", showticklabels=True, visible=True, matches=None)
+    return fig
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--product-types", type=int, nargs="+", default=[10, 30, 60])
+    parser.add_argument("--repeat", type=int, default=10)
+    args = parser.parse_args()
+
+    print(f"{'facets':>8} {'per-call ms':>12} {'template ms':>12} {'saved':>7}")
+    for product_types in args.product_types:
+        data = make_product_type_month_data(product_types)
+
+        pio.templates.default = "plotly"
+        per_call = min(
+            timeit.repeat(lambda: per_call_styling(data), number=1, repeat=args.repeat)
+        )
+        register_bte_plotly_template()
+        template = min(
+            timeit.repeat(lambda: template_styling(data), number=1, repeat=args.repeat)
+        )
+        print(
+            f"{product_types:>8} {per_call * 1000:>12.1f} {template * 1000:>12.1f}"
+            f" {1 - template / per_call:>7.0%}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,471 @@
+"""benchmark suite of the figure builders and data callbacks on synthetic data, with a history.
+
+Runs every create_*_figure function and every data shaping callback against synthetic WebAppData
+snapshots (bte_synthetic_data.py) at several scales and records per case
+
+- the latency distribution: the first call and p50/p90/p99/mean/min of the repeated calls, each
+  with the app's selection caches (lru_cache) cleared, so a repeat is not a cache hit,
+- the allocations of one more call (tracemalloc peak and retained bytes),
+- the payload: bytes of the serialized figure or callback response, plain and gzipped.
+
+Callbacks are requested through the flask test client (/_dash-update-component), so a
+callback's latency includes dash's dispatch and the json serialization of its response;
+figure builders are timed together with their json serialization. Each scale runs in its own
+process (the app loads its data at import), with BTE_LOCAL_DATA_DIR pointing at the snapshot.
+The snapshots are generated for a fixed date (--snapshot-date) and the cases select the three
+years before it, so every run measures the same data.
+
+Every run is appended to a json lines history (--history). Each result is compared with the
+median of the last --baseline-runs runs on the same host and snapshot: the suite exits with status 1 when
+the p50 latency (by more than --min-delta-ms too), the payload or the allocation peak grew by
+more than --threshold.
+
+Run from the repository root:
+    python benchmarks/bench_suite.py --scales 1 10 --repeat 20
+    python benchmarks/bench_suite.py --scales 1 --cases "ing_page|filter_" --no-save
+"""
+import argparse
+import gzip
+import json
+import os
+import platform
+import re
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+import warnings
+from datetime import datetime
+from typing import Callable, Dict, List, Tuple
+
+import numpy as np
+import pandas as pd
+
+BENCHMARKS_DIR = os.path.dirname(os.path.abspath(__file__))
+APP_DIR = os.path.join(BENCHMARKS_DIR, "..", "meiyume_trend_engine")
+DEFAULT_DATA_DIR = os.path.join(BENCHMARKS_DIR, ".data")
+DEFAULT_HISTORY = os.path.join(BENCHMARKS_DIR, "history.jsonl")
+# compared between runs; latency only when the p50 moved by more than --min-delta-ms as well.
+REGRESSION_METRICS = ["p50_ms", "payload_bytes", "peak_alloc_bytes"]
+# date of the synthetic snapshots, fixed so the history compares runs on the same data. It has to lie after
+# today, the app plots its default date range (the three years before today) on import: when it has passed,
+# move it forward (the runs on the new date start a new baseline).
+DEFAULT_SNAPSHOT_DATE = "2030-01-01"
+# the app's per-selection caches, cleared before every timed call.
+SELECTION_CACHES = [
+    "get_product_context",
+    "get_product_context_in_date_range",
+    "ing_page_new_ing_frame",
+    "ing_page_banned_ing_frame",
+    "ing_page_product_frame",
+]
+
+
+def snapshot_dir(data_dir: str, scale: float, seed: int, snapshot_date: str) -> str:
+    """snapshot_dir generates (once) the synthetic snapshot of a scale and date and returns its directory."""
+    directory = os.path.join(data_dir, f"{scale:g}x-seed{seed}-{snapshot_date}")
+    if not os.path.isdir(directory):
+        sys.path.insert(0, APP_DIR)
+        from bte_synthetic_data import SyntheticSnapshot, write_snapshot
+
+        print(f"generating the scale {scale:g} snapshot in {directory}", flush=True)
+        tables = SyntheticSnapshot(scale, seed, snapshot_date).generate()
+        partial = directory + ".partial"
+        write_snapshot(tables, partial)
+        os.rename(partial, directory)
+    return directory
+
+
+class Fixture:
+    """Fixture picks the selections the cases request: the busiest source, category, product type, product and ingredient."""
+
+    def __init__(self, main, snapshot_date: str):
+        products = main.prod_page_metadetail_data_df
+        self.source = "us"
+        products = products[products.source == self.source]
+        self.category = str(products.category.value_counts().index[0])
+        self.product_type = str(
+            products[products.category == self.category].product_type.value_counts().index[0]
+        )
+        reviews = main.prod_page_reviews_attribute_df.prod_id
+        reviews = reviews[reviews.isin(set(products.prod_id.astype(str)))]
+        self.prod_id = str(reviews.value_counts().index[0])
+        self.ingredient = str(main.ing_page_ing.value_counts("ingredient").index[0])
+        # the three years before the snapshot, like the app's default date range before today.
+        end = pd.Timestamp(snapshot_date)
+        self.start_date, self.end_date = str((end - pd.DateOffset(years=3)).date()), str(end.date())
+        self.categories = sorted(str(c) for c in products.category.unique())
+        self.click = {"points": [{"customdata": [self.category]}]}
+
+
+def callback_cases(f: Fixture) -> Dict[str, Tuple[str, list]]:
+    """callback_cases returns case name -> (callback output, input and state values in argument order)."""
+    table = lambda sort: [0, 15, sort, ""]  # noqa: E731  page_current, page_size, sort_by, filter_query
+    by_brand = [{"column_id": "brand", "direction": "asc"}]
+    cat = [f.source, f.category]
+    prod = [f.prod_id, f.start_date, f.end_date]
+    return {
+        "update_category_review_trend_figure": (
+            "category_trend.figure", [f.source, f.categories, f.start_date, f.end_date]),
+        "update_category_influenced_review_trend_figure": (
+            "influenced_category_trend.figure", [f.source, f.categories, f.start_date, f.end_date]),
+        "update_product_type_review_trend_figure": (
+            "subcategory_trend.figure", [f.source, f.click, 0, f.start_date, f.end_date]),
+        "update_product_type_influenced_review_trend_figure": (
+            "influenced_subcategory_trend.figure", [f.source, f.click, 0, f.start_date, f.end_date]),
+        "update_category_product_launch_figure": (
+            "product_launch_trend_category.figure", [f.source, f.categories, f.start_date, f.end_date]),
+        "update_product_type_product_launch_figure": (
+            "product_launch_trend_subcategory.figure", [f.source, f.click, f.start_date, f.end_date]),
+        "update_product_launch_intensity_figure": (
+            "product_launch_intensity_category.figure", [f.source, f.categories, f.start_date, f.end_date]),
+        "update_category_new_ingredient_trend_figure": (
+            "ingredient_launch_trend_category.figure", [f.source, f.categories, f.start_date, f.end_date]),
+        "update_product_type_new_ingredient_trend_figure": (
+            "ingredient_launch_trend_subcategory.figure", [f.source, f.click, f.start_date, f.end_date]),
+        "set_category_page_product_type_options_and_value": ("cat_page_product_type.options", cat),
+        "update_reviews_by_user_attribute_figure": (
+            "cat_page_reviews_by_attribute.figure", [f.product_type, "age"] + cat),
+        "filter_new_ingredients_data_table": (
+            "new_ingredients_data_table.data", [f.product_type] + table(by_brand) + cat),
+        "filter_new_products_data_table": (
+            "new_products_data_table.data", [f.product_type] + table(by_brand) + cat),
+        "filter_top_products_data_table": (
+            "top_products_data_table.data", [f.product_type] + table(by_brand) + cat),
+        "filter_product_packaging_data_table": (
+            "product_package_data_table.data", [f.product_type] + table([]) + cat),
+        "update_product_analysis_text": ("distinct_brands_text.children", [f.product_type] + cat),
+        "update_pricing_analysis_text": ("min_price_text.children", [f.product_type] + cat),
+        "set_ing_page_product_type_options_and_value": ("ing_page_product_type.options", cat),
+        "update_ing_page_new_ing_table": ("ing_page_new_ing_table.data", [f.product_type] + table([]) + cat),
+        "update_ing_page_banned_ing_table": (
+            "ing_page_banned_ing_table.data", [f.product_type] + table([]) + cat),
+        "update_ing_page_product_table": ("ing_page_prod_search_table.data", [f.ingredient] + table([])),
+        "update_ing_page_ingredient_type_figure": ("ing_page_ing_type_fig.figure", [f.product_type] + cat),
+        "update_ing_page_ing_analysis_text": ("new_ing_count_text.children", [f.product_type] + cat),
+        "update_ing_page_category_count_figure": ("ing_page_ing_cat_presence.figure", [f.ingredient]),
+        "update_ing_page_category_count_figure (product types)": (
+            "ing_page_ing_subcat_presence.figure", [f.ingredient, f.click]),
+        "set_product_page_product_options_and_value": ("prod_page_product.options", [f.source]),
+        "update_prod_page_product_ingredients_table": ("prod_page_ingredients.data", [f.prod_id, f.source]),
+        "update_prod_page_product_variants_table": ("prod_page_product_variants.data", prod + [f.source]),
+        "update_prod_page_item_price_figure": ("prod_page_price_variation.figure", prod + [None, f.source]),
+        "display_prod_page_price_data": ("prod_small_price_text.children", [f.prod_id, f.source]),
+        "update_prod_page_reviews_distribution_figure": ("prod_page_reviews_by_stars.figure", prod + [f.source]),
+        "update_prod_page_reviews_by_user_attribute_figure": (
+            "prod_page_reviews_by_attribute.figure", [f.prod_id, "age", f.source]),
+        "update_prod_page_review_timeseries_figure": (
+            "review_sentiment_timeseries.figure", prod + [None, None, f.source]),
+        "update_prod_page_review_breakdown_figure": ("review_sentiment_breakdown.figure", prod + [f.source]),
+        "update_prod_page_review_talking_points_figure": ("pos_talking_points_fig.figure", [f.prod_id, f.source]),
+        "display_product_page_review_summary": ("pos_review_sum.children", [f.prod_id, f.source]),
+        "display_product_data_in_card": ("prod_page_card_brand_name.children", prod + [f.source]),
+    }
+
+
+def figure_cases(main, f: Fixture) -> Dict[str, Tuple[Callable, tuple, dict]]:
+    """figure_cases returns case name -> (create_*_figure function, args, kwargs), with the data prepared."""
+    dates = {"start_date": f.start_date, "end_date": f.end_date}
+    context = main.get_product_context(f.source, f.prod_id)
+    ingredient_categories = (
+        main.ing_page_ing.where(["product_name", "category"], ingredient=f.ingredient)
+        .groupby(by=["category"], observed=True)
+        .product_name.size()
+        .sort_index()
+        .reset_index()
+    )
+    ingredient_categories.columns = ["category", "product_count"]
+    return {
+        "create_category_review_trend_figure": (
+            main.create_category_review_trend_figure,
+            (main.review_trend_category_df, f.source, f.categories), dates),
+        "create_product_type_review_trend_figure": (
+            main.create_product_type_review_trend_figure,
+            (main.review_trend_product_type_df, f.source, f.category), dates),
+        "create_category_product_launch_figure": (
+            main.create_category_product_launch_figure,
+            (main.meta_product_launch_trend_category_df, f.source, f.categories), dates),
+        "create_product_type_product_launch_figure": (
+            main.create_product_type_product_launch_figure,
+            (main.meta_product_launch_trend_product_type_df, f.source, f.category), dates),
+        "create_product_launch_intensity_figure": (
+            main.create_product_launch_intensity_figure,
+            (main.product_launch_intensity_category_df, f.source, f.categories), dates),
+        "create_category_new_ingredient_trend_figure": (
+            main.create_category_new_ingredient_trend_figure,
+            (main.new_ingredient_trend_category_df, f.source, f.categories), dates),
+        "create_product_type_new_ingredient_trend_figure": (
+            main.create_product_type_new_ingredient_trend_figure,
+            (main.new_ingredient_trend_product_type_df, f.source, f.category), dates),
+        "create_reviews_by_user_attribute_figure": (
+            main.create_reviews_by_user_attribute_figure,
+            (f.source, f.category, f.product_type, "age"), {}),
+        "create_ing_page_ingredient_type_figure": (
+            main.create_ing_page_ingredient_type_figure, (f.source, f.category, f.product_type), {}),
+        "create_ing_page_category_count_figure": (
+            main.create_ing_page_category_count_figure,
+            (ingredient_categories, "category", f.ingredient), {}),
+        "create_prod_page_review_talking_points_figure": (
+            main.create_prod_page_review_talking_points_figure,
+            (context.talking_points, f.prod_id, "pos_talking_points"), {}),
+        "create_prod_page_review_breakdown_figure": (
+            main.create_prod_page_review_breakdown_figure, (context.reviews, f.prod_id, "sentiment"), {}),
+        "create_prod_page_review_timeseries_figure": (
+            main.create_prod_page_review_timeseries_figure, (context.reviews, f.prod_id, "sentiment"), {}),
+        "create_prod_page_reviews_by_user_attribute_figure": (
+            main.create_prod_page_reviews_by_user_attribute_figure, (f.prod_id, "age"), {}),
+        "create_prod_page_reviews_distribution_figure": (
+            main.create_prod_page_reviews_distribution_figure, (context.reviews, f.prod_id), {}),
+        "create_prod_page_item_price_figure": (
+            main.create_prod_page_item_price_figure, (context.item_prices,), {}),
+    }
+
+
+def callback_request(app, output: str, values: list) -> dict:
+    """callback_request builds the /_dash-update-component body of the callback with the given output."""
+    key = next(k for k in app.callback_map if output == k or output in k.strip(".").split("..."))
+    spec = app.callback_map[key]
+    inputs = [{"id": i["id"], "property": i["property"], "value": v} for i, v in zip(spec["inputs"], values)]
+    state = [
+        {"id": s["id"], "property": s["property"], "value": v}
+        for s, v in zip(spec["state"], values[len(spec["inputs"]):])
+    ]
+    outputs = [dict(zip(("id", "property"), o.rsplit(".", 1))) for o in key.strip(".").split("...")]
+    return {
+        "output": key,
+        "outputs": outputs if key.startswith("..") else outputs[0],
+        "inputs": inputs,
+        "state": state,
+        "changedPropIds": [f"{inputs[0]['id']}.{inputs[0]['property']}"],
+    }
+
+
+def measure(call: Callable[[], bytes], repeat: int, reset: Callable[[], None] = lambda: None) -> dict:
+    """measure times call (the first call, then repeat calls) and traces the allocations of one more call.
+
+    Args:
+        call (Callable[[], bytes]): runs the case and returns its payload.
+        repeat (int): number of repeated calls.
+        reset (Callable[[], None], optional): runs (untimed) before every call, e.g. clears the caches
+            the call would otherwise hit. Defaults to nothing.
+
+    Returns:
+        dict: latency distribution in milliseconds, allocation and payload bytes.
+    """
+    reset()
+    start = time.perf_counter()
+    payload = call()
+    cold = (time.perf_counter() - start) * 1000
+    timings = []
+    for _ in range(repeat):
+        reset()
+        start = time.perf_counter()
+        call()
+        timings.append((time.perf_counter() - start) * 1000)
+    reset()
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    call()
+    retained, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    timings = np.array(timings)
+    return {
+        "cold_ms": round(cold, 3),
+        "p50_ms": round(float(np.percentile(timings, 50)), 3),
+        "p90_ms": round(float(np.percentile(timings, 90)), 3),
+        "p99_ms": round(float(np.percentile(timings, 99)), 3),
+        "mean_ms": round(float(timings.mean()), 3),
+        "min_ms": round(float(timings.min()), 3),
+        "peak_alloc_bytes": int(peak - before),
+        "retained_alloc_bytes": int(retained - before),
+        "payload_bytes": len(payload),
+        "payload_gzip_bytes": len(gzip.compress(payload, 6)),
+    }
+
+
+def run_scale(scale: float, repeat: int, pattern: str, snapshot_date: str) -> List[dict]:
+    """run_scale benchmarks all cases matching pattern in this process, on the snapshot in BTE_LOCAL_DATA_DIR."""
+    import base64
+
+    from plotly.utils import PlotlyJSONEncoder
+
+    # the figure builders' pandas warnings would repeat for every call.
+    warnings.simplefilter("ignore")
+    sys.path.insert(0, APP_DIR)
+    os.chdir(APP_DIR)
+    start = time.perf_counter()
+    import main
+
+    load_seconds = time.perf_counter() - start
+    fixture = Fixture(main, snapshot_date)
+
+    def clear_caches():
+        for name in SELECTION_CACHES:
+            getattr(main, name).cache_clear()
+
+    client = main.app.server.test_client()
+    user, password = main.USERNAME_PASSWORD_PAIRS[0]
+    headers = {"Authorization": "Basic " + base64.b64encode(f"{user}:{password}".encode()).decode()}
+    selected = re.compile(pattern)
+    results = [{"case": "import main", "kind": "startup", "scale": scale, "cold_ms": round(load_seconds * 1000, 1)}]
+
+    for name, (output, values) in callback_cases(fixture).items():
+        if not selected.search(name):
+            continue
+        body = callback_request(main.app, output, values)
+
+        def call() -> bytes:
+            response = client.post("/_dash-update-component", json=body, headers=headers)
+            if response.status_code not in (200, 204):
+                raise RuntimeError(f"{name}: status {response.status_code}")
+            return response.get_data()
+
+        results.append({"case": name, "kind": "callback", "scale": scale, **measure(call, repeat, clear_caches)})
+
+    for name, (func, args, kwargs) in figure_cases(main, fixture).items():
+        if not selected.search(name):
+            continue
+        call = lambda: json.dumps(func(*args, **kwargs), cls=PlotlyJSONEncoder).encode()  # noqa: E731
+        results.append({"case": name, "kind": "figure", "scale": scale, **measure(call, repeat, clear_caches)})
+    return results
+
+
+def git_commit() -> str:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=BENCHMARKS_DIR, capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def read_history(path: str) -> List[dict]:
+    if not os.path.exists(path):
+        return []
+    with open(path) as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def baselines(history: List[dict], host: str, snapshot_date: str, runs: int) -> Dict[Tuple[str, float], dict]:
+    """baselines returns the median of every metric of the last runs on this host and snapshot, per (case, scale)."""
+    values: Dict[Tuple[str, float], Dict[str, list]] = {}
+    for run in [r for r in history if r["host"] == host and r.get("snapshot_date") == snapshot_date][-runs:]:
+        for result in run["results"]:
+            metrics = values.setdefault((result["case"], result["scale"]), {})
+            for metric in REGRESSION_METRICS:
+                if metric in result:
+                    metrics.setdefault(metric, []).append(result[metric])
+    return {
+        key: {metric: float(np.median(v)) for metric, v in metrics.items()} for key, metrics in values.items()
+    }
+
+
+def regressions(results: List[dict], baseline: dict, threshold: float, min_delta_ms: float) -> List[str]:
+    """regressions lists the metrics of the results that grew by more than threshold over the baseline."""
+    found = []
+    for result in results:
+        base = baseline.get((result["case"], result["scale"]))
+        if base is None:
+            continue
+        for metric in REGRESSION_METRICS:
+            if metric not in result or not base.get(metric):
+                continue
+            growth = result[metric] / base[metric] - 1
+            if growth <= threshold:
+                continue
+            if metric == "p50_ms" and result[metric] - base[metric] < min_delta_ms:
+                continue
+            found.append(
+                f"{result['case']} (scale {result['scale']:g}) {metric}: {base[metric]:g} -> {result[metric]:g}"
+                f" (+{growth:.0%})"
+            )
+    return found
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--scales", type=float, nargs="+", default=[1, 10])
+    parser.add_argument("--repeat", type=int, default=20, help="repeated calls per case")
+    parser.add_argument("--cases", default="", help="regular expression selecting the cases")
+    parser.add_argument("--seed", type=int, default=0, help="seed of the synthetic data")
+    parser.add_argument("--snapshot-date", default=DEFAULT_SNAPSHOT_DATE, help="date of the synthetic data")
+    parser.add_argument("--data-dir", default=DEFAULT_DATA_DIR, help="cache of the synthetic snapshots")
+    parser.add_argument("--history", default=DEFAULT_HISTORY)
+    parser.add_argument("--baseline-runs", type=int, default=5)
+    parser.add_argument("--threshold", type=float, default=0.2, help="allowed growth, 0.2 = 20%%")
+    parser.add_argument("--min-delta-ms", type=float, default=1.0, help="ignore smaller p50 latency changes")
+    parser.add_argument("--no-save", action="store_true", help="do not append this run to the history")
+    # internal: benchmark one scale in this process and write the results to a file.
+    parser.add_argument("--run-scale", type=float, help=argparse.SUPPRESS)
+    parser.add_argument("--results", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.run_scale is not None:
+        results = run_scale(args.run_scale, args.repeat, args.cases, args.snapshot_date)
+        with open(args.results, "w") as f:
+            json.dump(results, f)
+        return
+
+    results = []
+    for scale in args.scales:
+        directory = snapshot_dir(args.data_dir, scale, args.seed, args.snapshot_date)
+        with tempfile.NamedTemporaryFile(suffix=".json") as output:
+            subprocess.run(
+                [
+                    sys.executable, os.path.abspath(__file__), "--run-scale", str(scale),
+                    "--repeat", str(args.repeat), "--cases", args.cases, "--snapshot-date", args.snapshot_date, "--results", output.name,
+                ],
+                env={
+                    # the benchmarks serve no page, the stylesheets may stay on their CDNs.
+                    "BTE_SELF_HOSTED_ASSETS": "0",
+                    **os.environ,
+                    "BTE_LOCAL_DATA_DIR": os.path.abspath(directory),
+                },
+                check=True,
+                stdout=subprocess.DEVNULL,
+            )
+            results += json.load(open(output.name))
+
+    host = socket.gethostname()
+    baseline = baselines(read_history(args.history), host, args.snapshot_date, args.baseline_runs)
+    print(
+        f"{'case':<56}{'scale':>6}{'cold ms':>10}{'p50 ms':>9}{'p90 ms':>9}{'p99 ms':>9}"
+        f"{'alloc KB':>10}{'bytes':>10}{'gzip':>9}{'p50 vs base':>12}"
+    )
+    for r in results:
+        base = baseline.get((r["case"], r["scale"]), {}).get("p50_ms")
+        change = f"{r['p50_ms'] / base - 1:+.0%}" if base and "p50_ms" in r else ""
+        if r["kind"] == "startup":
+            print(f"{r['case']:<56}{r['scale']:>6g}{r['cold_ms']:>10.1f}")
+            continue
+        print(
+            f"{r['case'][:55]:<56}{r['scale']:>6g}{r['cold_ms']:>10.1f}{r['p50_ms']:>9.2f}{r['p90_ms']:>9.2f}"
+            f"{r['p99_ms']:>9.2f}{r['peak_alloc_bytes'] / 1024:>10.0f}{r['payload_bytes']:>10}"
+            f"{r['payload_gzip_bytes']:>9}{change:>12}"
+        )
+
+    if not args.no_save:
+        run = {
+            "time": datetime.now().isoformat(timespec="seconds"),
+            "commit": git_commit(),
+            "host": host,
+            "python": platform.python_version(),
+            "repeat": args.repeat,
+            "seed": args.seed,
+            "snapshot_date": args.snapshot_date,
+            "results": results,
+        }
+        with open(args.history, "a") as f:
+            f.write(json.dumps(run) + "\n")
+
+    found = regressions(results, baseline, args.threshold, args.min_delta_ms)
+    if found:
+        print(f"\n{len(found)} regression(s) beyond {args.threshold:.0%}:")
+        print("\n".join(found))
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
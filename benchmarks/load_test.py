@@ -0,0 +1,424 @@
+"""load test of a running web-app: concurrent analysts replaying user journeys through the dash callbacks.
+
+Every virtual user behaves like a browser tab running the dash renderer: it loads the layout
+(/_dash-layout), renders a page and fires the server side callbacks the way the renderer does,
+POSTing the real callback payloads to /_dash-update-component:
+
+- the initial callbacks of every component that appears (page layouts, tables, dropdown options),
+- the callbacks of every changed input, then the ones of the outputs they changed in turn, a
+  callback only once the callbacks producing its inputs are done,
+- the ready callbacks concurrently, over at most BROWSER_CONNECTIONS connections.
+
+Clientside callbacks run in the browser and are skipped. The users pick journeys at random:
+
+- category: open the category page, change the category, pick a product type and a user attribute,
+- product: open the product page, pick a product, drag the review date range twice,
+- market_trend: open the market trend page, change the categories, drag the date range,
+- ingredient: open the ingredient page, pick an ingredient, change the category,
+
+with a think time between the steps. The report gives the throughput, the error rate and the
+latency percentiles per callback (named after its first output) and per journey step.
+
+Start the server, e.g. on a synthetic snapshot (see README, 6.), then run the load test from the repository root:
+    cd meiyume_trend_engine && BTE_LOCAL_DATA_DIR=../synthetic_data/1x gunicorn --config gunicorn.conf.py wsgi:server
+    python benchmarks/load_test.py --url http://127.0.0.1:8050 --users 20 --duration 120 --ramp-up 20
+"""
+import argparse
+import json
+import random
+import threading
+import time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date
+from typing import Callable, Dict, List, NamedTuple, Set, Tuple
+
+import numpy as np
+import requests
+
+# connections a browser opens to one host.
+BROWSER_CONNECTIONS = 6
+# stop following a chain of callbacks after this many rounds (a callback cycle).
+MAX_ROUNDS = 50
+
+Prop = Tuple[str, str]
+
+
+class Dependency(NamedTuple):
+    """Dependency is a server side callback as listed by /_dash-dependencies."""
+
+    output: str
+    outputs: Tuple[Prop, ...]
+    inputs: Tuple[Prop, ...]
+    state: Tuple[Prop, ...]
+    prevent_initial_call: bool
+
+    @property
+    def name(self) -> str:
+        name = ".".join(self.outputs[0])
+        return name if len(self.outputs) == 1 else f"{name} (+{len(self.outputs) - 1})"
+
+
+def parse_dependencies(dependencies: List[dict]) -> List[Dependency]:
+    """parse_dependencies keeps the server side callbacks of /_dash-dependencies."""
+    props = lambda items: tuple((i["id"], i["property"]) for i in items)  # noqa: E731
+    return [
+        Dependency(
+            d["output"],
+            tuple(tuple(o.rsplit(".", 1)) for o in d["output"].strip(".").split("...")),
+            props(d["inputs"]),
+            props(d["state"]),
+            d.get("prevent_initial_call", False),
+        )
+        for d in dependencies
+        if not d.get("clientside_function")
+    ]
+
+
+class LoadStats:
+    """LoadStats collects the latency and outcome of every request, thread safe."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.latencies: Dict[str, List[float]] = defaultdict(list)
+        self.errors: Dict[str, int] = defaultdict(int)
+        self.bytes: Dict[str, int] = defaultdict(int)
+        self.steps: Dict[str, List[float]] = defaultdict(list)
+        self.journeys = 0
+        self.failed_journeys = 0
+
+    def record(self, name: str, seconds: float, ok: bool, size: int = 0) -> None:
+        with self._lock:
+            self.latencies[name].append(seconds)
+            self.bytes[name] += size
+            if not ok:
+                self.errors[name] += 1
+
+    def record_step(self, name: str, seconds: float) -> None:
+        with self._lock:
+            self.steps[name].append(seconds)
+
+    def record_journey(self, ok: bool) -> None:
+        with self._lock:
+            self.journeys += 1
+            self.failed_journeys += not ok
+
+
+class BrowserSession:
+    """BrowserSession is one analyst's browser tab: the rendered components' props and the callbacks they trigger."""
+
+    def __init__(self, url: str, auth: Tuple[str, str], dependencies: List[Dependency], stats: LoadStats, timeout: float):
+        self.url = url.rstrip("/")
+        self.http = requests.Session()
+        self.http.auth = auth
+        self.http.mount(self.url, requests.adapters.HTTPAdapter(pool_maxsize=BROWSER_CONNECTIONS))
+        self.dependencies = dependencies
+        self.stats = stats
+        self.timeout = timeout
+        self.props: Dict[Prop, object] = {}
+        self.components: Set[str] = set()
+        # ids rendered inside the children of a component, removed when the children are replaced.
+        self.subtrees: Dict[str, Set[str]] = {}
+        self.pool = ThreadPoolExecutor(BROWSER_CONNECTIONS)
+
+    def close(self) -> None:
+        self.pool.shutdown()
+        self.http.close()
+
+    def _collect(self, value) -> Set[str]:
+        """_collect adds the components in a layout (sub)tree and returns their ids."""
+        ids = set()
+        if isinstance(value, list):
+            for item in value:
+                ids |= self._collect(item)
+        elif isinstance(value, dict) and "props" in value and "type" in value:
+            props = value["props"] or {}
+            component_id = props.get("id")
+            if isinstance(component_id, str):
+                ids.add(component_id)
+                self.components.add(component_id)
+                for prop, prop_value in props.items():
+                    if prop != "children":
+                        self.props[(component_id, prop)] = prop_value
+            children = self._collect(props.get("children"))
+            if isinstance(component_id, str):
+                self.subtrees[component_id] = children
+            ids |= children
+        return ids
+
+    def _set_children(self, component_id: str, children) -> Set[str]:
+        for removed in self.subtrees.pop(component_id, set()):
+            self.components.discard(removed)
+            self.subtrees.pop(removed, None)
+        self.props = {k: v for k, v in self.props.items() if k[0] in self.components}
+        ids = self._collect(children)
+        self.subtrees[component_id] = ids
+        return ids
+
+    def _request(self, name: str, method: str, path: str, **kwargs) -> requests.Response:
+        start = time.perf_counter()
+        try:
+            response = self.http.request(method, self.url + path, timeout=self.timeout, **kwargs)
+        except requests.RequestException:
+            self.stats.record(name, time.perf_counter() - start, False)
+            raise
+        self.stats.record(
+            name, time.perf_counter() - start, response.status_code in (200, 204), len(response.content)
+        )
+        return response
+
+    def _fire(self, dependency: Dependency, changed: Set[Prop]) -> Dict[Prop, object]:
+        """_fire requests a callback and returns the props it updated."""
+        value = lambda prop: {"id": prop[0], "property": prop[1], "value": self.props.get(prop)}  # noqa: E731
+        outputs = [{"id": i, "property": p} for i, p in dependency.outputs]
+        body = {
+            "output": dependency.output,
+            "outputs": outputs if dependency.output.startswith("..") else outputs[0],
+            "inputs": [value(p) for p in dependency.inputs],
+            "state": [value(p) for p in dependency.state],
+            "changedPropIds": [f"{i}.{p}" for i, p in dependency.inputs if (i, p) in changed],
+        }
+        response = self._request(dependency.name, "POST", "/_dash-update-component", json=body)
+        if response.status_code != 200:
+            return {}
+        return {
+            (component_id, prop): prop_value
+            for component_id, props in response.json()["response"].items()
+            for prop, prop_value in props.items()
+        }
+
+    def _triggered(self, changed: Set[Prop], new_ids: Set[str]) -> Dict[Dependency, Set[Prop]]:
+        triggered = {}
+        for dependency in self.dependencies:
+            ids = {i for i, _ in dependency.inputs + dependency.outputs}
+            if any(i not in self.components for i in ids | {i for i, _ in dependency.state}):
+                continue
+            if any(p in changed for p in dependency.inputs) or (
+                not dependency.prevent_initial_call and ids & new_ids
+            ):
+                triggered[dependency] = {p for p in dependency.inputs if p in changed}
+        return triggered
+
+    def _run(self, changed: Set[Prop], new_ids: Set[str]) -> None:
+        """_run fires the callbacks triggered by changed props and new components, and the ones they trigger."""
+        pending = self._triggered(changed, new_ids)
+        for _ in range(MAX_ROUNDS):
+            if not pending:
+                return
+            produced = {p for d in pending for p in d.outputs}
+            ready = [d for d in pending if not (set(d.inputs) & produced - set(d.outputs))] or list(pending)
+            futures = [(d, self.pool.submit(self._fire, d, pending.pop(d))) for d in ready]
+            changed, new_ids = set(), set()
+            for _, future in futures:
+                for prop, prop_value in future.result().items():
+                    if prop[1] == "children":
+                        new_ids |= self._set_children(prop[0], prop_value)
+                    else:
+                        self.props[prop] = prop_value
+                    changed.add(prop)
+            for dependency, props in self._triggered(changed, new_ids).items():
+                pending[dependency] = pending.get(dependency, set()) | props
+
+    def open(self, pathname: str) -> None:
+        """open loads the app at pathname, like a new tab."""
+        self.props, self.components, self.subtrees = {}, set(), {}
+        response = self._request("GET /_dash-layout", "GET", "/_dash-layout")
+        response.raise_for_status()
+        new_ids = self._collect(response.json())
+        self.props[("url", "pathname")] = pathname
+        self._run({("url", "pathname")}, new_ids)
+
+    def set(self, values: Dict[Prop, object]) -> None:
+        """set changes input props, like the user picking a value, and runs the triggered callbacks."""
+        self.props.update(values)
+        self._run(set(values), set())
+
+    def options(self, component_id: str) -> list:
+        return [o["value"] for o in self.props.get((component_id, "options")) or []]
+
+
+def drag_date_range(session: BrowserSession, component_id: str, rng: random.Random) -> None:
+    """drag_date_range moves the start of a date range to a random month of the last three years."""
+    end = date.fromisoformat(str(session.props.get((component_id, "end_date")) or date.today())[:10])
+    month = end.year * 12 + end.month - 1 - rng.randint(1, 36)
+    start = date(month // 12, month % 12 + 1, 1)
+    session.set({(component_id, "start_date"): start.isoformat(), (component_id, "end_date"): end.isoformat()})
+
+
+def pick(session: BrowserSession, component_id: str, rng: random.Random) -> None:
+    """pick selects another option of a dropdown (any option when there is no other)."""
+    options = session.options(component_id)
+    if not options:
+        return
+    current = session.props.get((component_id, "value"))
+    session.set({(component_id, "value"): rng.choice([o for o in options if o != current] or options)})
+
+
+def category_journey(session: BrowserSession, rng: random.Random, step: Callable) -> None:
+    step("open category page", lambda: session.open("/page-3"))
+    step("change category", lambda: pick(session, "cat_page_category", rng))
+    step("pick product type", lambda: pick(session, "cat_page_product_type", rng))
+    step("pick user attribute", lambda: pick(session, "cat_page_user_attribute", rng))
+
+
+def product_journey(session: BrowserSession, rng: random.Random, step: Callable) -> None:
+    step("open product page", lambda: session.open("/page-4"))
+    step("pick product", lambda: pick(session, "prod_page_product", rng))
+    for _ in range(2):
+        step("drag product date range", lambda: drag_date_range(session, "prod_page_review_month_range", rng))
+
+
+def market_trend_journey(session: BrowserSession, rng: random.Random, step: Callable) -> None:
+    step("open market trend page", lambda: session.open("/page-2"))
+
+    def change_categories():
+        options = session.options("category")
+        session.set({("category", "value"): rng.sample(options, rng.randint(1, len(options)))})
+
+    step("change categories", change_categories)
+    step("drag date range", lambda: drag_date_range(session, "review_month_range", rng))
+
+
+def ingredient_journey(session: BrowserSession, rng: random.Random, step: Callable) -> None:
+    step("open ingredient page", lambda: session.open("/page-5"))
+    step("pick ingredient", lambda: pick(session, "ing_page_ing", rng))
+    step("change ingredient page category", lambda: pick(session, "ing_page_category", rng))
+
+
+JOURNEYS = {
+    "category": category_journey,
+    "product": product_journey,
+    "market_trend": market_trend_journey,
+    "ingredient": ingredient_journey,
+}
+
+
+def virtual_user(args, user: int, dependencies: List[Dependency], stats: LoadStats, deadline: float, stop: threading.Event):
+    """virtual_user runs random journeys, with think times between the steps, until the deadline."""
+    rng = random.Random(args.seed * 1000 + user)
+    session = BrowserSession(args.url, tuple(args.auth.split(":", 1)), dependencies, stats, args.timeout)
+
+    def step(name: str, action: Callable) -> None:
+        if time.monotonic() >= deadline or stop.is_set():
+            raise TimeoutError
+        start = time.perf_counter()
+        action()
+        stats.record_step(name, time.perf_counter() - start)
+        stop.wait(rng.uniform(0.5, 1.5) * args.think_time)
+
+    try:
+        while time.monotonic() < deadline and not stop.is_set():
+            journey = JOURNEYS[rng.choice(args.journeys)]
+            try:
+                journey(session, rng, step)
+            except TimeoutError:
+                return
+            except (requests.RequestException, ValueError, KeyError) as ex:
+                print(f"*WARNING: user {user} journey {journey.__name__} failed: {ex!r}*", flush=True)
+                stats.record_journey(False)
+                stop.wait(args.think_time)
+            else:
+                stats.record_journey(True)
+    finally:
+        session.close()
+
+
+def summarize(latencies: Dict[str, List[float]], errors: Dict[str, int] = None) -> List[dict]:
+    rows = []
+    for name, seconds in latencies.items():
+        ms = np.array(seconds) * 1000
+        rows.append({
+            "name": name,
+            "count": len(ms),
+            "errors": (errors or {}).get(name, 0),
+            "p50_ms": round(float(np.percentile(ms, 50)), 1),
+            "p90_ms": round(float(np.percentile(ms, 90)), 1),
+            "p99_ms": round(float(np.percentile(ms, 99)), 1),
+            "max_ms": round(float(ms.max()), 1),
+        })
+    return sorted(rows, key=lambda r: -r["p99_ms"])
+
+
+def print_table(title: str, rows: List[dict], elapsed: float) -> None:
+    print(f"\n{title:<60}{'count':>8}{'req/s':>8}{'errors':>8}{'p50 ms':>9}{'p90 ms':>9}{'p99 ms':>9}{'max ms':>9}")
+    for r in rows:
+        print(
+            f"{r['name'][:59]:<60}{r['count']:>8}{r['count'] / elapsed:>8.2f}{r['errors']:>8}"
+            f"{r['p50_ms']:>9.1f}{r['p90_ms']:>9.1f}{r['p99_ms']:>9.1f}{r['max_ms']:>9.1f}"
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--url", default="http://127.0.0.1:8050")
+    parser.add_argument("--auth", default="user:pwd123", help="basic auth user:password")
+    parser.add_argument("--users", type=int, default=10, help="concurrent analysts")
+    parser.add_argument("--duration", type=float, default=60, help="seconds of load (after the ramp-up)")
+    parser.add_argument("--ramp-up", type=float, default=10, help="seconds over which the users start")
+    parser.add_argument("--think-time", type=float, default=2.0, help="mean seconds between two steps")
+    parser.add_argument("--journeys", nargs="+", choices=sorted(JOURNEYS), default=sorted(JOURNEYS))
+    parser.add_argument("--timeout", type=float, default=60, help="seconds before a request fails")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--json", help="also write the report to this file")
+    args = parser.parse_args()
+
+    http = requests.Session()
+    http.auth = tuple(args.auth.split(":", 1))
+    response = http.get(args.url.rstrip("/") + "/_dash-dependencies", timeout=args.timeout)
+    response.raise_for_status()
+    dependencies = parse_dependencies(response.json())
+
+    stats = LoadStats()
+    stop = threading.Event()
+    start = time.monotonic()
+    deadline = start + args.ramp_up + args.duration
+    users = []
+    for user in range(args.users):
+        thread = threading.Thread(
+            target=virtual_user, args=(args, user, dependencies, stats, deadline, stop), name=f"user-{user}", daemon=True
+        )
+        thread.start()
+        users.append(thread)
+        stop.wait(args.ramp_up / args.users)
+    try:
+        for thread in users:
+            thread.join()
+    except KeyboardInterrupt:
+        stop.set()
+        for thread in users:
+            thread.join()
+    elapsed = time.monotonic() - start
+
+    requests_rows = summarize(stats.latencies, stats.errors)
+    step_rows = summarize(stats.steps)
+    total = sum(r["count"] for r in requests_rows)
+    errors = sum(r["errors"] for r in requests_rows)
+    print(
+        f"{args.users} users, {elapsed:.0f}s: {stats.journeys} journeys ({stats.failed_journeys} failed), "
+        f"{total} requests, {total / elapsed:.1f} req/s, {sum(stats.bytes.values()) / 2 ** 20:.1f}MB received, "
+        f"error rate {errors / max(total, 1):.2%}"
+    )
+    print_table("request", requests_rows, elapsed)
+    print_table("journey step", step_rows, elapsed)
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(
+                {
+                    "url": args.url,
+                    "users": args.users,
+                    "seconds": round(elapsed, 1),
+                    "journeys": stats.journeys,
+                    "failed_journeys": stats.failed_journeys,
+                    "requests": total,
+                    "errors": errors,
+                    "requests_per_second": round(total / elapsed, 2),
+                    "callbacks": requests_rows,
+                    "steps": step_rows,
+                },
+                f,
+                indent=2,
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,115 @@
+// clientside callbacks for presentation only interactions (text from clicks, navigation state).
+// they run in the browser, so these interactions do not cost a request to the server.
+if (!window.dash_clientside) {
+  window.dash_clientside = {};
+}
+
+function selectedCategoryText(clickData, defaultText) {
+  if (clickData) {
+    return "Selected Category: " + clickData.points[0].customdata[0];
+  }
+  return defaultText;
+}
+
+// keeps the points of a trace whose x (month, YYYY-MM-DD) lies within [start, end].
+// every per point array of the trace (y, customdata, hovertext, marker colors...) is cut the same way.
+function sliceTraceByDate(trace, start, end) {
+  if (!Array.isArray(trace.x)) {
+    return trace;
+  }
+  var n = trace.x.length;
+  var keep = [];
+  for (var i = 0; i < n; i++) {
+    var x = String(trace.x[i]).slice(0, 10);
+    if ((!start || x >= start) && (!end || x <= end)) {
+      keep.push(i);
+    }
+  }
+  function cut(values) {
+    return keep.map(function(i) {
+      return values[i];
+    });
+  }
+  var sliced = {};
+  Object.keys(trace).forEach(function(key) {
+    var value = trace[key];
+    if (Array.isArray(value) && value.length === n) {
+      sliced[key] = cut(value);
+    } else if (value && typeof value === "object" && !Array.isArray(value)) {
+      sliced[key] = {};
+      Object.keys(value).forEach(function(subkey) {
+        var subvalue = value[subkey];
+        sliced[key][subkey] =
+          Array.isArray(subvalue) && subvalue.length === n ? cut(subvalue) : subvalue;
+      });
+    } else {
+      sliced[key] = value;
+    }
+  });
+  return sliced;
+}
+
+window.dash_clientside.bte = {
+  // cuts a stored whole-date-range market trend figure down to the picked date range and,
+  // when categories are passed, to the traces of the selected categories.
+  filterFigure: function(figure, startDate, endDate, categories) {
+    if (!figure || !figure.data) {
+      return figure || {};
+    }
+    var start = startDate ? startDate.slice(0, 10) : null;
+    var end = endDate ? endDate.slice(0, 10) : null;
+    if (categories && !Array.isArray(categories)) {
+      categories = [categories];
+    }
+    var data = figure.data
+      .filter(function(trace) {
+        return !categories || categories.indexOf(trace.legendgroup) !== -1;
+      })
+      .map(function(trace) {
+        return sliceTraceByDate(trace, start, end);
+      });
+    return Object.assign({}, figure, { data: data });
+  },
+
+  // category name of the clicked bar on the market trend page figures.
+  selectedCategory: function(clickData) {
+    return selectedCategoryText(clickData, "");
+  },
+
+  // category name of the clicked bar, for figures whose subcategory plot defaults to bath-body.
+  selectedCategoryOrBathBody: function(clickData) {
+    return selectedCategoryText(clickData, "Selected Category: bath-body");
+  },
+
+  // category name of the clicked bar on the ingredient page.
+  selectedIngredientCategory: function(clickData) {
+    return selectedCategoryText(
+      clickData,
+      "Click on the bar of a Category to display ingredient distribution over Subcategories under it."
+    );
+  },
+
+  toggleNavbarCollapse: function(n, isOpen) {
+    if (n) {
+      return !isOpen;
+    }
+    return isOpen;
+  },
+
+  toggleSidebarClassname: function(n, classname) {
+    if (n && classname === "") {
+      return "collapsed";
+    }
+    return "";
+  },
+
+  // sets the active state of the nav links from the current pathname.
+  toggleActiveLinks: function(pathname) {
+    var active = [];
+    for (var i = 1; i <= 5; i++) {
+      // treat page 1 as the homepage / index
+      active.push(pathname === "/page-" + i || (i === 1 && pathname === "/"));
+    }
+    return active;
+  }
+};
@@ -1,9 +1,16 @@
 """this module reads all the required data for category page of web-app, defines figure functions and create initial placeholder graphs."""
 import pandas as pd
-import plotly.express as px
 import plotly.graph_objs as go
 
-from bte_utils import read_file_s3, set_default_start_and_end_dates
+from bte_figure_builders import bar_figure
+from bte_single_flight import single_flight
+from bte_startup_trace import startup_span
+from bte_utils import (
+    build_row_index,
+    observed_value_counts,
+    read_file_s3,
+    set_default_start_and_end_dates,
+)
 
 BANNED = "Banned?"
 DATE_FIRST_REVIEWED = "Date (First Reviewed)"
@@ -110,6 +117,21 @@ cat_page_reviews_by_user_attributes_df = read_file_s3(
 # pd.read_feather(
 #     dash_data_path/'category_page_reviews_by_user_attributes')
 
+""" index the table data by selection so a page request does not scan the whole frame """
+CATEGORY_PAGE_KEYS = ["source", "category", "product_type"]
+cat_page_new_products_details_index = build_row_index(
+    cat_page_new_products_details_df, CATEGORY_PAGE_KEYS
+)
+cat_page_item_package_oz_index = build_row_index(
+    cat_page_item_package_oz_df, CATEGORY_PAGE_KEYS
+)
+cat_page_top_products_index = build_row_index(
+    cat_page_top_products_df, CATEGORY_PAGE_KEYS
+)
+cat_page_new_ingredients_index = build_row_index(
+    cat_page_new_ingredients_df, CATEGORY_PAGE_KEYS
+)
+
 """ create dropdown options """
 category_page_category_options = [
     {"label": i, "value": i} for i in cat_page_pricing_analytics_df.category.unique()
@@ -133,6 +155,7 @@ category_page_user_attribute_options = [
 """ create graph figure functions"""
 
 
+@single_flight
 def create_reviews_by_user_attribute_figure(
     source: str = "us",
     category: str = "skincare",
@@ -153,17 +176,23 @@ def create_reviews_by_user_attribute_figure(
         go.Figure: [description]
     """
     data = pd.DataFrame(
-        cat_page_reviews_by_user_attributes_df[
-            (cat_page_reviews_by_user_attributes_df.source == source)
-            & (cat_page_reviews_by_user_attributes_df.category == category)
-            & (cat_page_reviews_by_user_attributes_df.product_type == product_type)
-        ][user_attribute].value_counts()
+        observed_value_counts(
+            cat_page_reviews_by_user_attributes_df[
+                (cat_page_reviews_by_user_attributes_df.source == source)
+                & (cat_page_reviews_by_user_attributes_df.category == category)
+                & (cat_page_reviews_by_user_attributes_df.product_type == product_type)
+            ][user_attribute]
+        )
     ).reset_index()
     data.columns = [user_attribute, "review_count"]
     data = data[data[user_attribute] != ""]
 
     plot_title = user_attribute.replace("_", " ").title()
-    fig = px.bar(
+    if user_attribute == "age":
+        categoryorder = "category descending"
+    else:
+        categoryorder = "total ascending"
+    return bar_figure(
         data,
         x="review_count",
         y=user_attribute,
@@ -172,33 +201,12 @@ def create_reviews_by_user_attribute_figure(
         height=400,
         # title=f"Reviews by {plot_title}",
         text="review_count",
-    )
-    fig.update_layout(
-        font_family="GothamLight",
-        font_color="#c09891",
-        title_font_family="GildaDisplay",
-        title_font_color="#c09891",
-        title_font_size=24,
-        legend_title_font_color="green",
-        hovermode="closest",
         xaxis={"title": "Review Count"},
-        yaxis={"title": user_attribute},
+        yaxis={"title": user_attribute, "categoryorder": categoryorder},
+        layout={"hovermode": "closest"},
     )
-    if user_attribute == "age":
-        fig.update_layout(yaxis={"categoryorder": "category descending"})
-    else:
-        fig.update_layout(yaxis={"categoryorder": "total ascending"})
-    fig.update_xaxes(
-        tickfont=dict(family="GothamLight", color="crimson", size=14),
-        title_font=dict(size=20, family="GothamLight", color="crimson"),
-    )
-    fig.update_yaxes(
-        tickfont=dict(family="GothamLight", color="crimson", size=14),
-        title_font=dict(size=20, family="GothamLight", color="crimson"),
-    )
-
-    return fig
 
 
 """ create initial figures/graphs. """
-cat_page_user_attribute_figure = create_reviews_by_user_attribute_figure()
+with startup_span("cat_page_user_attribute_figure", "figure"):
+    cat_page_user_attribute_figure = create_reviews_by_user_attribute_figure()
@@ -0,0 +1,383 @@
+"""read-only datasets shared by the server's worker processes through POSIX shared memory.
+
+Even with the data preloaded in the gunicorn master, a pandas frame loses its copy-on-write
+sharing page by page: every read of an object column changes the reference counts of its
+python strings. With SHARED_DATASETS the largest frames are published once as Arrow tables
+in named shared memory segments (/dev/shm/bte_<name>_<pid>). Arrow keeps its columns in
+flat buffers without python objects, so every worker reads the same physical pages, and
+only the rows a request selects become (small, private) pandas frames.
+
+Both dataset kinds answer the same row selections:
+
+- take(positions, columns): rows at known positions (e.g. from bte_utils.build_row_index),
+- where(columns, **equals): rows whose columns equal the given values,
+- column(name): one whole column,
+- unique(name): the distinct values of a column,
+- value_counts(name): the rows per distinct value of a column.
+
+Without SHARED_DATASETS publish_dataset returns a FrameDataset, which answers them from the
+pandas frame in process memory.
+
+The datasets in PARTITIONED_DATASETS are not read whole: open_partitioned_dataset returns a
+PartitionedDataset over hive partitioned parquet files (source=/category=), which reads a
+partition when a selection first pins it and keeps it in the worker. So a worker only holds
+the partitions its users selected. Selections across partitions (e.g. an ingredient in every
+category) scan the partitions not held, with the filter pushed down to the parquet files: each
+such selection opens every partition not held which may contain its rows, so the last
+PARTITION_SCAN_CACHE_SIZE of them are kept. The distinct values of the columns indexed when the
+dataset was written (bte_utils.PARTITION_INDEX_COLUMNS) come from that index, which also tells
+the partitions a value is in, the others are not opened. It has no row positions, so it does not
+answer take.
+"""
+import atexit
+import os
+import time
+from functools import lru_cache
+from multiprocessing import shared_memory
+from typing import Dict, List
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.dataset as ds
+
+from bte_instrumentation import note_slice
+from bte_metrics import record_data_load, track_dataset
+from bte_single_flight import SingleFlight
+from bte_startup_trace import startup_span
+from bte_utils import (
+    PARTITION_COLUMNS,
+    categorize_columns,
+    read_partitioned_dataset,
+    read_partitioned_dataset_index,
+)
+from settings import CALLBACK_TIMING, CATEGORICAL_COLUMNS, PARTITION_SCAN_CACHE_SIZE, SHARED_DATASETS
+
+# posix shared memory segments are files of this tmpfs on linux.
+SHM_DIR = "/dev/shm"
+
+
+def _frame_mask(data: pd.DataFrame, equals: dict) -> np.ndarray:
+    mask = np.ones(len(data), dtype=bool)
+    for column, value in equals.items():
+        mask &= (data[column] == value).values
+    return mask
+
+
+class FrameDataset:
+    """FrameDataset answers row selections from a pandas DataFrame in process memory."""
+
+    def __init__(self, name: str, data: pd.DataFrame):
+        self.name = name
+        self.data = data
+
+    def __len__(self) -> int:
+        return len(self.data)
+
+    def _rows(self, positions: np.ndarray, columns: List[str] = None) -> pd.DataFrame:
+        rows = self.data.iloc[positions]
+        return (rows if columns is None else rows[columns]).reset_index(drop=True)
+
+    def take(self, positions: np.ndarray, columns: List[str] = None) -> pd.DataFrame:
+        if CALLBACK_TIMING:
+            note_slice(self.name, f"{len(positions)} positions", len(positions))
+        return self._rows(positions, columns)
+
+    def where(self, columns: List[str] = None, **equals) -> pd.DataFrame:
+        mask = _frame_mask(self.data, equals)
+        if CALLBACK_TIMING:
+            note_slice(self.name, equals, int(mask.sum()))
+        return self._rows(np.flatnonzero(mask), columns)
+
+    def column(self, name: str) -> pd.Series:
+        return self.data[name]
+
+    def unique(self, name: str) -> list:
+        return self.data[name].unique().tolist()
+
+    def value_counts(self, name: str) -> pd.Series:
+        return self.data[name].value_counts()
+
+
+def _unlink(segment: shared_memory.SharedMemory, owner: int) -> None:
+    # forked workers inherit the atexit hook, only the publishing process removes the segment.
+    if os.getpid() == owner:
+        try:
+            segment.unlink()
+        except FileNotFoundError:
+            pass
+
+
+def _equal_mask(array: pa.Array, value) -> np.ndarray:
+    # nulls and values of another type never match.
+    try:
+        return pc.fill_null(pc.equal(array, value), False).to_numpy(zero_copy_only=False)
+    except (pa.ArrowInvalid, pa.ArrowNotImplementedError, pa.ArrowTypeError):
+        return np.zeros(len(array), dtype=bool)
+
+
+class ArrowDataset:
+    """ArrowDataset answers row selections from an Arrow table in a named shared memory segment."""
+
+    def __init__(self, name: str, segment_name: str):
+        self.name = name
+        self.segment_name = segment_name
+        # the segment is memory mapped read only: every process maps the same physical pages and the
+        # record batches point into them, reading the stream copies nothing.
+        source = pa.memory_map(os.path.join(SHM_DIR, segment_name))
+        self.table = pa.ipc.open_stream(source).read_all()
+
+    @classmethod
+    def publish(cls, name: str, data: pd.DataFrame) -> "ArrowDataset":
+        """publish writes a DataFrame as an Arrow ipc stream into a new shared memory segment.
+
+        Args:
+            name (str): dataset name, part of the segment name.
+            data (pd.DataFrame): data to share; categorical columns are stored dictionary encoded.
+
+        Returns:
+            ArrowDataset: the dataset, attached to the segment.
+        """
+        table = pa.Table.from_pandas(data, preserve_index=False)
+        size = pa.MockOutputStream()
+        with pa.ipc.new_stream(size, table.schema) as writer:
+            writer.write_table(table)
+        segment = shared_memory.SharedMemory(
+            name=f"bte_{name}_{os.getpid()}", create=True, size=size.size()
+        )
+        buffer = pa.py_buffer(segment.buf)
+        with pa.ipc.new_stream(pa.FixedSizeBufferWriter(buffer), table.schema) as writer:
+            writer.write_table(table)
+        del buffer, writer
+        segment.close()
+        atexit.register(_unlink, segment, os.getpid())
+        return cls(name, segment.name)
+
+    @classmethod
+    def attach(cls, name: str, segment_name: str) -> "ArrowDataset":
+        """attach opens a dataset another process published, e.g. in a process that was not forked from it."""
+        return cls(name, segment_name)
+
+    def __reduce__(self):
+        # processes receiving the dataset attach to the segment instead of unpickling a copy.
+        return ArrowDataset.attach, (self.name, self.segment_name)
+
+    def __len__(self) -> int:
+        return self.table.num_rows
+
+    def _select(self, table: pa.Table, columns: List[str] = None) -> pd.DataFrame:
+        if columns is not None:
+            table = pa.table({c: table.column(c) for c in columns})
+        return table.to_pandas()
+
+    def take(self, positions: np.ndarray, columns: List[str] = None) -> pd.DataFrame:
+        positions = np.asarray(positions, dtype=np.int64)
+        if CALLBACK_TIMING:
+            note_slice(self.name, f"{len(positions)} positions", len(positions))
+        return self._select(self.table.take(pa.array(positions)), columns)
+
+    def _equals(self, column: str, value) -> np.ndarray:
+        masks = []
+        for chunk in self.table.column(column).chunks:
+            if pa.types.is_dictionary(chunk.type):
+                # compare the dictionary (one entry per distinct value) in arrow and pick the match of every
+                # integer code: the strings of the column are never materialized.
+                matches = _equal_mask(chunk.dictionary, value)
+                if not matches.any():
+                    masks.append(np.zeros(len(chunk), dtype=bool))
+                    continue
+                mask = matches[pc.fill_null(chunk.indices, 0).to_numpy(zero_copy_only=False)]
+                if chunk.null_count:
+                    mask &= chunk.is_valid().to_numpy(zero_copy_only=False)
+                masks.append(mask)
+            else:
+                masks.append(_equal_mask(chunk, value))
+        return np.concatenate(masks) if masks else np.zeros(0, dtype=bool)
+
+    def where(self, columns: List[str] = None, **equals) -> pd.DataFrame:
+        mask = np.ones(self.table.num_rows, dtype=bool)
+        for column, value in equals.items():
+            mask &= self._equals(column, value)
+        positions = np.flatnonzero(mask)
+        if CALLBACK_TIMING:
+            note_slice(self.name, equals, len(positions))
+        return self._select(self.table.take(pa.array(positions)), columns)
+
+    def column(self, name: str) -> pd.Series:
+        return self.table.column(name).to_pandas()
+
+    def unique(self, name: str) -> list:
+        return self.column(name).unique().tolist()
+
+    def value_counts(self, name: str) -> pd.Series:
+        return self.column(name).value_counts()
+
+
+class PartitionedDataset:
+    """PartitionedDataset answers row selections from hive partitioned parquet files, read per partition on demand."""
+
+    def __init__(self, name: str, dataset: ds.Dataset, index: pd.DataFrame = None):
+        self.name = name
+        self.dataset = dataset
+        # distinct values of some columns per partition (see bte_utils.partition_value_index), if indexed.
+        self.index = index
+        self.indexed: Dict[str, pd.DataFrame] = {}
+        if index is not None:
+            self.indexed = {column: values for column, values in index.groupby("column", sort=False)}
+        # files of every partition, by partition values (in PARTITION_COLUMNS order); listing them reads no rows.
+        self.fragments: Dict[tuple, list] = {}
+        for fragment in dataset.get_fragments():
+            values = ds.get_partition_keys(fragment.partition_expression)
+            key = tuple(values.get(column) for column in PARTITION_COLUMNS)
+            self.fragments.setdefault(key, []).append(fragment)
+        # partitions read so far, by partition values.
+        self.partitions: Dict[tuple, pd.DataFrame] = {}
+        self._reads = SingleFlight(f"partitions_{name}")
+        self._scanned = lru_cache(maxsize=PARTITION_SCAN_CACHE_SIZE)(self._scan_frame)
+        self._rows = None
+
+    def __reduce__(self):
+        # processes receiving the dataset read their own partitions.
+        return PartitionedDataset, (self.name, self.dataset, self.index)
+
+    def __len__(self) -> int:
+        if self._rows is None:
+            # from the parquet footers, no rows are read.
+            self._rows = self.dataset.count_rows()
+        return self._rows
+
+    def _read_partition(self, key: tuple) -> pd.DataFrame:
+        data = self.partitions.get(key)
+        if data is None:
+            data = self._scan([key]).to_pandas()
+            if CATEGORICAL_COLUMNS:
+                categorize_columns(data)
+            self.partitions[key] = data
+        return data
+
+    def partition(self, key: tuple) -> pd.DataFrame:
+        """partition returns the rows of a partition, read once (by one request at a time) and kept."""
+        data = self.partitions.get(key)
+        if data is None:
+            data = self._reads.do(key, self._read_partition, key)
+        return data
+
+    def _scan(self, keys: List[tuple], columns: List[str] = None, equals: dict = None) -> pa.Table:
+        # only the files of the partitions are opened, the filter skips their row groups whose statistics exclude it.
+        fragments = [fragment for key in keys for fragment in self.fragments[key]]
+        dataset = ds.FileSystemDataset(fragments, self.dataset.schema, self.dataset.format, self.dataset.filesystem)
+        condition = None
+        for column, value in (equals or {}).items():
+            condition = ds.field(column) == value if condition is None else condition & (ds.field(column) == value)
+        return dataset.to_table(columns=columns, filter=condition)
+
+    def _scan_frame(self, keys: tuple, columns: tuple, equals: tuple) -> pd.DataFrame:
+        # read only, callers get copies.
+        return self._scan(list(keys), None if columns is None else list(columns), dict(equals)).to_pandas()
+
+    def _partitions_with(self, name: str, value) -> set:
+        values = self.indexed[name]
+        values = values[values.value == str(value)]
+        return set(zip(*(values[column] for column in PARTITION_COLUMNS)))
+
+    def where(self, columns: List[str] = None, **equals) -> pd.DataFrame:
+        pinned = [equals.get(column) for column in PARTITION_COLUMNS]
+        keys = [
+            key
+            for key in self.fragments
+            if all(value is None or value == key_value for value, key_value in zip(pinned, key))
+        ]
+        rest = {column: value for column, value in equals.items() if column not in PARTITION_COLUMNS}
+        for column in self.indexed.keys() & rest.keys():
+            # the partitions without the value hold none of the rows.
+            having = self._partitions_with(column, rest[column])
+            keys = [key for key in keys if key in having]
+        if None not in pinned:
+            # one partition: read it whole once, the next selections of its rows are answered from memory.
+            held = keys
+        else:
+            # across partitions: the ones held answer from memory, the others are scanned and not kept.
+            held = [key for key in keys if key in self.partitions]
+        frames = []
+        for key in held:
+            data = self.partition(key)
+            rows = data[_frame_mask(data, rest)]
+            frames.append(rows if columns is None else rows[columns])
+        scanned = [key for key in keys if key not in held]
+        if scanned or not frames:
+            if scanned:
+                frames.append(
+                    self._scanned(tuple(scanned), None if columns is None else tuple(columns), tuple(rest.items()))
+                )
+            else:
+                frames.append(self._empty(columns))
+        rows = frames[0] if len(frames) == 1 else pd.concat(frames)
+        if CALLBACK_TIMING:
+            note_slice(self.name, equals, len(rows))
+        return rows.reset_index(drop=True)
+
+    def _empty(self, columns: List[str] = None) -> pd.DataFrame:
+        schema = self.dataset.schema
+        if columns is not None:
+            schema = pa.schema([schema.field(column) for column in columns])
+        return schema.empty_table().to_pandas()
+
+    def column(self, name: str) -> pd.Series:
+        return self.dataset.to_table(columns=[name]).column(name).to_pandas()
+
+    def unique(self, name: str) -> list:
+        if name in PARTITION_COLUMNS:
+            # from the partition values, no rows are read.
+            position = PARTITION_COLUMNS.index(name)
+            return list(dict.fromkeys(key[position] for key in self.fragments))
+        if name in self.indexed:
+            return list(dict.fromkeys(self.indexed[name].value))
+        return self.column(name).unique().tolist()
+
+    def value_counts(self, name: str) -> pd.Series:
+        if name in self.indexed:
+            counts = self.indexed[name].groupby("value").rows.sum()
+            return counts.rename(name).rename_axis(None).sort_values(ascending=False)
+        return self.column(name).value_counts()
+
+
+def publish_dataset(name: str, data: pd.DataFrame):
+    """publish_dataset makes a frame available for row selections, in shared memory with SHARED_DATASETS.
+
+    The caller drops its own reference to data afterwards, so only the dataset keeps the rows.
+
+    Args:
+        name (str): dataset name.
+        data (pd.DataFrame): data to publish; repetitive string columns are made categorical first
+                             (with CATEGORICAL_COLUMNS).
+
+    Returns:
+        Union[ArrowDataset, FrameDataset]: the dataset.
+    """
+    with startup_span(data.attrs.get("name", name), "publish", shared=SHARED_DATASETS, rows=len(data)):
+        if CATEGORICAL_COLUMNS:
+            categorize_columns(data)
+        if SHARED_DATASETS:
+            dataset = ArrowDataset.publish(name, data)
+        else:
+            dataset = FrameDataset(name, data)
+    # the metrics of the file the rows were read from measure the dataset from now on.
+    track_dataset(data.attrs.get("name", name), dataset)
+    return dataset
+
+
+def open_partitioned_dataset(name: str, filename: str) -> PartitionedDataset:
+    """open_partitioned_dataset opens a dataset stored as hive partitioned parquet, its rows are read on demand.
+
+    Args:
+        name (str): dataset name.
+        filename (str): name of the stored dataset (its feather file name), see read_partitioned_dataset.
+
+    Returns:
+        PartitionedDataset: the dataset.
+    """
+    start = time.perf_counter()
+    dataset = PartitionedDataset(name, read_partitioned_dataset(filename), read_partitioned_dataset_index(filename))
+    record_data_load(filename, dataset, time.perf_counter() - start)
+    return dataset
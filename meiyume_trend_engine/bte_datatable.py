@@ -0,0 +1,148 @@
+"""server side ('custom') filtering, sorting and paging backend for the web-app's DataTables.
+
+With filter_action, sort_action and page_action set to 'custom' the table sends its
+filter_query, sort_by, page_current and page_size to the callback, and the callback
+returns only the rows of the requested page together with the page count.
+"""
+import math
+import re
+from typing import List, Tuple
+
+import numpy as np
+import pandas as pd
+
+from settings import DATATABLE_PAGE_SIZE
+
+# "{column} operator value" clauses of a DataTable filter_query, joined by "&&".
+# operators may carry dash_table's "s" (case sensitive) or "i" (case insensitive) prefix.
+FILTER_CLAUSE = re.compile(
+    r"^\s*\{(?P<column>[^}]+)\}\s*"
+    r"(?P<case>[si]?)(?P<operator>>=|<=|!=|<|>|=|eq|ne|lt|le|gt|ge|contains|datestartswith)"
+    r"\s*(?P<value>.*?)\s*$"
+)
+OPERATORS = {
+    ">=": "ge",
+    "<=": "le",
+    "!=": "ne",
+    "<": "lt",
+    ">": "gt",
+    "=": "eq",
+}
+
+
+def split_filter_query(filter_query: str) -> List[Tuple[str, str, bool, str]]:
+    """split_filter_query parses a DataTable filter_query into (column, operator, case_sensitive, value) clauses.
+
+    Clauses that cannot be parsed are skipped, the same way the table ignores an invalid filter.
+
+    Args:
+        filter_query (str): filter_query property of the DataTable.
+
+    Returns:
+        List[Tuple[str, str, bool, str]]: parsed clauses.
+    """
+    clauses = []
+    for part in (filter_query or "").split("&&"):
+        match = FILTER_CLAUSE.match(part)
+        if match is None or match.group("value") == "":
+            continue
+        value = match.group("value")
+        if value[0] == value[-1] and value[0] in "'\"`" and len(value) > 1:
+            value = value[1:-1].replace("\\" + value[0], value[0])
+        operator = OPERATORS.get(match.group("operator"), match.group("operator"))
+        clauses.append(
+            (match.group("column"), operator, match.group("case") != "i", value)
+        )
+    return clauses
+
+
+def _is_number(value: str) -> bool:
+    try:
+        float(value)
+    except ValueError:
+        return False
+    return True
+
+
+def filter_rows(data: pd.DataFrame, filter_query: str) -> pd.DataFrame:
+    """filter_rows evaluates a DataTable filter_query against the DataFrame.
+
+    Args:
+        data (pd.DataFrame): table data.
+        filter_query (str): filter_query property of the DataTable.
+
+    Returns:
+        pd.DataFrame: rows matching all clauses.
+    """
+    mask = np.ones(len(data), dtype=bool)
+    for column, operator, case_sensitive, value in split_filter_query(filter_query):
+        if column not in data.columns:
+            continue
+        col = data[column]
+        if (
+            operator not in ("contains", "datestartswith")
+            and pd.api.types.is_numeric_dtype(col)
+            and _is_number(value)
+        ):
+            value = float(value)
+        else:
+            col = col.astype(str)
+            if not case_sensitive:
+                col = col.str.lower()
+                value = value.lower()
+        if operator == "contains":
+            mask &= col.str.contains(value, regex=False).values
+        elif operator == "datestartswith":
+            mask &= col.str.startswith(value).values
+        else:
+            mask &= getattr(col, operator)(value).values
+    return data[mask]
+
+
+def sort_rows(data: pd.DataFrame, sort_by: List[dict]) -> pd.DataFrame:
+    """sort_rows sorts the DataFrame by the DataTable sort_by property.
+
+    Args:
+        data (pd.DataFrame): table data.
+        sort_by (List[dict]): sort_by property of the DataTable.
+
+    Returns:
+        pd.DataFrame: sorted rows.
+    """
+    sort_by = [s for s in sort_by or [] if s["column_id"] in data.columns]
+    if not sort_by:
+        return data
+    return data.sort_values(
+        by=[s["column_id"] for s in sort_by],
+        ascending=[s["direction"] == "asc" for s in sort_by],
+        kind="mergesort",
+        na_position="last",
+    )
+
+
+def page_table(
+    data: pd.DataFrame,
+    page_current: int = 0,
+    page_size: int = DATATABLE_PAGE_SIZE,
+    sort_by: List[dict] = None,
+    filter_query: str = "",
+) -> Tuple[list, int, int]:
+    """page_table filters, sorts and pages a table on the server.
+
+    Args:
+        data (pd.DataFrame): rows of the current selection.
+        page_current (int, optional): page the table is on. Defaults to 0.
+        page_size (int, optional): rows per page. Defaults to DATATABLE_PAGE_SIZE.
+        sort_by (List[dict], optional): sort_by property of the DataTable. Defaults to None.
+        filter_query (str, optional): filter_query property of the DataTable. Defaults to ''.
+
+    Returns:
+        Tuple[list, int, int]: records of the requested page, page count and total matching row count.
+    """
+    data = sort_rows(filter_rows(data, filter_query), sort_by)
+    total = len(data)
+    page_size = page_size or DATATABLE_PAGE_SIZE
+    page_count = max(1, math.ceil(total / page_size))
+    page_current = min(page_current or 0, page_count - 1)
+    start = page_current * page_size
+    return data.iloc[start : start + page_size].to_dict("records"), page_count, total
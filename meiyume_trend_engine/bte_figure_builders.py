@@ -0,0 +1,244 @@
+"""thin figure builders for the per-request bar and pie charts of the web-app.
+
+plotly.express spends most of its time on argument validation, column inference and
+trace grouping. The page figure functions already hand over aggregated data, so the
+"go" engine builds the plotly figure dicts straight from the numpy arrays, with the
+same traces and layout plotly.express would produce, and skips graph_objects
+validation unless VALIDATE_FIGURES is set. The "px" engine keeps the plotly.express
+implementation as reference and fallback.
+"""
+from functools import lru_cache
+from typing import Mapping, Sequence, Union
+
+import numpy as np
+import pandas as pd
+import plotly.express as px
+import plotly.graph_objs as go
+import plotly.io as pio
+
+from settings import FIGURE_ENGINE, VALIDATE_FIGURES
+
+Figure = Union[dict, go.Figure]
+
+
+@lru_cache(maxsize=None)
+def _template_json(template_name: str) -> dict:
+    """_template_json returns the (merged) plotly template as plain json, once per template name."""
+    return pio.templates[template_name].to_plotly_json()
+
+
+def _layout_defaults() -> dict:
+    return {
+        "template": _template_json(pio.templates.default),
+        "legend": {"tracegroupgap": 0},
+    }
+
+
+def _axis(anchor: str, title: str, overrides: dict = None) -> dict:
+    axis = {"anchor": anchor, "domain": [0.0, 1.0], "title": {"text": title}}
+    for key, value in (overrides or {}).items():
+        if key == "title" and not isinstance(value, dict):
+            value = {"text": value}
+        axis[key] = value
+    return axis
+
+
+def _title_and_size(layout: dict, title: str, width: int, height: int) -> dict:
+    if title is None:
+        layout["margin"] = {"t": 60}
+    else:
+        layout["title"] = {"text": title}
+    if height is not None:
+        layout["height"] = height
+    if width is not None:
+        layout["width"] = width
+    return layout
+
+
+def _values(data: Mapping, column: str) -> np.ndarray:
+    values = data[column]
+    return values.values if isinstance(values, pd.Series) else np.asarray(values)
+
+
+def _frame(data: Mapping, *columns: str) -> pd.DataFrame:
+    return pd.DataFrame(
+        {col: _values(data, col) for col in dict.fromkeys(columns) if col is not None}
+    )
+
+
+def _merge(obj: dict, overrides: dict = None) -> None:
+    """_merge merges nested overrides one level deep, like update_traces/update_layout do."""
+    for key, value in (overrides or {}).items():
+        if isinstance(value, dict):
+            obj[key] = {**obj.get(key, {}), **value}
+        else:
+            obj[key] = value
+
+
+def _finalize(fig: dict) -> Figure:
+    return go.Figure(fig) if VALIDATE_FIGURES else fig
+
+
+def bar_figure(
+    data: Mapping,
+    x: str,
+    y: str,
+    orientation: str = "v",
+    text: str = None,
+    hover_name: str = None,
+    hover_data: Sequence[str] = (),
+    title: str = None,
+    width: int = None,
+    height: int = None,
+    xaxis: dict = None,
+    yaxis: dict = None,
+    trace: dict = None,
+    layout: dict = None,
+    engine: str = None,
+) -> Figure:
+    """bar_figure builds a single trace bar chart, equivalent to px.bar followed by a layout update.
+
+    Args:
+        data (Mapping): DataFrame or dict of column name to array.
+        x (str): column for the x axis.
+        y (str): column for the y axis.
+        orientation (str, optional): 'v' or 'h'. Defaults to 'v'.
+        text (str, optional): column shown as bar text. Defaults to None.
+        hover_name (str, optional): column shown in bold on hover. Defaults to None.
+        hover_data (Sequence[str], optional): columns added to customdata/hover. Defaults to ().
+        title (str, optional): figure title. Defaults to None.
+        width (int, optional): figure width. Defaults to None.
+        height (int, optional): figure height. Defaults to None.
+        xaxis (dict, optional): x axis layout overrides. Defaults to None.
+        yaxis (dict, optional): y axis layout overrides. Defaults to None.
+        trace (dict, optional): trace property overrides (e.g. marker, opacity). Defaults to None.
+        layout (dict, optional): other layout overrides (e.g. margin). Defaults to None.
+        engine (str, optional): 'go' or 'px'. Defaults to settings.FIGURE_ENGINE.
+
+    Returns:
+        Figure: figure dict ('go') or go.Figure ('px' or VALIDATE_FIGURES).
+    """
+    hover_data = list(hover_data)
+    if (engine or FIGURE_ENGINE) == "px":
+        fig = px.bar(
+            _frame(data, x, y, text, hover_name, *hover_data),
+            x=x,
+            y=y,
+            orientation=orientation,
+            text=text,
+            hover_name=hover_name,
+            hover_data=hover_data or None,
+            title=title,
+            width=width,
+            height=height,
+        )
+        if trace:
+            fig.update_traces(**trace)
+        fig.update_layout(xaxis=xaxis or {}, yaxis=yaxis or {}, **(layout or {}))
+        return fig
+
+    def hover_ref(col: str, axis_ref: str) -> str:
+        if col in hover_data:
+            return f"%{{customdata[{hover_data.index(col)}]}}"
+        if col == text:
+            return "%{text}"
+        return axis_ref
+
+    hover = [f"{x}={hover_ref(x, '%{x}')}", f"{y}={hover_ref(y, '%{y}')}"] + [
+        f"{col}=%{{customdata[{i}]}}"
+        for i, col in enumerate(hover_data)
+        if col not in (x, y)
+    ]
+    bar = {
+        "alignmentgroup": "True",
+        "hovertemplate": "<br>".join(hover) + "<extra></extra>",
+        "legendgroup": "",
+        "marker": {"color": _template_json(pio.templates.default)["layout"]["colorway"][0]},
+        "name": "",
+        "offsetgroup": "",
+        "orientation": orientation,
+        "showlegend": False,
+        "x": _values(data, x),
+        "xaxis": "x",
+        "y": _values(data, y),
+        "yaxis": "y",
+        "type": "bar",
+    }
+    if text is not None:
+        bar["text"] = _values(data, text)
+        bar["textposition"] = "auto"
+    if hover_name is not None:
+        bar["hovertext"] = _values(data, hover_name)
+        bar["hovertemplate"] = "<b>%{hovertext}</b><br><br>" + bar["hovertemplate"]
+    if hover_data:
+        bar["customdata"] = np.column_stack([_values(data, col) for col in hover_data])
+    _merge(bar, trace)
+
+    bar_layout = _title_and_size(_layout_defaults(), title, width, height)
+    bar_layout["xaxis"] = _axis("y", x, xaxis)
+    bar_layout["yaxis"] = _axis("x", y, yaxis)
+    bar_layout["barmode"] = "relative"
+    _merge(bar_layout, layout)
+    return _finalize({"data": [bar], "layout": bar_layout})
+
+
+def pie_figure(
+    data: Mapping,
+    values: str,
+    names: str,
+    hole: float = None,
+    title: str = None,
+    width: int = None,
+    height: int = None,
+    trace: dict = None,
+    engine: str = None,
+) -> Figure:
+    """pie_figure builds a pie/donut chart, equivalent to px.pie followed by a trace update.
+
+    Args:
+        data (Mapping): DataFrame or dict of column name to array.
+        values (str): column with the slice sizes.
+        names (str): column with the slice labels.
+        hole (float, optional): donut hole fraction. Defaults to None.
+        title (str, optional): figure title. Defaults to None.
+        width (int, optional): figure width. Defaults to None.
+        height (int, optional): figure height. Defaults to None.
+        trace (dict, optional): trace property overrides (e.g. marker colors, pull). Defaults to None.
+        engine (str, optional): 'go' or 'px'. Defaults to settings.FIGURE_ENGINE.
+
+    Returns:
+        Figure: figure dict ('go') or go.Figure ('px' or VALIDATE_FIGURES).
+    """
+    if (engine or FIGURE_ENGINE) == "px":
+        fig = px.pie(
+            _frame(data, values, names),
+            values=values,
+            names=names,
+            hole=hole,
+            title=title,
+            width=width,
+            height=height,
+        )
+        if trace:
+            fig.update_traces(**trace)
+        return fig
+
+    pie = {
+        "domain": {"x": [0.0, 1.0], "y": [0.0, 1.0]},
+        "hovertemplate": f"{names}=%{{label}}<br>{values}=%{{value}}<extra></extra>",
+        "labels": _values(data, names),
+        "legendgroup": "",
+        "name": "",
+        "showlegend": True,
+        "values": _values(data, values),
+        "type": "pie",
+    }
+    if hole is not None:
+        pie["hole"] = hole
+    _merge(pie, trace)
+    return _finalize(
+        {
+            "data": [pie],
+            "layout": _title_and_size(_layout_defaults(), title, width, height),
+        }
+    )
@@ -4,11 +4,17 @@ import re
 
 import numpy as np
 import pandas as pd
-import plotly.express as px
 import plotly.graph_objs as go
 from path import Path
 
-from bte_utils import read_file_s3, set_default_start_and_end_dates
+from bte_dataset_store import open_partitioned_dataset, publish_dataset
+from bte_figure_builders import bar_figure
+from bte_utils import (
+    observed_value_counts,
+    read_file_s3,
+    set_default_start_and_end_dates,
+)
+from settings import PARTITIONED_DATASETS
 
 default_start_date, default_end_date = set_default_start_and_end_dates()
 
@@ -17,26 +23,34 @@ Read all the data from flat files.
 """
 # ingredient data
 # prod_page_ing_df = pd.read_feather(dash_data_path/'prod_page_ing_data')
-ing_page_ing_df = read_file_s3(
-    filename="ing_page_ing_data", file_type="feather")
-ing_page_ing_df.category = ing_page_ing_df.category.astype(str)
-ing_page_ing_df.product_type = ing_page_ing_df.product_type.astype(str)
+if "ing_page_ing_data" in PARTITIONED_DATASETS:
+    # the ingredient rows are read per source and category, when first selected.
+    ing_page_ing = open_partitioned_dataset("ing_page_ing", "ing_page_ing_data")
+else:
+    ing_page_ing_df = read_file_s3(
+        filename="ing_page_ing_data", file_type="feather")
+    ing_page_ing_df.category = ing_page_ing_df.category.astype(str)
+    ing_page_ing_df.product_type = ing_page_ing_df.product_type.astype(str)
+    # the ingredient rows are read per selection only (from shared memory with SHARED_DATASETS).
+    ing_page_ing = publish_dataset("ing_page_ing", ing_page_ing_df)
+    del ing_page_ing_df
 
 # pd.read_feather(dash_data_path/'ing_page_ing_data')
 
 """ create dropdown options """
+# partitioned, the values come from the partition names and the distinct values index, no rows are read.
 ing_page_source_options = [
-    {"label": i, "value": i} for i in ing_page_ing_df.source.unique()
+    {"label": i, "value": i} for i in ing_page_ing.unique("source")
 ]
 ing_page_category_options = [
-    {"label": i, "value": i} for i in ing_page_ing_df.category.unique()
+    {"label": i, "value": i} for i in ing_page_ing.unique("category")
 ]
 ing_page_product_type_options = [
-    {"label": i, "value": i} for i in ing_page_ing_df.product_type.unique()
+    {"label": str(i), "value": str(i)} for i in ing_page_ing.unique("product_type")
 ]
 ing_page_ingredient_options = sorted(
     [
-        {"label": i, "value": i} for i in ing_page_ing_df.ingredient.unique()
+        {"label": i, "value": i} for i in ing_page_ing.unique("ingredient")
     ],
     key=lambda k: k["label"],
 )
@@ -61,19 +75,22 @@ def create_ing_page_ingredient_type_figure(
         go.Figure: [description]
     """
     data = pd.DataFrame(
-        ing_page_ing_df[
-            (ing_page_ing_df.source == source)
-            & (ing_page_ing_df.category == category)
-            & (ing_page_ing_df.product_type == product_type)
-        ][["ingredient", "ingredient_type"]]
-        .drop_duplicates(subset="ingredient")
-        .ingredient_type.value_counts()
+        observed_value_counts(
+            ing_page_ing.where(
+                ["ingredient", "ingredient_type"],
+                source=source,
+                category=category,
+                product_type=product_type,
+            )
+            .drop_duplicates(subset="ingredient")
+            .ingredient_type
+        )
     ).reset_index()
     data.columns = ["ingredient_type", "count"]
     data.ingredient_type = data.ingredient_type.astype(str)
     data.ingredient_type[data.ingredient_type == ""] = "unclassified"
 
-    fig = px.bar(
+    return bar_figure(
         data,
         x="count",
         y="ingredient_type",
@@ -82,15 +99,6 @@ def create_ing_page_ingredient_type_figure(
         orientation="h",
         title="Ingredient Type Distribution",
         text="count",
-    )
-    fig.update_layout(
-        font_family="GothamLight",
-        font_color="#c09891",
-        title_font_family="GildaDisplay",
-        title_font_color="#c09891",
-        title_font_size=24,
-        legend_title_font_color="green",
-        #         hovermode='closest',
         xaxis={
             "title": "Count",
             "categoryorder": "category descending",
@@ -100,15 +108,6 @@ def create_ing_page_ingredient_type_figure(
             "categoryorder": "total ascending",
         },
     )
-    fig.update_xaxes(
-        tickfont=dict(family="GothamLight", color="crimson", size=14),
-        title_font=dict(size=20, family="GothamLight", color="crimson"),
-    )
-    fig.update_yaxes(
-        tickfont=dict(family="GothamLight", color="crimson", size=14),
-        title_font=dict(size=20, family="GothamLight", color="crimson"),
-    )
-    return fig
 
 
 def create_ing_page_category_count_figure(
@@ -140,7 +139,14 @@ def create_ing_page_category_count_figure(
             width = 2000
         text = y
 
-    fig = px.bar(
+    xaxis = {"title": x.title()}
+    yaxis = {"title": y.title()}
+    if orientation == "h":
+        yaxis["categoryorder"] = "total ascending"
+    else:
+        xaxis["categoryorder"] = "total descending"
+
+    return bar_figure(
         data,
         x=x,
         y=y,
@@ -151,31 +157,7 @@ def create_ing_page_category_count_figure(
         hover_data=[group],
         hover_name=group,
         text=text,
+        xaxis=xaxis,
+        yaxis=yaxis,
+        layout={"hovermode": "closest"},
     )
-
-    fig.update_layout(
-        font_family="GothamLight",
-        font_color="#c09891",
-        title_font_family="GildaDisplay",
-        title_font_color="#c09891",
-        title_font_size=24,
-        legend_title_font_color="green",
-        hovermode="closest",
-        xaxis={"title": x.title()},
-        yaxis={"title": y.title()},
-    )
-
-    if orientation == "h":
-        fig.update_yaxes({"categoryorder": "total ascending"})
-    else:
-        fig.update_xaxes({"categoryorder": "total descending"})
-
-    fig.update_xaxes(
-        tickfont=dict(family="GothamLight", color="crimson", size=14),
-        title_font=dict(size=20, family="GothamLight", color="crimson"),
-    )
-    fig.update_yaxes(
-        tickfont=dict(family="GothamLight", color="crimson", size=14),
-        title_font=dict(size=20, family="GothamLight", color="crimson"),
-    )
-    return fig
@@ -0,0 +1,223 @@
+"""request instrumentation for the web-app's callbacks.
+
+Counts the callback requests the browser sends to /_dash-update-component, keyed by the
+callback output, so the number of server round trips an interaction costs (e.g. changing
+the source or category dropdown of a page) can be read before and after a change, and
+serves in-process counters (e.g. single-flight stats) as json routes.
+
+instrument_callbacks times every registered callback: wall and cpu time, response size and
+the data slices it selected (note_slice) go into rolling windows per callback, and calls
+slower than a threshold are printed as one json line each. Without CALLBACK_TIMING nothing
+is wrapped and the data selection helpers skip note_slice, so it costs nothing.
+"""
+import contextvars
+import json
+import threading
+import time
+from collections import Counter, defaultdict, deque
+from functools import wraps
+from typing import Callable, Hashable
+
+import dash
+import numpy as np
+from dash.exceptions import PreventUpdate
+from flask import Flask, jsonify, request
+
+DASH_UPDATE_ROUTE = "/_dash-update-component"
+
+
+class CallbackRequestCounter:
+    """CallbackRequestCounter counts callback requests per output in a thread safe way."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counts = Counter()
+
+    def add(self, output: str) -> None:
+        with self._lock:
+            self._counts[output] += 1
+
+    def snapshot(self, reset: bool = False) -> dict:
+        """snapshot returns the counts so far (and the total), optionally starting over.
+
+        Args:
+            reset (bool, optional): clear the counts after reading them. Defaults to False.
+
+        Returns:
+            dict: {'total': int, 'counts': {output: count}} with the busiest outputs first.
+        """
+        with self._lock:
+            counts = dict(self._counts.most_common())
+            if reset:
+                self._counts.clear()
+        return {"total": sum(counts.values()), "counts": counts}
+
+
+def add_json_route(server: Flask, route: str, snapshot: Callable[[], dict]) -> None:
+    """add_json_route serves the output of snapshot() as json at route (GET).
+
+    Args:
+        server (Flask): the app's flask server (app.server).
+        route (str): url of the route.
+        snapshot (Callable[[], dict]): returns the current counters.
+    """
+
+    def view():
+        return jsonify(snapshot())
+
+    server.add_url_rule(route, route.strip("/").replace("/", "_").replace("-", "_"), view)
+
+
+def install_request_counter(
+    server: Flask, route: str = "/_bte/request-counts"
+) -> CallbackRequestCounter:
+    """install_request_counter counts every callback request of the app and serves the counts.
+
+    GET <route> returns the counts as json, GET <route>?reset=1 returns them and starts over.
+
+    Args:
+        server (Flask): the app's flask server (app.server).
+        route (str, optional): url of the counts. Defaults to '/_bte/request-counts'.
+
+    Returns:
+        CallbackRequestCounter: the counter, for reading the counts in process.
+    """
+    counter = CallbackRequestCounter()
+
+    @server.before_request
+    def count_callback_request():
+        if request.path.endswith(DASH_UPDATE_ROUTE) and request.method == "POST":
+            body = request.get_json(silent=True) or {}
+            counter.add(body.get("output", "unknown"))
+
+    add_json_route(
+        server, route, lambda: counter.snapshot(reset=request.args.get("reset") == "1")
+    )
+    return counter
+
+
+# data slices selected by the callback running on this thread (None outside a timed callback).
+_slices = contextvars.ContextVar("bte_callback_slices", default=None)
+
+
+def note_slice(data: str, key: Hashable, rows: int) -> None:
+    """note_slice records a data selection of the timed callback running on this thread (no-op otherwise).
+
+    Args:
+        data (str): name of the data (s3 file or dataset).
+        key (Hashable): selection, e.g. a row index key or the column values filtered on.
+        rows (int): number of selected rows.
+    """
+    slices = _slices.get()
+    if slices is not None:
+        slices.append({"data": data, "key": str(key), "rows": rows})
+
+
+def _short(value, limit: int = 200) -> str:
+    text = json.dumps(value, default=str)
+    return text if len(text) <= limit else text[:limit] + "..."
+
+
+class CallbackTimings:
+    """CallbackTimings keeps the latest wall/cpu times and response sizes of every callback."""
+
+    def __init__(self, window: int = 1000):
+        self._lock = threading.Lock()
+        self._calls = defaultdict(lambda: deque(maxlen=window))
+        self._counts = defaultdict(Counter)
+
+    def add(self, output: str, wall_ms: float, cpu_ms: float, size: int, status: str) -> None:
+        with self._lock:
+            self._calls[output].append((wall_ms, cpu_ms, size))
+            self._counts[output][status] += 1
+
+    def snapshot(self) -> dict:
+        """snapshot returns per callback percentiles of the rolling window, slowest (p90) first.
+
+        Returns:
+            dict: {output: {'calls', 'ok', 'prevented', 'error', 'wall_ms': {p50, p90, p99, max},
+                   'cpu_ms': {p50, p90}, 'bytes_mean'}}.
+        """
+        with self._lock:
+            calls = {output: np.array(window) for output, window in self._calls.items()}
+            counts = {output: dict(c) for output, c in self._counts.items()}
+        callbacks = {}
+        for output, window in calls.items():
+            wall, cpu, size = window[:, 0], window[:, 1], window[:, 2]
+            callbacks[output] = {
+                "calls": sum(counts[output].values()),
+                **{s: counts[output].get(s, 0) for s in ("ok", "prevented", "error")},
+                "wall_ms": {
+                    "p50": round(float(np.percentile(wall, 50)), 2),
+                    "p90": round(float(np.percentile(wall, 90)), 2),
+                    "p99": round(float(np.percentile(wall, 99)), 2),
+                    "max": round(float(wall.max()), 2),
+                },
+                "cpu_ms": {
+                    "p50": round(float(np.percentile(cpu, 50)), 2),
+                    "p90": round(float(np.percentile(cpu, 90)), 2),
+                },
+                "bytes_mean": int(size.mean()),
+            }
+        return dict(sorted(callbacks.items(), key=lambda c: -c[1]["wall_ms"]["p90"]))
+
+
+def _timed(output: str, func: Callable, timings: CallbackTimings, slow_ms: float) -> Callable:
+    @wraps(func)
+    def timed_callback(*args, **kwargs):
+        slices = []
+        token = _slices.set(slices)
+        status, response = "error", None
+        wall, cpu = time.perf_counter(), time.thread_time()
+        try:
+            response = func(*args, **kwargs)
+            status = "ok"
+            return response
+        except PreventUpdate:
+            status = "prevented"
+            raise
+        finally:
+            wall_ms = (time.perf_counter() - wall) * 1000
+            cpu_ms = (time.thread_time() - cpu) * 1000
+            _slices.reset(token)
+            size = len(response) if isinstance(response, (str, bytes)) else 0
+            timings.add(output, wall_ms, cpu_ms, size, status)
+            if wall_ms >= slow_ms:
+                print(
+                    json.dumps(
+                        {
+                            "event": "slow_callback",
+                            "output": output,
+                            "status": status,
+                            "wall_ms": round(wall_ms, 1),
+                            "cpu_ms": round(cpu_ms, 1),
+                            "bytes": size,
+                            "args": [_short(a) for a in args],
+                            "slices": slices,
+                        }
+                    ),
+                    flush=True,
+                )
+
+    return timed_callback
+
+
+def instrument_callbacks(app: dash.Dash, timings: CallbackTimings, slow_ms: float) -> int:
+    """instrument_callbacks wraps every registered (server side) callback of the app with timing.
+
+    Call it once, after the last callback is registered.
+
+    Args:
+        app (dash.Dash): the app.
+        timings (CallbackTimings): collects the timings.
+        slow_ms (float): calls taking at least this long (wall time, milliseconds) are logged.
+
+    Returns:
+        int: number of wrapped callbacks.
+    """
+    wrapped = 0
+    for output, callback in app.callback_map.items():
+        if "callback" in callback:
+            callback["callback"] = _timed(output, callback["callback"], timings, slow_ms)
+            wrapped += 1
+    return wrapped
@@ -0,0 +1,262 @@
+"""background jobs for heavy callbacks.
+
+A heavy callback (e.g. a market trend figure with more than 50 product type facets) would
+block a flask worker thread for seconds. In background job mode the callback only submits
+its computation to a local process pool and returns a job id; the browser then polls the
+job with a dcc.Interval, shows its progress and picks up the result when it is done. A new
+selection cancels the job of the previous one.
+
+The polls of a job may reach any of the server's (gunicorn) workers, not only the one that
+submitted it. So job ids are unique across processes (pid and a random uuid), and the state,
+progress and result of every job are files in a directory all workers share
+(BACKGROUND_JOB_DIR): <job id>.json (state and progress), <job id>.result (pickled result or
+error) and <job id>.cancel (cancelled by any worker). Finished jobs are deleted JOB_TTL
+seconds after they were last updated, picked up or not.
+
+Job functions must be module level functions (they are pickled by reference) and can call
+report_progress to update the progress bar; report_progress also stops a job that has
+been cancelled while running. Identical jobs submitted to the same worker while one is
+pending or running share it.
+"""
+import json
+import os
+import pickle
+import threading
+import time
+import uuid
+from concurrent.futures import Future, ProcessPoolExecutor
+from typing import Any, Callable, Hashable
+
+from bte_single_flight import make_key
+
+# set in the pool processes by _run.
+_job_dir = None
+_job_id = None
+
+# finished jobs (e.g. whose browser tab was closed) are deleted after this many seconds.
+JOB_TTL = 600
+FINAL_STATES = ("done", "error", "cancelled")
+
+
+class JobCancelled(Exception):
+    """JobCancelled stops a running job that was cancelled."""
+
+
+class JobNotFound(KeyError):
+    """JobNotFound is raised for the result of a job that is not finished or was deleted."""
+
+
+def _path(directory: str, job_id: str, suffix: str) -> str:
+    return os.path.join(directory, job_id + suffix)
+
+
+def _write(path: str, data: bytes) -> None:
+    # readers in other processes see the old or the new file, never a partial one.
+    temp = f"{path}.{os.getpid()}-{threading.get_ident()}.tmp"
+    with open(temp, "wb") as f:
+        f.write(data)
+    os.replace(temp, path)
+
+
+def _write_state(directory: str, job_id: str, state: str, progress: float = 0.0, message: str = "") -> None:
+    _write(
+        _path(directory, job_id, ".json"),
+        json.dumps({"state": state, "progress": progress, "message": message}).encode(),
+    )
+
+
+def _run(directory: str, job_id: str, func: Callable, args: tuple) -> Any:
+    global _job_dir, _job_id
+    _job_dir, _job_id = directory, job_id
+    try:
+        report_progress(0.05, "started")
+        return func(*args)
+    finally:
+        _job_id = None
+
+
+def report_progress(fraction: float, message: str = "") -> None:
+    """report_progress publishes the progress of the running background job.
+
+    It does nothing outside a background job, so job functions can call it unconditionally.
+
+    Args:
+        fraction (float): done fraction between 0 and 1.
+        message (str, optional): short text shown on the progress bar. Defaults to ''.
+
+    Raises:
+        JobCancelled: the job was cancelled (its inputs changed).
+    """
+    if _job_id is None:
+        return
+    if os.path.exists(_path(_job_dir, _job_id, ".cancel")):
+        raise JobCancelled(_job_id)
+    _write_state(_job_dir, _job_id, "running", fraction, message)
+
+
+class JobManager:
+    """JobManager runs job functions on a local process pool and keeps their state where every worker polls it."""
+
+    def __init__(self, directory: str, max_workers: int = 2):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+        self.max_workers = max_workers
+        self._lock = threading.Lock()
+        # pending and running jobs submitted by this process, with their future, key and subscribers.
+        self._jobs = {}
+        self._keys = {}
+        # created on the first job, in the (forked) worker process submitting it.
+        self._pool = None
+
+    def _ensure_pool(self) -> None:
+        if self._pool is None:
+            self._pool = ProcessPoolExecutor(max_workers=self.max_workers)
+
+    def _new_job_id(self) -> str:
+        return f"job-{os.getpid()}-{uuid.uuid4().hex}"
+
+    def _write_result(self, job_id: str, kind: str, value: Any) -> None:
+        try:
+            data = pickle.dumps((kind, value))
+        except Exception:
+            data = pickle.dumps(("error", RuntimeError(repr(value))))
+        _write(_path(self.directory, job_id, ".result"), data)
+
+    def _finish(self, job_id: str, future: Future) -> None:
+        # the result first: a worker reading a final state finds it.
+        if future.cancelled() or isinstance(future.exception(), JobCancelled):
+            _write_state(self.directory, job_id, "cancelled", 1.0)
+        elif future.exception() is not None:
+            self._write_result(job_id, "error", future.exception())
+            _write_state(self.directory, job_id, "error", 1.0)
+        else:
+            self._write_result(job_id, "result", future.result())
+            _write_state(self.directory, job_id, "done", 1.0)
+        with self._lock:
+            job = self._jobs.pop(job_id, None)
+            if job is not None and self._keys.get(job["key"]) == job_id:
+                del self._keys[job["key"]]
+
+    def _prune(self) -> None:
+        now = time.time()
+        for name in os.listdir(self.directory):
+            if not name.endswith(".json"):
+                continue
+            job_id = name[: -len(".json")]
+            try:
+                expired = now - os.path.getmtime(_path(self.directory, job_id, ".json")) > JOB_TTL
+            except OSError:
+                continue
+            if expired and self.status(job_id)["state"] in FINAL_STATES:
+                for suffix in (".json", ".result", ".cancel"):
+                    try:
+                        os.remove(_path(self.directory, job_id, suffix))
+                    except OSError:
+                        pass
+
+    def submit(self, func: Callable, *args) -> str:
+        """submit queues func(*args) on the process pool, or joins the identical job already queued.
+
+        Args:
+            func (Callable): module level job function.
+
+        Returns:
+            str: job id to poll.
+        """
+        key: Hashable = (func, make_key(*args))
+        with self._lock:
+            self._prune()
+            job_id = self._keys.get(key)
+            if job_id is not None:
+                self._jobs[job_id]["subscribers"] += 1
+                return job_id
+            self._ensure_pool()
+            job_id = self._new_job_id()
+            _write_state(self.directory, job_id, "pending", 0.0, "queued")
+            future = self._pool.submit(_run, self.directory, job_id, func, args)
+            self._jobs[job_id] = {"future": future, "key": key, "subscribers": 1}
+            self._keys[key] = job_id
+        # runs right away when the job already finished.
+        future.add_done_callback(lambda done: self._finish(job_id, done))
+        return job_id
+
+    def run_inline(self, func: Callable, *args) -> str:
+        """run_inline runs a light job right away on the calling thread, so it is polled like any other job.
+
+        Args:
+            func (Callable): job function.
+
+        Returns:
+            str: job id to poll.
+        """
+        job_id = self._new_job_id()
+        try:
+            self._write_result(job_id, "result", func(*args))
+            _write_state(self.directory, job_id, "done", 1.0)
+        except Exception as ex:
+            self._write_result(job_id, "error", ex)
+            _write_state(self.directory, job_id, "error", 1.0)
+        return job_id
+
+    def status(self, job_id: str) -> dict:
+        """status returns the state ('pending', 'running', 'done', 'error', 'cancelled' or 'unknown') and progress of a job.
+
+        Args:
+            job_id (str): job id, submitted by any worker.
+
+        Returns:
+            dict: {'state': str, 'progress': float, 'message': str}.
+        """
+        try:
+            with open(_path(self.directory, job_id, ".json"), "rb") as f:
+                return json.loads(f.read())
+        except (OSError, ValueError):
+            return {"state": "unknown", "progress": 0.0, "message": ""}
+
+    def result(self, job_id: str) -> Any:
+        """result returns the result of a finished job, raising its error.
+
+        Args:
+            job_id (str): job id, submitted by any worker.
+
+        Raises:
+            JobNotFound: the job has no result (it is not finished, or was deleted).
+
+        Returns:
+            Any: return value of the job function.
+        """
+        try:
+            with open(_path(self.directory, job_id, ".result"), "rb") as f:
+                kind, value = pickle.loads(f.read())
+        except OSError:
+            raise JobNotFound(job_id)
+        if kind == "error":
+            raise value
+        return value
+
+    def cancel(self, job_id: str) -> None:
+        """cancel gives up a job: a queued job is dropped, a running one stops at its next report_progress.
+
+        A job shared by several requests keeps running until all of them gave it up. Finished
+        jobs are left alone, they are deleted after JOB_TTL.
+
+        Args:
+            job_id (str): job id, submitted by any worker.
+        """
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is not None:
+                job["subscribers"] -= 1
+                if job["subscribers"] > 0:
+                    return
+                # no longer shared, even while it is still stopping.
+                self._keys.pop(job["key"], None)
+                if job["future"].cancel():
+                    return
+        if self.status(job_id)["state"] in ("pending", "running"):
+            # running here, or submitted by another worker: the job stops at its next report_progress.
+            _write(_path(self.directory, job_id, ".cancel"), b"")
+
+    def shutdown(self) -> None:
+        if self._pool is not None:
+            self._pool.shutdown(wait=False)
@@ -0,0 +1,91 @@
+"""memory report of the web-app's server processes.
+
+Under gunicorn (wsgi.py) the data is loaded once in the master process and the forked
+workers share its pages copy-on-write until they write to them. For every process
+/proc/<pid>/smaps_rollup tells the memory only this process holds (unique: private pages)
+apart from the memory still shared with the master and the other workers. memory_report
+reads it for the master and all its workers, so a worker that drifts towards a private
+copy of the data shows up.
+"""
+import os
+from typing import List, Optional
+
+# set in the workers by gunicorn.conf.py's post_fork hook.
+MASTER_PID_ENV = "BTE_WSGI_MASTER_PID"
+SMAPS_FIELDS = {
+    "Rss": "rss",
+    "Pss": "pss",
+    "Shared_Clean": "shared_clean",
+    "Shared_Dirty": "shared_dirty",
+    "Private_Clean": "private_clean",
+    "Private_Dirty": "private_dirty",
+    "Swap": "swap",
+}
+
+
+def process_memory(pid: str = "self") -> Optional[dict]:
+    """process_memory reads the unique and shared memory of a process from /proc/<pid>/smaps_rollup.
+
+    Args:
+        pid (str, optional): process id. Defaults to 'self'.
+
+    Returns:
+        Optional[dict]: bytes per smaps field plus 'unique' (private pages) and 'shared' (pages shared with
+                        other processes), None where smaps_rollup is not available (not linux, no access).
+    """
+    try:
+        with open(f"/proc/{pid}/smaps_rollup") as f:
+            lines = f.read().splitlines()
+    except OSError:
+        return None
+    usage = {}
+    for line in lines[1:]:
+        name, _, value = line.partition(":")
+        if name in SMAPS_FIELDS:
+            usage[SMAPS_FIELDS[name]] = int(value.split()[0]) * 1024
+    usage["unique"] = usage.get("private_clean", 0) + usage.get("private_dirty", 0)
+    usage["shared"] = usage.get("shared_clean", 0) + usage.get("shared_dirty", 0)
+    return usage
+
+
+def _child_pids(parent: int) -> List[int]:
+    children = []
+    for entry in os.listdir("/proc"):
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f"/proc/{entry}/stat") as f:
+                # the command name (2nd field) may contain spaces, the parent pid follows its ')'.
+                ppid = int(f.read().rpartition(")")[2].split()[1])
+        except (OSError, IndexError, ValueError):
+            continue
+        if ppid == parent:
+            children.append(int(entry))
+    return sorted(children)
+
+
+def memory_report() -> dict:
+    """memory_report returns the unique and shared memory of this server's processes.
+
+    Under gunicorn it covers the master and every worker (the answering one is 'this_pid'),
+    otherwise only this process.
+
+    Returns:
+        dict: {'this_pid': int, 'master': usage or None, 'workers': {pid: usage}, 'total_unique': int}.
+    """
+    master = os.environ.get(MASTER_PID_ENV)
+    if master is not None and int(master) == os.getppid():
+        pids = _child_pids(int(master))
+        master_usage = process_memory(master)
+    else:
+        pids = [os.getpid()]
+        master_usage = None
+    workers = {pid: process_memory(str(pid)) for pid in pids}
+    workers = {pid: usage for pid, usage in workers.items() if usage is not None}
+    return {
+        "this_pid": os.getpid(),
+        "master": master_usage,
+        "workers": workers,
+        "total_unique": sum(u["unique"] for u in workers.values())
+        + (master_usage["unique"] if master_usage else 0),
+    }
@@ -0,0 +1,247 @@
+"""memory accounting of the web-app's data structures, per structure and across data loads.
+
+bte_memory tells how much memory the server processes hold; this module tells which structure
+holds it. register_namespace registers the data structures of a module namespace (main's, which
+imports the page modules' names), by kind:
+
+- dataset: a frame read from storage (read_file_s3) or a published dataset (bte_dataset_store),
+- derived: any other frame built from them, e.g. prod_page_item_price_df,
+- index: a row index (build_row_index: value -> row positions),
+- options: a dropdown option list ({'label', 'value'} dicts),
+- figure: an initial figure.
+
+measure takes the deep memory of each (strings and other python objects included, every
+structure on its own, so the total counts memory shared by two structures twice) and compares
+it with the previous data load, kept in a small json history file. A structure is flagged when
+it grew by more than growth_ratio and min_growth_bytes, and its memory per row (item) grew by
+more than growth_ratio too: more rows in a new snapshot are expected, fatter rows are not.
+
+Measure once, in the process loading the data and before the server workers are forked:
+reading every python object of a frame in a forked worker would un-share its pages.
+"""
+import json
+import os
+import sys
+import threading
+import time
+import weakref
+from typing import Callable, Dict, Optional
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+from plotly.basedatatypes import BaseFigure
+
+from bte_memory import process_memory
+
+# data loads kept in the history file.
+HISTORY_SIZE = 20
+KINDS = ["dataset", "derived", "index", "options", "figure"]
+
+# frames read from storage, by id (entries go away with the frames).
+_loaded_frames = weakref.WeakValueDictionary()
+
+
+def note_loaded(data: pd.DataFrame) -> None:
+    """note_loaded marks a frame read from storage, so it is accounted as a dataset (not a derived frame)."""
+    _loaded_frames[id(data)] = data
+
+
+def deep_memory(obj, seen: set = None) -> int:
+    """deep_memory estimates the bytes held by an object and everything it references.
+
+    Args:
+        obj: frame, series, array, dataset, figure or (nested) python container.
+        seen (set, optional): ids of objects counted already. Defaults to None.
+
+    Returns:
+        int: bytes.
+    """
+    if seen is None:
+        seen = set()
+    if id(obj) in seen:
+        return 0
+    seen.add(id(obj))
+    if isinstance(obj, pd.DataFrame):
+        return int(obj.memory_usage(index=True, deep=True).sum())
+    if isinstance(obj, (pd.Series, pd.Index)):
+        return int(obj.memory_usage(deep=True))
+    if isinstance(obj, np.ndarray):
+        size = sys.getsizeof(obj) if obj.base is None else obj.nbytes
+        if obj.dtype == object:
+            size += sum(deep_memory(item, seen) for item in obj.ravel())
+        return size
+    if isinstance(obj, BaseFigure):
+        return deep_memory(obj.to_plotly_json(), seen)
+    if _is_dataset(obj):
+        # ArrowDataset (the table in shared memory), PartitionedDataset (the partitions read so far) or FrameDataset.
+        if hasattr(obj, "table"):
+            return int(obj.table.nbytes)
+        return deep_memory(obj.partitions if hasattr(obj, "partitions") else obj.data, seen)
+    size = sys.getsizeof(obj)
+    if isinstance(obj, dict):
+        size += sum(deep_memory(k, seen) + deep_memory(v, seen) for k, v in obj.items())
+    elif isinstance(obj, (list, tuple, set, frozenset)):
+        size += sum(deep_memory(item, seen) for item in obj)
+    return size
+
+
+def _is_dataset(obj) -> bool:
+    # bte_dataset_store's datasets; the module imports bte_utils, which imports this one.
+    return type(obj).__name__ in ("ArrowDataset", "FrameDataset", "PartitionedDataset") and (
+        isinstance(getattr(obj, "table", None), pa.Table)
+        or isinstance(getattr(obj, "data", None), pd.DataFrame)
+        or isinstance(getattr(obj, "partitions", None), dict)
+    )
+
+
+def _is_figure(obj) -> bool:
+    return isinstance(obj, BaseFigure) or (isinstance(obj, dict) and {"data", "layout"} <= obj.keys())
+
+
+def structure_kind(obj) -> Optional[str]:
+    """structure_kind tells the kind of a data structure, None for anything else."""
+    if isinstance(obj, pd.DataFrame):
+        return "dataset" if _loaded_frames.get(id(obj)) is obj else "derived"
+    if _is_dataset(obj):
+        return "dataset"
+    if _is_figure(obj):
+        return "figure"
+    if isinstance(obj, dict) and obj and all(isinstance(v, np.ndarray) for v in obj.values()):
+        return "index"
+    if (
+        isinstance(obj, list)
+        and obj
+        and all(isinstance(o, dict) and "label" in o and "value" in o for o in obj)
+    ):
+        return "options"
+    return None
+
+
+class MemoryAccounting:
+    """MemoryAccounting measures the registered data structures and flags the ones that grew unexpectedly."""
+
+    def __init__(self, history_path: str = "", growth_ratio: float = 0.25, min_growth_bytes: int = 2 ** 20):
+        self.history_path = history_path
+        self.growth_ratio = growth_ratio
+        self.min_growth_bytes = min_growth_bytes
+        self._structures: Dict[str, tuple] = {}
+        self._lock = threading.Lock()
+        self._report: Optional[dict] = None
+
+    def register(self, name: str, kind: str, get: Callable[[], object]) -> None:
+        """register adds a structure; get returns its current object (so a reloaded one is measured)."""
+        self._structures[name] = (kind, get)
+
+    def register_namespace(self, namespace: dict) -> int:
+        """register_namespace registers the public data structures of a module namespace (e.g. globals()).
+
+        Args:
+            namespace (dict): names to objects.
+
+        Returns:
+            int: number of registered structures.
+        """
+        registered = 0
+        for name, obj in list(namespace.items()):
+            if name.startswith("_"):
+                continue
+            kind = structure_kind(obj)
+            if kind is None:
+                continue
+            # containers of figures (initial_figures) are accounted by their figures.
+            if isinstance(obj, dict) and obj and kind != "figure" and all(map(_is_figure, obj.values())):
+                continue
+            self.register(name, kind, lambda name=name: namespace.get(name))
+            registered += 1
+        return registered
+
+    def _read_history(self) -> list:
+        if not self.history_path:
+            return []
+        try:
+            with open(self.history_path) as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return []
+        except (OSError, ValueError) as ex:
+            print(f"*WARNING: could not read the memory accounting history {self.history_path}: {ex}*")
+            return []
+
+    def _write_history(self, history: list) -> None:
+        if not self.history_path:
+            return
+        try:
+            with open(self.history_path + ".tmp", "w") as f:
+                json.dump(history[-HISTORY_SIZE:], f)
+            os.replace(self.history_path + ".tmp", self.history_path)
+        except OSError as ex:
+            print(f"*WARNING: could not write the memory accounting history {self.history_path}: {ex}*")
+
+    def _growth(self, current: dict, previous: Optional[dict]) -> dict:
+        if previous is None or not previous["bytes"]:
+            return {"previous_bytes": None, "growth": None, "flagged": False}
+        growth = current["bytes"] / previous["bytes"] - 1
+        per_item_growth = growth
+        if current["items"] and previous["items"]:
+            per_item_growth = (current["bytes"] / current["items"]) / (previous["bytes"] / previous["items"]) - 1
+        return {
+            "previous_bytes": previous["bytes"],
+            "growth": round(growth, 4),
+            "flagged": current["bytes"] - previous["bytes"] >= self.min_growth_bytes
+            and growth > self.growth_ratio
+            and per_item_growth > self.growth_ratio,
+        }
+
+    def measure(self, snapshot_version: str = "unknown") -> dict:
+        """measure takes the deep memory of every registered structure and compares it with the previous load.
+
+        Prints a warning for every flagged structure and appends this load to the history file.
+
+        Args:
+            snapshot_version (str, optional): version of the loaded data. Defaults to 'unknown'.
+
+        Returns:
+            dict: the report (see snapshot).
+        """
+        history = self._read_history()
+        previous = history[-1]["structures"] if history else {}
+        structures = {}
+        for name, (kind, get) in sorted(self._structures.items()):
+            obj = get()
+            if obj is None:
+                continue
+            current = {"kind": kind, "bytes": deep_memory(obj), "items": len(obj) if hasattr(obj, "__len__") else None}
+            structures[name] = current
+        report = {
+            "measured_at": time.time(),
+            "pid": os.getpid(),
+            "snapshot_version": snapshot_version,
+            "previous_load": {k: history[-1][k] for k in ("measured_at", "snapshot_version")} if history else None,
+            "process": process_memory(),
+            "total_bytes": sum(s["bytes"] for s in structures.values()),
+            "by_kind": {k: sum(s["bytes"] for s in structures.values() if s["kind"] == k) for k in KINDS},
+            "structures": [
+                {"name": name, **s, **self._growth(s, previous.get(name))}
+                for name, s in sorted(structures.items(), key=lambda kv: -kv[1]["bytes"])
+            ],
+        }
+        report["flagged"] = [s["name"] for s in report["structures"] if s["flagged"]]
+        for s in report["structures"]:
+            if s["flagged"]:
+                print(
+                    f"*WARNING: {s['kind']} {s['name']} grew from {s['previous_bytes'] / 2 ** 20:.1f}MB to "
+                    f"{s['bytes'] / 2 ** 20:.1f}MB ({s['growth']:+.0%}) since the previous data load*"
+                )
+        history.append(
+            {"measured_at": report["measured_at"], "snapshot_version": snapshot_version, "structures": structures}
+        )
+        self._write_history(history)
+        with self._lock:
+            self._report = report
+        return report
+
+    def snapshot(self) -> dict:
+        """snapshot returns the last report: totals by kind and every structure, largest first, with its growth."""
+        with self._lock:
+            return self._report or {"structures": [], "flagged": []}
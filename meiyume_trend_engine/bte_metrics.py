@@ -0,0 +1,545 @@
+"""prometheus metrics of the web-app, served by the flask server in the text exposition format.
+
+install_metrics times every request with flask hooks, outside of dash's callback machinery:
+callback requests (/_dash-update-component) per callback output, all other requests per page
+or flask route. Together with the request histograms /metrics reports, at scrape time,
+
+- hits and misses of the lru caches and the single-flight counters,
+- rows, memory, load time and s3 modification time of every dataset read with read_file_s3,
+- the data snapshot version and age,
+- the resident, unique and shared memory of the server processes (bte_memory),
+- the memory of every accounted data structure and its growth flag (bte_memory_accounting).
+
+Under gunicorn every worker counts its own requests, cache hits and single-flight calls, and
+any worker may answer a scrape. So each process writes its counters, less the ones it
+inherited when it was forked, to a file of METRICS_DIR (worker_<pid>.json, at most
+FLUSH_SECONDS after they changed and whenever it answers a scrape), and /metrics reports
+their sum over all processes. The master folds the file of a worker that exits into
+exited.json (gunicorn.conf.py child_exit), so the totals never go down while the server
+runs; they start at zero when the app is loaded. The dataset memory is measured once, by
+measure_datasets in the process loading the data, because measuring object columns later
+would un-share the pages of the forked workers.
+"""
+import fcntl
+import json
+import os
+import threading
+import time
+import weakref
+from bisect import bisect_left
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Callable, Dict, Iterable, List, Tuple
+
+import pandas as pd
+from flask import Flask, Response, g, request
+
+from bte_memory import memory_report
+from settings import METRICS_DIR
+
+DASH_UPDATE_ROUTE = "/_dash-update-component"
+# request latency histogram buckets, in seconds.
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+# a process writes its counters at most this many seconds after they changed.
+FLUSH_SECONDS = 1.0
+EXITED_FILE = "exited.json"
+
+# datasets read so far: name -> rows, load time, s3 modification time and, once measured, memory.
+_datasets: Dict[str, dict] = {}
+# the objects holding each dataset's rows, until they are measured or released.
+_dataset_objects: Dict[str, weakref.ref] = {}
+_datasets_lock = threading.Lock()
+
+
+def record_data_load(name: str, data: pd.DataFrame, seconds: float, modified: datetime = None) -> None:
+    """record_data_load registers a dataset read from storage for the dataset metrics.
+
+    Args:
+        name (str): dataset (file) name.
+        data (pd.DataFrame): the data read.
+        seconds (float): time it took to download and parse it.
+        modified (datetime, optional): last modification time of the stored file. Defaults to None.
+    """
+    with _datasets_lock:
+        _datasets[name] = {
+            "rows": len(data),
+            "load_seconds": seconds,
+            "modified": modified.timestamp() if modified is not None else None,
+            "memory_bytes": None,
+            "shared": False,
+        }
+        _dataset_objects[name] = weakref.ref(data)
+
+
+def track_dataset(name: str, dataset) -> None:
+    """track_dataset points the metrics of a dataset at the object now holding its rows.
+
+    Used when a frame is published (bte_dataset_store), so the dataset is measured where it lives.
+
+    Args:
+        name (str): dataset name given to record_data_load.
+        dataset (Union[ArrowDataset, FrameDataset]): the published dataset.
+    """
+    with _datasets_lock:
+        if name in _datasets:
+            _dataset_objects[name] = weakref.ref(dataset)
+
+
+def _memory_bytes(data) -> Tuple[int, bool]:
+    if isinstance(data, pd.DataFrame):
+        return int(data.memory_usage(index=True, deep=True).sum()), False
+    if hasattr(data, "table"):
+        return int(data.table.nbytes), True
+    if hasattr(data, "partitions"):
+        # PartitionedDataset: the partitions read so far.
+        return sum(_memory_bytes(partition)[0] for partition in list(data.partitions.values())), False
+    return _memory_bytes(data.data)
+
+
+def measure_datasets() -> int:
+    """measure_datasets measures the memory of every dataset still held in process.
+
+    Call it once all data is loaded and prepared, before the server workers are forked.
+
+    Returns:
+        int: total bytes of the measured datasets.
+    """
+    with _datasets_lock:
+        objects = {name: ref() for name, ref in _dataset_objects.items()}
+        _dataset_objects.clear()
+    total = 0
+    for name, data in objects.items():
+        if data is None:
+            continue
+        memory, shared = _memory_bytes(data)
+        with _datasets_lock:
+            _datasets[name].update(rows=len(data), memory_bytes=memory, shared=shared)
+        total += memory
+    return total
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(labels: dict) -> str:
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in labels.items()) + "}"
+
+
+def _number(value) -> str:
+    if isinstance(value, float):
+        return repr(value) if value == value and abs(value) != float("inf") else str(value)
+    return str(value)
+
+
+class MetricFamily:
+    """MetricFamily collects the samples of one metric for the text exposition format."""
+
+    def __init__(self, name: str, kind: str, help_text: str):
+        self.name = name
+        self.kind = kind
+        self.help_text = help_text
+        self.samples: List[Tuple[str, dict, float]] = []
+
+    def add(self, value: float, suffix: str = "", **labels) -> "MetricFamily":
+        self.samples.append((self.name + suffix, labels, value))
+        return self
+
+    def lines(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} {self.kind}"]
+        lines += [f"{name}{_labels(labels)} {_number(value)}" for name, labels, value in self.samples]
+        return lines
+
+
+class RequestHistograms:
+    """RequestHistograms counts request latencies into cumulative buckets per label value, thread safe."""
+
+    def __init__(self, buckets: Tuple[float, ...] = LATENCY_BUCKETS):
+        self.buckets = buckets
+        self._lock = threading.Lock()
+        # label value -> [bucket counts (last: +Inf), sum of seconds]
+        self._series: Dict[str, list] = {}
+
+    def observe(self, label: str, seconds: float) -> None:
+        bucket = bisect_left(self.buckets, seconds)
+        with self._lock:
+            series = self._series.get(label)
+            if series is None:
+                series = self._series[label] = [[0] * (len(self.buckets) + 1), 0.0]
+            series[0][bucket] += 1
+            series[1] += seconds
+
+    def snapshot(self) -> Dict[str, list]:
+        """snapshot returns the bucket counts (last: +Inf) and the sum of seconds per label value."""
+        with self._lock:
+            return {label: [list(counts), total] for label, (counts, total) in self._series.items()}
+
+
+def _histogram_family(
+    series: Dict[str, list], name: str, help_text: str, label_name: str, buckets: Tuple[float, ...] = LATENCY_BUCKETS
+) -> MetricFamily:
+    family = MetricFamily(name, "histogram", help_text)
+    for label, (counts, total) in sorted(series.items()):
+        cumulative = 0
+        for bound, count in zip(buckets + (float("inf"),), counts):
+            cumulative += count
+            le = "+Inf" if bound == float("inf") else repr(bound)
+            family.add(cumulative, "_bucket", **{label_name: label}, le=le)
+        family.add(total, "_sum", **{label_name: label})
+        family.add(cumulative, "_count", **{label_name: label})
+    return family
+
+
+def _process_file(directory: str, pid: int) -> str:
+    return os.path.join(directory, f"worker_{pid}.json")
+
+
+def _read_json(path: str) -> dict:
+    try:
+        with open(path, encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def _write_json(path: str, data: dict) -> None:
+    # readers in other processes see the old or the new file, never a partial one.
+    temp = f"{path}.{os.getpid()}-{threading.get_ident()}.tmp"
+    with open(temp, "w", encoding="utf-8") as f:
+        json.dump(data, f)
+    os.replace(temp, path)
+
+
+@contextmanager
+def _directory_lock(directory: str, operation: int):
+    # a scrape (shared) never reads the files while an exited worker is folded into exited.json (exclusive).
+    with open(os.path.join(directory, ".lock"), "a") as f:
+        fcntl.flock(f, operation)
+        try:
+            yield
+        finally:
+            fcntl.flock(f, fcntl.LOCK_UN)
+
+
+def _merge(total: dict, counters: dict, live: bool = True, sign: int = 1) -> dict:
+    """_merge adds (sign -1: subtracts) the counters of a process to total; cache entries only count if it runs."""
+    for kind in ("callbacks", "routes"):
+        for label, (counts, seconds) in counters.get(kind, {}).items():
+            series = total.setdefault(kind, {}).setdefault(label, [[0] * len(counts), 0.0])
+            series[0] = [a + sign * b for a, b in zip(series[0], counts)]
+            series[1] += sign * seconds
+    for name, cache in counters.get("caches", {}).items():
+        merged = total.setdefault("caches", {}).setdefault(name, {"hits": 0, "misses": 0, "entries": 0})
+        merged["hits"] += sign * cache["hits"]
+        merged["misses"] += sign * cache["misses"]
+        if live:
+            merged["entries"] += sign * cache["entries"]
+    for function, stats in counters.get("single_flight", {}).items():
+        merged = total.setdefault("single_flight", {}).setdefault(function, {"calls": 0, "coalesced": 0})
+        merged["calls"] += sign * stats["calls"]
+        merged["coalesced"] += sign * stats["coalesced"]
+    return total
+
+
+def merge_process_metrics(directory: str) -> dict:
+    """merge_process_metrics sums the counters written by all server processes, running or exited.
+
+    Args:
+        directory (str): the metrics directory (METRICS_DIR).
+
+    Returns:
+        dict: {'callbacks', 'routes': {label: [bucket counts, seconds]}, 'caches': {name: counters},
+              'single_flight': {function: counters}}.
+    """
+    total = {"callbacks": {}, "routes": {}, "caches": {}, "single_flight": {}}
+    with _directory_lock(directory, fcntl.LOCK_SH):
+        _merge(total, _read_json(os.path.join(directory, EXITED_FILE)), live=False)
+        for name in sorted(os.listdir(directory)):
+            if name.startswith("worker_") and name.endswith(".json"):
+                _merge(total, _read_json(os.path.join(directory, name)))
+    return total
+
+
+def archive_process_metrics(directory: str, pid: int) -> None:
+    """archive_process_metrics folds the counters of an exited process into exited.json (gunicorn child_exit).
+
+    Args:
+        directory (str): the metrics directory (METRICS_DIR).
+        pid (int): pid of the exited process.
+    """
+    path = _process_file(directory, pid)
+    if not os.path.exists(path):
+        return
+    with _directory_lock(directory, fcntl.LOCK_EX):
+        exited = os.path.join(directory, EXITED_FILE)
+        _write_json(exited, _merge(_read_json(exited), _read_json(path), live=False))
+        os.remove(path)
+
+
+def clear_process_metrics(directory: str) -> None:
+    """clear_process_metrics deletes the counters of a previous run of the server."""
+    os.makedirs(directory, exist_ok=True)
+    for name in os.listdir(directory):
+        if name == EXITED_FILE or name.startswith("worker_"):
+            try:
+                os.remove(os.path.join(directory, name))
+            except OSError:
+                pass
+
+
+class SharedCounters:
+    """SharedCounters writes the counters of the calling process to its file of the metrics directory."""
+
+    def __init__(self, directory: str, collect: Callable[[], dict]):
+        self.directory = directory
+        self.collect = collect
+        self._lock = threading.Lock()
+        # pid of the process with a flush scheduled (timers are not inherited by forked workers).
+        self._scheduled = None
+        # the counts a forked worker inherited from the master (e.g. cache misses while preloading) are not its own.
+        self._pid = None
+        self._baseline = {}
+
+    def started(self) -> None:
+        """started takes the inherited counts as the baseline of this process, before its first request."""
+        if self._pid == os.getpid():
+            return
+        baseline = self.collect()
+        with self._lock:
+            if self._pid != os.getpid():
+                self._pid, self._baseline = os.getpid(), baseline
+
+    def changed(self) -> None:
+        """changed schedules a flush of this process' counters, unless one is scheduled already."""
+        with self._lock:
+            if self._scheduled == os.getpid():
+                return
+            self._scheduled = os.getpid()
+        timer = threading.Timer(FLUSH_SECONDS, self.flush)
+        timer.daemon = True
+        timer.start()
+
+    def flush(self) -> None:
+        with self._lock:
+            self._scheduled = None
+            baseline = self._baseline if self._pid == os.getpid() else {}
+        _write_json(_process_file(self.directory, os.getpid()), _merge(self.collect(), baseline, live=False, sign=-1))
+
+
+_shared_counters: List[SharedCounters] = []
+
+
+def flush_process_metrics() -> None:
+    """flush_process_metrics writes the counters of the calling process now, e.g. when a gunicorn worker exits."""
+    for counters in _shared_counters:
+        counters.flush()
+
+
+def _cache_counters(caches: Iterable[Callable]) -> Dict[str, dict]:
+    counters = {}
+    for cache in caches:
+        info = cache.cache_info()
+        counters[cache.__name__] = {"hits": info.hits, "misses": info.misses, "entries": info.currsize}
+    return counters
+
+
+def _cache_families(caches: Dict[str, dict]) -> List[MetricFamily]:
+    hits = MetricFamily("bte_cache_hits_total", "counter", "lru cache hits.")
+    misses = MetricFamily("bte_cache_misses_total", "counter", "lru cache misses.")
+    ratio = MetricFamily("bte_cache_hit_ratio", "gauge", "lru cache hits / (hits + misses) since start.")
+    size = MetricFamily("bte_cache_entries", "gauge", "entries held by the lru caches of the running workers.")
+    for name, cache in sorted(caches.items()):
+        calls = cache["hits"] + cache["misses"]
+        hits.add(cache["hits"], cache=name)
+        misses.add(cache["misses"], cache=name)
+        ratio.add(cache["hits"] / calls if calls else 0.0, cache=name)
+        size.add(cache["entries"], cache=name)
+    return [hits, misses, ratio, size]
+
+
+def _single_flight_families(functions: Dict[str, dict]) -> List[MetricFamily]:
+    calls = MetricFamily("bte_single_flight_calls_total", "counter", "calls of single-flight functions.")
+    coalesced = MetricFamily(
+        "bte_single_flight_coalesced_total", "counter", "calls served by a computation already in flight."
+    )
+    for function, stats in sorted(functions.items()):
+        calls.add(stats["calls"], function=function)
+        coalesced.add(stats["coalesced"], function=function)
+    return [calls, coalesced]
+
+
+def _dataset_families(snapshot_version: str) -> List[MetricFamily]:
+    with _datasets_lock:
+        datasets = {name: dict(d) for name, d in _datasets.items()}
+    rows = MetricFamily("bte_dataset_rows", "gauge", "rows of the dataset.")
+    memory = MetricFamily(
+        "bte_dataset_memory_bytes", "gauge", "memory of the dataset, measured once it was prepared."
+    )
+    load = MetricFamily("bte_dataset_load_seconds", "gauge", "time it took to download and parse the dataset.")
+    modified = MetricFamily(
+        "bte_dataset_modified_timestamp_seconds", "gauge", "last modification time of the stored dataset."
+    )
+    for name, dataset in sorted(datasets.items()):
+        rows.add(dataset["rows"], dataset=name)
+        load.add(round(dataset["load_seconds"], 6), dataset=name)
+        if dataset["memory_bytes"] is not None:
+            memory.add(dataset["memory_bytes"], dataset=name, shared=str(dataset["shared"]).lower())
+        if dataset["modified"] is not None:
+            modified.add(dataset["modified"], dataset=name)
+    families = [rows, memory, load, modified]
+    families.append(
+        MetricFamily("bte_data_snapshot_info", "gauge", "version (fingerprint) of the loaded data snapshot.").add(
+            1, version=snapshot_version
+        )
+    )
+    stamps = [d["modified"] for d in datasets.values() if d["modified"] is not None]
+    if stamps:
+        families.append(
+            MetricFamily(
+                "bte_data_snapshot_age_seconds", "gauge", "seconds since the newest dataset of the snapshot was stored."
+            ).add(round(time.time() - max(stamps), 3))
+        )
+    return families
+
+
+def _process_families() -> List[MetricFamily]:
+    report = memory_report()
+    processes = [("worker", pid, usage) for pid, usage in report["workers"].items()]
+    if report["master"] is not None:
+        processes.insert(0, ("master", None, report["master"]))
+    families = []
+    for field, help_text in [
+        ("rss", "resident memory of the server process."),
+        ("unique", "memory only this server process holds (private pages)."),
+        ("shared", "memory this server process shares with the others."),
+    ]:
+        family = MetricFamily(f"bte_process_{field}_memory_bytes", "gauge", help_text)
+        for role, pid, usage in processes:
+            family.add(usage.get(field, 0), role=role, pid=pid if pid is not None else "master")
+        families.append(family)
+    return families
+
+
+def _structure_families(memory_accounting: Callable[[], dict]) -> List[MetricFamily]:
+    report = memory_accounting()
+    memory = MetricFamily(
+        "bte_structure_memory_bytes", "gauge", "deep memory of the data structure, measured once it was loaded."
+    )
+    items = MetricFamily("bte_structure_items", "gauge", "rows (items) of the data structure.")
+    growth = MetricFamily(
+        "bte_structure_memory_growth_ratio", "gauge", "memory growth of the data structure since the previous data load."
+    )
+    flagged = MetricFamily(
+        "bte_structure_memory_unexpected_growth", "gauge", "1 if the data structure grew more than its rows explain."
+    )
+    for structure in report["structures"]:
+        labels = {"structure": structure["name"], "kind": structure["kind"]}
+        memory.add(structure["bytes"], **labels)
+        if structure["items"] is not None:
+            items.add(structure["items"], **labels)
+        if structure["growth"] is not None:
+            growth.add(structure["growth"], **labels)
+        flagged.add(int(structure["flagged"]), **labels)
+    return [memory, items, growth, flagged]
+
+
+def install_metrics(
+    server: Flask,
+    caches: Callable[[], Iterable[Callable]] = None,
+    single_flight_stats: Callable[[], dict] = None,
+    memory_accounting: Callable[[], dict] = None,
+    snapshot_version: str = "unknown",
+    pages: Iterable[str] = (),
+    route: str = "/metrics",
+    directory: str = METRICS_DIR,
+) -> Tuple[RequestHistograms, RequestHistograms]:
+    """install_metrics times every request of the server and serves the metrics at route in prometheus format.
+
+    Install it before the response compression, so the measured latency includes it, and before
+    the server forks its workers (gunicorn preload_app): the counters of a previous run in
+    directory are deleted.
+
+    Args:
+        server (Flask): the app's flask server (app.server).
+        caches (Callable[[], Iterable[Callable]], optional): returns the lru_cache wrapped functions to report;
+                                                            called per scrape, so they may be defined later.
+                                                            Defaults to None.
+        single_flight_stats (Callable[[], dict], optional): single-flight counters (bte_single_flight). Defaults to None.
+        memory_accounting (Callable[[], dict], optional): report of the data structures' memory
+                                                          (MemoryAccounting.snapshot). Defaults to None.
+        snapshot_version (str, optional): version of the loaded data snapshot. Defaults to 'unknown'.
+        pages (Iterable[str], optional): page paths served by dash's catch-all route, reported on their own.
+                                         Defaults to ().
+        route (str, optional): url of the metrics. Defaults to '/metrics'.
+        directory (str, optional): where every server process writes its counters. Defaults to METRICS_DIR.
+
+    Returns:
+        Tuple[RequestHistograms, RequestHistograms]: the callback and the page request histograms.
+    """
+    callbacks, routes = RequestHistograms(), RequestHistograms()
+    pages = frozenset(pages)
+
+    def collect():
+        counters = {"callbacks": callbacks.snapshot(), "routes": routes.snapshot()}
+        if caches is not None:
+            counters["caches"] = _cache_counters(caches())
+        if single_flight_stats is not None:
+            counters["single_flight"] = single_flight_stats()["functions"]
+        return counters
+
+    clear_process_metrics(directory)
+    shared = SharedCounters(directory, collect)
+    _shared_counters.append(shared)
+
+    @server.before_request
+    def start_request_timer():
+        shared.started()
+        g.bte_request_start = time.perf_counter()
+
+    @server.after_request
+    def observe_request(response):
+        start = g.pop("bte_request_start", None)
+        if start is None:
+            return response
+        seconds = time.perf_counter() - start
+        if request.path.endswith(DASH_UPDATE_ROUTE) and request.method == "POST":
+            body = request.get_json(silent=True) or {}
+            callbacks.observe(body.get("output", "unknown"), seconds)
+        elif request.path in pages:
+            routes.observe(request.path, seconds)
+        else:
+            routes.observe(request.url_rule.rule if request.url_rule else "unmatched", seconds)
+        shared.changed()
+        return response
+
+    def metrics():
+        # the counters of all server processes, this one's up to date.
+        shared.flush()
+        counters = merge_process_metrics(directory)
+        families = [
+            _histogram_family(
+                counters["callbacks"],
+                "bte_callback_request_duration_seconds",
+                "latency of the callback requests.",
+                "callback",
+            ),
+            _histogram_family(
+                counters["routes"], "bte_http_request_duration_seconds", "latency of the other requests.", "route"
+            ),
+        ]
+        if caches is not None:
+            families += _cache_families(counters["caches"])
+        if single_flight_stats is not None:
+            families += _single_flight_families(counters["single_flight"])
+        if memory_accounting is not None:
+            families += _structure_families(memory_accounting)
+        families += _dataset_families(snapshot_version)
+        families += _process_families()
+        text = "\n".join(line for family in families if family.samples for line in family.lines())
+        return Response(text + "\n", content_type=CONTENT_TYPE)
+
+    server.add_url_rule(route, route.strip("/").replace("/", "_").replace("-", "_"), metrics)
+    return callbacks, routes
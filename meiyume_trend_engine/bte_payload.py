@@ -0,0 +1,281 @@
+"""payload slimming for the figures the web-app's callbacks send to the browser.
+
+Figure responses carry full precision floats, hover customdata columns that only repeat
+the trace name (e.g. hover_data=['category'] next to color='category') and the same
+style block on every facet axis. slim_figure rewrites a figure json into an equivalent,
+smaller one:
+
+- floats are rounded to FIGURE_SIGNIFICANT_DIGITS significant digits,
+- customdata columns that are constant within a trace are written into the hovertemplate
+  and dropped, unless a callback reads the figure's clickData (clicks send customdata),
+- style properties shared by all x (y) axes of a faceted figure move to the figure
+  template, which plotly.js applies to every axis,
+- optionally (FIGURE_TYPED_ARRAYS) numeric arrays are sent as base64 typed arrays
+  ({'dtype', 'bdata'}), which needs plotly.js 2.28 or newer in the browser. Figures
+  sent into a dcc.Store are left as plain arrays, clientside callbacks slice them.
+
+install_payload_slimming applies it to every callback response and keeps the payload
+bytes before and after per callback.
+"""
+import base64
+import json
+import re
+import threading
+from collections import defaultdict
+from typing import Callable, Set
+
+import numpy as np
+from flask import Flask, request
+from plotly.utils import PlotlyJSONEncoder
+
+from settings import FIGURE_SIGNIFICANT_DIGITS, FIGURE_TYPED_ARRAYS
+
+# axis properties that place an axis or are not applied from templates; they stay on the
+# axis even when all axes agree.
+AXIS_OWN_KEYS = {
+    "anchor",
+    "categoryarray",
+    "domain",
+    "matches",
+    "overlaying",
+    "position",
+    "range",
+    "scaleanchor",
+    "side",
+    "title",
+    "type",
+}
+AXIS_KEY = re.compile(r"^(xaxis|yaxis)\d*$")
+CUSTOMDATA_REF = re.compile(r"%\{customdata\[(\d+)\](:[^}]*)?\}")
+
+
+def _float_array(values) -> np.ndarray:
+    """_float_array returns the values as a float array if they are all plain numbers with a float among them."""
+    if not isinstance(values, list) or not values:
+        return None
+    if not all(
+        isinstance(v, (int, float)) and not isinstance(v, bool) for v in values
+    ):
+        return None
+    if not any(isinstance(v, float) for v in values):
+        return None
+    return np.asarray(values, dtype=float)
+
+
+def round_significant(values: np.ndarray, digits: int) -> np.ndarray:
+    """round_significant rounds every value to the given number of significant digits.
+
+    Args:
+        values (np.ndarray): float values.
+        digits (int): significant digits to keep.
+
+    Returns:
+        np.ndarray: rounded values (nearest double of the decimal, so json writes it short).
+    """
+    finite = np.isfinite(values) & (values != 0)
+    exponent = np.zeros(len(values), dtype=int)
+    magnitude = np.floor(np.log10(np.abs(values[finite]))).astype(int)
+    exponent[finite] = digits - 1 - magnitude
+    rounded = values.copy()
+    # multiply/divide by exact powers of ten so the result is the double nearest to the decimal
+    up = finite & (exponent >= 0)
+    scale = 10.0 ** exponent[up]
+    rounded[up] = np.round(values[up] * scale) / scale
+    down = finite & (exponent < 0)
+    scale = 10.0 ** -exponent[down]
+    rounded[down] = np.round(values[down] / scale) * scale
+    return rounded
+
+
+def _typed_array(values: np.ndarray) -> dict:
+    if np.all(np.mod(values, 1) == 0) and np.all(np.abs(values) < 2 ** 31):
+        values, dtype = values.astype("<i4"), "i4"
+    else:
+        values, dtype = values.astype("<f8"), "f8"
+    bdata = base64.b64encode(values.tobytes()).decode("ascii")
+    return {"dtype": dtype, "bdata": bdata}
+
+
+def _slim_arrays(obj, digits: int, typed_arrays: bool):
+    """_slim_arrays rounds (and optionally typed-array encodes) every numeric array in a trace."""
+    if isinstance(obj, dict):
+        return {k: _slim_arrays(v, digits, typed_arrays) for k, v in obj.items()}
+    if isinstance(obj, list):
+        values = _float_array(obj)
+        if values is None:
+            return [_slim_arrays(v, digits, typed_arrays) for v in obj]
+        if not np.all(np.isfinite(values)):
+            return obj
+        values = round_significant(values, digits)
+        if typed_arrays:
+            return _typed_array(values)
+        # whole numbers are written without '.0'
+        return [int(v) if v.is_integer() else v for v in values.tolist()]
+    if isinstance(obj, float) and np.isfinite(obj):
+        return float(round_significant(np.array([obj]), digits)[0])
+    return obj
+
+
+def _drop_constant_customdata(trace: dict) -> None:
+    """_drop_constant_customdata moves customdata columns that are the same for every point into the hovertemplate."""
+    customdata = trace.get("customdata")
+    template = trace.get("hovertemplate")
+    if not customdata or not isinstance(customdata, list) or not isinstance(template, str):
+        return
+    width = len(customdata[0]) if isinstance(customdata[0], list) else None
+    if width is None or not all(
+        isinstance(row, list) and len(row) == width for row in customdata
+    ):
+        return
+    formatted = {int(m.group(1)) for m in CUSTOMDATA_REF.finditer(template) if m.group(2)}
+    constant = [
+        i
+        for i in range(len(customdata[0]))
+        if i not in formatted
+        and all(row[i] == customdata[0][i] for row in customdata)
+        and isinstance(customdata[0][i], (str, int, float))
+    ]
+    if not constant:
+        return
+    kept = [i for i in range(len(customdata[0])) if i not in constant]
+    new_index = {old: new for new, old in enumerate(kept)}
+
+    def replace(match):
+        i = int(match.group(1))
+        if i in constant:
+            return str(customdata[0][i])
+        return "%{customdata[" + str(new_index[i]) + "]" + (match.group(2) or "") + "}"
+
+    trace["hovertemplate"] = CUSTOMDATA_REF.sub(replace, template)
+    if kept:
+        trace["customdata"] = [[row[i] for i in kept] for row in customdata]
+    else:
+        del trace["customdata"]
+
+
+def _dedupe_axis_styles(layout: dict) -> None:
+    """_dedupe_axis_styles moves style properties shared by all x (y) axes into the layout template."""
+    for letter in ("xaxis", "yaxis"):
+        axes = [
+            axis
+            for key, axis in layout.items()
+            if AXIS_KEY.match(key) and key.startswith(letter) and isinstance(axis, dict)
+        ]
+        if len(axes) < 2:
+            continue
+        shared = {
+            key: value
+            for key, value in axes[0].items()
+            if key not in AXIS_OWN_KEYS
+            and all(key in axis and axis[key] == value for axis in axes[1:])
+        }
+        if not shared:
+            continue
+        template = layout.setdefault("template", {}).setdefault("layout", {})
+        template[letter] = {**template.get(letter, {}), **shared}
+        for axis in axes:
+            for key in shared:
+                del axis[key]
+
+
+def is_figure(value) -> bool:
+    return isinstance(value, dict) and isinstance(value.get("data"), list) and "layout" in value
+
+
+def slim_figure(
+    figure: dict,
+    keep_customdata: bool = True,
+    digits: int = FIGURE_SIGNIFICANT_DIGITS,
+    typed_arrays: bool = FIGURE_TYPED_ARRAYS,
+) -> dict:
+    """slim_figure returns a smaller json figure that plotly.js draws the same way.
+
+    Args:
+        figure (dict): figure json (as sent in a callback response).
+        keep_customdata (bool, optional): keep customdata as is, for figures whose clickData is read. Defaults to True.
+        digits (int, optional): significant digits of floats. Defaults to FIGURE_SIGNIFICANT_DIGITS.
+        typed_arrays (bool, optional): base64 typed arrays for numeric arrays. Defaults to FIGURE_TYPED_ARRAYS.
+
+    Returns:
+        dict: slimmed figure json.
+    """
+    traces = []
+    for trace in figure["data"]:
+        trace = dict(trace)
+        if not keep_customdata:
+            _drop_constant_customdata(trace)
+        traces.append(_slim_arrays(trace, digits, typed_arrays))
+    layout = json.loads(json.dumps(figure.get("layout", {})))
+    _dedupe_axis_styles(layout)
+    return {**figure, "data": traces, "layout": layout}
+
+
+class PayloadSizes:
+    """PayloadSizes keeps the response bytes of every callback before and after slimming."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._sizes = defaultdict(lambda: {"calls": 0, "bytes_before": 0, "bytes_after": 0})
+
+    def add(self, output: str, before: int, after: int) -> None:
+        with self._lock:
+            sizes = self._sizes[output]
+            sizes["calls"] += 1
+            sizes["bytes_before"] += before
+            sizes["bytes_after"] += after
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            callbacks = {output: dict(sizes) for output, sizes in self._sizes.items()}
+        return {
+            "bytes_before": sum(s["bytes_before"] for s in callbacks.values()),
+            "bytes_after": sum(s["bytes_after"] for s in callbacks.values()),
+            "callbacks": callbacks,
+        }
+
+
+def install_payload_slimming(
+    server: Flask, clicked_figure_ids: Callable[[], Set[str]]
+) -> PayloadSizes:
+    """install_payload_slimming slims the figures of every callback response and counts the saved bytes.
+
+    Args:
+        server (Flask): the app's flask server (app.server).
+        clicked_figure_ids (Callable[[], Set[str]]): ids of the graphs whose clickData a callback reads.
+
+    Returns:
+        PayloadSizes: bytes before/after per callback output.
+    """
+    sizes = PayloadSizes()
+
+    @server.after_request
+    def slim_callback_response(response):
+        if (
+            not request.path.endswith("/_dash-update-component")
+            or response.status_code != 200
+        ):
+            return response
+        body = response.get_data()
+        if b'"layout"' not in body:
+            return response
+        payload = json.loads(body)
+        keep = clicked_figure_ids()
+        for component_id, props in payload.get("response", {}).items():
+            for prop, value in props.items():
+                if not is_figure(value):
+                    continue
+                # a figure in a dcc.Store (prop 'data') is drawn by '<graph id>_store' clientside callbacks
+                in_store = prop == "data"
+                graph_id = re.sub("_store$", "", component_id) if in_store else component_id
+                props[prop] = slim_figure(
+                    value,
+                    keep_customdata=graph_id in keep,
+                    typed_arrays=FIGURE_TYPED_ARRAYS and not in_store,
+                )
+        slimmed = json.dumps(payload, cls=PlotlyJSONEncoder).encode("utf-8")
+        output = (request.get_json(silent=True) or {}).get("output", "unknown")
+        sizes.add(output, len(body), len(slimmed))
+        response.set_data(slimmed)
+        return response
+
+    return sizes
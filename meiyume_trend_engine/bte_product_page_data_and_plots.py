@@ -3,12 +3,32 @@
 # import re
 # import numpy as np
 # from path import Path
+from functools import lru_cache
+from typing import List, NamedTuple, Tuple
 
+import numpy as np
 import pandas as pd
 import plotly.express as px
 import plotly.graph_objs as go
 
-from bte_utils import read_file_s3, set_default_start_and_end_dates
+from bte_dataset_store import open_partitioned_dataset, publish_dataset
+from bte_figure_builders import bar_figure, pie_figure
+from bte_single_flight import single_flight
+from bte_timeseries import downsample, point_budget, render_mode
+from bte_utils import (
+    build_row_index,
+    categorize_columns,
+    observed_value_counts,
+    read_file_s3,
+    select_rows,
+    set_default_start_and_end_dates,
+)
+from settings import (
+    CATEGORICAL_COLUMNS,
+    PARTITIONED_DATASETS,
+    PRODUCT_CONTEXT_CACHE_SIZE,
+    TIMESERIES_RENDERING,
+)
 
 default_start_date, default_end_date = set_default_start_and_end_dates()
 
@@ -37,9 +57,15 @@ prod_page_review_talking_points_df = read_file_s3(
 # pd.read_pickle(
 #     dash_data_path/'prod_page_review_talking_points')
 # review sentiment and influence data
-prod_page_review_sentiment_influence_df = read_file_s3(
-    filename="prod_page_review_sentiment_influence", file_type="feather"
-)
+if "prod_page_review_sentiment_influence" in PARTITIONED_DATASETS:
+    # the review rows are read per source and category, when a product of the partition is first selected.
+    prod_page_review_sentiment_influence = open_partitioned_dataset(
+        "prod_page_review_sentiment_influence", "prod_page_review_sentiment_influence"
+    )
+else:
+    prod_page_review_sentiment_influence_df = read_file_s3(
+        filename="prod_page_review_sentiment_influence", file_type="feather"
+    )
 
 # pd.read_feather(
 #     dash_data_path/'prod_page_review_sentiment_influence')
@@ -55,11 +81,14 @@ prod_page_item_df = read_file_s3(filename="prod_page_item_data", file_type="feat
 # pd.read_feather(dash_data_path/'prod_page_item_data')
 prod_page_item_price_df = prod_page_item_df[
     ["prod_id", "item_size", "meta_date", "item_price"]
-]
+].copy()
 prod_page_item_price_df["source"] = prod_page_item_price_df.prod_id.apply(
     lambda x: "us" if "sph" in x else "uk"
 )
 prod_page_item_price_df.reset_index(inplace=True, drop=True)
+if CATEGORICAL_COLUMNS:
+    # the frames read from storage are converted by read_file_s3, this one adds the source.
+    categorize_columns(prod_page_item_price_df)
 
 # ingredient data
 prod_page_ing_df = read_file_s3(filename="prod_page_ing_data", file_type="feather")
@@ -96,6 +125,148 @@ prod_page_user_attribute_options = sorted(
 #                                             ['source', 'category', 'product_type']))]
 
 
+""" product context shared by the product page callbacks """
+# row positions of every product, so a product selection does not scan the whole frames.
+prod_page_metadetail_index = build_row_index(
+    prod_page_metadetail_data_df, ["source", "prod_id"]
+)
+prod_page_review_sum_index = build_row_index(prod_page_review_sum_df, "prod_id")
+prod_page_review_talking_points_index = build_row_index(
+    prod_page_review_talking_points_df, "prod_id"
+)
+if "prod_page_review_sentiment_influence" in PARTITIONED_DATASETS:
+    # the partitions are selected by source, category and prod_id instead.
+    prod_page_review_sentiment_influence_index = None
+else:
+    prod_page_review_sentiment_influence_index = build_row_index(
+        prod_page_review_sentiment_influence_df, "prod_id"
+    )
+    # the review rows are read per product only (from shared memory with SHARED_DATASETS).
+    prod_page_review_sentiment_influence = publish_dataset(
+        "prod_page_review_sentiment_influence", prod_page_review_sentiment_influence_df
+    )
+    del prod_page_review_sentiment_influence_df
+prod_page_item_index = build_row_index(prod_page_item_df, "prod_id")
+prod_page_item_price_index = build_row_index(prod_page_item_price_df, "prod_id")
+prod_page_ing_index = build_row_index(prod_page_ing_df, "prod_id")
+# latest price snapshot of each source.
+prod_page_latest_price_date = prod_page_item_price_df.groupby(
+    "source", observed=True
+).meta_date.max()
+
+
+class ProductContext(NamedTuple):
+    """ProductContext holds the slices of the product page data for one product (and date range).
+
+    The frames are shared between requests through the cache and must not be modified.
+    """
+
+    metadetail: pd.Series
+    review_summary: pd.DataFrame
+    talking_points: pd.DataFrame
+    reviews: pd.DataFrame
+    items: pd.DataFrame
+    item_prices: pd.DataFrame
+    latest_prices: List[float]
+    ingredients: pd.DataFrame
+
+
+def select_product_reviews(source: str, prod_id: str, metadetail: pd.DataFrame) -> pd.DataFrame:
+    """select_product_reviews reads the review rows of a product.
+
+    Args:
+        source (str): market region.
+        prod_id (str): product id.
+        metadetail (pd.DataFrame): meta detail rows of the product, their category picks its partition.
+
+    Returns:
+        pd.DataFrame: review sentiment and influence rows of the product.
+    """
+    if prod_page_review_sentiment_influence_index is not None:
+        return prod_page_review_sentiment_influence.take(
+            prod_page_review_sentiment_influence_index.get(
+                prod_id, np.array([], dtype=int)
+            )
+        )
+    if len(metadetail) == 0:
+        return prod_page_review_sentiment_influence.where(source=source, prod_id=prod_id)
+    return prod_page_review_sentiment_influence.where(
+        source=source, category=str(metadetail.category.iloc[0]), prod_id=prod_id
+    )
+
+
+@lru_cache(maxsize=PRODUCT_CONTEXT_CACHE_SIZE)
+@single_flight
+def get_product_context(source: str, prod_id: str) -> ProductContext:
+    """get_product_context resolves the product page data of a product once for all product page callbacks.
+
+    Args:
+        source (str): market region.
+        prod_id (str): product id.
+
+    Returns:
+        ProductContext: whole history of the product.
+    """
+    metadetail = select_rows(
+        prod_page_metadetail_data_df, prod_page_metadetail_index, (source, prod_id)
+    )
+    item_prices = select_rows(
+        prod_page_item_price_df, prod_page_item_price_index, prod_id
+    )
+    return ProductContext(
+        metadetail=metadetail.iloc[0] if len(metadetail) > 0 else None,
+        review_summary=select_rows(
+            prod_page_review_sum_df, prod_page_review_sum_index, prod_id
+        ),
+        talking_points=select_rows(
+            prod_page_review_talking_points_df,
+            prod_page_review_talking_points_index,
+            prod_id,
+        ),
+        reviews=select_product_reviews(source, prod_id, metadetail),
+        items=select_rows(prod_page_item_df, prod_page_item_index, prod_id),
+        item_prices=item_prices,
+        latest_prices=item_prices.item_price[
+            (item_prices.source == source)
+            & (item_prices.meta_date == prod_page_latest_price_date.get(source))
+        ].tolist(),
+        ingredients=select_rows(prod_page_ing_df, prod_page_ing_index, prod_id),
+    )
+
+
+@lru_cache(maxsize=PRODUCT_CONTEXT_CACHE_SIZE)
+@single_flight
+def get_product_context_in_date_range(
+    source: str, prod_id: str, start_date: str, end_date: str
+) -> ProductContext:
+    """get_product_context_in_date_range narrows the product context to a date range.
+
+    Args:
+        source (str): market region.
+        prod_id (str): product id.
+        start_date (str): start date string (YYYY-MM-DD).
+        end_date (str): end date string (YYYY-MM-DD).
+
+    Returns:
+        ProductContext: product context with reviews, items and item prices within the date range.
+    """
+    context = get_product_context(source, prod_id)
+    return context._replace(
+        reviews=context.reviews[
+            (context.reviews.review_date >= start_date)
+            & (context.reviews.review_date <= end_date)
+        ],
+        items=context.items[
+            (context.items.meta_date >= start_date)
+            & (context.items.meta_date <= end_date)
+        ],
+        item_prices=context.item_prices[
+            (context.item_prices.meta_date >= start_date)
+            & (context.item_prices.meta_date <= end_date)
+        ],
+    )
+
+
 """ create graph figure functions"""
 
 
@@ -134,7 +305,7 @@ def create_prod_page_review_talking_points_figure(
             title = "Negative Talking Points"
             marker_color = "red"
 
-        fig = px.bar(
+        return bar_figure(
             tpdf,
             x="frequency",
             y="keyphrase",
@@ -142,35 +313,17 @@ def create_prod_page_review_talking_points_figure(
             title=title,
             width=1000,
             height=600,
+            xaxis={"title": "Frequency", "tickfont": {"size": 12.5}},
+            yaxis={"title": "", "tickfont": {"size": 12.5}},
+            trace={
+                "marker": {
+                    "color": marker_color,
+                    "line": {"color": "rgb(8,48,107)", "width": 1.5},
+                },
+                "opacity": 0.5,
+            },
+            layout={"margin": {"l": 200}, "hovermode": "closest"},
         )
-        fig.update_traces(
-            marker_color=marker_color,
-            marker=dict(line=dict(color="rgb(8,48,107)", width=1.5)),
-            opacity=0.5,
-        )
-        for axis in fig.layout:
-            if type(fig.layout[axis]) == go.layout.YAxis:
-                fig.layout[axis].title.text = ""
-        fig.update_layout(
-            font_family="GothamLight",
-            font_color="#c09891",
-            title_font_family="GildaDisplay",
-            title_font_color="#c09891",
-            title_font_size=24,
-            legend_title_font_color="green",
-            hovermode="closest",
-            xaxis={"title": "Frequency"},
-            margin=go.layout.Margin(l=200),
-        )
-        fig.update_xaxes(
-            tickfont=dict(family="GothamLight", color="crimson", size=12.5),
-            title_font=dict(size=20, family="GothamLight", color="crimson"),
-        )
-        fig.update_yaxes(
-            tickfont=dict(family="GothamLight", color="crimson", size=12.5),
-            title_font=dict(size=20, family="GothamLight", color="crimson"),
-        )
-        return fig
     else:
         return {}
 
@@ -190,7 +343,7 @@ def create_prod_page_review_breakdown_figure(
     Returns:
         go.Figure: [description]
     """
-    df = pd.DataFrame(data[col][data.prod_id == prod_id].value_counts()).reset_index()
+    df = pd.DataFrame(observed_value_counts(data[col][data.prod_id == prod_id])).reset_index()
     df.columns = [col, "review_count"]
     df.sort_values(by=[col], inplace=True, ascending=False)
 
@@ -199,7 +352,7 @@ def create_prod_page_review_breakdown_figure(
     else:
         marker_colors = ["orange", "#c09891"]
 
-    fig = px.pie(
+    return pie_figure(
         df,
         values="review_count",
         names=col,
@@ -207,21 +360,16 @@ def create_prod_page_review_breakdown_figure(
         height=400,
         width=450,
         title=f'Review {col.replace("_", " ").title()} Breakdown',
+        trace={"marker": {"colors": marker_colors}, "pull": [0, 0.2]},
     )
-    fig.update_layout(
-        font_family="GothamLight",
-        font_color="#c09891",
-        title_font_family="GildaDisplay",
-        title_font_color="#c09891",
-        title_font_size=24,
-        legend_title_font_color="green",
-    )
-    fig.update_traces(marker_colors=marker_colors, pull=[0, 0.2])
-    return fig
 
 
 def create_prod_page_review_timeseries_figure(
-    data: pd.DataFrame, prod_id: str, col: str
+    data: pd.DataFrame,
+    prod_id: str,
+    col: str,
+    x_range: Tuple[str, str] = None,
+    adaptive: bool = None,
 ) -> go.Figure:
     """create_prod_page_review_timeseries_figure [summary]
 
@@ -231,6 +379,9 @@ def create_prod_page_review_timeseries_figure(
         data (pd.DataFrame): [description]
         prod_id (str): [description]
         col (str): [description]
+        x_range (Tuple[str, str], optional): visible window of the zoomed chart (adaptive mode). Defaults to None.
+        adaptive (bool, optional): downsample with LTTB and use WebGL for many points.
+            Defaults to TIMESERIES_RENDERING == 'adaptive'.
 
     Returns:
         go.Figure: [description]
@@ -240,9 +391,10 @@ def create_prod_page_review_timeseries_figure(
     if len(data[data.prod_id == prod_id]) > 0:
         df = pd.DataFrame(
             data[data.prod_id == prod_id]
-            .groupby(by=["review_date"])[col]
+            .groupby(by=["review_date"], observed=True)[col]
             .value_counts()
         )
+        df = df[df[col] > 0]
         df.columns = ["review_count"]
         df.reset_index(inplace=True)
 
@@ -252,38 +404,31 @@ def create_prod_page_review_timeseries_figure(
         else:
             marker_color = ["#c09891", "orange"]
 
+        line_options = {"line_shape": "spline"}
+        if adaptive if adaptive is not None else TIMESERIES_RENDERING == "adaptive":
+            df = downsample(
+                df, "review_date", "review_count", col, point_budget(1000), x_range
+            )
+            line_options = {"line_shape": "linear", "render_mode": render_mode(len(df))}
+
         fig = px.line(
             df,
             x="review_date",
             y="review_count",
             color=col,
-            line_shape="spline",
             height=500,
             width=1000,
             color_discrete_sequence=marker_color,
             title=f"Reviews {col.title()} Over Time",
+            **line_options,
         )
         fig.update_traces(connectgaps=True, mode="markers+lines")
         fig.update_layout(
-            # keep the original annotations and add a list of new annotations:
-            font_family="GothamLight",
-            font_color="#c09891",
-            title_font_family="GildaDisplay",
-            title_font_color="#c09891",
-            title_font_size=24,
-            legend_title_font_color="green",
             hovermode="closest",
+            # keep the original annotations and add a list of new annotations:
             xaxis={"title": "Month"},
             yaxis={"title": "Review Count"},
         )
-        fig.update_xaxes(
-            tickfont=dict(family="GothamLight", color="crimson", size=14),
-            title_font=dict(size=20, family="GothamLight", color="crimson"),
-        )
-        fig.update_yaxes(
-            tickfont=dict(family="GothamLight", color="crimson", size=14),
-            title_font=dict(size=20, family="GothamLight", color="crimson"),
-        )
         return fig
     else:
         return {}
@@ -304,15 +449,21 @@ def create_prod_page_reviews_by_user_attribute_figure(
         go.Figure: [description]
     """
     data = pd.DataFrame(
-        prod_page_reviews_attribute_df[
-            (prod_page_reviews_attribute_df.prod_id == prod_id)
-        ][user_attribute].value_counts()
+        observed_value_counts(
+            prod_page_reviews_attribute_df[
+                (prod_page_reviews_attribute_df.prod_id == prod_id)
+            ][user_attribute]
+        )
     ).reset_index()
     data.columns = [user_attribute, "review_count"]
     data = data[data[user_attribute] != ""]
 
     plot_title = user_attribute.replace("_", " ").title()
-    fig = px.bar(
+    if user_attribute == "age":
+        categoryorder = "category descending"
+    else:
+        categoryorder = "total ascending"
+    return bar_figure(
         data,
         x="review_count",
         y=user_attribute,
@@ -320,32 +471,10 @@ def create_prod_page_reviews_by_user_attribute_figure(
         height=400,
         # title=f"Reviews by {plot_title}",
         text="review_count",
-    )
-    fig.update_layout(
-        font_family="GothamLight",
-        font_color="#c09891",
-        title_font_family="GildaDisplay",
-        title_font_color="#c09891",
-        title_font_size=24,
-        legend_title_font_color="green",
-        hovermode="closest",
         xaxis={"title": "Review Count"},
-        yaxis={"categoryorder": "category descending", "title": user_attribute},
-    )
-    fig.update_xaxes(
-        tickfont=dict(family="GothamLight", color="crimson", size=14),
-        title_font=dict(size=20, family="GothamLight", color="crimson"),
+        yaxis={"categoryorder": categoryorder, "title": user_attribute},
+        layout={"hovermode": "closest"},
     )
-    fig.update_yaxes(
-        tickfont=dict(family="GothamLight", color="crimson", size=14),
-        title_font=dict(size=20, family="GothamLight", color="crimson"),
-    )
-    if user_attribute == "age":
-        fig.update_layout(yaxis={"categoryorder": "category descending"})
-    else:
-        fig.update_layout(yaxis={"categoryorder": "total ascending"})
-
-    return fig
 
 
 def create_prod_page_reviews_distribution_figure(
@@ -363,10 +492,10 @@ def create_prod_page_reviews_distribution_figure(
         go.Figure: [description]
     """
     rev_dist = pd.DataFrame(
-        data[data.prod_id == prod_id].review_rating.value_counts()
+        observed_value_counts(data[data.prod_id == prod_id].review_rating)
     ).reset_index()
     rev_dist.columns = ["stars", "review_count"]
-    fig = px.bar(
+    return bar_figure(
         rev_dist,
         x="review_count",
         y="stars",
@@ -374,74 +503,53 @@ def create_prod_page_reviews_distribution_figure(
         height=400,
         # title=f"Reviews by Stars",
         text="review_count",
-    )
-    fig.update_layout(
-        font_family="GothamLight",
-        font_color="#c09891",
-        title_font_family="GildaDisplay",
-        title_font_color="#c09891",
-        title_font_size=24,
-        legend_title_font_color="green",
-        hovermode="closest",
         xaxis={"title": "Review Count"},
         yaxis={"categoryorder": "category descending", "title": "Stars"},
-    )
-    fig.update_xaxes(
-        tickfont=dict(family="GothamLight", color="crimson", size=14),
-        title_font=dict(size=20, family="GothamLight", color="crimson"),
-    )
-    fig.update_yaxes(
-        tickfont=dict(family="GothamLight", color="crimson", size=14),
-        title_font=dict(size=20, family="GothamLight", color="crimson"),
+        layout={"hovermode": "closest"},
     )
 
-    return fig
 
-
-def create_prod_page_item_price_figure(data: pd.DataFrame) -> go.Figure:
+def create_prod_page_item_price_figure(
+    data: pd.DataFrame, x_range: Tuple[str, str] = None, adaptive: bool = None
+) -> go.Figure:
     """create_prod_page_item_price_figure [summary]
 
     [extended_summary]
 
     Args:
         data (pd.DataFrame): [description]
+        x_range (Tuple[str, str], optional): visible window of the zoomed chart (adaptive mode). Defaults to None.
+        adaptive (bool, optional): downsample with LTTB and use WebGL for many points.
+            Defaults to TIMESERIES_RENDERING == 'adaptive'.
 
     Returns:
         go.Figure: [description]
     """
     data = data.sort_values(by="meta_date")
+    line_options = {"line_shape": "spline"}
+    if adaptive if adaptive is not None else TIMESERIES_RENDERING == "adaptive":
+        data = downsample(
+            data, "meta_date", "item_price", "item_size", point_budget(1000), x_range
+        )
+        line_options = {"line_shape": "linear", "render_mode": render_mode(len(data))}
     fig = px.line(
         data,
         x="meta_date",
         y="item_price",
         color="item_size",
-        line_shape="spline",
         height=600,
         width=1000,
         #               color_discrete_sequence=marker_color,
         title=f"Price Over Time",
+        **line_options,
     )
     fig.update_traces(connectgaps=True, mode="markers+lines")
     fig.update_layout(
-        # keep the original annotations and add a list of new annotations:
-        font_family="GothamLight",
-        font_color="#c09891",
-        title_font_family="GildaDisplay",
-        title_font_color="#c09891",
-        title_font_size=24,
-        legend_title_font_color="green",
         hovermode="closest",
+        # keep the original annotations and add a list of new annotations:
         xaxis={"title": "Month"},
         yaxis={"title": "Price"},
     )
-    fig.update_xaxes(
-        tickfont=dict(family="GothamLight", color="crimson", size=14),
-        title_font=dict(size=20, family="GothamLight", color="crimson"),
-    )
-    fig.update_yaxes(
-        tickfont=dict(family="GothamLight", color="crimson", size=14),
-        title_font=dict(size=20, family="GothamLight", color="crimson"),
-    )
     return fig
 
 
@@ -0,0 +1,297 @@
+"""sampling profiler for the live server process.
+
+A sampler thread reads the python stacks of the other threads (sys._current_frames) every few
+milliseconds and counts them as collapsed stacks: one line per distinct stack, frames from the
+outermost to the innermost separated by ';', then the number of samples,
+
+    thread:ThreadPoolExecutor-0_1;run (threading.py:975);...;select_rows (bte_utils.py:257) 12
+
+which flamegraph.pl, speedscope and similar tools read as they are. Nothing is sampled until a
+profile is requested:
+
+- install_profiler_route: an admin route that profiles the whole worker for N seconds, or only
+  the next K invocations of a callback, named by its output (wrap_callbacks installs the hook for that),
+- install_profile_signal: a signal that writes an N seconds profile of the process to a file.
+"""
+import os
+import signal
+import sys
+import threading
+import time
+from collections import Counter
+from functools import wraps
+from typing import Callable, Dict, Iterable, Optional, Set
+
+import dash
+from flask import Flask, Response, request
+
+# hard limits of a requested profile.
+MAX_PROFILE_SECONDS = 120
+MIN_INTERVAL_MS = 1
+
+
+def _frame_name(frame) -> str:
+    code = frame.f_code
+    name = f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+    # ';' separates the frames and ' ' the count of a collapsed stack.
+    return name.replace(";", ":")
+
+
+def collapse_stack(frame, root: str = None) -> str:
+    """collapse_stack joins the frames of a stack from the outermost to frame with ';'."""
+    names = []
+    while frame is not None:
+        names.append(_frame_name(frame))
+        frame = frame.f_back
+    if root is not None:
+        names.append(root)
+    return ";".join(reversed(names))
+
+
+def format_collapsed(stacks: Counter) -> str:
+    """format_collapsed writes counted stacks in the collapsed stack format, most sampled first."""
+    return "".join(f"{stack} {count}\n" for stack, count in stacks.most_common())
+
+
+class StackSampler(threading.Thread):
+    """StackSampler counts the stacks of the process' threads (or of the selected ones) until it is stopped."""
+
+    def __init__(self, interval: float, thread_ids: Optional[Set[int]] = None):
+        super().__init__(name="bte-stack-sampler", daemon=True)
+        self.interval = interval
+        # None samples every thread but the sampler and the one that started it.
+        self.thread_ids = thread_ids
+        self.excluded = {threading.get_ident()}
+        self.stacks = Counter()
+        self.samples = 0
+        self._stop_event = threading.Event()
+
+    def run(self):
+        self.excluded.add(threading.get_ident())
+        while not self._stop_event.wait(self.interval):
+            names = {t.ident: t.name for t in threading.enumerate()}
+            selected = self.thread_ids
+            for ident, frame in sys._current_frames().items():
+                if ident in self.excluded or (selected is not None and ident not in selected):
+                    continue
+                self.stacks[collapse_stack(frame, f"thread:{names.get(ident, ident)}")] += 1
+            self.samples += 1
+
+    def stop(self) -> Counter:
+        self._stop_event.set()
+        self.join()
+        return self.stacks
+
+
+def profile_process(seconds: float, interval: float) -> Counter:
+    """profile_process samples the stacks of every other thread of the process for some seconds.
+
+    Args:
+        seconds (float): profile duration.
+        interval (float): seconds between two samples.
+
+    Returns:
+        Counter: samples per collapsed stack.
+    """
+    sampler = StackSampler(interval)
+    sampler.start()
+    time.sleep(seconds)
+    return sampler.stop()
+
+
+class _CallbackCapture:
+    """_CallbackCapture samples the threads running the next calls of one callback."""
+
+    def __init__(self, calls: int, interval: float):
+        self.remaining = calls
+        self.running = 0
+        self.thread_ids: Set[int] = set()
+        self.done = threading.Event()
+        self.sampler = StackSampler(interval, self.thread_ids)
+
+    def begin(self) -> bool:
+        # called under CallbackProfiler's lock.
+        if self.remaining == 0:
+            return False
+        self.remaining -= 1
+        self.running += 1
+        self.thread_ids.add(threading.get_ident())
+        return True
+
+    def end(self) -> None:
+        self.thread_ids.discard(threading.get_ident())
+        self.running -= 1
+        if self.remaining == 0 and self.running == 0:
+            self.done.set()
+
+
+class CallbackProfiler:
+    """CallbackProfiler profiles the next invocations of a callback, by its output (function names are not unique)."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._captures: Dict[str, _CallbackCapture] = {}
+        self.names: Set[str] = set()
+        # single outputs of the multi-output callbacks, to the name of their callback.
+        self.aliases: Dict[str, str] = {}
+
+    def wrap(self, name: str, func: Callable, aliases: Iterable[str] = ()) -> Callable:
+        self.names.add(name)
+        for alias in aliases:
+            self.aliases[alias] = name
+
+        @wraps(func)
+        def profiled_callback(*args, **kwargs):
+            # one dict lookup while no profile of this callback is requested.
+            capture = self._captures.get(name)
+            if capture is None:
+                return func(*args, **kwargs)
+            with self._lock:
+                started = capture.begin()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                if started:
+                    with self._lock:
+                        capture.end()
+
+        return profiled_callback
+
+    def profile(self, name: str, calls: int, interval: float, timeout: float) -> Counter:
+        """profile samples the next calls of the callback and returns their stacks.
+
+        Args:
+            name (str): output of the callback as in app.callback_map (e.g. 'ing_page_new_ing_table.data'), or one
+                        of the outputs of a multi-output callback.
+            calls (int): number of calls to profile.
+            interval (float): seconds between two samples.
+            timeout (float): give up waiting for the calls after this many seconds.
+
+        Raises:
+            KeyError: no wrapped callback has this output.
+            RuntimeError: this callback is profiled already.
+
+        Returns:
+            Counter: samples per collapsed stack (of the calls that ran before the timeout).
+        """
+        if name not in self.names:
+            if name not in self.aliases:
+                raise KeyError(name)
+            name = self.aliases[name]
+        capture = _CallbackCapture(calls, interval)
+        with self._lock:
+            if name in self._captures:
+                raise RuntimeError(f"{name} is profiled already")
+            self._captures[name] = capture
+        capture.sampler.start()
+        try:
+            capture.done.wait(timeout)
+        finally:
+            with self._lock:
+                del self._captures[name]
+        return capture.sampler.stop()
+
+
+def wrap_callbacks(app: dash.Dash, profiler: CallbackProfiler) -> int:
+    """wrap_callbacks lets the profiler sample the (server side) callbacks of the app.
+
+    Call it once, after the last callback is registered.
+
+    Args:
+        app (dash.Dash): the app.
+        profiler (CallbackProfiler): profiler requests are served by.
+
+    Returns:
+        int: number of wrapped callbacks.
+    """
+    wrapped = 0
+    for output, callback in app.callback_map.items():
+        if "callback" in callback:
+            # multi-output callbacks are keyed '..a.children...b.figure..', each output names them too.
+            outputs = output.strip(".").split("...") if output.startswith("..") else []
+            callback["callback"] = profiler.wrap(output, callback["callback"], outputs)
+            wrapped += 1
+    return wrapped
+
+
+def install_profiler_route(
+    server: Flask,
+    profiler: CallbackProfiler,
+    admin_users: Iterable[str],
+    route: str = "/_bte/profile",
+) -> None:
+    """install_profiler_route serves sampling profiles of the answering worker to admin users.
+
+    GET <route>?seconds=10&interval_ms=5 profiles every thread of the worker for 10 seconds,
+    GET <route>?callback=ing_page_new_ing_table.data&calls=3&seconds=60 the next 3 calls of the
+    callback of that output (waiting at most 60 seconds for them). The response is a collapsed stack file.
+    The route is meant to be protected by the app's basic auth, which checks the password;
+    only the users in admin_users get a profile.
+
+    Args:
+        server (Flask): the app's flask server (app.server).
+        profiler (CallbackProfiler): profiler of the wrapped callbacks.
+        admin_users (Iterable[str]): basic auth users allowed to profile.
+        route (str, optional): url of the profiler. Defaults to '/_bte/profile'.
+    """
+    admin_users = frozenset(u for u in admin_users if u)
+
+    def profile():
+        if request.authorization is None or request.authorization.username not in admin_users:
+            return Response("profiling is restricted to the admin users\n", 403, mimetype="text/plain")
+        try:
+            seconds = min(float(request.args.get("seconds", 10)), MAX_PROFILE_SECONDS)
+            interval = max(float(request.args.get("interval_ms", 5)), MIN_INTERVAL_MS) / 1000
+            calls = max(int(request.args.get("calls", 1)), 1)
+        except ValueError as ex:
+            return Response(f"{ex}\n", 400, mimetype="text/plain")
+        callback = request.args.get("callback")
+        if callback is None:
+            stacks = profile_process(seconds, interval)
+        else:
+            try:
+                stacks = profiler.profile(callback, calls, interval, timeout=seconds)
+            except KeyError:
+                return Response(f"no callback has the output {callback}\n", 404, mimetype="text/plain")
+            except RuntimeError as ex:
+                return Response(f"{ex}\n", 409, mimetype="text/plain")
+        return Response(
+            format_collapsed(stacks),
+            mimetype="text/plain",
+            headers={
+                "Content-Disposition": f"attachment; filename=bte_profile_{os.getpid()}.collapsed",
+                # a compressed (cached) copy is of no use, every profile is different.
+                "Cache-Control": "no-store",
+            },
+        )
+
+    server.add_url_rule(route, route.strip("/").replace("/", "_").replace("-", "_"), profile)
+
+
+def install_profile_signal(
+    directory: str, seconds: float = 30, interval: float = 0.005, signum: int = signal.SIGUSR2
+) -> None:
+    """install_profile_signal writes a profile of the process to a file whenever it receives signum.
+
+    The file is <directory>/bte_profile_<pid>_<time>.collapsed. Must be called from the main thread
+    (under gunicorn: in the post_worker_init hook, after the worker installed its own handlers).
+
+    Args:
+        directory (str): folder of the profiles.
+        seconds (float, optional): profile duration. Defaults to 30.
+        interval (float, optional): seconds between two samples. Defaults to 0.005.
+        signum (int, optional): signal. Defaults to signal.SIGUSR2.
+    """
+
+    def write_profile():
+        stacks = profile_process(seconds, interval)
+        path = os.path.join(directory, f"bte_profile_{os.getpid()}_{time.strftime('%Y%m%d%H%M%S')}.collapsed")
+        with open(path, "w") as f:
+            f.write(format_collapsed(stacks))
+        print(f"profile of process {os.getpid()} written to {path}", flush=True)
+
+    def on_signal(signum, frame):
+        # the handler runs on the main thread between two bytecodes, the profile on its own thread.
+        threading.Thread(target=write_profile, name="bte-profile-writer", daemon=True).start()
+
+    signal.signal(signum, on_signal)
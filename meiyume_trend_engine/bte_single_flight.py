@@ -0,0 +1,138 @@
+"""single-flight de-duplication of identical in-flight computations.
+
+When several requests ask for the same data or figure at the same time (e.g. a team
+opening the same category view), only the first request computes it. The others wait
+for that computation and share its result (or its exception) instead of repeating it
+on their own threads. Nothing is kept once the computation is done, so single_flight
+goes under an lru_cache when results should also be reused later.
+"""
+import threading
+from collections import Counter
+from functools import wraps
+from typing import Any, Callable, Hashable
+
+
+class _Call:
+    """_Call is one in-flight computation that waiting requests can join."""
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+    """SingleFlight runs at most one computation per key at a time and counts how often requests were coalesced."""
+
+    def __init__(self, name: str):
+        self.name = name
+        self._lock = threading.Lock()
+        self._calls = {}
+        self._counts = Counter()
+
+    def do(self, key: Hashable, func: Callable, *args, **kwargs) -> Any:
+        """do returns func(*args, **kwargs), joining an identical computation already running for key.
+
+        Args:
+            key (Hashable): identity of the computation.
+            func (Callable): computation to run.
+
+        Returns:
+            Any: result of the (shared) computation.
+        """
+        with self._lock:
+            self._counts["calls"] += 1
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+            else:
+                self._counts["coalesced"] += 1
+
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = func(*args, **kwargs)
+        except Exception as ex:
+            call.error = ex
+            with self._lock:
+                self._counts["errors"] += 1
+            raise
+        finally:
+            with self._lock:
+                self._counts["computations"] += 1
+                del self._calls[key]
+            call.done.set()
+        return call.result
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "calls": self._counts["calls"],
+                "computations": self._counts["computations"],
+                "coalesced": self._counts["coalesced"],
+                "errors": self._counts["errors"],
+                "in_flight": len(self._calls),
+            }
+
+
+_groups = {}
+
+
+def make_key(*args, **kwargs) -> Hashable:
+    """make_key turns callback style arguments (lists, dicts) into a hashable key."""
+
+    def freeze(value):
+        if isinstance(value, (list, tuple)):
+            return tuple(freeze(v) for v in value)
+        if isinstance(value, dict):
+            return tuple(sorted((k, freeze(v)) for k, v in value.items()))
+        return value
+
+    return freeze(args), freeze(kwargs)
+
+
+def single_flight(func: Callable = None, name: str = None) -> Callable:
+    """single_flight de-duplicates concurrent calls of func with the same arguments.
+
+    Usable as @single_flight or @single_flight(name='...'); the counters of every decorated
+    function are reported by single_flight_stats under its name.
+
+    Args:
+        func (Callable, optional): function to wrap. Defaults to None.
+        name (str, optional): counter name. Defaults to the module and qualified name of the function.
+
+    Returns:
+        Callable: wrapped function.
+    """
+    if func is None:
+        return lambda f: single_flight(f, name=name)
+
+    name = name or f"{func.__module__}.{func.__qualname__}"
+    group = _groups.setdefault(name, SingleFlight(name))
+
+    @wraps(func)
+    def wrapper(*args, **kwargs):
+        # functions sharing a name (redefined or made by a factory) share the counters, never a computation.
+        return group.do((func, make_key(*args, **kwargs)), func, *args, **kwargs)
+
+    wrapper.single_flight = group
+    return wrapper
+
+
+def single_flight_stats() -> dict:
+    """single_flight_stats returns the counters of all single-flight functions and their totals.
+
+    Returns:
+        dict: {'coalesced': int, 'computations': int, 'functions': {name: counters}}.
+    """
+    functions = {name: group.stats() for name, group in sorted(_groups.items())}
+    return {
+        "coalesced": sum(s["coalesced"] for s in functions.values()),
+        "computations": sum(s["computations"] for s in functions.values()),
+        "functions": functions,
+    }
@@ -0,0 +1,249 @@
+"""startup tracer: a timeline of where the start of the web-app spends its time.
+
+Importing main imports the page modules, which download their data, decode it, convert dtypes,
+build row indexes, publish datasets and render initial figures at import. While the tracer runs,
+
+- every module import is a span (the import statement of a module not loaded yet, so it contains
+  the imports of the modules it loads in turn),
+- bte_utils and the page modules open startup_span's around the other stages: download, decode,
+  dtype (categorical conversion), index (row indexes), publish (bte_dataset_store) and figure,
+
+and finish_startup_trace prints a report (by stage, by dataset, by module, slowest first) and
+optionally writes the timeline as a Chrome trace-event json file (chrome://tracing, Perfetto,
+speedscope). A stage nested in another (the dtype conversion of a publish) only counts in the
+innermost one; the "own" time of a module is the time of its code outside nested spans.
+
+With BTE_STARTUP_TRACE=1, importing this module starts the tracer (wsgi.py imports it before main
+and finishes the trace after). The tracer can also be run on its own:
+
+    cd meiyume_trend_engine
+    python bte_startup_trace.py --chrome startup_trace.json
+"""
+import argparse
+import builtins
+import importlib
+import importlib.util
+import json
+import os
+import sys
+import threading
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+from typing import Dict, List, NamedTuple, Optional
+
+from settings import STARTUP_TRACE, STARTUP_TRACE_FILE
+
+STAGES = ["download", "decode", "dtype", "index", "publish", "figure"]
+
+
+class Span(NamedTuple):
+    name: str
+    category: str
+    start: float
+    end: float
+    thread: int
+    args: dict
+
+
+class StartupTracer:
+    """StartupTracer records the spans of the startup and times the module imports, by wrapping __import__."""
+
+    def __init__(self):
+        self.origin = time.perf_counter()
+        self.spans: List[Span] = []
+        self._lock = threading.Lock()
+        self._import = builtins.__import__
+
+    def add(self, name: str, category: str, start: float, end: float, args: dict = None) -> None:
+        with self._lock:
+            self.spans.append(Span(name, category, start, end, threading.get_ident(), args or {}))
+
+    def _traced_import(self, name, globals=None, locals=None, fromlist=(), level=0):
+        module = name
+        if level:
+            package = (globals or {}).get("__package__") or ""
+            try:
+                module = importlib.util.resolve_name("." * level + name, package)
+            except (ImportError, ValueError):
+                pass
+        if module in sys.modules:
+            return self._import(name, globals, locals, fromlist, level)
+        start = time.perf_counter()
+        try:
+            return self._import(name, globals, locals, fromlist, level)
+        finally:
+            self.add(module, "import", start, time.perf_counter())
+
+    def install(self) -> None:
+        builtins.__import__ = self._traced_import
+
+    def uninstall(self) -> None:
+        if builtins.__import__ == self._traced_import:
+            builtins.__import__ = self._import
+
+
+_tracer: Optional[StartupTracer] = None
+
+
+@contextmanager
+def startup_span(name: str, category: str, **args):
+    """startup_span records the enclosed block as a span of the startup trace (when the tracer runs).
+
+    Args:
+        name (str): what the block works on, e.g. the data file name.
+        category (str): stage, one of STAGES.
+        **args: details shown with the span in the trace viewer, e.g. bytes.
+    """
+    tracer = _tracer
+    if tracer is None:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        tracer.add(name, category, start, time.perf_counter(), args)
+
+
+def start_startup_trace() -> StartupTracer:
+    """start_startup_trace starts recording the startup (once)."""
+    global _tracer
+    if _tracer is None:
+        _tracer = StartupTracer()
+        _tracer.install()
+    return _tracer
+
+
+def _own_times(spans: List[Span]) -> List[tuple]:
+    """_own_times pairs every span with its time outside its direct children and its innermost enclosing import."""
+    result = {}
+    by_thread = defaultdict(list)
+    for span in spans:
+        by_thread[span.thread].append(span)
+    for thread_spans in by_thread.values():
+        stack = []
+        for span in sorted(thread_spans, key=lambda s: (s.start, -s.end)):
+            while stack and stack[-1].end <= span.start:
+                stack.pop()
+            if stack:
+                parent = result[id(stack[-1])]
+                parent[1] -= span.end - span.start
+            module = next((s.name for s in reversed(stack) if s.category == "import"), None)
+            result[id(span)] = [span, span.end - span.start, module]
+            stack.append(span)
+    return [tuple(v) for v in result.values()]
+
+
+def startup_report(tracer: StartupTracer, top: int = 25) -> str:
+    """startup_report sums the spans by stage, by dataset and by module.
+
+    Args:
+        tracer (StartupTracer): the recorded startup.
+        top (int, optional): number of modules listed. Defaults to 25.
+
+    Returns:
+        str: the report.
+    """
+    spans = _own_times(tracer.spans)
+    total = max([s.end for s, _, _ in spans] + [time.perf_counter()]) - tracer.origin
+    stages = defaultdict(float)
+    datasets: Dict[str, Dict[str, float]] = defaultdict(lambda: defaultdict(float))
+    modules: Dict[str, Dict[str, float]] = defaultdict(lambda: defaultdict(float))
+    for span, own, module in spans:
+        stages[span.category] += own
+        if span.category == "import":
+            modules[span.name]["total"] += span.end - span.start
+            modules[span.name]["own"] += own
+        else:
+            if span.category != "figure":
+                datasets[span.name][span.category] += own
+                datasets[span.name]["total"] += own
+            if module is not None:
+                modules[module][span.category] += own
+
+    ms = lambda seconds: f"{seconds * 1000:>10.0f}"  # noqa: E731
+    lines = [f"startup {total:.2f}s, by stage (ms):"]
+    for stage, seconds in sorted(stages.items(), key=lambda kv: -kv[1]):
+        lines.append(f"  {stage:<12}{ms(seconds)}  {seconds / total:>5.1%}")
+    lines.append("module code outside the traced stages counts as import.")
+
+    lines.append(f"\nby dataset (ms):\n  {'dataset':<48}" + "".join(f"{s:>10}" for s in STAGES[:-1] + ["total"]))
+    for name, times in sorted(datasets.items(), key=lambda kv: -kv[1]["total"]):
+        lines.append(f"  {name[:47]:<48}" + "".join(ms(times[s]) for s in STAGES[:-1] + ["total"]))
+
+    columns = ["total", "own"] + STAGES
+    lines.append(f"\nby module, {top} slowest (ms):\n  {'module':<48}" + "".join(f"{c:>10}" for c in columns))
+    for name, times in sorted(modules.items(), key=lambda kv: -kv[1]["total"])[:top]:
+        lines.append(f"  {name[:47]:<48}" + "".join(ms(times[c]) for c in columns))
+
+    figures = [(s, own) for s, own, _ in spans if s.category == "figure"]
+    if figures:
+        lines.append("\ninitial figures (ms):")
+        for span, own in sorted(figures, key=lambda f: -f[1]):
+            lines.append(f"  {span.name[:47]:<48}{ms(own)}")
+    return "\n".join(lines)
+
+
+def chrome_trace(tracer: StartupTracer) -> dict:
+    """chrome_trace converts the spans into the Chrome trace-event format (complete events, microseconds)."""
+    pid = os.getpid()
+    threads = {t.ident: t.name for t in threading.enumerate()}
+    events = [
+        {"name": "thread_name", "ph": "M", "pid": pid, "tid": tid, "args": {"name": threads.get(tid, str(tid))}}
+        for tid in {s.thread for s in tracer.spans}
+    ]
+    for span in tracer.spans:
+        events.append({
+            "name": span.name,
+            "cat": span.category,
+            "ph": "X",
+            "ts": round((span.start - tracer.origin) * 1e6, 1),
+            "dur": round((span.end - span.start) * 1e6, 1),
+            "pid": pid,
+            "tid": span.thread,
+            "args": span.args,
+        })
+    return {"traceEvents": events, "displayTimeUnit": "ms"}
+
+
+def finish_startup_trace(path: str = STARTUP_TRACE_FILE, top: int = 25) -> Optional[StartupTracer]:
+    """finish_startup_trace stops the tracer, prints the report and writes the chrome trace to path (if any).
+
+    Args:
+        path (str, optional): chrome trace-event json file. Defaults to STARTUP_TRACE_FILE.
+        top (int, optional): number of modules in the report. Defaults to 25.
+
+    Returns:
+        Optional[StartupTracer]: the finished tracer, None when it was not started.
+    """
+    global _tracer
+    tracer, _tracer = _tracer, None
+    if tracer is None:
+        return None
+    tracer.uninstall()
+    print(startup_report(tracer, top), flush=True)
+    if path:
+        with open(path, "w") as f:
+            json.dump(chrome_trace(tracer), f)
+        print(f"startup trace written to {path}", flush=True)
+    return tracer
+
+
+if STARTUP_TRACE:
+    start_startup_trace()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="trace the import of the web-app")
+    parser.add_argument("--chrome", default=STARTUP_TRACE_FILE, help="write a chrome trace-event json file")
+    parser.add_argument("--module", default="main", help="module to import")
+    parser.add_argument("--top", type=int, default=25, help="number of modules in the report")
+    args = parser.parse_args()
+    # the data modules import this one as bte_startup_trace, they must share its tracer.
+    tracer_module = importlib.import_module("bte_startup_trace")
+    tracer_module.start_startup_trace()
+    # import_module does not go through __import__.
+    with tracer_module.startup_span(args.module, "import"):
+        importlib.import_module(args.module)
+    tracer_module.finish_startup_trace(args.chrome, args.top)
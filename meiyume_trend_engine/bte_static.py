@@ -0,0 +1,428 @@
+"""compression and long-lived caching of the web-app's responses and static assets.
+
+Callback and layout responses are json of up to several megabytes and the assets folder
+holds megabytes of fonts. install_compression compresses every text, json and font
+response of at least COMPRESS_MIN_SIZE bytes with the first of COMPRESS_ALGORITHMS the
+browser accepts ('br' needs the brotli package, without it gzip is used).
+
+install_static_caching serves the assets folder under content-hash fingerprints: the page
+links every asset as <url>?v=<hash of its content>. A request carrying the current hash is
+answered with an immutable cache header for a year, any other one is revalidated with the
+hash as ETag. Relative url() references of stylesheets (fonts) are fingerprinted as well
+and a stylesheet's hash covers the assets it references, so a new font also moves the
+stylesheet url. Fingerprinted assets are compressed once, at the highest level.
+
+The stylesheets the page pulled from CDNs on every load (bootstrap theme, dash base
+styles, font awesome) are self-hosted from assets/vendor once downloaded with
+`python bte_static.py` (`--check` fails when a file is missing); they are not in git, and
+without them the page keeps the CDN urls. Production builds download them and turn
+SELF_HOSTED_ASSETS on, then vendored_stylesheets refuses to start the app while one is
+missing.
+"""
+import argparse
+import gzip
+import hashlib
+import mimetypes
+import os
+import re
+import threading
+from stat import S_ISREG
+from typing import Dict, List, Optional, Tuple
+from urllib.parse import urljoin, urlparse
+
+import dash_bootstrap_components as dbc
+from flask import Flask, Response, abort, request
+from flask_compress import Compress
+from werkzeug.security import safe_join
+
+from settings import COMPRESS_ALGORITHMS, COMPRESS_MIN_SIZE, SELF_HOSTED_ASSETS
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+ASSETS_FOLDER = os.path.join(os.path.dirname(os.path.abspath(__file__)), "assets")
+CDN_STYLESHEETS = [
+    dbc.themes.LUX,
+    "https://codepen.io/chriddyp/pen/bWLwgP.css",
+    "https://use.fontawesome.com/releases/v5.10.2/css/all.css",
+]
+VENDOR_FOLDER = "vendor"
+# vendored stylesheets are linked explicitly before the app's own styles, dash must not add them again.
+VENDOR_ASSETS_IGNORE = r"\.vendor\.css$"
+IMMUTABLE = "public, max-age=31536000, immutable"
+COMPRESS_MIMETYPES = [
+    "application/javascript",
+    "application/json",
+    "application/vnd.ms-fontobject",
+    "application/x-font-opentype",
+    "application/x-font-ttf",
+    "font/otf",
+    "font/ttf",
+    "image/svg+xml",
+    "text/css",
+    "text/html",
+    "text/javascript",
+    "text/plain",
+]
+CSS_URL = re.compile(r"""url\(\s*(['"]?)([^'")]+)\1\s*\)""")
+
+
+def compression_algorithms() -> List[str]:
+    """compression_algorithms returns COMPRESS_ALGORITHMS without the ones this python cannot produce."""
+    algorithms = [a.strip() for a in COMPRESS_ALGORITHMS if a.strip() in ("br", "gzip")]
+    if "br" in algorithms and brotli is None:
+        print("*WARNING: brotli is not installed, responses are compressed with gzip only.*")
+        algorithms = [a for a in algorithms if a != "br"] or ["gzip"]
+    return algorithms or ["gzip"]
+
+
+def install_compression(server: Flask) -> None:
+    """install_compression compresses the app's responses above the size threshold.
+
+    Call it before any other after_request hook that rewrites response bodies (e.g. payload
+    slimming) is installed; flask runs the hooks installed last first, so those rewrite the
+    body before it is compressed. The app must be created with compress=False.
+
+    Args:
+        server (Flask): the app's flask server (app.server).
+    """
+    server.config["COMPRESS_ALGORITHM"] = compression_algorithms()
+    server.config["COMPRESS_MIN_SIZE"] = COMPRESS_MIN_SIZE
+    server.config["COMPRESS_MIMETYPES"] = COMPRESS_MIMETYPES
+    # fast levels for callback responses, they are compressed on every request.
+    server.config["COMPRESS_LEVEL"] = 6
+    server.config["COMPRESS_BR_LEVEL"] = 4
+    Compress(server)
+
+
+def _accepted_algorithm(accept_encoding: str) -> Optional[str]:
+    accepted = set()
+    for token in accept_encoding.split(","):
+        name, _, params = token.strip().partition(";")
+        if params.replace(" ", "") not in ("q=0", "q=0.0"):
+            accepted.add(name.strip().lower())
+    for algorithm in compression_algorithms():
+        if algorithm in accepted:
+            return algorithm
+    return None
+
+
+def _compress_static(body: bytes, algorithm: str) -> bytes:
+    if algorithm == "br":
+        return brotli.compress(body, quality=11)
+    return gzip.compress(body, compresslevel=9)
+
+
+def _split_reference(reference: str) -> Tuple[str, str]:
+    """_split_reference splits a url() reference into its path and its fragment (the query is dropped)."""
+    path, _, fragment = reference.partition("#")
+    return path.partition("?")[0], "#" + fragment if fragment else ""
+
+
+def _is_relative(reference: str) -> bool:
+    return not re.match(r"^([a-z][a-z0-9+.-]*:|/|#)", reference, re.I)
+
+
+class StaticAssets:
+    """StaticAssets serves the assets folder with content-hash fingerprints and keeps the compressed bodies."""
+
+    def __init__(self, folder: str, url_path: str = "/assets/"):
+        self.folder = folder
+        self.url_path = url_path
+        self._lock = threading.Lock()
+        # raw bytes by path, with the (mtime_ns, size) stamp they were read at.
+        self._files = {}
+        # served body and fingerprint by path, with the stamps of the asset and of the assets it references.
+        self._assets = {}
+        self._compressed = {}
+
+    def _stamp(self, path: str) -> Optional[Tuple[int, int]]:
+        full = safe_join(self.folder, path)
+        if full is None:
+            return None
+        try:
+            stat = os.stat(full)
+        except OSError:
+            return None
+        if not S_ISREG(stat.st_mode):
+            return None
+        return stat.st_mtime_ns, stat.st_size
+
+    def _raw(self, path: str, stamp: Tuple[int, int]) -> bytes:
+        with self._lock:
+            cached = self._files.get(path)
+        if cached is not None and cached[0] == stamp:
+            return cached[1]
+        with open(safe_join(self.folder, path), "rb") as f:
+            body = f.read()
+        with self._lock:
+            self._files[path] = (stamp, body)
+        return body
+
+    def _asset(self, path: str, _seen: frozenset = frozenset()) -> Optional[Tuple[bytes, str, dict]]:
+        """_asset returns the served body, fingerprint and dependency stamps of an asset, rebuilt only when a stamp changed."""
+        # a stylesheet reached through an @import cycle is rewritten differently, it is not cached.
+        cacheable = not _seen or not path.endswith(".css")
+        if cacheable:
+            with self._lock:
+                cached = self._assets.get(path)
+            if cached is not None and all(self._stamp(p) == stamp for p, stamp in cached[2].items()):
+                return cached
+        # stamped before reading: a file changed meanwhile is rebuilt on the next call.
+        stamp = self._stamp(path)
+        if stamp is None:
+            return None
+        body = self._raw(path, stamp)
+        stamps = {path: stamp}
+        if path.endswith(".css"):
+            base = os.path.dirname(path)
+
+            def fingerprinted(match):
+                quote, reference = match.groups()
+                if not _is_relative(reference):
+                    return match.group(0)
+                target, fragment = _split_reference(reference)
+                target_path = os.path.normpath(os.path.join(base, target)).replace(os.sep, "/")
+                if target_path in _seen:
+                    return match.group(0)
+                asset = self._asset(target_path, _seen | {path})
+                if asset is None:
+                    # picked up once the file is added.
+                    stamps[target_path] = None
+                    return match.group(0)
+                stamps.update(asset[2])
+                return f"url({quote}{target}?v={asset[1]}{fragment}{quote})"
+
+            body = CSS_URL.sub(fingerprinted, body.decode("utf-8")).encode("utf-8")
+        asset = (body, hashlib.sha256(body).hexdigest()[:12], stamps)
+        if cacheable:
+            with self._lock:
+                self._assets[path] = asset
+        return asset
+
+    def content(self, path: str) -> Optional[bytes]:
+        """content returns the body served for an asset; stylesheets get fingerprinted url() references.
+
+        Args:
+            path (str): path of the asset within the assets folder.
+
+        Returns:
+            Optional[bytes]: body, None if there is no such asset.
+        """
+        asset = self._asset(path)
+        return None if asset is None else asset[0]
+
+    def fingerprint(self, path: str) -> Optional[str]:
+        """fingerprint returns the content hash of an asset, None if there is no such asset."""
+        asset = self._asset(path)
+        return None if asset is None else asset[1]
+
+    def url(self, path: str) -> str:
+        """url returns the fingerprinted url of an asset (the plain url if it does not exist)."""
+        fingerprint = self.fingerprint(path)
+        if fingerprint is None:
+            return self.url_path + path
+        return f"{self.url_path}{path}?v={fingerprint}"
+
+    def serve(self, filename: str) -> Response:
+        """serve is the view of the assets route, it replaces the static file view dash registers."""
+        asset = self._asset(filename)
+        if asset is None:
+            abort(404)
+        body, fingerprint, _ = asset
+        mimetype = mimetypes.guess_type(filename)[0] or "application/octet-stream"
+        algorithm = None
+        if mimetype in COMPRESS_MIMETYPES and len(body) >= COMPRESS_MIN_SIZE:
+            algorithm = _accepted_algorithm(request.headers.get("Accept-Encoding", ""))
+        if algorithm is not None:
+            key = (filename, fingerprint, algorithm)
+            with self._lock:
+                compressed = self._compressed.get(key)
+            if compressed is None:
+                compressed = _compress_static(body, algorithm)
+                with self._lock:
+                    self._compressed[key] = compressed
+            body = compressed
+        response = Response(body, mimetype=mimetype)
+        response.headers["Vary"] = "Accept-Encoding"
+        if algorithm is not None:
+            response.headers["Content-Encoding"] = algorithm
+        response.set_etag(fingerprint + (f"-{algorithm}" if algorithm else ""))
+        if request.args.get("v") == fingerprint:
+            response.headers["Cache-Control"] = IMMUTABLE
+        else:
+            response.headers["Cache-Control"] = "no-cache"
+        return response.make_conditional(request)
+
+    def fingerprint_links(self, html: str) -> str:
+        """fingerprint_links points the page's href/src links to assets at their fingerprinted urls."""
+        link = re.compile(
+            r'((?:href|src)=")' + re.escape(self.url_path) + r'([^"?]+)(?:\?m=[\d.]+)?"'
+        )
+        return link.sub(lambda m: f'{m.group(1)}{self.url(m.group(2))}"', html)
+
+
+def install_static_caching(
+    server: Flask, assets_folder: str, url_path: str = "/assets/"
+) -> StaticAssets:
+    """install_static_caching serves the assets with content-hash fingerprints and immutable cache headers.
+
+    Install it after install_compression, so the page links are fingerprinted before the
+    page is compressed.
+
+    Args:
+        server (Flask): the app's flask server (app.server).
+        assets_folder (str): the app's assets folder (app.config.assets_folder).
+        url_path (str, optional): url of the assets folder. Defaults to '/assets/'.
+
+    Returns:
+        StaticAssets: the fingerprinted assets.
+    """
+    assets = StaticAssets(assets_folder, url_path)
+    # dash serves the assets folder as the static folder of a blueprint, its view is replaced.
+    for rule in server.url_map.iter_rules():
+        if rule.rule == url_path + "<path:filename>":
+            server.view_functions[rule.endpoint] = assets.serve
+
+    @server.after_request
+    def fingerprint_page(response):
+        if response.mimetype != "text/html" or response.status_code != 200:
+            return response
+        if response.direct_passthrough or "Content-Encoding" in response.headers:
+            return response
+        response.set_data(assets.fingerprint_links(response.get_data(as_text=True)))
+        return response
+
+    return assets
+
+
+def vendor_file_name(url: str) -> str:
+    """vendor_file_name returns the file name a CDN file is self-hosted under (stylesheets end in .vendor.css)."""
+    parsed = urlparse(url)
+    name = re.sub(r"[^A-Za-z0-9._-]+", "-", (parsed.netloc + parsed.path).strip("/"))
+    return re.sub(r"\.css$", "", name) + ".vendor.css" if name.endswith(".css") else name
+
+
+def missing_vendor_files(urls: List[str], assets_folder: str = ASSETS_FOLDER) -> List[str]:
+    """missing_vendor_files lists the self-hosted stylesheets, and the files they reference, not downloaded yet.
+
+    Args:
+        urls (List[str]): CDN stylesheet urls.
+        assets_folder (str, optional): the app's assets folder. Defaults to ASSETS_FOLDER.
+
+    Returns:
+        List[str]: paths of the missing files.
+    """
+    vendor_folder = os.path.join(assets_folder, VENDOR_FOLDER)
+    missing = []
+    for url in urls:
+        path = os.path.join(vendor_folder, vendor_file_name(url))
+        if not os.path.isfile(path):
+            missing.append(path)
+            continue
+        with open(path, encoding="utf-8") as f:
+            for _, reference in CSS_URL.findall(f.read()):
+                if _is_relative(reference):
+                    target = os.path.join(vendor_folder, _split_reference(reference)[0])
+                    if not os.path.isfile(target) and target not in missing:
+                        missing.append(target)
+    return missing
+
+
+def vendored_stylesheets(
+    urls: List[str],
+    assets_folder: str = ASSETS_FOLDER,
+    url_path: str = "/assets/",
+    required: bool = SELF_HOSTED_ASSETS,
+) -> List[str]:
+    """vendored_stylesheets swaps CDN stylesheet urls for their self-hosted copies in assets/vendor.
+
+    Args:
+        urls (List[str]): CDN stylesheet urls.
+        assets_folder (str, optional): the app's assets folder. Defaults to ASSETS_FOLDER.
+        url_path (str, optional): url of the assets folder. Defaults to '/assets/'.
+        required (bool, optional): fail when a copy is missing, the CDN url is used otherwise.
+                                   Defaults to SELF_HOSTED_ASSETS.
+
+    Raises:
+        FileNotFoundError: a self-hosted file is missing (and required).
+
+    Returns:
+        List[str]: self-hosted urls where a copy exists, CDN urls otherwise.
+    """
+    missing = missing_vendor_files(urls, assets_folder)
+    if missing and required:
+        raise FileNotFoundError(
+            f"self-hosted stylesheets are missing ({', '.join(missing)}): run python bte_static.py "
+            "in the build, or set BTE_SELF_HOSTED_ASSETS=0 to load them from their CDNs"
+        )
+    stylesheets = []
+    for url in urls:
+        name = vendor_file_name(url)
+        if os.path.isfile(os.path.join(assets_folder, VENDOR_FOLDER, name)):
+            stylesheets.append(f"{url_path}{VENDOR_FOLDER}/{name}")
+        else:
+            stylesheets.append(url)
+    return stylesheets
+
+
+def download_vendor_stylesheets(
+    urls: List[str], assets_folder: str = ASSETS_FOLDER
+) -> Dict[str, str]:
+    """download_vendor_stylesheets downloads CDN stylesheets and the files they reference into assets/vendor.
+
+    Relative url() references (e.g. font awesome's webfonts) are downloaded to assets/vendor/files
+    and the stylesheets are rewritten to point at them. Absolute references (e.g. a google fonts
+    @import) are left pointing to their origin.
+
+    Args:
+        urls (List[str]): CDN stylesheet urls.
+        assets_folder (str, optional): the app's assets folder. Defaults to ASSETS_FOLDER.
+
+    Returns:
+        Dict[str, str]: local path of every downloaded stylesheet by url.
+    """
+    import requests
+
+    vendor_folder = os.path.join(assets_folder, VENDOR_FOLDER)
+    os.makedirs(os.path.join(vendor_folder, "files"), exist_ok=True)
+    saved = {}
+    for url in urls:
+        response = requests.get(url, timeout=30)
+        response.raise_for_status()
+
+        def localize(match):
+            quote, reference = match.groups()
+            if not _is_relative(reference):
+                return match.group(0)
+            target, fragment = _split_reference(reference)
+            source = urljoin(url, target)
+            name = vendor_file_name(source)
+            path = os.path.join(vendor_folder, "files", name)
+            if not os.path.exists(path):
+                file_response = requests.get(source, timeout=30)
+                file_response.raise_for_status()
+                with open(path, "wb") as f:
+                    f.write(file_response.content)
+            return f"url({quote}files/{name}{fragment}{quote})"
+
+        path = os.path.join(vendor_folder, vendor_file_name(url))
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(CSS_URL.sub(localize, response.text))
+        saved[url] = path
+        print(f"{url} -> {path}")
+    return saved
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="download the self-hosted stylesheets and fonts into assets/vendor")
+    parser.add_argument("--check", action="store_true", help="only check that every file is there")
+    args = parser.parse_args()
+    if not args.check:
+        download_vendor_stylesheets(CDN_STYLESHEETS)
+    missing = missing_vendor_files(CDN_STYLESHEETS)
+    for path in missing:
+        print(f"*ERROR: {path} is missing*")
+    raise SystemExit(1 if missing else 0)
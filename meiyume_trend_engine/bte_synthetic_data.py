@@ -0,0 +1,600 @@
+"""synthetic WebAppData snapshot at a chosen scale, for benchmarks and load tests without s3 access.
+
+    cd meiyume_trend_engine
+    python bte_synthetic_data.py --scale 10 --out ../synthetic_data/10x
+    BTE_LOCAL_DATA_DIR=../synthetic_data/10x python main.py
+
+Writes every file the web-app reads with read_file_s3, with the production file names, formats,
+columns and dtypes, into a local directory laid out like the s3 bucket (see LOCAL_DATA_DIR).
+The snapshot is generated bottom up, like the production pipeline aggregates its data:
+
+- products get a source, a product type (and with it a category) and a brand from skewed
+  (zipf like) distributions and a launch date from a growing market,
+- reviews per product are heavy tailed and dated between the launch and the snapshot date,
+  ingredients per product are drawn from a zipf distributed vocabulary, items are the sizes
+  of a product with a monthly price history,
+- the market trend, category page and landing page tables are aggregated from those.
+
+Scale 1 has BASE_PRODUCTS products (about 0.3 million reviews); products, reviews, items and
+ingredient rows grow linearly with the scale, brands and distinct ingredients with its square
+root. The taxonomy (sources, categories, product types) is fixed. The same scale, seed and
+snapshot date give the same files.
+"""
+import argparse
+import os
+import time
+from datetime import date
+from typing import Dict, List
+
+import numpy as np
+import pandas as pd
+
+from bte_utils import PARTITION_COLUMNS, local_data_path, write_partitioned_dataset
+from settings import S3_PREFIX
+
+# products at scale 1.
+BASE_PRODUCTS = 4000
+BASE_BRANDS = 400
+BASE_INGREDIENTS = 2500
+# first month of the market trend data.
+FIRST_MONTH = "2008-12-01"
+# months of item price history kept per item.
+ITEM_PRICE_MONTHS = 36
+# products launched (and ingredients first used) in the last months before the snapshot are new.
+NEW_MONTHS = 6
+NEW_INGREDIENT_MONTHS = 12
+# top products per product type on the category page.
+TOP_PRODUCTS = 20
+
+# source -> prod_id prefix (the product page derives the source from it) and share of the products.
+SOURCES = {"us": ("sph", 0.65), "uk": ("bts", 0.35)}
+# category -> share of the products and its product types, most common first.
+CATEGORIES = {
+    "skincare": (
+        0.30,
+        [
+            "moisturizer-skincare", "face-serum", "face-wash-facial-cleanser", "face-mask",
+            "eye-cream-dark-circles", "face-sunscreen", "toner-face-toner", "anti-aging-skin-care",
+            "acne-products-acne-cream", "face-oil", "facial-peels", "lip-balm-lip-care",
+        ],
+    ),
+    "makeup-cosmetics": (
+        0.27,
+        [
+            "foundation-makeup", "lipstick", "mascara", "concealer", "eyeshadow-palettes", "lip-gloss",
+            "eyeliner", "blush", "highlighter-makeup", "setting-powder-face-powder", "bronzer-makeup",
+            "makeup-primer-face-primer",
+        ],
+    ),
+    "hair-products": (
+        0.12,
+        [
+            "shampoo", "hair-conditioner", "hair-styling-products", "hair-masks", "hair-oil",
+            "dry-shampoo", "hair-spray",
+        ],
+    ),
+    "fragrance": (
+        0.10,
+        ["perfume", "cologne", "body-mist-hair-mist", "rollerballs-travel-size-fragrance", "candles-home-scents"],
+    ),
+    "bath-body": (
+        0.08,
+        [
+            "body-lotion-body-oil", "shower-gel-body-wash", "hand-cream-foot-cream", "body-scrub-exfoliant",
+            "deodorant-antiperspirant", "bath-soaks-bubble-bath",
+        ],
+    ),
+    "tools-brushes": (
+        0.05,
+        [
+            "makeup-brushes-applicators", "sponges-applicators", "facial-cleansing-brushes", "hair-dryers",
+            "tweezers-eyebrow-tools",
+        ],
+    ),
+    "travel-size-toiletries": (0.05, ["mini-size", "travel-size-skincare", "value-size"]),
+    "mens": (0.03, ["mens-skincare", "shaving-cream", "beard-oil", "mens-fragrance"]),
+}
+REVIEW_RATINGS = np.array([1, 2, 3, 4, 5])
+REVIEW_RATING_SHARES = np.array([0.06, 0.05, 0.09, 0.22, 0.58])
+# share of incentivized (influenced) reviews.
+INFLUENCED_SHARE = 0.12
+# reviewer attribute -> values and their shares; "" is not disclosed.
+USER_ATTRIBUTES = {
+    "age": (["", "13-17", "18-24", "25-34", "35-44", "45-54", "over 54"], [0.45, 0.02, 0.15, 0.18, 0.11, 0.06, 0.03]),
+    "skin_type": (["", "combination", "dry", "normal", "oily"], [0.25, 0.33, 0.18, 0.12, 0.12]),
+    "skin_tone": (
+        ["", "fair", "light", "medium", "tan", "olive", "deep", "dark"],
+        [0.30, 0.14, 0.20, 0.16, 0.08, 0.05, 0.04, 0.03],
+    ),
+    "eye_color": (["", "brown", "blue", "green", "hazel", "gray"], [0.35, 0.33, 0.14, 0.08, 0.08, 0.02]),
+    "hair_color": (
+        ["", "brunette", "black", "blonde", "auburn", "red", "gray"],
+        [0.35, 0.27, 0.15, 0.14, 0.04, 0.03, 0.02],
+    ),
+}
+ITEM_SIZES = ["0.17 oz", "0.5 oz", "1 oz", "1.7 oz", "2.5 oz", "3.4 oz", "5 oz", "8 oz", "16 oz"]
+INGREDIENT_TYPES = (["", "natural", "synthetic", "natural & synthetic"], [0.35, 0.25, 0.30, 0.10])
+BANNED_SHARE = 0.02
+POSITIVE_TALKING_POINTS = [
+    "smells amazing", "lightweight texture", "absorbs quickly", "long lasting", "worth the price",
+    "gentle on skin", "very hydrating", "great for sensitive skin", "beautiful packaging", "little goes a long way",
+    "blends easily", "no white cast", "soft finish", "holy grail", "visible results",
+]
+NEGATIVE_TALKING_POINTS = [
+    "too sticky", "strong fragrance", "broke me out", "too expensive", "drying", "small size", "pilling",
+    "irritating", "greasy feel", "bad packaging", "no visible results", "oxidizes",
+]
+# syllables of the brand names and words of the ingredient names.
+BRAND_SYLLABLES = ["la", "ve", "mo", "ri", "sa", "no", "ka", "lu", "be", "ta", "di", "zo", "fe", "ra", "mi", "so"]
+INGREDIENT_WORDS = (
+    [
+        "sodium", "cetyl", "glyceryl", "caprylic", "butylene", "sorbitan", "potassium", "peg-40", "hydrolyzed",
+        "tocopheryl", "ascorbyl", "retinyl", "magnesium", "zinc", "cocoyl", "lauryl", "stearyl", "isopropyl",
+        "dimethicone", "polyglyceryl", "panthenyl", "niacin", "salicylic", "lactic", "citric",
+    ],
+    [
+        "rosa", "camellia", "aloe", "olea", "butyrospermum", "simmondsia", "helianthus", "prunus", "citrus",
+        "centella", "glycyrrhiza", "vitis", "cocos", "argania", "persea", "avena", "chamomilla", "lavandula",
+        "hyaluronic", "ceramide", "peptide", "squalane", "collagen", "kojic", "azelaic",
+    ],
+    [
+        "stearate", "hyaluronate", "alcohol", "extract", "oil", "acetate", "glucoside", "chloride", "phosphate",
+        "citrate", "benzoate", "sulfate", "acid", "butter", "ester", "glycol", "amide", "silicate", "palmitate",
+        "oleate", "lactate", "ferment", "powder", "water", "wax",
+    ],
+)
+COMMON_INGREDIENTS = [
+    "water", "glycerin", "butylene glycol", "phenoxyethanol", "dimethicone", "tocopherol", "caprylyl glycol",
+    "ethylhexylglycerin", "sodium hyaluronate", "fragrance", "xanthan gum", "citric acid", "niacinamide",
+]
+
+
+def _zipf_weights(n: int, exponent: float, rng: np.random.Generator = None) -> np.ndarray:
+    # rank weights 1 / rank ** exponent, optionally assigned to the items in random order.
+    weights = 1.0 / np.arange(1, n + 1) ** exponent
+    if rng is not None:
+        weights = rng.permutation(weights)
+    return weights / weights.sum()
+
+
+def _labels(values: List[str], codes: np.ndarray) -> np.ndarray:
+    # object column whose cells reference one python string per distinct value.
+    return np.asarray(values, dtype=object)[codes]
+
+
+def _brand_names(n: int, rng: np.random.Generator) -> List[str]:
+    names = set()
+    while len(names) < n:
+        syllables = rng.choice(BRAND_SYLLABLES, int(rng.integers(2, 5)))
+        names.add("".join(syllables).capitalize())
+    return sorted(names)
+
+
+def _ingredient_names(n: int, rng: np.random.Generator) -> List[str]:
+    first, second, third = INGREDIENT_WORDS
+    combinations = len(first) * len(second) * len(third)
+    codes = rng.permutation(combinations)[: max(n - len(COMMON_INGREDIENTS), 0)]
+    names = [
+        f"{first[c // (len(second) * len(third))]} {second[c // len(third) % len(second)]} {third[c % len(third)]}"
+        for c in codes
+    ]
+    # the (rare) ingredients beyond all combinations are numbered.
+    names += [f"{third[i % len(third)]} {i}" for i in range(n - len(COMMON_INGREDIENTS) - len(names))]
+    # the most common ingredients come first, the popularity ranks follow the order.
+    return (COMMON_INGREDIENTS + names)[:n]
+
+
+class SyntheticSnapshot:
+    """SyntheticSnapshot generates the web-app data tables of one synthetic snapshot."""
+
+    def __init__(self, scale: float = 1.0, seed: int = 0, snapshot_date: str = None):
+        self.scale = scale
+        self.rng = np.random.default_rng(seed)
+        snapshot = pd.Timestamp(snapshot_date or date.today()).normalize()
+        self.snapshot = snapshot
+        self.months = pd.date_range(FIRST_MONTH, snapshot, freq="MS")
+        self.first_day = self.months[0]
+        self.days = (snapshot - self.first_day).days + 1
+        # day offset of every month start, to find the month of a day.
+        self.month_starts = np.asarray((self.months - self.first_day).days)
+        self.product_types = [(c, pt) for c, (_, types) in CATEGORIES.items() for pt in types]
+        self.tables: Dict[str, pd.DataFrame] = {}
+
+    def _month(self, days: np.ndarray) -> np.ndarray:
+        return np.searchsorted(self.month_starts, days, side="right") - 1
+
+    def _growing_days(self, n: int, growth: float = 4.0) -> np.ndarray:
+        # days since the first month, denser towards the snapshot (exponentially growing market).
+        u = self.rng.random(n)
+        return (np.log1p(u * np.expm1(growth)) / growth * (self.days - 1)).astype(np.int64)
+
+    def generate(self) -> Dict[str, pd.DataFrame]:
+        """generate builds all tables, keyed by their file name."""
+        self._products()
+        self._reviews()
+        self._ingredients()
+        self._items()
+        self._market_trend_tables()
+        self._category_page_tables()
+        self._product_page_tables()
+        self._landing_page_table()
+        return self.tables
+
+    def _products(self) -> None:
+        rng = self.rng
+        n = max(int(round(BASE_PRODUCTS * self.scale)), len(self.product_types))
+        sources = list(SOURCES)
+        self.p_source = rng.choice(len(sources), n, p=[SOURCES[s][1] for s in sources])
+        # product type shares: category share split zipf-like over its product types.
+        shares = np.concatenate(
+            [share * _zipf_weights(len(types), 0.8) for share, types in CATEGORIES.values()]
+        )
+        self.p_type = rng.choice(len(self.product_types), n, p=shares / shares.sum())
+        brands = _brand_names(max(int(BASE_BRANDS * np.sqrt(self.scale)), 10), rng)
+        self.brands = brands
+        self.p_brand = rng.choice(len(brands), n, p=_zipf_weights(len(brands), 0.9, rng))
+        self.p_launch = self._growing_days(n)
+        # products of the same source and product type get consecutive ids.
+        order = np.lexsort((self.p_launch, self.p_type, self.p_source))
+        self.p_source, self.p_type, self.p_brand, self.p_launch = (
+            a[order] for a in (self.p_source, self.p_type, self.p_brand, self.p_launch)
+        )
+        prefixes = np.asarray([SOURCES[s][0] for s in sources], dtype=object)[self.p_source]
+        self.prod_ids = prefixes + pd.Series(np.arange(n) + 100000).astype(str).values
+        words = np.asarray([pt.split("-")[0] for _, pt in self.product_types], dtype=object)
+        self.product_names = (
+            _labels(brands, self.p_brand) + " " + words[self.p_type] + " " + pd.Series(np.arange(n)).astype(str).values
+        )
+        self.p_category = np.asarray([list(CATEGORIES).index(c) for c, _ in self.product_types])[self.p_type]
+        self.p_rating = np.round(1 + 4 * rng.beta(8, 2, n), 2)
+        self.p_new = self.p_launch >= self.month_starts[max(len(self.months) - NEW_MONTHS, 0)]
+
+    def _reviews(self) -> None:
+        rng = self.rng
+        n = len(self.prod_ids)
+        # heavy tailed popularity, older products collected more reviews.
+        age = (self.days - self.p_launch) / self.days
+        counts = rng.poisson(np.exp(rng.normal(4.35, 1.2, n)) * np.sqrt(age))
+        counts = np.minimum(counts, 20000)
+        self.r_prod = np.repeat(np.arange(n), counts)
+        launch = self.p_launch[self.r_prod]
+        # reviews come in faster after the launch and with the growing market.
+        self.r_day = launch + ((self.days - 1 - launch) * rng.random(len(self.r_prod)) ** 0.7).astype(np.int64)
+        self.r_rating = rng.choice(REVIEW_RATINGS, len(self.r_prod), p=REVIEW_RATING_SHARES)
+        flip = rng.random(len(self.r_prod)) < 0.08
+        self.r_positive = (self.r_rating >= 4) ^ flip
+        self.r_influenced = rng.random(len(self.r_prod)) < INFLUENCED_SHARE
+        self.p_reviews = np.bincount(self.r_prod, minlength=n)
+        self.p_positive = np.bincount(self.r_prod, weights=self.r_positive, minlength=n).astype(np.int64)
+
+    def _ingredients(self) -> None:
+        rng = self.rng
+        n = len(self.prod_ids)
+        names = _ingredient_names(max(int(BASE_INGREDIENTS * np.sqrt(self.scale)), 50), rng)
+        self.ingredients = names
+        per_product = rng.poisson(20, n) + 3
+        prod = np.repeat(np.arange(n), per_product)
+        ing = rng.choice(len(names), len(prod), p=_zipf_weights(len(names), 1.0))
+        rows = pd.DataFrame({"prod": prod, "ing": ing}).drop_duplicates()
+        self.i_prod, self.i_ing = rows["prod"].values, rows["ing"].values
+        self.ing_type = rng.choice(len(INGREDIENT_TYPES[0]), len(names), p=INGREDIENT_TYPES[1])
+        # banned ingredients are rare ones.
+        self.ing_banned = (rng.random(len(names)) < BANNED_SHARE * 2 * np.arange(len(names)) / len(names))
+        # an ingredient is new in a category when it was first used there in the last months.
+        used = pd.DataFrame(
+            {"category": self.p_category[self.i_prod], "ing": self.i_ing, "launch": self.p_launch[self.i_prod]}
+        )
+        first = used.groupby(["category", "ing"]).launch.transform("min").values
+        recent = self.month_starts[max(len(self.months) - NEW_INGREDIENT_MONTHS, 0)]
+        self.i_new = (first >= recent) & (self.p_launch[self.i_prod] == first)
+
+    def _items(self) -> None:
+        rng = self.rng
+        n = len(self.prod_ids)
+        sizes = rng.integers(1, 4, n)
+        prod = np.repeat(np.arange(n), sizes)
+        # the sizes of a product are consecutive.
+        smallest = rng.integers(0, len(ITEM_SIZES) - 2, n)
+        size = np.minimum(smallest[prod] + np.concatenate([np.arange(s) for s in sizes]), len(ITEM_SIZES) - 1)
+        base_price = np.exp(rng.normal(3.3, 0.6, n))
+        price = base_price[prod] * (1 + 0.35 * size / 2)
+        # monthly price observations since the launch, at most ITEM_PRICE_MONTHS.
+        first_month = np.maximum(self._month(self.p_launch[prod]), len(self.months) - ITEM_PRICE_MONTHS)
+        months = len(self.months) - first_month
+        item = np.repeat(np.arange(len(prod)), months)
+        month = first_month[item] + np.concatenate([np.arange(m) for m in months])
+        drift = 1 + rng.normal(0, 0.05, len(item)) * (rng.random(len(item)) < 0.2)
+        self.item_prod, self.item_size, self.item_price = prod, size, price
+        self.t_item, self.t_month = item, month
+        self.t_price = np.round(price[item] * drift, 2)
+
+    def _keys(self, products: np.ndarray, product_type: bool = True) -> dict:
+        keys = {
+            "source": _labels(list(SOURCES), self.p_source[products]),
+            "category": _labels([c for c, _ in self.product_types], self.p_type[products]),
+        }
+        if product_type:
+            keys["product_type"] = _labels([pt for _, pt in self.product_types], self.p_type[products])
+        return keys
+
+    def _monthly_counts(self, products: np.ndarray, days: np.ndarray, date_column: str, value: str) -> tuple:
+        frame = pd.DataFrame(self._keys(products))
+        frame[date_column] = self.months[self._month(days)]
+        by_type = (
+            frame.groupby(["source", "category", "product_type", date_column]).size().rename(value).reset_index()
+        )
+        by_category = frame.groupby(["source", "category", date_column]).size().rename(value).reset_index()
+        return by_category, by_type
+
+    def _market_trend_tables(self) -> None:
+        t = self.tables
+        t["review_trend_category_month"], t["review_trend_product_type_month"] = self._monthly_counts(
+            self.r_prod, self.r_day, "month", "review_text"
+        )
+        influenced = self.r_influenced
+        (
+            t["review_trend_by_marketing_category_month"],
+            t["review_trend_by_marketing_product_type_month"],
+        ) = self._monthly_counts(self.r_prod[influenced], self.r_day[influenced], "month", "review_text")
+        products = np.arange(len(self.prod_ids))
+        (
+            t["meta_product_launch_trend_category_month"],
+            t["meta_product_launch_trend_product_type_month"],
+        ) = self._monthly_counts(products, self.p_launch, "meta_date", "new_product_count")
+        # launch intensity: products launched in a month vs. the ones on the market before.
+        launches = t["meta_product_launch_trend_category_month"].pivot_table(
+            index="meta_date", columns=["source", "category"], values="new_product_count", fill_value=0
+        ).reindex(self.months, fill_value=0)
+        before = launches.cumsum().shift(1, fill_value=0)
+        intensity = pd.DataFrame({"new": launches.stack([0, 1]), "old": before.stack([0, 1])})
+        intensity = intensity[intensity.new + intensity.old > 0].reset_index()
+        intensity.columns = ["meta_date", "source", "category", "new", "old"]
+        intensity["launch_intensity"] = (intensity.new / (intensity.new + intensity.old)).round(3)
+        t["meta_product_launch_intensity_category_month"] = intensity[
+            ["source", "category", "meta_date", "new", "old", "launch_intensity"]
+        ].sort_values(["source", "category", "meta_date"])
+        # an ingredient counts once per product type (category), in the month it was first used there.
+        uses = pd.DataFrame(
+            {
+                "source": self.p_source[self.i_prod],
+                "type": self.p_type[self.i_prod],
+                "category": self.p_category[self.i_prod],
+                "ing": self.i_ing,
+                "prod": self.i_prod,
+                "launch": self.p_launch[self.i_prod],
+            }
+        ).sort_values("launch", kind="stable")
+        first = uses.drop_duplicates(["source", "category", "ing"])
+        t["new_ingredient_trend_category_month"], _ = self._monthly_counts(
+            first["prod"].values, first["launch"].values, "meta_date", "new_ingredient_count"
+        )
+        first = uses.drop_duplicates(["source", "type", "ing"])
+        _, t["new_ingredient_trend_product_type_month"] = self._monthly_counts(
+            first["prod"].values, first["launch"].values, "meta_date", "new_ingredient_count"
+        )
+
+    def _product_rows(self, products: np.ndarray) -> pd.DataFrame:
+        rows = pd.DataFrame(self._keys(products))
+        rows["brand"] = _labels(self.brands, self.p_brand[products])
+        rows["product_name"] = self.product_names[products]
+        rows["adjusted_rating"] = self.p_rating[products]
+        rows["first_review_date"] = self.first_day + pd.to_timedelta(self.p_launch[products], unit="D")
+        rows["first_review_date"] = rows["first_review_date"].dt.strftime("%Y-%m-%d")
+        rows["reviews"] = self.p_reviews[products]
+        rows["positive_reviews"] = self.p_positive[products]
+        rows["negative_reviews"] = rows["reviews"] - rows["positive_reviews"]
+        return rows
+
+    def _category_page_tables(self) -> None:
+        t = self.tables
+        products = np.arange(len(self.prod_ids))
+        meta = pd.DataFrame(self._keys(products))
+        meta["brand"], meta["new"] = self.p_brand, self.p_new
+        keys = ["source", "category", "product_type"]
+        grouped = meta.groupby(keys, sort=True)
+        t["category_page_new_products_count"] = grouped.new.sum().astype(np.int64).rename(
+            "new_product_count").reset_index()
+        t["category_page_distinct_brands_products"] = grouped.agg(
+            distinct_brands=("brand", "nunique"), distinct_products=("new", "size")
+        ).reset_index()
+        t["category_page_new_products_details"] = self._product_rows(products[self.p_new])
+        top = meta.assign(reviews=self.p_reviews).sort_values("reviews", ascending=False)
+        top = top.groupby(keys, sort=False).head(TOP_PRODUCTS).index.values
+        t["category_page_top_products"] = self._product_rows(np.sort(top))
+
+        # prices of the latest month.
+        latest = self.t_month == len(self.months) - 1
+        items = pd.DataFrame(self._keys(self.item_prod[self.t_item[latest]]))
+        items["prod"] = self.item_prod[self.t_item[latest]]
+        items["item_size"] = _labels(ITEM_SIZES, self.item_size[self.t_item[latest]])
+        items["price"] = self.t_price[latest]
+        grouped = items.groupby(keys)
+        per_product = items.groupby(keys + ["prod"]).price.agg(["min", "max"]).reset_index()
+        pricing = grouped.price.agg(min_price="min", max_price="max").reset_index()
+        pricing = pricing.merge(
+            per_product.groupby(keys).agg(avg_low_price=("min", "mean"), avg_high_price=("max", "mean")).reset_index()
+        )
+        t["category_page_pricing_data"] = pricing.round(2)
+        t["category_page_item_variations_price"] = grouped.agg(
+            product_variations=("price", "size"), avg_item_price=("price", "mean")
+        ).reset_index().round(2)
+        t["category_page_item_package_oz"] = items.groupby(keys + ["item_size"]).agg(
+            product_count=("prod", "nunique"), avg_price=("price", "mean")
+        ).reset_index().round(2)
+
+        new = self.i_new
+        rows = self._product_rows(self.i_prod[new])
+        rows.insert(5, "ingredient", _labels(self.ingredients, self.i_ing[new]))
+        rows.insert(6, "ingredient_type", _labels(INGREDIENT_TYPES[0], self.ing_type[self.i_ing[new]]))
+        rows.insert(7, "ban_flag", np.where(self.ing_banned[self.i_ing[new]], "yes", "no"))
+        t["category_page_new_ingredients"] = rows[
+            keys + ["brand", "product_name", "ingredient", "ingredient_type", "ban_flag", "adjusted_rating"]
+        ]
+
+        attributes = pd.DataFrame(self._keys(self.r_prod))
+        for name, column in self._review_attributes().items():
+            attributes[name] = column
+        t["category_page_reviews_by_user_attributes"] = attributes
+
+    def _review_attributes(self) -> Dict[str, np.ndarray]:
+        if not hasattr(self, "r_attributes"):
+            self.r_attributes = {
+                name: _labels(values, self.rng.choice(len(values), len(self.r_prod), p=shares))
+                for name, (values, shares) in USER_ATTRIBUTES.items()
+            }
+        return self.r_attributes
+
+    def _product_page_tables(self) -> None:
+        rng = self.rng
+        t = self.tables
+        n = len(self.prod_ids)
+        products = np.arange(n)
+        meta = pd.DataFrame({"prod_id": self.prod_ids, **self._keys(products)})
+        meta["brand"] = _labels(self.brands, self.p_brand)
+        meta["product_name"] = self.product_names
+        meta["new_flag"] = np.where(self.p_new, "new", "")
+        meta["adjusted_rating"] = self.p_rating
+        meta["first_review_date"] = self._product_rows(products)["first_review_date"].values
+        t["product_page_metadetail_data"] = meta
+
+        t["prod_page_review_sentiment_influence"] = pd.DataFrame(
+            {
+                "prod_id": self.prod_ids[self.r_prod],
+                "review_date": self.first_day + pd.to_timedelta(self.r_day, unit="D"),
+                "sentiment": np.where(self.r_positive, "positive", "negative"),
+                "is_influenced": np.where(self.r_influenced, "yes", "no"),
+                "review_rating": self.r_rating.astype(np.int64),
+            }
+        )
+        t["prod_page_reviews_attribute"] = pd.DataFrame(
+            {"prod_id": self.prod_ids[self.r_prod], **self._review_attributes()}
+        )
+
+        ing = pd.DataFrame({"prod_id": self.prod_ids[self.i_prod], **self._keys(self.i_prod)})
+        ing["product_name"] = self.product_names[self.i_prod]
+        ing["ingredient"] = _labels(self.ingredients, self.i_ing)
+        ing["ingredient_type"] = _labels(INGREDIENT_TYPES[0], self.ing_type[self.i_ing])
+        ing["ban_flag"] = np.where(self.ing_banned[self.i_ing], "yes", "no")
+        t["ing_page_ing_data"] = ing.copy()
+        ing["new_flag"] = np.where(self.i_new, "new_ingredient", "")
+        t["prod_page_ing_data"] = ing
+
+        # the first few ingredients of a product, as printed on the item.
+        ingredient_list = ing.groupby("prod_id", sort=False).ingredient.agg(lambda i: ", ".join(i.iloc[:10]))
+        item_names = np.asarray([f"size {s}" for s in ITEM_SIZES], dtype=object)
+        t["prod_page_item_data"] = pd.DataFrame(
+            {
+                "prod_id": self.prod_ids[self.item_prod[self.t_item]],
+                "item_size": _labels(ITEM_SIZES, self.item_size[self.t_item]),
+                "meta_date": self.months[self.t_month],
+                "item_price": self.t_price,
+                "item_name": item_names[self.item_size[self.t_item]],
+                "item_ingredients": ingredient_list.reindex(self.prod_ids[self.item_prod[self.t_item]]).fillna("").values,
+            }
+        )
+
+        summaries, positive, negative = [], [], []
+        for i in range(n):
+            pos = rng.choice(len(POSITIVE_TALKING_POINTS), int(rng.integers(0, 8)), replace=False)
+            neg = rng.choice(len(NEGATIVE_TALKING_POINTS), int(rng.integers(0, 5)), replace=False)
+            reviews = max(int(self.p_reviews[i]), 1)
+            positive.append({POSITIVE_TALKING_POINTS[p]: int(rng.integers(1, reviews + 1)) for p in pos})
+            negative.append({NEGATIVE_TALKING_POINTS[p]: int(rng.integers(1, reviews + 1)) for p in neg})
+            summaries.append(
+                (
+                    "Reviewers mention " + (", ".join(positive[-1]) or "nothing in particular") + ".",
+                    "Some reviewers find it " + (", ".join(negative[-1]) or "unremarkable") + ".",
+                )
+            )
+        t["prod_page_product_review_summary"] = pd.DataFrame(
+            {
+                "prod_id": self.prod_ids,
+                "pos_review_summary": [s[0] for s in summaries],
+                "neg_review_summary": [s[1] for s in summaries],
+            }
+        )
+        t["prod_page_review_talking_points"] = pd.DataFrame(
+            {"prod_id": self.prod_ids, "pos_talking_points": positive, "neg_talking_points": negative}
+        )
+
+    def _landing_page_table(self) -> None:
+        self.tables["landing_page_data"] = pd.DataFrame(
+            {
+                "latest_scraped_date": [self.snapshot],
+                "brands": [len(np.unique(self.p_brand))],
+                "products": [len(self.prod_ids)],
+                "ingredients": [len(np.unique(self.i_ing))],
+                "reviews": [len(self.r_prod)],
+                "images": [len(self.prod_ids)],
+            }
+        )
+
+
+# files the web-app reads as pickle, all others are feather.
+PICKLE_FILES = {"prod_page_review_talking_points"}
+# files also written as hive partitioned parquet with --partitioned (see PARTITIONED_DATASETS).
+PARTITIONED_FILES = {"prod_page_review_sentiment_influence", "ing_page_ing_data"}
+
+
+def write_snapshot(
+    tables: Dict[str, pd.DataFrame],
+    directory: str,
+    prefix: str = f"{S3_PREFIX}/WebAppData",
+    partitioned: bool = False,
+) -> List[str]:
+    """write_snapshot writes the tables where read_file_s3 finds them with LOCAL_DATA_DIR=directory.
+
+    Args:
+        tables (Dict[str, pd.DataFrame]): tables keyed by file name.
+        directory (str): local stand-in of the s3 bucket.
+        prefix (str, optional): s3 prefix of the web-app data. Defaults to f'{S3_PREFIX}/WebAppData'.
+        partitioned (bool, optional): also write the PARTITIONED_FILES as hive partitioned parquet
+                                      (<name>.parquet directories). Defaults to False.
+
+    Returns:
+        List[str]: paths of the written files and directories.
+    """
+    paths = []
+    for name, table in tables.items():
+        path = local_data_path(f"{prefix}/{name}", directory)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        table = table.reset_index(drop=True)
+        if name in PICKLE_FILES:
+            table.to_pickle(path)
+        else:
+            table.to_feather(path)
+        paths.append(path)
+        if partitioned and name in PARTITIONED_FILES:
+            if not set(PARTITION_COLUMNS) <= set(table.columns):
+                # the reviews are partitioned by the source and category of their product.
+                products = tables["product_page_metadetail_data"][["prod_id"] + PARTITION_COLUMNS]
+                table = table.merge(products.drop_duplicates("prod_id"), on="prod_id", how="left")
+            paths.append(write_partitioned_dataset(table, name, prefix, directory=directory))
+    return paths
+
+
+def _size(path: str) -> int:
+    if os.path.isfile(path):
+        return os.path.getsize(path)
+    return sum(os.path.getsize(os.path.join(root, f)) for root, _, files in os.walk(path) for f in files)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--scale", type=float, default=1.0, help="scale factor, e.g. 1, 10 or 100")
+    parser.add_argument("--out", required=True, help="local directory standing in for the s3 bucket")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--snapshot-date", default=None, help="date of the snapshot, defaults to today")
+    parser.add_argument(
+        "--partitioned", action="store_true", help="also write the review and ingredient tables hive partitioned"
+    )
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    snapshot = SyntheticSnapshot(args.scale, args.seed, args.snapshot_date)
+    tables = snapshot.generate()
+    for path in write_snapshot(tables, args.out, partitioned=args.partitioned):
+        name = os.path.basename(path)
+        rows = len(tables[os.path.splitext(name)[0]])
+        print(f"{name:<48}{rows:>12,} rows {_size(path) / 2 ** 20:>10.1f}MB")
+    print(f"scale {args.scale:g} snapshot written to {args.out} in {time.perf_counter() - start:.1f}s")
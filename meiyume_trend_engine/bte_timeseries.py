@@ -0,0 +1,128 @@
+"""adaptive rendering of long time series for the web-app's line charts.
+
+Daily review counts and prices since 2008 are thousands of points per trace. Drawn as
+spline smoothed SVG lines with markers they make the browser lag. In 'adaptive'
+TIMESERIES_RENDERING mode every trace is downsampled on the server with
+Largest-Triangle-Three-Buckets (LTTB, which keeps peaks and dips) to a point budget
+derived from the chart width, drawn without spline smoothing, and switched to WebGL
+(scattergl) traces when the figure still has many points. Zooming sends the visible
+x range (relayoutData) back, and the window is re-sampled at the same budget, so the
+detail grows as the user zooms in.
+"""
+from typing import Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from settings import TIMESERIES_POINTS_PER_PIXEL, WEBGL_MIN_POINTS
+
+
+def lttb(x: np.ndarray, y: np.ndarray, threshold: int) -> np.ndarray:
+    """lttb picks the positions of the points to keep with Largest-Triangle-Three-Buckets.
+
+    The first and last points are kept; every bucket in between keeps the point forming the
+    largest triangle with the previously kept point and the average of the next bucket.
+
+    Args:
+        x (np.ndarray): numeric, ascending x values.
+        y (np.ndarray): y values.
+        threshold (int): number of points to keep.
+
+    Returns:
+        np.ndarray: positions of the kept points, ascending.
+    """
+    n = len(x)
+    if threshold >= n or threshold < 3:
+        return np.arange(n)
+    x = np.asarray(x, dtype=float)
+    y = np.asarray(y, dtype=float)
+    # threshold - 2 buckets over the points between the first and the last one
+    edges = np.linspace(1, n - 1, threshold - 1).astype(int)
+    kept = np.empty(threshold, dtype=int)
+    kept[0], kept[-1] = 0, n - 1
+    a = 0
+    for i in range(threshold - 2):
+        start, end = edges[i], edges[i + 1]
+        if i + 2 < len(edges):
+            next_x = x[end : edges[i + 2]].mean()
+            next_y = y[end : edges[i + 2]].mean()
+        else:
+            next_x, next_y = x[n - 1], y[n - 1]
+        area = np.abs(
+            (x[a] - next_x) * (y[start:end] - y[a])
+            - (x[a] - x[start:end]) * (next_y - y[a])
+        )
+        a = start + int(area.argmax())
+        kept[i + 1] = a
+    return kept
+
+
+def point_budget(width: int) -> int:
+    """point_budget returns the number of points per trace worth sending for a chart width (pixels)."""
+    return max(3, int(width * TIMESERIES_POINTS_PER_PIXEL))
+
+
+def downsample(
+    data: pd.DataFrame,
+    x: str,
+    y: str,
+    color: str = None,
+    budget: int = 1000,
+    x_range: Tuple[str, str] = None,
+) -> pd.DataFrame:
+    """downsample cuts the data to the visible x range and reduces every trace to the point budget with LTTB.
+
+    Args:
+        data (pd.DataFrame): long format line chart data.
+        x (str): date column of the x axis.
+        y (str): value column of the y axis.
+        color (str, optional): column splitting the data into traces. Defaults to None.
+        budget (int, optional): points per trace. Defaults to 1000.
+        x_range (Tuple[str, str], optional): visible window of a zoomed chart. Defaults to None.
+
+    Returns:
+        pd.DataFrame: kept rows, in their original order.
+    """
+    dates = pd.to_datetime(data[x])
+    if x_range is not None:
+        start, end = pd.Timestamp(x_range[0]), pd.Timestamp(x_range[1])
+        in_range = (dates >= start) & (dates <= end)
+        data, dates = data[in_range], dates[in_range]
+    if color is not None:
+        groups = data.groupby(color, sort=False).indices
+    else:
+        groups = {None: np.arange(len(data))}
+    xs = dates.values.astype("int64")
+    kept = []
+    for rows in groups.values():
+        rows = rows[np.argsort(xs[rows], kind="mergesort")]
+        kept.append(rows[lttb(xs[rows], data[y].values[rows], budget)])
+    # keep the row order of the data, which decides the trace order of plotly express
+    return data.iloc[np.sort(np.concatenate(kept))] if kept else data
+
+
+def render_mode(point_count: int) -> str:
+    """render_mode returns plotly express' render_mode for the number of points in a figure."""
+    return "webgl" if point_count > WEBGL_MIN_POINTS else "svg"
+
+
+def is_x_relayout(relayout_data: dict) -> bool:
+    """is_x_relayout tells if a relayoutData event zoomed, panned or reset the x axis (not e.g. an autosize)."""
+    return any(key.startswith("xaxis.") for key in relayout_data or {})
+
+
+def relayout_x_range(relayout_data: dict) -> Optional[Tuple[str, str]]:
+    """relayout_x_range returns the visible x range of a relayoutData event, None once the axis is reset.
+
+    Args:
+        relayout_data (dict): relayoutData of the dcc.Graph.
+
+    Returns:
+        Optional[Tuple[str, str]]: start and end of the visible window.
+    """
+    relayout_data = relayout_data or {}
+    if "xaxis.range[0]" in relayout_data and "xaxis.range[1]" in relayout_data:
+        return relayout_data["xaxis.range[0]"], relayout_data["xaxis.range[1]"]
+    if "xaxis.range" in relayout_data:
+        return tuple(relayout_data["xaxis.range"][:2])
+    return None
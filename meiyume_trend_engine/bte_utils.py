@@ -3,17 +3,61 @@ import base64
 import gc
 import sys
 import io
+import json
+import os
+import re
+import time
 from datetime import datetime as dt
 from pathlib import Path
+from typing import Hashable, List, Tuple, Union
 
 import boto3
 import numpy as np
 import pandas as pd
+import plotly.graph_objs as go
+import pyarrow as pa
+import pyarrow.dataset as ds
+import pyarrow.fs as pafs
+import pyarrow.parquet as pq
+import plotly.io as pio
 from botocore.exceptions import ClientError
 from dateutil.relativedelta import relativedelta
 from PIL import Image
+
+from bte_instrumentation import note_slice
+from bte_memory_accounting import note_loaded
+from bte_metrics import record_data_load
+from bte_startup_trace import startup_span
 from settings import *
 
+BTE_AXIS_STYLE = dict(
+    tickfont=dict(family="GothamLight", color="crimson", size=14),
+    title_font=dict(size=20, family="GothamLight", color="crimson"),
+)
+# project-wide figure styling. applied by plotly.js to every (facet) axis, so the
+# figure functions only set what is specific to a figure.
+BTE_PLOTLY_TEMPLATE = go.layout.Template(
+    layout=dict(
+        font_family="GothamLight",
+        font_color="#c09891",
+        title_font_family="GildaDisplay",
+        title_font_color="#c09891",
+        title_font_size=24,
+        legend_title_font_color="green",
+        xaxis=BTE_AXIS_STYLE,
+        yaxis=BTE_AXIS_STYLE,
+    )
+)
+
+
+def register_bte_plotly_template():
+    """register_bte_plotly_template registers the bte template once and makes it the default on top of 'plotly'."""
+    pio.templates["bte"] = BTE_PLOTLY_TEMPLATE
+    pio.templates.default = "plotly+bte"
+
+
+register_bte_plotly_template()
+
 
 def get_s3_client(region: str, access_key_id: str, secret_access_key: str):
     """
@@ -35,6 +79,28 @@ def get_s3_client(region: str, access_key_id: str, secret_access_key: str):
     return client
 
 
+def local_data_path(key: str, directory: str = LOCAL_DATA_DIR) -> str:
+    """local_data_path maps an s3 key to its file in a local directory laid out like the bucket.
+
+    Args:
+        key (str): s3 key, e.g. f'{S3_PREFIX}/WebAppData/landing_page_data'.
+        directory (str, optional): local stand-in of the bucket. Defaults to LOCAL_DATA_DIR.
+
+    Returns:
+        str: path of the file.
+    """
+    return os.path.join(directory, *[part for part in key.split("/") if part])
+
+
+# partition columns of the hive partitioned datasets (PARTITIONED_DATASETS), outermost first.
+PARTITION_COLUMNS = ["source", "category"]
+# columns of the partitioned datasets whose distinct values are listed per partition (with their row counts) in
+# <file name>.parquet/_distinct_values.parquet, so listing them reads no partition.
+PARTITION_INDEX_COLUMNS = {"ing_page_ing_data": ["product_type", "ingredient"]}
+# dataset discovery skips the files starting with "_".
+PARTITION_INDEX_FILE = "_distinct_values.parquet"
+
+
 def read_file_s3(
     filename: str,
     # f"{S3_PREFIX}/WebAppData",
@@ -57,15 +123,248 @@ def read_file_s3(
         pd.DataFrame: [description]
     """
     key = prefix + "/" + filename
-    s3 = get_s3_client(S3_REGION, AWS_ACCESS_KEY_ID, AWS_SECRET_ACCESS_KEY)
-    obj = s3.get_object(Bucket=bucket, Key=key)
-    if file_type == "feather":
-        df = pd.read_feather(io.BytesIO(obj["Body"].read()))
-    elif file_type == "pickle":
-        df = pd.read_pickle(io.BytesIO(obj["Body"].read()))
+    start = time.perf_counter()
+    with startup_span(filename, "download", local=bool(LOCAL_DATA_DIR)):
+        if LOCAL_DATA_DIR:
+            path = local_data_path(key)
+            with open(path, "rb") as f:
+                body = f.read()
+            modified = dt.fromtimestamp(os.path.getmtime(path))
+        else:
+            s3 = get_s3_client(S3_REGION, AWS_ACCESS_KEY_ID, AWS_SECRET_ACCESS_KEY)
+            obj = s3.get_object(Bucket=bucket, Key=key)
+            body = obj["Body"].read()
+            modified = obj.get("LastModified")
+    with startup_span(filename, "decode", file_type=file_type, bytes=len(body)):
+        if file_type == "feather":
+            df = pd.read_feather(io.BytesIO(body))
+        elif file_type == "pickle":
+            df = pd.read_pickle(io.BytesIO(body))
+    # names the data in the slices callback timing reports.
+    df.attrs["name"] = filename
+    if CATEGORICAL_COLUMNS and isinstance(df, pd.DataFrame):
+        # before the page modules derive their frames from it, so the slices share the categoricals.
+        categorize_columns(df)
+    record_data_load(filename, df, time.perf_counter() - start, modified)
+    note_loaded(df)
     return df
 
 
+def read_json_s3(
+    filename: str,
+    prefix: str = f"{S3_PREFIX}/WebAppData",
+    bucket: str = S3_BUCKET,
+) -> dict:
+    """read_json_s3 reads a json artifact (e.g. pre-rendered figures) stored next to the web-app data.
+
+    Args:
+        filename (str): name of the json file.
+        prefix (str, optional): s3 prefix. Defaults to f'{S3_PREFIX}/WebAppData'.
+        bucket (str, optional): s3 bucket. Defaults to S3_BUCKET.
+
+    Returns:
+        dict: decoded json content.
+    """
+    key = prefix + "/" + filename
+    with startup_span(filename, "download", local=bool(LOCAL_DATA_DIR)):
+        if LOCAL_DATA_DIR:
+            with open(local_data_path(key), "rb") as f:
+                body = f.read()
+        else:
+            s3 = get_s3_client(S3_REGION, AWS_ACCESS_KEY_ID, AWS_SECRET_ACCESS_KEY)
+            obj = s3.get_object(Bucket=bucket, Key=key)
+            body = obj["Body"].read()
+    with startup_span(filename, "decode", file_type="json", bytes=len(body)):
+        return json.loads(body)
+
+
+def write_json_s3(
+    content: str,
+    filename: str,
+    prefix: str = f"{S3_PREFIX}/WebAppData",
+    bucket: str = S3_BUCKET,
+) -> None:
+    """write_json_s3 writes an already serialized json artifact next to the web-app data.
+
+    Args:
+        content (str): serialized json.
+        filename (str): name of the json file.
+        prefix (str, optional): s3 prefix. Defaults to f'{S3_PREFIX}/WebAppData'.
+        bucket (str, optional): s3 bucket. Defaults to S3_BUCKET.
+    """
+    key = prefix + "/" + filename
+    if LOCAL_DATA_DIR:
+        path = local_data_path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(content)
+        return
+    s3 = get_s3_client(S3_REGION, AWS_ACCESS_KEY_ID, AWS_SECRET_ACCESS_KEY)
+    s3.put_object(
+        Bucket=bucket,
+        Key=key,
+        Body=content.encode("utf-8"),
+        ContentType="application/json",
+    )
+
+
+def partitioned_dataset_location(
+    filename: str,
+    prefix: str = f"{S3_PREFIX}/WebAppData",
+    bucket: str = S3_BUCKET,
+    directory: str = LOCAL_DATA_DIR,
+) -> Tuple[pafs.FileSystem, str]:
+    """partitioned_dataset_location finds the directory of a hive partitioned dataset (<filename>.parquet).
+
+    Args:
+        filename (str): name of the dataset (its feather file name).
+        prefix (str, optional): s3 prefix. Defaults to f'{S3_PREFIX}/WebAppData'.
+        bucket (str, optional): s3 bucket. Defaults to S3_BUCKET.
+        directory (str, optional): local stand-in of the bucket, s3 if empty. Defaults to LOCAL_DATA_DIR.
+
+    Returns:
+        Tuple[pafs.FileSystem, str]: file system and path of the dataset directory.
+
+    Raises:
+        ValueError: the dataset is on s3 and S3_REGION is not set.
+    """
+    key = prefix + "/" + filename + ".parquet"
+    if directory:
+        return pafs.LocalFileSystem(), local_data_path(key, directory)
+    if S3_REGION == "":
+        raise ValueError(f"S3_REGION is not set, {filename} can not be read from s3 (or set BTE_LOCAL_DATA_DIR)")
+    credentials = {}
+    if AWS_ACCESS_KEY_ID and AWS_SECRET_ACCESS_KEY:
+        credentials = dict(access_key=AWS_ACCESS_KEY_ID, secret_key=AWS_SECRET_ACCESS_KEY)
+    return pafs.S3FileSystem(region=S3_REGION, **credentials), bucket + "/" + key.strip("/")
+
+
+def read_partitioned_dataset(
+    filename: str,
+    prefix: str = f"{S3_PREFIX}/WebAppData",
+    bucket: str = S3_BUCKET,
+) -> ds.Dataset:
+    """read_partitioned_dataset opens a dataset stored as hive partitioned parquet (source=/category=).
+
+    Only the files are listed: the rows are read by the scans of the dataset, partitions whose values do
+    not match a scan's filter are skipped without reading them.
+
+    Args:
+        filename (str): name of the dataset (its feather file name).
+        prefix (str, optional): s3 prefix. Defaults to f'{S3_PREFIX}/WebAppData'.
+        bucket (str, optional): s3 bucket. Defaults to S3_BUCKET.
+
+    Returns:
+        ds.Dataset: the dataset, with the partition columns as string columns.
+    """
+    with startup_span(filename, "download", local=bool(LOCAL_DATA_DIR), partitioned=True):
+        filesystem, path = partitioned_dataset_location(filename, prefix, bucket)
+        return ds.dataset(
+            path,
+            filesystem=filesystem,
+            format="parquet",
+            partitioning=ds.partitioning(
+                pa.schema([(column, pa.string()) for column in PARTITION_COLUMNS]), flavor="hive"
+            ),
+        )
+
+
+def read_partitioned_dataset_index(
+    filename: str,
+    prefix: str = f"{S3_PREFIX}/WebAppData",
+    bucket: str = S3_BUCKET,
+) -> Union[pd.DataFrame, None]:
+    """read_partitioned_dataset_index reads the distinct values index of a partitioned dataset, if it has one.
+
+    Args:
+        filename (str): name of the dataset (its feather file name).
+        prefix (str, optional): s3 prefix. Defaults to f'{S3_PREFIX}/WebAppData'.
+        bucket (str, optional): s3 bucket. Defaults to S3_BUCKET.
+
+    Returns:
+        Union[pd.DataFrame, None]: see partition_value_index, None if the dataset has no index (yet).
+    """
+    if filename not in PARTITION_INDEX_COLUMNS:
+        return None
+    with startup_span(filename + "/" + PARTITION_INDEX_FILE, "download", local=bool(LOCAL_DATA_DIR)):
+        filesystem, path = partitioned_dataset_location(filename, prefix, bucket)
+        path = path + "/" + PARTITION_INDEX_FILE
+        if filesystem.get_file_info(path).type == pafs.FileType.NotFound:
+            print(f"*WARNING: {filename} has no {PARTITION_INDEX_FILE}, its values are read from all partitions*")
+            return None
+        return pq.read_table(path, filesystem=filesystem).to_pandas()
+
+
+def partition_value_index(data: pd.DataFrame, columns: List[str]) -> pd.DataFrame:
+    """partition_value_index lists the distinct values of columns in every partition of data.
+
+    Args:
+        data (pd.DataFrame): rows, with the PARTITION_COLUMNS.
+        columns (List[str]): columns to list the values of.
+
+    Returns:
+        pd.DataFrame: the PARTITION_COLUMNS, column (name), value (as string) and rows (with the value).
+    """
+    frames = []
+    for column in columns:
+        counts = (
+            data.groupby(PARTITION_COLUMNS + [column], sort=False, observed=True)
+            .size()
+            .reset_index(name="rows")
+            .rename(columns={column: "value"})
+        )
+        counts.insert(len(PARTITION_COLUMNS), "column", column)
+        frames.append(counts)
+    return pd.concat(frames, ignore_index=True).astype(
+        {**{column: str for column in PARTITION_COLUMNS + ["column", "value"]}, "rows": "int64"}
+    )
+
+
+def write_partitioned_dataset(
+    data: pd.DataFrame,
+    filename: str,
+    prefix: str = f"{S3_PREFIX}/WebAppData",
+    bucket: str = S3_BUCKET,
+    directory: str = LOCAL_DATA_DIR,
+) -> str:
+    """write_partitioned_dataset writes a frame as hive partitioned parquet, one directory per source and category.
+
+    Partitions of a previous write are replaced, partitions without rows in data are left as they are.
+    The distinct values index (PARTITION_INDEX_COLUMNS) is updated the same way.
+
+    Args:
+        data (pd.DataFrame): rows to write, with the PARTITION_COLUMNS.
+        filename (str): name of the dataset (its feather file name).
+        prefix (str, optional): s3 prefix. Defaults to f'{S3_PREFIX}/WebAppData'.
+        bucket (str, optional): s3 bucket. Defaults to S3_BUCKET.
+        directory (str, optional): local stand-in of the bucket, s3 if empty. Defaults to LOCAL_DATA_DIR.
+
+    Returns:
+        str: path of the dataset directory.
+    """
+    filesystem, path = partitioned_dataset_location(filename, prefix, bucket, directory)
+    data = data.astype({column: str for column in PARTITION_COLUMNS})
+    ds.write_dataset(
+        pa.Table.from_pandas(data, preserve_index=False),
+        path,
+        filesystem=filesystem,
+        format="parquet",
+        partitioning=PARTITION_COLUMNS,
+        partitioning_flavor="hive",
+        existing_data_behavior="delete_matching",
+    )
+    if filename in PARTITION_INDEX_COLUMNS:
+        index = partition_value_index(data, PARTITION_INDEX_COLUMNS[filename])
+        index_path = path + "/" + PARTITION_INDEX_FILE
+        if filesystem.get_file_info(index_path).type != pafs.FileType.NotFound:
+            # keep the values of the partitions not written.
+            previous = pq.read_table(index_path, filesystem=filesystem).to_pandas()
+            written = previous.set_index(PARTITION_COLUMNS).index.isin(index.set_index(PARTITION_COLUMNS).index)
+            index = pd.concat([previous[~written], index], ignore_index=True)
+        pq.write_table(pa.Table.from_pandas(index, preserve_index=False), index_path, filesystem=filesystem)
+    return path
+
+
 def read_image_s3(
     prod_id: str,
     prefix: str = f"{S3_PREFIX}/Image/Staging",
@@ -121,3 +420,117 @@ def set_default_start_and_end_dates():
     default_end_date[-1] = "01"
     default_end_date = ("-").join(default_end_date)
     return default_start_date, default_end_date
+
+
+def parse_date_range(
+    start_date: str,
+    end_date: str,
+    default_start_date: str = None,
+    default_end_date: str = None,
+) -> Tuple[str, str]:
+    """parse_date_range turns the start/end dates of a DatePickerRange into 'YYYY-MM-DD' strings.
+
+    Args:
+        start_date (str): start_date of the date picker (may carry a time part or be None).
+        end_date (str): end_date of the date picker (may carry a time part or be None).
+        default_start_date (str, optional): used when start_date is None. Defaults to set_default_start_and_end_dates().
+        default_end_date (str, optional): used when end_date is None. Defaults to set_default_start_and_end_dates().
+
+    Returns:
+        Tuple[str, str]: start and end date strings.
+    """
+    if default_start_date is None or default_end_date is None:
+        default_start_date, default_end_date = set_default_start_and_end_dates()
+
+    if start_date is not None:
+        start_date = dt.strptime(re.split("T| ", start_date)[0], "%Y-%m-%d")
+        start_date_string = start_date.strftime("%Y-%m-%d")
+    else:
+        start_date_string = default_start_date
+
+    if end_date is not None:
+        end_date = dt.strptime(re.split("T| ", end_date)[0], "%Y-%m-%d")
+        end_date_string = end_date.strftime("%Y-%m-%d")
+    else:
+        end_date_string = default_end_date
+
+    return start_date_string, end_date_string
+
+
+def build_row_index(data: pd.DataFrame, keys: Union[str, List[str]]) -> dict:
+    """build_row_index maps every value (combination) of the key column(s) to its row positions.
+
+    Args:
+        data (pd.DataFrame): data to index.
+        keys (Union[str, List[str]]): key column (e.g. prod_id) or columns (e.g. source, category, product_type).
+
+    Returns:
+        dict: key value (tuple for several columns) to np.ndarray of row positions.
+    """
+    with startup_span(data.attrs.get("name", "unnamed"), "index", keys=keys, rows=len(data)):
+        return data.groupby(keys, sort=False, observed=True).indices
+
+
+def select_rows(
+    data: pd.DataFrame, row_index: dict, key: Hashable, columns: List[str] = None
+) -> pd.DataFrame:
+    """select_rows returns the rows of one key combination without scanning the whole frame.
+
+    Args:
+        data (pd.DataFrame): data the index was built on.
+        row_index (dict): output of build_row_index.
+        key (Hashable): key value or tuple (e.g. (source, category, product_type)).
+        columns (List[str], optional): columns to return. Defaults to all columns.
+
+    Returns:
+        pd.DataFrame: matching rows, empty if the key is unknown.
+    """
+    rows = data.iloc[row_index.get(key, np.array([], dtype=int))]
+    if CALLBACK_TIMING:
+        note_slice(data.attrs.get("name", "unknown"), key, len(rows))
+    return rows if columns is None else rows[columns]
+
+
+def observed_value_counts(values: pd.Series) -> pd.Series:
+    """observed_value_counts is value_counts without the zero counts a categorical column reports for unused categories.
+
+    Args:
+        values (pd.Series): column (or selection of a column) to count.
+
+    Returns:
+        pd.Series: count per value, most frequent first.
+    """
+    counts = values.value_counts()
+    return counts[counts > 0]
+
+
+def categorize_columns(data: pd.DataFrame, max_ratio: float = CATEGORICAL_MAX_RATIO) -> List[str]:
+    """categorize_columns turns repetitive string columns of a DataFrame into categoricals, in place.
+
+    A categorical column is an integer code array plus one string per distinct value, so forked
+    server workers read it without touching (and un-sharing) a python object per row. Date
+    strings are left alone, they are compared by range, which unordered categoricals refuse.
+
+    Args:
+        data (pd.DataFrame): data to convert.
+        max_ratio (float, optional): largest distinct values to rows ratio of a converted column.
+                                     Defaults to CATEGORICAL_MAX_RATIO.
+
+    Returns:
+        List[str]: converted columns.
+    """
+    converted = []
+    with startup_span(data.attrs.get("name", "unnamed"), "dtype", columns=converted):
+        for col in data.columns:
+            values = data[col]
+            if values.dtype != object or pd.api.types.infer_dtype(values, skipna=True) != "string":
+                continue
+            distinct = values.dropna().unique()
+            if len(distinct) == 0 or len(distinct) > max_ratio * len(values):
+                continue
+            sample = pd.to_datetime(pd.Series(distinct[:20]), errors="coerce")
+            if sample.notna().all():
+                continue
+            data[col] = values.astype("category")
+            converted.append(col)
+    return converted
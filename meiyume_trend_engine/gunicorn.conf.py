@@ -0,0 +1,60 @@
+"""gunicorn settings of the web-app: gunicorn --config gunicorn.conf.py wsgi:server"""
+import os
+
+from bte_memory import MASTER_PID_ENV, process_memory
+from bte_metrics import archive_process_metrics, flush_process_metrics
+from bte_profiler import install_profile_signal
+from settings import (
+    METRICS,
+    METRICS_DIR,
+    PROFILE_DIR,
+    PROFILE_SIGNAL_SECONDS,
+    PROFILER,
+    WSGI_BIND,
+    WSGI_THREADS,
+    WSGI_WORKERS,
+)
+
+bind = WSGI_BIND
+workers = WSGI_WORKERS
+# callbacks wait on s3, shared in-flight computations and background jobs, threads keep a worker responsive.
+worker_class = "gthread"
+threads = WSGI_THREADS
+# load the data once in the master, the forked workers share it copy-on-write.
+preload_app = True
+timeout = 120
+
+
+def _megabytes(usage: dict) -> str:
+    return ", ".join(f"{k} {usage[k] / 2 ** 20:.0f}MB" for k in ("rss", "unique", "shared"))
+
+
+def when_ready(server):
+    usage = process_memory()
+    if usage is not None:
+        server.log.info("master %s after preload: %s", os.getpid(), _megabytes(usage))
+
+
+def post_fork(server, worker):
+    # lets bte_memory.memory_report find the master and the other workers.
+    os.environ[MASTER_PID_ENV] = str(server.pid)
+
+
+def post_worker_init(worker):
+    # after the worker replaced the signal handlers it inherited; gunicorn workers leave SIGUSR2 alone.
+    if PROFILER:
+        install_profile_signal(PROFILE_DIR, PROFILE_SIGNAL_SECONDS)
+
+
+def worker_exit(server, worker):
+    # its last counts, child_exit keeps them in the totals.
+    flush_process_metrics()
+    usage = process_memory()
+    if usage is not None:
+        server.log.info("worker %s exits: %s", worker.pid, _megabytes(usage))
+
+
+def child_exit(server, worker):
+    # in the master, once the worker is gone: any worker answering /metrics still counts its requests.
+    if METRICS:
+        archive_process_metrics(METRICS_DIR, worker.pid)
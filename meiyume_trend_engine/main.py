@@ -7,6 +7,7 @@ links.
 """
 import re
 from datetime import datetime as dt
+from functools import lru_cache, partial
 from typing import Tuple
 
 import dash
@@ -17,13 +18,46 @@ import dash_html_components as html
 import dash_table
 import pandas as pd
 import plotly.graph_objs as go
-from dash.dependencies import Input, Output, State
+from dash.dependencies import ClientsideFunction, Input, Output, State
+from dash.exceptions import PreventUpdate
 
 from bte_category_page_data_and_plots import *
+from bte_datatable import page_table
+from bte_jobs import JobManager, JobNotFound, report_progress
+from bte_memory import memory_report
+from bte_memory_accounting import MemoryAccounting
+from bte_metrics import install_metrics, measure_datasets
+from bte_payload import install_payload_slimming
+from bte_instrumentation import (
+    CallbackTimings,
+    add_json_route,
+    install_request_counter,
+    instrument_callbacks,
+)
 from bte_ingredient_page_data_and_plots import *
 from bte_market_trend_page_data_and_plots import *
 from bte_product_page_data_and_plots import *
-from bte_utils import read_file_s3, read_image_s3
+from bte_profiler import (
+    CallbackProfiler,
+    install_profile_signal,
+    install_profiler_route,
+    wrap_callbacks,
+)
+from bte_single_flight import single_flight, single_flight_stats
+from bte_static import (
+    CDN_STYLESHEETS,
+    VENDOR_ASSETS_IGNORE,
+    install_compression,
+    install_static_caching,
+    vendored_stylesheets,
+)
+from bte_timeseries import is_x_relayout, relayout_x_range
+from bte_utils import (
+    parse_date_range,
+    read_file_s3,
+    read_image_s3,
+    select_rows,
+)
 from settings import *
 
 # assign default values
@@ -43,10 +77,34 @@ PRODUCT_RATING_ADJUSTED = "adjusted_rating"
 DATE_FIRST_REVIEWED = "first_review_date"
 PRICE_LOW = "small_size_price"
 PRICE_HIGH = "big_size_price"
+DATE_RANGE_HELP_TEXT = "Minimum start date is 12/01/2008. \n You can write in MM/DD/YYYY format in the date box to filter."
+MARKET_TREND_FIGURE_IDS = [
+    "category_trend",
+    "influenced_category_trend",
+    "subcategory_trend",
+    "influenced_subcategory_trend",
+    "product_launch_trend_category",
+    "product_launch_trend_subcategory",
+    "product_launch_intensity_category",
+    "ingredient_launch_trend_category",
+    "ingredient_launch_trend_subcategory",
+]
+# first month the review date picker allows.
+MARKET_TREND_MIN_DATE = "2008-12-01"
+# with BACKGROUND_JOBS, selections larger than these are computed on the background job pool.
+BACKGROUND_MIN_PRODUCT_TYPE_FACETS = 50
+BACKGROUND_MIN_INGREDIENT_ROWS = 2000
 
 lp_df = read_file_s3(filename="landing_page_data", file_type="feather")
 # pd.read_feather(dash_data_path/'landing_page_data')
 
+if METRICS:
+    # measured here, before gunicorn forks the workers (see bte_metrics).
+    measure_datasets()
+if MEMORY_ACCOUNTING:
+    # the structures are registered and measured at the end of this module, once all of them are defined.
+    memory_accounting = MemoryAccounting(MEMORY_ACCOUNTING_FILE, MEMORY_GROWTH_RATIO, MEMORY_GROWTH_MIN_BYTES)
+
 USERNAME_PASSWORD_PAIRS = [
     ["user", "pwd123"],
     ["meiyume", "pwd123"],
@@ -60,11 +118,9 @@ USERNAME_PASSWORD_PAIRS = [
 logo_url = f"https://{S3_BUCKET}.s3-{S3_REGION}.amazonaws.com/{S3_PREFIX}/static/assets/bte_logo.png"
 
 # Create Dash Application
-external_stylesheets = [
-    dbc.themes.LUX,
-    "https://codepen.io/chriddyp/pen/bWLwgP.css",
-    "https://use.fontawesome.com/releases/v5.10.2/css/all.css",
-]
+# bootstrap theme, dash base styles and font awesome, self-hosted from assets/vendor (downloaded by the build with
+# `python bte_static.py`)
+external_stylesheets = vendored_stylesheets(CDN_STYLESHEETS)
 external_scripts = [
     "https://www.googletagmanager.com/gtag/js?id=UA-180588565-1",
 ]
@@ -73,14 +129,190 @@ app = dash.Dash(
     __name__,
     external_scripts=external_scripts,
     external_stylesheets=external_stylesheets,
+    assets_ignore=VENDOR_ASSETS_IGNORE,
+    # responses are compressed by install_compression below
+    compress=False,
     # these meta_tags ensure content is scaled correctly on different devices
     # see: https://www.w3schools.com/css/css_rwd_viewport.asp for more
     meta_tags=[{"name": "viewport",
                 "content": "width=device-width, initial-scale=1"}],
 )
+# wsgi application, served in production by wsgi.py.
+server = app.server
+
+
+@lru_cache(maxsize=None)
+def clicked_figure_ids() -> frozenset:
+    """clicked_figure_ids returns the graphs whose clickData a (server or clientside) callback reads.
+
+    Called once all callbacks are registered (on the first callback response).
+    """
+    return frozenset(
+        dependency["id"]
+        for callback in app.callback_map.values()
+        for dependency in callback["inputs"]
+        if dependency["property"] == "clickData"
+    )
+
+
+# metrics first, their request latencies include everything the other after_request hooks do.
+if METRICS:
+    install_metrics(
+        app.server,
+        caches=lambda: [
+            get_product_context,
+            get_product_context_in_date_range,
+            ing_page_new_ing_frame,
+            ing_page_banned_ing_frame,
+            ing_page_product_frame,
+        ],
+        single_flight_stats=single_flight_stats,
+        memory_accounting=memory_accounting.snapshot if MEMORY_ACCOUNTING else None,
+        snapshot_version=market_trend_data_version,
+        pages=["/", "/page-1", "/page-2", "/page-3", "/page-4", "/page-5"],
+    )
+# compression next: flask runs the after_request hooks installed later (fingerprinting, slimming) before it.
+if COMPRESSION:
+    install_compression(app.server)
+if STATIC_ASSET_FINGERPRINTS:
+    static_assets = install_static_caching(
+        app.server, app.config.assets_folder, app.get_asset_url("")
+    )
+
+# instrumentation routes are added before the basic auth, so they are protected by it.
+if CALLBACK_REQUEST_COUNTS:
+    callback_request_counter = install_request_counter(app.server)
+add_json_route(app.server, "/_bte/single-flight", single_flight_stats)
+add_json_route(app.server, "/_bte/memory", memory_report)
+if MEMORY_ACCOUNTING:
+    add_json_route(app.server, "/_bte/memory/structures", memory_accounting.snapshot)
+if CALLBACK_TIMING:
+    # the callbacks are wrapped at the end of this module, once all of them are registered.
+    callback_timings = CallbackTimings(CALLBACK_TIMING_WINDOW)
+    add_json_route(app.server, "/_bte/callback-timings", callback_timings.snapshot)
+if PROFILER:
+    # the callbacks are wrapped at the end of this module, once all of them are registered.
+    callback_profiler = CallbackProfiler()
+    install_profiler_route(app.server, callback_profiler, PROFILER_ADMIN_USERS)
+if FIGURE_PAYLOAD_SLIMMING:
+    payload_sizes = install_payload_slimming(app.server, clicked_figure_ids)
+    add_json_route(app.server, "/_bte/payload-sizes", payload_sizes.snapshot)
 
 auth = dash_auth.BasicAuth(app, USERNAME_PASSWORD_PAIRS)
 
+background_jobs = (
+    JobManager(BACKGROUND_JOB_DIR, BACKGROUND_JOB_WORKERS) if BACKGROUND_JOBS else None
+)
+
+
+def job_components(name: str) -> list:
+    """job_components returns the job store, poll interval and progress bar of a background job callback.
+
+    Args:
+        name (str): name the callback was registered with in background_job_callback.
+
+    Returns:
+        list: components to place next to the callback's outputs, empty unless BACKGROUND_JOBS is set.
+    """
+    if not BACKGROUND_JOBS:
+        return []
+    return [
+        dcc.Store(id=f"{name}_job"),
+        dcc.Interval(
+            id=f"{name}_job_poll", interval=BACKGROUND_JOB_POLL_INTERVAL, disabled=True
+        ),
+        dbc.Progress(
+            id=f"{name}_job_progress",
+            value=0,
+            striped=True,
+            animated=True,
+            style={"display": "none"},
+        ),
+    ]
+
+
+def background_job_callback(
+    name: str, outputs, inputs: list, is_heavy=None, inline_func=None
+):
+    """background_job_callback registers a heavy callback to run as a background job when BACKGROUND_JOBS is set.
+
+    The callback then only submits a job (cancelling the job of the previous selection) into the
+    '<name>_job' dcc.Store. The '<name>_job_poll' dcc.Interval polls the job, updates the
+    '<name>_job_progress' bar and sets the outputs once the job is done. Selections for which
+    is_heavy is false run right away on the request thread and are picked up by the first poll.
+    A job the poll cannot find (deleted) or that was cancelled elsewhere is computed on the poll's
+    request instead, a failed job is shown on the progress bar. Without BACKGROUND_JOBS this is a
+    plain app.callback.
+
+    Args:
+        name (str): prefix of the job component ids (see job_components).
+        outputs (Union[Output, list]): output(s) of the callback.
+        inputs (list): inputs of the callback.
+        is_heavy (Callable, optional): takes the callback arguments, tells if the job goes to the
+            process pool. Defaults to None (always).
+        inline_func (Callable, optional): runs light selections and the plain callback. Defaults to
+            the decorated function.
+
+    Returns:
+        Callable: decorator registering the (module level) job function, which is returned unchanged.
+    """
+    output_list = outputs if isinstance(outputs, list) else [outputs]
+
+    def register(func):
+        run = inline_func or func
+        if not BACKGROUND_JOBS:
+            app.callback(outputs, inputs)(run)
+            return func
+
+        @app.callback(
+            Output(f"{name}_job", "data"), inputs, [State(f"{name}_job", "data")]
+        )
+        def submit_job(*args):
+            *args, previous_job = args
+            if previous_job:
+                background_jobs.cancel(previous_job["job_id"])
+            if is_heavy is None or is_heavy(*args):
+                return {"job_id": background_jobs.submit(func, *args)}
+            return {"job_id": background_jobs.run_inline(run, *args)}
+
+        @app.callback(
+            output_list
+            + [
+                Output(f"{name}_job_poll", "disabled"),
+                Output(f"{name}_job_progress", "value"),
+                Output(f"{name}_job_progress", "children"),
+                Output(f"{name}_job_progress", "style"),
+            ],
+            [Input(f"{name}_job", "data"), Input(f"{name}_job_poll", "n_intervals")],
+            # the job's arguments, to compute it here when the job is gone.
+            [State(i.component_id, i.component_property) for i in inputs],
+        )
+        def poll_job(job: dict, n_intervals: int, *args):
+            if not job:
+                raise PreventUpdate
+            status = background_jobs.status(job["job_id"])
+            unchanged = [dash.no_update] * len(output_list)
+            if status["state"] in ("pending", "running"):
+                progress = round(100 * status["progress"])
+                return unchanged + [False, progress, status["message"], {}]
+            idle = [True, 100, "", {"display": "none"}]
+            try:
+                try:
+                    result = background_jobs.result(job["job_id"])
+                except JobNotFound:
+                    # a new selection replaces the job before cancelling it, so the job of the current
+                    # selection was deleted (JOB_TTL) or cancelled with a shared job.
+                    print(f"*WARNING: background job {name} is {status['state']}, computed on the request*")
+                    result = run(*args)
+            except Exception as ex:
+                print(f"*WARNING: background job {name} failed: {ex!r}*")
+                return unchanged + [True, 100, "failed, change the selection to retry", {}]
+            return (list(result) if isinstance(outputs, list) else [result]) + idle
+
+        return func
+
+    return register
+
 # create tab and sidebar css style sheets
 tabs_styles = {"height": "44px"}
 tab_style = {
@@ -519,8 +751,15 @@ def market_trend_page_layout():
     Returns:
         html: market trend page layout
     """
+    # in client filter mode each figure is sent once for the whole date range into a store.
+    figure_stores = [
+        dcc.Store(id=f"{figure_id}_store")
+        for figure_id in MARKET_TREND_FIGURE_IDS
+        if MARKET_TREND_FILTER_MODE == "client"
+    ]
     return html.Div(
-        [
+        figure_stores
+        + [
             html.H2(
                 "What is happening in the market?",
                 style={
@@ -576,6 +815,7 @@ def market_trend_page_layout():
                             ),
                             dcc.Markdown(
                                 id="output-container-date-picker-range",
+                                children=DATE_RANGE_HELP_TEXT,
                                 style={"textAlign": "left", "fontSize": "10"},
                             ),
                         ],
@@ -662,6 +902,18 @@ def market_trend_page_layout():
                                                     "fontFamily": "GothamLight",
                                                 },
                                             ),
+                                            # pages of the product type small multiples
+                                            dcc.Dropdown(
+                                                id="subcategory_trend_page",
+                                                options=[],
+                                                value=0,
+                                                clearable=False,
+                                                searchable=False,
+                                                style={"width": 320}
+                                                if PRODUCT_TYPE_FACETS_PER_PAGE
+                                                else {"display": "none"},
+                                            ),
+                                            *job_components("subcategory_trend"),
                                             dcc.Graph(
                                                 id="subcategory_trend",
                                             ),
@@ -717,6 +969,17 @@ def market_trend_page_layout():
                                                 },
                                             ),
                                             # html.Hr(),
+                                            # pages of the product type small multiples
+                                            dcc.Dropdown(
+                                                id="influenced_subcategory_trend_page",
+                                                options=[],
+                                                value=0,
+                                                clearable=False,
+                                                searchable=False,
+                                                style={"width": 320}
+                                                if PRODUCT_TYPE_FACETS_PER_PAGE
+                                                else {"display": "none"},
+                                            ),
                                             dcc.Graph(
                                                 id="influenced_subcategory_trend",
                                             ),
@@ -1200,14 +1463,11 @@ def category_page_layout():
                                     }
                                     for i in packaging_filtered_df.columns
                                 ],
-                                data=packaging_filtered_df.to_dict(
-                                    "records"
-                                ),  # the contents of the table
                                 editable=False,  # allow editing of data inside all cells
                                 # allow filtering of data by user ('native') or not ('none')
-                                filter_action="native",
+                                filter_action="custom",
                                 # enables data to be sorted per-column by user or not ('none')
-                                sort_action="native",
+                                sort_action="custom",
                                 sort_mode="single",  # sort across 'multi' or 'single' columns
                                 # column_selectable="multi",  # allow users to select 'multi' or 'single' columns
                                 # row_selectable="multi",     # allow users to select 'multi' or 'single' rows
@@ -1215,8 +1475,10 @@ def category_page_layout():
                                 row_deletable=False,
                                 selected_columns=[],  # ids of columns that user selects
                                 selected_rows=[],  # indices of rows that user selects
-                                # all data is passed to the table up-front or not ('none')
-                                page_action="none",
+                                # rows are filtered, sorted and paged on the server (bte_datatable)
+                                page_action="custom",
+                                page_current=0,
+                                page_size=DATATABLE_PAGE_SIZE,
                                 style_cell={  # ensure adequate header width when text is shorter than cell's text
                                     "minWidth": 60,
                                     "maxWidth": 60,
@@ -1262,14 +1524,11 @@ def category_page_layout():
                                     }
                                     for i in top_products_df.columns
                                 ],
-                                data=top_products_df.to_dict(
-                                    "records"
-                                ),  # the contents of the table
                                 editable=False,  # allow editing of data inside all cells
                                 # allow filtering of data by user ('native') or not ('none')
-                                filter_action="native",
+                                filter_action="custom",
                                 # enables data to be sorted per-column by user or not ('none')
-                                sort_action="native",
+                                sort_action="custom",
                                 sort_mode="single",  # sort across 'multi' or 'single' columns
                                 # column_selectable="multi",  # allow users to select 'multi' or 'single' columns
                                 # row_selectable="multi",     # allow users to select 'multi' or 'single' rows
@@ -1277,8 +1536,10 @@ def category_page_layout():
                                 row_deletable=False,
                                 selected_columns=[],  # ids of columns that user selects
                                 selected_rows=[],  # indices of rows that user selects
-                                # all data is passed to the table up-front or not ('none')
-                                page_action="none",
+                                # rows are filtered, sorted and paged on the server (bte_datatable)
+                                page_action="custom",
+                                page_current=0,
+                                page_size=DATATABLE_PAGE_SIZE,
                                 style_cell={  # ensure adequate header width when text is shorter than cell's text
                                     "minWidth": 60,
                                     "width": 80,
@@ -1351,14 +1612,11 @@ def category_page_layout():
                                     }
                                     for i in new_products_detail_df.columns
                                 ],
-                                data=new_products_detail_df.to_dict(
-                                    "records"
-                                ),  # the contents of the table
                                 editable=False,  # allow editing of data inside all cells
                                 # allow filtering of data by user ('native') or not ('none')
-                                filter_action="native",
+                                filter_action="custom",
                                 # enables data to be sorted per-column by user or not ('none')
-                                sort_action="native",
+                                sort_action="custom",
                                 sort_mode="single",  # sort across 'multi' or 'single' columns
                                 # column_selectable="multi",  # allow users to select 'multi' or 'single' columns
                                 # row_selectable="multi",     # allow users to select 'multi' or 'single' rows
@@ -1366,7 +1624,10 @@ def category_page_layout():
                                 row_deletable=False,
                                 selected_columns=[],  # ids of columns that user selects
                                 selected_rows=[],  # indices of rows that user selects
-                                # all data is passed to the table up-front or not ('none')
+                                # rows are filtered, sorted and paged on the server (bte_datatable)
+                                page_action="custom",
+                                page_current=0,
+                                page_size=DATATABLE_PAGE_SIZE,
                                 style_cell={  # ensure adequate header width when text is shorter than cell's text
                                     "minWidth": 60,
                                     "width": 80,
@@ -1438,16 +1699,17 @@ def category_page_layout():
                                     }
                                     for i in new_ingredients_df.columns
                                 ],
-                                data=new_ingredients_df.to_dict(
-                                    "records"
-                                ),  # the contents of the table
                                 editable=False,  # allow editing of data inside all cells
-                                filter_action="native",
-                                sort_action="native",
+                                filter_action="custom",
+                                sort_action="custom",
                                 sort_mode="single",  # sort across 'multi' or 'single' columns
                                 row_deletable=False,
                                 selected_columns=[],  # ids of columns that user selects
                                 selected_rows=[],  # indices of rows that user selects
+                                # rows are filtered, sorted and paged on the server (bte_datatable)
+                                page_action="custom",
+                                page_current=0,
+                                page_size=DATATABLE_PAGE_SIZE,
                                 style_cell={  # ensure adequate header width when text is shorter than cell's text
                                     "minWidth": 120,
                                     "maxWidth": 120,
@@ -1626,6 +1888,7 @@ def product_page_layout():
                                     ),
                                     dcc.Markdown(
                                         id="prod-page-output-container-date-picker-range",
+                                        children=DATE_RANGE_HELP_TEXT,
                                         style={
                                             "textAlign": "left",
                                             "fontSize": "8",
@@ -2450,6 +2713,7 @@ def ingredient_page_layout():
                         [
                             dbc.Col(
                                 [
+                                    *job_components("ing_page_prod_search_table"),
                                     dash_table.DataTable(
                                         id="ing_page_prod_search_table",
                                         columns=[
@@ -2467,13 +2731,11 @@ def ingredient_page_layout():
                                                 "source",
                                             ]
                                         ],
-                                        # data=new_products_detail_df.to_dict(
-                                        #     'records'),  # the contents of the table
                                         editable=False,  # allow editing of data inside all cells
                                         # allow filtering of data by user ('native') or not ('none')
-                                        filter_action="native",
+                                        filter_action="custom",
                                         # enables data to be sorted per-column by user or not ('none')
-                                        sort_action="native",
+                                        sort_action="custom",
                                         sort_mode="single",  # sort across 'multi' or 'single' columns
                                         # column_selectable="multi",  # allow users to select 'multi' or 'single' columns
                                         # row_selectable="multi",     # allow users to select 'multi' or 'single' rows
@@ -2481,10 +2743,10 @@ def ingredient_page_layout():
                                         row_deletable=False,
                                         selected_columns=[],  # ids of columns that user selects
                                         selected_rows=[],  # indices of rows that user selects
-                                        # all data is passed to the table up-front or not ('none')
-                                        page_action="native",
-                                        # page_current=0,  # page number that user is on
-                                        # page_size=0,  # number of rows visible per page
+                                        # rows are filtered, sorted and paged on the server (bte_datatable)
+                                        page_action="custom",
+                                        page_current=0,
+                                        page_size=DATATABLE_PAGE_SIZE,
                                         style_cell={  # ensure adequate header width when text is shorter than cell's text
                                             "minWidth": 80,
                                             "maxWidth": 80,
@@ -2701,13 +2963,11 @@ def ingredient_page_layout():
                                     }
                                     for i in ["ingredient", "product_name"]
                                 ],
-                                # data=new_products_detail_df.to_dict(
-                                #     'records'),  # the contents of the table
                                 editable=False,  # allow editing of data inside all cells
                                 # allow filtering of data by user ('native') or not ('none')
-                                filter_action="native",
+                                filter_action="custom",
                                 # enables data to be sorted per-column by user or not ('none')
-                                sort_action="native",
+                                sort_action="custom",
                                 sort_mode="single",  # sort across 'multi' or 'single' columns
                                 # column_selectable="multi",  # allow users to select 'multi' or 'single' columns
                                 # row_selectable="multi",     # allow users to select 'multi' or 'single' rows
@@ -2715,8 +2975,10 @@ def ingredient_page_layout():
                                 row_deletable=False,
                                 selected_columns=[],  # ids of columns that user selects
                                 selected_rows=[],  # indices of rows that user selects
-                                # all data is passed to the table up-front or not ('none')
-                                page_action="none",
+                                # rows are filtered, sorted and paged on the server (bte_datatable)
+                                page_action="custom",
+                                page_current=0,
+                                page_size=DATATABLE_PAGE_SIZE,
                                 style_cell={  # ensure adequate header width when text is shorter than cell's text
                                     "minWidth": 80,
                                     "maxWidth": 80,
@@ -2773,13 +3035,11 @@ def ingredient_page_layout():
                                         "product_name",
                                     ]
                                 ],
-                                # data=new_products_detail_df.to_dict(
-                                #     'records'),  # the contents of the table
                                 editable=False,  # allow editing of data inside all cells
                                 # allow filtering of data by user ('native') or not ('none')
-                                filter_action="native",
+                                filter_action="custom",
                                 # enables data to be sorted per-column by user or not ('none')
-                                sort_action="native",
+                                sort_action="custom",
                                 sort_mode="single",  # sort across 'multi' or 'single' columns
                                 # column_selectable="multi",  # allow users to select 'multi' or 'single' columns
                                 # row_selectable="multi",     # allow users to select 'multi' or 'single' rows
@@ -2787,8 +3047,10 @@ def ingredient_page_layout():
                                 row_deletable=False,
                                 selected_columns=[],  # ids of columns that user selects
                                 selected_rows=[],  # indices of rows that user selects
-                                # all data is passed to the table up-front or not ('none')
-                                page_action="none",
+                                # rows are filtered, sorted and paged on the server (bte_datatable)
+                                page_action="custom",
+                                page_current=0,
+                                page_size=DATATABLE_PAGE_SIZE,
                                 style_cell={  # ensure adequate header width when text is shorter than cell's text
                                     "minWidth": 60,
                                     "maxWidth": 60,
@@ -2843,27 +3105,11 @@ def mark_digit(d):
 # Ingredient Page Callbacks
 
 
-@app.callback(
+app.clientside_callback(
+    ClientsideFunction(namespace="bte", function_name="selectedIngredientCategory"),
     Output("ing_page_click_data_text", "children"),
-    [
-        Input("ing_page_ing_cat_presence", "clickData"),
-    ],
+    [Input("ing_page_ing_cat_presence", "clickData")],
 )
-def display_click_data_ing_page(clickData) -> str:
-    """display_click_data_product_trend [summary]
-
-    [extended_summary]
-
-    Args:
-        clickData (json): clicked web element information
-
-    Returns:
-        str: Category Name
-    """
-    if clickData is not None:
-        return f"Selected Category: {clickData['points'][0]['customdata'][0]}"
-    else:
-        return "Click on the bar of a Category to display ingredient distribution over Subcategories under it."
 
 
 @app.callback(
@@ -2886,12 +3132,14 @@ def update_ing_page_category_count_figure(ingredient: str, clickData):
         category = clickData["points"][0]["customdata"][0]
 
         data = (
-            ing_page_ing_df[
-                (ing_page_ing_df.category == category)
-                & (ing_page_ing_df.ingredient == ingredient)
-            ][["product_name", "product_type"]]
-            .groupby(by=["product_type"])
+            ing_page_ing.where(
+                ["product_name", "product_type"],
+                category=category,
+                ingredient=ingredient,
+            )
+            .groupby(by=["product_type"], observed=True)
             .product_name.size()
+            .sort_index()
             .reset_index()
         )
         data.columns = ["product_type", "product_count"]
@@ -2922,11 +3170,10 @@ def update_ing_page_category_count_figure(ingredient: str):
     """
     if ingredient:
         data = (
-            ing_page_ing_df[["product_name", "category"]][
-                ing_page_ing_df.ingredient == ingredient
-            ]
-            .groupby(by=["category"])
+            ing_page_ing.where(["product_name", "category"], ingredient=ingredient)
+            .groupby(by=["category"], observed=True)
             .product_name.size()
+            .sort_index()
             .reset_index()
         )
         data.columns = ["category", "product_count"]
@@ -2939,20 +3186,10 @@ def update_ing_page_category_count_figure(ingredient: str):
     return {}
 
 
-@app.callback(
-    Output("ing_page_new_ing_table", "data"),
-    [
-        Input("ing_page_source", "value"),
-        Input("ing_page_category", "value"),
-        Input("ing_page_product_type", "value"),
-    ],
-)
-def update_ing_page_new_ing_table(
-    source: str, category: str, product_type: str
-) -> list:
-    """update_ing_page_new_ing_table [summary]
-
-    [extended_summary]
+@lru_cache(maxsize=32)
+@single_flight
+def ing_page_new_ing_frame(source: str, category: str, product_type: str) -> pd.DataFrame:
+    """ing_page_new_ing_frame builds the new ingredients table of a selection once for all its page requests.
 
     Args:
         source (str): [description]
@@ -2960,7 +3197,7 @@ def update_ing_page_new_ing_table(
         product_type (str): [description]
 
     Returns:
-        list: [description]
+        pd.DataFrame: new ingredients with the products containing them (read only, shared between requests).
     """
     new_ing = prod_page_ing_df[prod_page_ing_df.new_flag == "new_ingredient"][
         (prod_page_ing_df.source == source)
@@ -2969,86 +3206,249 @@ def update_ing_page_new_ing_table(
     ][["ingredient", "ingredient_type", "product_name"]]
     for col in new_ing.columns:
         new_ing[col] = new_ing[col].astype(str)
-    new_ing = (
+    return (
         new_ing.groupby(by=["ingredient", "ingredient_type"])
         .product_name.apply(", ".join)
         .reset_index()
     )
 
-    return new_ing.to_dict("records")
+
+@lru_cache(maxsize=32)
+@single_flight
+def ing_page_banned_ing_frame(
+    source: str, category: str, product_type: str
+) -> pd.DataFrame:
+    """ing_page_banned_ing_frame builds the banned ingredients table of a selection once for all its page requests.
+
+    Args:
+        source (str): [description]
+        category (str): [description]
+        product_type (str): [description]
+
+    Returns:
+        pd.DataFrame: products with the banned ingredients they contain (read only, shared between requests).
+    """
+    ban_ing = ing_page_ing.where(
+        ["ingredient", "product_name"],
+        ban_flag="yes",
+        source=source,
+        category=category,
+        product_type=product_type,
+    ).drop_duplicates()
+    ban_ing.product_name = ban_ing.product_name.astype("str")
+    ban_ing.reset_index(inplace=True, drop=True)
+    return ban_ing.groupby("product_name").ingredient.apply(", ".join).reset_index()
+
+
+@lru_cache(maxsize=32)
+@single_flight
+def ing_page_product_frame(ingredient: str) -> pd.DataFrame:
+    """ing_page_product_frame lists the products containing an ingredient once for all its page requests.
+
+    Args:
+        ingredient (str): [description]
+
+    Returns:
+        pd.DataFrame: products containing the ingredient (read only, shared between requests).
+    """
+    return (
+        ing_page_ing.where(
+            ["product_name", "product_type", "category", "source"],
+            ingredient=ingredient,
+        )
+        .drop_duplicates()
+        .sort_values("source", ascending=False)
+    )
+
+
+@app.callback(
+    [
+        Output("ing_page_new_ing_table", "page_current"),
+        Output("ing_page_banned_ing_table", "page_current"),
+    ],
+    [
+        Input("ing_page_product_type", "value"),
+    ],
+    [State("ing_page_source", "value"), State("ing_page_category", "value")],
+)
+def reset_ing_page_tables_page(product_type: str, source: str, category: str):
+    """reset_ing_page_tables_page sends the ingredient tables back to their first page on a new selection."""
+    return 0, 0
+
+
+@app.callback(
+    Output("ing_page_prod_search_table", "page_current"),
+    [Input("ing_page_ing", "value")],
+)
+def reset_ing_page_product_table_page(ingredient: str) -> int:
+    """reset_ing_page_product_table_page sends the product search table back to its first page on a new ingredient."""
+    return 0
+
+
+@app.callback(
+    [
+        Output("ing_page_new_ing_table", "data"),
+        Output("ing_page_new_ing_table", "page_count"),
+    ],
+    [
+        Input("ing_page_product_type", "value"),
+        Input("ing_page_new_ing_table", "page_current"),
+        Input("ing_page_new_ing_table", "page_size"),
+        Input("ing_page_new_ing_table", "sort_by"),
+        Input("ing_page_new_ing_table", "filter_query"),
+    ],
+    [State("ing_page_source", "value"), State("ing_page_category", "value")],
+)
+def update_ing_page_new_ing_table(
+    product_type: str,
+    page_current: int,
+    page_size: int,
+    sort_by: list,
+    filter_query: str,
+    source: str,
+    category: str,
+) -> Tuple[list, int]:
+    """update_ing_page_new_ing_table [summary]
+
+    [extended_summary]
+
+    Args:
+        product_type (str): [description]
+        page_current (int): page the table is on.
+        page_size (int): rows per page.
+        sort_by (list): columns the user sorted by.
+        filter_query (str): filter typed into the table.
+        source (str): [description]
+        category (str): [description]
+
+    Returns:
+        Tuple[list, int]: records of the page and page count.
+    """
+    data, page_count, _ = page_table(
+        ing_page_new_ing_frame(source, category, product_type),
+        page_current,
+        page_size,
+        sort_by,
+        filter_query,
+    )
+    return data, page_count
 
 
 @app.callback(
-    Output("ing_page_banned_ing_table", "data"),
     [
-        Input("ing_page_source", "value"),
-        Input("ing_page_category", "value"),
+        Output("ing_page_banned_ing_table", "data"),
+        Output("ing_page_banned_ing_table", "page_count"),
+    ],
+    [
         Input("ing_page_product_type", "value"),
+        Input("ing_page_banned_ing_table", "page_current"),
+        Input("ing_page_banned_ing_table", "page_size"),
+        Input("ing_page_banned_ing_table", "sort_by"),
+        Input("ing_page_banned_ing_table", "filter_query"),
     ],
+    [State("ing_page_source", "value"), State("ing_page_category", "value")],
 )
 def update_ing_page_banned_ing_table(
-    source: str, category: str, product_type: str
-) -> list:
+    product_type: str,
+    page_current: int,
+    page_size: int,
+    sort_by: list,
+    filter_query: str,
+    source: str,
+    category: str,
+) -> Tuple[list, int]:
     """update_ing_page_banned_ing_table [summary]
 
     [extended_summary]
 
     Args:
+        product_type (str): [description]
+        page_current (int): page the table is on.
+        page_size (int): rows per page.
+        sort_by (list): columns the user sorted by.
+        filter_query (str): filter typed into the table.
         source (str): [description]
         category (str): [description]
-        product_type (str): [description]
 
     Returns:
-        list: [description]
+        Tuple[list, int]: records of the page and page count.
     """
-    ban_ing = ing_page_ing_df[ing_page_ing_df.ban_flag == "yes"][
-        (ing_page_ing_df.source == source)
-        & (ing_page_ing_df.category == category)
-        & (ing_page_ing_df.product_type == product_type)
-    ][["ingredient", "product_name"]].drop_duplicates()
-    ban_ing.product_name = ban_ing.product_name.astype("str")
-    ban_ing.reset_index(inplace=True, drop=True)
-    ban_ing = ban_ing.groupby("product_name").ingredient.apply(
-        ", ".join).reset_index()
+    data, page_count, _ = page_table(
+        ing_page_banned_ing_frame(source, category, product_type),
+        page_current,
+        page_size,
+        sort_by,
+        filter_query,
+    )
+    return data, page_count
+
 
-    return ban_ing.to_dict("records")
+# rows per ingredient, to tell the ingredients whose product table is built in the background.
+ing_page_ingredient_rows = (
+    ing_page_ing.value_counts("ingredient") if BACKGROUND_JOBS else None
+)
 
 
-@app.callback(
-    Output("ing_page_prod_search_table", "data"),
-    [Input("ing_page_ing", "value")],
+@background_job_callback(
+    "ing_page_prod_search_table",
+    [
+        Output("ing_page_prod_search_table", "data"),
+        Output("ing_page_prod_search_table", "page_count"),
+    ],
+    [
+        Input("ing_page_ing", "value"),
+        Input("ing_page_prod_search_table", "page_current"),
+        Input("ing_page_prod_search_table", "page_size"),
+        Input("ing_page_prod_search_table", "sort_by"),
+        Input("ing_page_prod_search_table", "filter_query"),
+    ],
+    is_heavy=lambda ingredient, *table_state: ing_page_ingredient_rows.get(
+        ingredient, 0
+    )
+    > BACKGROUND_MIN_INGREDIENT_ROWS,
 )
-def update_ing_page_product_table(ingredient: str) -> list:
+def update_ing_page_product_table(
+    ingredient: str,
+    page_current: int,
+    page_size: int,
+    sort_by: list,
+    filter_query: str,
+) -> Tuple[list, int]:
     """update_ing_page_product_table [summary]
 
     [extended_summary]
 
     Args:
         ingredient (str): [description]
+        page_current (int): page the table is on.
+        page_size (int): rows per page.
+        sort_by (list): columns the user sorted by.
+        filter_query (str): filter typed into the table.
 
     Returns:
-        list: [description]
+        Tuple[list, int]: records of the page and page count.
     """
-    data = (
-        ing_page_ing_df[["product_name", "product_type", "category", "source"]][
-            ing_page_ing_df.ingredient == ingredient
-        ]
-        .drop_duplicates()
-        .sort_values("source", ascending=False)
+    products = ing_page_product_frame(ingredient)
+    report_progress(0.8, f"paging {len(products)} products")
+    data, page_count, _ = page_table(
+        products,
+        page_current,
+        page_size,
+        sort_by,
+        filter_query,
     )
-    return data.to_dict("records")
+    return data, page_count
 
 
 @app.callback(
     Output("ing_page_ing_type_fig", "figure"),
     [
-        Input("ing_page_source", "value"),
-        Input("ing_page_category", "value"),
         Input("ing_page_product_type", "value"),
     ],
+    [State("ing_page_source", "value"), State("ing_page_category", "value")],
 )
 def update_ing_page_ingredient_type_figure(
-    source: str, category: str, product_type: str
+    product_type: str, source: str, category: str
 ) -> go.Figure:
     from bte_ingredient_page_data_and_plots import (
         create_ing_page_ingredient_type_figure,
@@ -3066,22 +3466,21 @@ def update_ing_page_ingredient_type_figure(
         Output("banned_ing_text", "children"),
     ],
     [
-        Input("ing_page_source", "value"),
-        Input("ing_page_category", "value"),
         Input("ing_page_product_type", "value"),
     ],
+    [State("ing_page_source", "value"), State("ing_page_category", "value")],
 )
 def update_ing_page_ing_analysis_text(
-    source: str, category: str, product_type: str
+    product_type: str, source: str, category: str
 ) -> Tuple[str, str, str, str]:
     """update_text [summary]
 
     [extended_summary]
 
     Args:
+        product_type (str): [description]
         source (str): [description]
         category (str): [description]
-        product_type (str): [description]
 
     Returns:
         Tuple[str, str, str, str]: [description]
@@ -3092,74 +3491,84 @@ def update_ing_page_ing_analysis_text(
         & (prod_page_ing_df.product_type == product_type)
     ].ingredient.nunique()
 
-    dist_ing = ing_page_ing_df[
-        (ing_page_ing_df.source == source)
-        & (ing_page_ing_df.category == category)
-        & (ing_page_ing_df.product_type == product_type)
-    ].ingredient.nunique()
+    dist_ing = ing_page_ing.where(
+        ["ingredient"], source=source, category=category, product_type=product_type
+    ).ingredient.nunique()
 
-    ban_ing = ing_page_ing_df[ing_page_ing_df.ban_flag == "yes"][
-        (ing_page_ing_df.source == source)
-        & (ing_page_ing_df.category == category)
-        & (ing_page_ing_df.product_type == product_type)
-    ].ingredient.nunique()
+    ban_ing = ing_page_ing.where(
+        ["ingredient"],
+        ban_flag="yes",
+        source=source,
+        category=category,
+        product_type=product_type,
+    ).ingredient.nunique()
 
     return new_ing, dist_ing, ban_ing
 
 
 @app.callback(
-    Output("ing_page_product_type", "options"),
+    [
+        Output("ing_page_product_type", "options"),
+        Output("ing_page_product_type", "value"),
+    ],
     [Input("ing_page_source", "value"), Input("ing_page_category", "value")],
 )
-def set_ing_page_product_type_options(source: str, category: str):
-    return [
+def set_ing_page_product_type_options_and_value(source: str, category: str):
+    """set_ing_page_product_type_options_and_value sets the product types of the selection and picks the first.
+
+    Options and value are produced together, so the ingredient page figures and tables
+    (which read source and category as State) fire once per consistent selection.
+    """
+    options = [
         {"label": i, "value": i}
-        for i in ing_page_ing_df.product_type[
-            (ing_page_ing_df.source == source) & (
-                ing_page_ing_df.category == category)
-        ]
-        .unique()
+        for i in ing_page_ing.where(["product_type"], source=source, category=category)
+        .product_type.unique()
         .tolist()
     ]
+    return options, options[0]["value"]
 
 
-@app.callback(
-    Output("ing_page_product_type", "value"),
-    [
-        Input("ing_page_source", "value"),
-        Input("ing_page_category", "value"),
-        Input("ing_page_product_type", "options"),
-    ],
-)
-def set_ing_page_product_type_value(source, category, available_options):
-    return available_options[0]["value"]
+# Product Page Callbacks
+# in adaptive time series rendering, zooming a time series re-samples the visible window on the server.
+TimeseriesRelayout = Input if TIMESERIES_RENDERING == "adaptive" else State
+
+
+def timeseries_x_range(figure_id: str, relayout_data: dict):
+    """timeseries_x_range returns the zoomed x range of a time series, None unless its own zoom triggered the callback.
+
+    Raises:
+        PreventUpdate: the relayout event did not touch the x axis (e.g. autosize on first draw).
+    """
+    triggered = [t["prop_id"] for t in dash.callback_context.triggered]
+    if f"{figure_id}.relayoutData" not in triggered:
+        return None
+    if not is_x_relayout(relayout_data):
+        raise PreventUpdate
+    return relayout_x_range(relayout_data)
 
 
-# Product Page Callbacks
 @app.callback(
     Output("prod_page_ingredients", "data"),
     [
-        Input("prod_page_source", "value"),
         Input("prod_page_product", "value"),
     ],
+    [State("prod_page_source", "value")],
 )
-def update_prod_page_product_ingredients_table(source: str, prod_id: str) -> list:
+def update_prod_page_product_ingredients_table(prod_id: str, source: str) -> list:
     """update_prod_page_product_ingredients_table [summary]
 
     [extended_summary]
 
     Args:
-        source (str): [description]
         prod_id (str): [description]
+        source (str): [description]
 
     Returns:
         list: [description]
     """
-    data = prod_page_ing_df[["ingredient", "ingredient_type", "ban_flag", "new_flag"]][
-        prod_page_ing_df.prod_id == prod_id
-    ]
-
-    data.sort_values(by="ingredient", inplace=True, ascending=True)
+    data = get_product_context(source, prod_id).ingredients[
+        ["ingredient", "ingredient_type", "ban_flag", "new_flag"]
+    ].sort_values(by="ingredient", ascending=True)
 
     return data.to_dict("records")
 
@@ -3167,48 +3576,37 @@ def update_prod_page_product_ingredients_table(source: str, prod_id: str) -> lis
 @app.callback(
     Output("prod_page_product_variants", "data"),
     [
-        Input("prod_page_source", "value"),
         Input("prod_page_product", "value"),
         Input("prod_page_review_month_range", "start_date"),
         Input("prod_page_review_month_range", "end_date"),
     ],
+    [State("prod_page_source", "value")],
 )
 def update_prod_page_product_variants_table(
-    source: str, prod_id: str, start_date: str, end_date: str
+    prod_id: str, start_date: str, end_date: str, source: str
 ) -> list:
     """update_prod_page_product_variants_table [summary]
 
     [extended_summary]
 
     Args:
-        source (str): [description]
         prod_id (str): [description]
         start_date (str): [description]
         end_date (str): [description]
+        source (str): [description]
 
     Returns:
         list: [description]
     """
-    if start_date is not None:
-        start_date = dt.strptime(re.split("T| ", start_date)[0], "%Y-%m-%d")
-        start_date_string = start_date.strftime("%Y-%m-%d")
-    else:
-        start_date_string = default_start_date
-
-    if end_date is not None:
-        end_date = dt.strptime(re.split("T| ", end_date)[0], "%Y-%m-%d")
-        end_date_string = end_date.strftime("%Y-%m-%d")
-    else:
-        end_date_string = default_end_date
-
-    data = prod_page_item_df[
-        (prod_page_item_df.prod_id == prod_id)
-        & (prod_page_item_df.meta_date >= start_date_string)
-        & (prod_page_item_df.meta_date <= end_date_string)
-    ]
-    data = data[(data.meta_date == data[data.prod_id == prod_id].meta_date.max())]
+    start_date_string, end_date_string = parse_date_range(
+        start_date, end_date, default_start_date, default_end_date
+    )
+    context = get_product_context_in_date_range(
+        source, prod_id, start_date_string, end_date_string
+    )
 
-    data.sort_values(by="item_size", inplace=True, ascending=False)
+    data = context.items[context.items.meta_date == context.items.meta_date.max()]
+    data = data.sort_values(by="item_size", ascending=False)
 
     return data.to_dict("records")
 
@@ -3216,34 +3614,27 @@ def update_prod_page_product_variants_table(
 @app.callback(
     Output("prod_page_price_variation", "figure"),
     [
-        Input("prod_page_source", "value"),
         Input("prod_page_product", "value"),
         Input("prod_page_review_month_range", "start_date"),
         Input("prod_page_review_month_range", "end_date"),
+        TimeseriesRelayout("prod_page_price_variation", "relayoutData"),
     ],
+    [State("prod_page_source", "value")],
 )
 def update_prod_page_item_price_figure(
-    source: str, prod_id: str, start_date: str, end_date: str
+    prod_id: str, start_date: str, end_date: str, relayout_data: dict, source: str
 ) -> go.Figure:
-    if start_date is not None:
-        start_date = dt.strptime(re.split("T| ", start_date)[0], "%Y-%m-%d")
-        start_date_string = start_date.strftime("%Y-%m-%d")
-    else:
-        start_date_string = default_start_date
-
-    if end_date is not None:
-        end_date = dt.strptime(re.split("T| ", end_date)[0], "%Y-%m-%d")
-        end_date_string = end_date.strftime("%Y-%m-%d")
-    else:
-        end_date_string = default_end_date
-
-    data = prod_page_item_price_df[
-        (prod_page_item_price_df.prod_id == prod_id)
-        & (prod_page_item_price_df.meta_date >= start_date_string)
-        & (prod_page_item_price_df.meta_date <= end_date_string)
-    ]
+    x_range = timeseries_x_range("prod_page_price_variation", relayout_data)
+    start_date_string, end_date_string = parse_date_range(
+        start_date, end_date, default_start_date, default_end_date
+    )
+    context = get_product_context_in_date_range(
+        source, prod_id, start_date_string, end_date_string
+    )
 
-    fig = create_prod_page_item_price_figure(data)
+    fig = create_prod_page_item_price_figure(context.item_prices, x_range=x_range)
+    # keeps the user's zoom while the zoomed window is re-sampled
+    fig.update_layout(uirevision=f"{prod_id}:{start_date_string}:{end_date_string}")
 
     return fig
 
@@ -3257,41 +3648,26 @@ def update_prod_page_item_price_figure(
         Output("prod_dist_ing", "children"),
     ],
     [
-        Input("prod_page_source", "value"),
         Input("prod_page_product", "value"),
     ],
+    [State("prod_page_source", "value")],
 )
-def display_prod_page_price_data(source: str, prod_id: str) -> Tuple[str, str, str]:
+def display_prod_page_price_data(prod_id: str, source: str) -> Tuple[str, str, str]:
     """display_prod_page_price_data [summary]
 
     [extended_summary]
 
     Args:
-        source (str): [description]
         prod_id (str): [description]
+        source (str): [description]
 
     Returns:
         Tuple[str, str, str]: [description]
     """
-    prices = prod_page_item_price_df[
-        (
-            prod_page_item_price_df.meta_date
-            == prod_page_item_price_df[
-                prod_page_item_price_df.source == source
-            ].meta_date.max()
-        )
-        & (prod_page_item_price_df.source == source)
-        & (prod_page_item_price_df.prod_id == prod_id)
-    ].item_price.tolist()
-
-    status = prod_page_metadetail_data_df.new_flag[
-        (prod_page_metadetail_data_df.source == source)
-        & (prod_page_metadetail_data_df.prod_id == prod_id)
-    ].values[0]
-
-    dist_ing = prod_page_ing_df[
-        prod_page_ing_df.prod_id == prod_id
-    ].ingredient.nunique()
+    context = get_product_context(source, prod_id)
+    prices = context.latest_prices
+    status = context.metadetail.new_flag
+    dist_ing = context.ingredients.ingredient.nunique()
 
     if source == "us":
         currency = "$"
@@ -3309,56 +3685,46 @@ def display_prod_page_price_data(source: str, prod_id: str) -> Tuple[str, str, s
 @app.callback(
     Output("prod_page_reviews_by_stars", "figure"),
     [
-        Input("prod_page_source", "value"),
         Input("prod_page_product", "value"),
         Input("prod_page_review_month_range", "start_date"),
         Input("prod_page_review_month_range", "end_date"),
     ],
+    [State("prod_page_source", "value")],
 )
 def update_prod_page_reviews_distribution_figure(
-    source: str, prod_id: str, start_date: str, end_date: str
+    prod_id: str, start_date: str, end_date: str, source: str
 ) -> Tuple[go.Figure, go.Figure]:
-    if start_date is not None:
-        start_date = dt.strptime(re.split("T| ", start_date)[0], "%Y-%m-%d")
-        start_date_string = start_date.strftime("%Y-%m-%d")
-    else:
-        start_date_string = default_start_date
-
-    if end_date is not None:
-        end_date = dt.strptime(re.split("T| ", end_date)[0], "%Y-%m-%d")
-        end_date_string = end_date.strftime("%Y-%m-%d")
-    else:
-        end_date_string = default_end_date
-
-    data = prod_page_review_sentiment_influence_df[
-        (prod_page_review_sentiment_influence_df.review_date >= start_date_string)
-        & (prod_page_review_sentiment_influence_df.review_date <= end_date_string)
-    ]
+    start_date_string, end_date_string = parse_date_range(
+        start_date, end_date, default_start_date, default_end_date
+    )
+    context = get_product_context_in_date_range(
+        source, prod_id, start_date_string, end_date_string
+    )
 
     star_fig = create_prod_page_reviews_distribution_figure(
-        data=data, prod_id=prod_id)
+        data=context.reviews, prod_id=prod_id)
     return star_fig
 
 
 @app.callback(
     Output("prod_page_reviews_by_attribute", "figure"),
     [
-        Input("prod_page_source", "value"),
         Input("prod_page_product", "value"),
         Input("prod_page_user_attribute", "value"),
     ],
+    [State("prod_page_source", "value")],
 )
 def update_prod_page_reviews_by_user_attribute_figure(
-    source: str, prod_id: str, user_attribute: str
+    prod_id: str, user_attribute: str, source: str
 ) -> go.Figure:
     """update_prod_page_reviews_by_user_attribute_figure [summary]
 
     [extended_summary]
 
     Args:
-        source (str): [description]
         prod_id (str): [description]
         user_attribute (str): [description]
+        source (str): [description]
 
     Returns:
         go.Figure: [description]
@@ -3370,66 +3736,62 @@ def update_prod_page_reviews_by_user_attribute_figure(
 
 
 @app.callback(
-    dash.dependencies.Output(
-        "prod-page-output-container-date-picker-range", "children"
-    ),
     [
-        dash.dependencies.Input("prod_page_review_month_range", "start_date"),
-        dash.dependencies.Input("prod_page_review_month_range", "end_date"),
+        Output("review_sentiment_timeseries", "figure"),
+        Output("review_influenced_timeseries", "figure"),
     ],
-)
-def date_selection_text(start_date: str, end_date: str) -> str:
-    """date_selection_text [summary]
-
-    [extended_summary]
-
-    Args:
-        start_date (str): [description]
-        end_date (str): [description]
-
-    Returns:
-        str: [description]
-    """
-    return "Minimum start date is 12/01/2008. \n You can write in MM/DD/YYYY format in the date box to filter."
-
-
-@app.callback(
     [
-        Output("review_sentiment_timeseries", "figure"),
-        Output("review_influenced_timeseries", "figure"),
-    ],
-    [
-        Input("prod_page_source", "value"),
         Input("prod_page_product", "value"),
         Input("prod_page_review_month_range", "start_date"),
         Input("prod_page_review_month_range", "end_date"),
+        TimeseriesRelayout("review_sentiment_timeseries", "relayoutData"),
+        TimeseriesRelayout("review_influenced_timeseries", "relayoutData"),
     ],
+    [State("prod_page_source", "value")],
 )
 def update_prod_page_review_timeseries_figure(
-    source: str, prod_id: str, start_date: str, end_date: str
+    prod_id: str,
+    start_date: str,
+    end_date: str,
+    sentiment_relayout_data: dict,
+    influenced_relayout_data: dict,
+    source: str,
 ) -> Tuple[go.Figure, go.Figure]:
-    if start_date is not None:
-        start_date = dt.strptime(re.split("T| ", start_date)[0], "%Y-%m-%d")
-        start_date_string = start_date.strftime("%Y-%m-%d")
-    else:
-        start_date_string = default_start_date
-
-    if end_date is not None:
-        end_date = dt.strptime(re.split("T| ", end_date)[0], "%Y-%m-%d")
-        end_date_string = end_date.strftime("%Y-%m-%d")
-    else:
-        end_date_string = default_end_date
-
-    data = prod_page_review_sentiment_influence_df[
-        (prod_page_review_sentiment_influence_df.review_date >= start_date_string)
-        & (prod_page_review_sentiment_influence_df.review_date <= end_date_string)
+    sent_x_range = timeseries_x_range(
+        "review_sentiment_timeseries", sentiment_relayout_data
+    )
+    inf_x_range = timeseries_x_range(
+        "review_influenced_timeseries", influenced_relayout_data
+    )
+    start_date_string, end_date_string = parse_date_range(
+        start_date, end_date, default_start_date, default_end_date
+    )
+    context = get_product_context_in_date_range(
+        source, prod_id, start_date_string, end_date_string
+    )
+    uirevision = f"{prod_id}:{start_date_string}:{end_date_string}"
+    # a zoom re-samples only the zoomed chart
+    zoomed = [
+        t["prop_id"].split(".")[0]
+        for t in dash.callback_context.triggered
+        if t["prop_id"].endswith(".relayoutData")
     ]
 
-    sent_fig = create_prod_page_review_timeseries_figure(
-        data, prod_id, "sentiment")
-    inf_fig = create_prod_page_review_timeseries_figure(
-        data, prod_id, "is_influenced")
-    return sent_fig, inf_fig
+    figs = []
+    for figure_id, col, x_range in [
+        ("review_sentiment_timeseries", "sentiment", sent_x_range),
+        ("review_influenced_timeseries", "is_influenced", inf_x_range),
+    ]:
+        if zoomed and figure_id not in zoomed:
+            figs.append(dash.no_update)
+            continue
+        fig = create_prod_page_review_timeseries_figure(
+            context.reviews, prod_id, col, x_range=x_range
+        )
+        if isinstance(fig, go.Figure):
+            fig.update_layout(uirevision=uirevision)
+        figs.append(fig)
+    return tuple(figs)
 
 
 @app.callback(
@@ -3438,41 +3800,26 @@ def update_prod_page_review_timeseries_figure(
         Output("review_influenced_breakdown", "figure"),
     ],
     [
-        Input("prod_page_source", "value"),
         Input("prod_page_product", "value"),
         Input("prod_page_review_month_range", "start_date"),
         Input("prod_page_review_month_range", "end_date"),
     ],
+    [State("prod_page_source", "value")],
 )
 def update_prod_page_review_breakdown_figure(
-    source: str, prod_id: str, start_date: str, end_date: str
+    prod_id: str, start_date: str, end_date: str, source: str
 ) -> Tuple[go.Figure, go.Figure]:
-    from bte_product_page_data_and_plots import (
-        create_prod_page_review_breakdown_figure,
-        prod_page_review_sentiment_influence_df,
+    start_date_string, end_date_string = parse_date_range(
+        start_date, end_date, default_start_date, default_end_date
+    )
+    context = get_product_context_in_date_range(
+        source, prod_id, start_date_string, end_date_string
     )
-
-    if start_date is not None:
-        start_date = dt.strptime(re.split("T| ", start_date)[0], "%Y-%m-%d")
-        start_date_string = start_date.strftime("%Y-%m-%d")
-    else:
-        start_date_string = default_start_date
-
-    if end_date is not None:
-        end_date = dt.strptime(re.split("T| ", end_date)[0], "%Y-%m-%d")
-        end_date_string = end_date.strftime("%Y-%m-%d")
-    else:
-        end_date_string = default_end_date
-
-    data = prod_page_review_sentiment_influence_df[
-        (prod_page_review_sentiment_influence_df.review_date >= start_date_string)
-        & (prod_page_review_sentiment_influence_df.review_date <= end_date_string)
-    ]
 
     sent_fig = create_prod_page_review_breakdown_figure(
-        data, prod_id, "sentiment")
+        context.reviews, prod_id, "sentiment")
     inf_fig = create_prod_page_review_breakdown_figure(
-        data, prod_id, "is_influenced")
+        context.reviews, prod_id, "is_influenced")
     return sent_fig, inf_fig
 
 
@@ -3481,19 +3828,16 @@ def update_prod_page_review_breakdown_figure(
         Output("pos_talking_points_fig", "figure"),
         Output("neg_talking_points_fig", "figure"),
     ],
-    [Input("prod_page_source", "value"), Input("prod_page_product", "value")],
+    [Input("prod_page_product", "value")],
+    [State("prod_page_source", "value")],
 )
-def update_prod_page_review_talking_points_figure(source: str, prod_id: str):
-    from bte_product_page_data_and_plots import (
-        create_prod_page_review_talking_points_figure,
-        prod_page_review_talking_points_df,
-    )
-
+def update_prod_page_review_talking_points_figure(prod_id: str, source: str):
+    talking_points = get_product_context(source, prod_id).talking_points
     pos_fig = create_prod_page_review_talking_points_figure(
-        prod_page_review_talking_points_df, prod_id, "pos_talking_points"
+        talking_points, prod_id, "pos_talking_points"
     )
     neg_fig = create_prod_page_review_talking_points_figure(
-        prod_page_review_talking_points_df, prod_id, "neg_talking_points"
+        talking_points, prod_id, "neg_talking_points"
     )
     return pos_fig, neg_fig
 
@@ -3504,45 +3848,27 @@ def update_prod_page_review_talking_points_figure(source: str, prod_id: str):
         Output("neg_review_sum", "children"),
     ],
     [
-        Input("prod_page_source", "value"),
         Input("prod_page_product", "value"),
     ],
+    [State("prod_page_source", "value")],
 )
-def display_product_page_category(source: str, prod_id: str):
-    if (
-        len(
-            prod_page_review_sum_df.pos_review_summary[
-                prod_page_review_sum_df.prod_id == prod_id
-            ]
-        )
-        > 0
-    ):
-        pos_sum = prod_page_review_sum_df.pos_review_summary[
-            prod_page_review_sum_df.prod_id == prod_id
-        ].values[0]
+def display_product_page_review_summary(prod_id: str, source: str):
+    review_summary = get_product_context(source, prod_id).review_summary
+    if len(review_summary) > 0:
+        pos_sum = review_summary.pos_review_summary.values[0]
+        neg_sum = review_summary.neg_review_summary.values[0]
     else:
         pos_sum = ""
-    if (
-        len(
-            prod_page_review_sum_df.neg_review_summary[
-                prod_page_review_sum_df.prod_id == prod_id
-            ]
-        )
-        > 0
-    ):
-        neg_sum = prod_page_review_sum_df.neg_review_summary[
-            prod_page_review_sum_df.prod_id == prod_id
-        ].values[0]
-    else:
         neg_sum = ""
     return pos_sum, neg_sum
 
 
 @app.callback(
     Output("prod_page_product_image", "src"),
-    [Input("prod_page_source", "value"), Input("prod_page_product", "value")],
+    [Input("prod_page_product", "value")],
+    [State("prod_page_source", "value")],
 )
-def update_prod_page_img_src(source: str, prod_id: str):
+def update_prod_page_img_src(prod_id: str, source: str):
     # commented by Arnold #
     # return image URL strictly from read_image_s3 #
     # prod_img_path = read_image_s3(prod_id=prod_id)
@@ -3560,53 +3886,28 @@ def update_prod_page_img_src(source: str, prod_id: str):
         Output("prod_page_product_first_review_date", "children"),
     ],
     [
-        Input("prod_page_source", "value"),
         Input("prod_page_product", "value"),
         Input("prod_page_review_month_range", "start_date"),
         Input("prod_page_review_month_range", "end_date"),
     ],
+    [State("prod_page_source", "value")],
 )
 def display_product_data_in_card(
-    source: str, prod_id: str, start_date: str, end_date: str
+    prod_id: str, start_date: str, end_date: str, source: str
 ):
-    if start_date is not None:
-        start_date = dt.strptime(re.split("T| ", start_date)[0], "%Y-%m-%d")
-        start_date_string = start_date.strftime("%Y-%m-%d")
-    else:
-        start_date_string = default_start_date
-
-    if end_date is not None:
-        end_date = dt.strptime(re.split("T| ", end_date)[0], "%Y-%m-%d")
-        end_date_string = end_date.strftime("%Y-%m-%d")
-    else:
-        end_date_string = default_end_date
-    prod_name = prod_page_metadetail_data_df.product_name[
-        (prod_page_metadetail_data_df.source == source)
-        & (prod_page_metadetail_data_df.prod_id == prod_id)
-    ].values[0]
-    brand_name = prod_page_metadetail_data_df.brand[
-        (prod_page_metadetail_data_df.source == source)
-        & (prod_page_metadetail_data_df.prod_id == prod_id)
-    ].values[0]
-    reviews = prod_page_review_sentiment_influence_df[
-        (prod_page_review_sentiment_influence_df.prod_id == prod_id)
-        & (prod_page_review_sentiment_influence_df.review_date >= start_date_string)
-        & (prod_page_review_sentiment_influence_df.review_date <= end_date_string)
-    ].shape[0]
-    adjusted_rating = prod_page_metadetail_data_df.adjusted_rating[
-        (prod_page_metadetail_data_df.source == source)
-        & (prod_page_metadetail_data_df.prod_id == prod_id)
-    ].values[0]
-    first_review_date = prod_page_metadetail_data_df.first_review_date[
-        (prod_page_metadetail_data_df.source == source)
-        & (prod_page_metadetail_data_df.prod_id == prod_id)
-    ].values[0]
+    start_date_string, end_date_string = parse_date_range(
+        start_date, end_date, default_start_date, default_end_date
+    )
+    context = get_product_context_in_date_range(
+        source, prod_id, start_date_string, end_date_string
+    )
+    metadetail = context.metadetail
     return (
-        f"Brand: {brand_name}",
-        f"Product Name: {prod_name}",
-        f"Product Reviews: {reviews}",
-        f"Product Rating: {adjusted_rating}",
-        f"First Review Date: {first_review_date}",
+        f"Brand: {metadetail.brand}",
+        f"Product Name: {metadetail.product_name}",
+        f"Product Reviews: {context.reviews.shape[0]}",
+        f"Product Rating: {metadetail.adjusted_rating}",
+        f"First Review Date: {metadetail.first_review_date}",
     )
 
 
@@ -3615,26 +3916,25 @@ def display_product_data_in_card(
         Output("prod_page_category", "children"),
         Output("prod_page_subcategory", "children"),
     ],
-    [Input("prod_page_source", "value"), Input("prod_page_product", "value")],
+    [Input("prod_page_product", "value")],
+    [State("prod_page_source", "value")],
 )
-def display_product_page_category(source: str, prod_id: str):
-    category = prod_page_metadetail_data_df.category[
-        (prod_page_metadetail_data_df.source == source)
-        & (prod_page_metadetail_data_df.prod_id == prod_id)
-    ].values[0]
-    product_type = prod_page_metadetail_data_df.product_type[
-        (prod_page_metadetail_data_df.source == source)
-        & (prod_page_metadetail_data_df.prod_id == prod_id)
-    ].values[0]
-    return category, product_type
+def display_product_page_category(prod_id: str, source: str):
+    metadetail = get_product_context(source, prod_id).metadetail
+    return metadetail.category, metadetail.product_type
 
 
 @app.callback(
-    Output("prod_page_product", "options"), [
-        Input("prod_page_source", "value")]
+    [Output("prod_page_product", "options"), Output("prod_page_product", "value")],
+    [Input("prod_page_source", "value")],
 )
-def set_product_page_product_options(source: str):
-    return sorted(
+def set_product_page_product_options_and_value(source: str):
+    """set_product_page_product_options_and_value sets the products of the source and picks the default one.
+
+    Options and value are produced together, so the product page callbacks (which read
+    the source as State) fire once per consistent selection.
+    """
+    options = sorted(
         [
             {"label": i[0], "value": i[1]}
             for i in prod_page_metadetail_data_df[["product_name", "prod_id"]][
@@ -3643,15 +3943,7 @@ def set_product_page_product_options(source: str):
         ],
         key=lambda k: k["label"],
     )
-
-
-@app.callback(
-    Output("prod_page_product", "value"),
-    [Input("prod_page_source", "value"), Input(
-        "prod_page_product", "options")],
-)
-def set_product_page_product_value(source, available_options):
-    return available_options[10]["value"]
+    return options, options[10]["value"]
 
 
 # Category Page Callbacks
@@ -3660,24 +3952,23 @@ def set_product_page_product_value(source, available_options):
 @app.callback(
     Output("cat_page_reviews_by_attribute", "figure"),
     [
-        Input("cat_page_source", "value"),
-        Input("cat_page_category", "value"),
         Input("cat_page_product_type", "value"),
         Input("cat_page_user_attribute", "value"),
     ],
+    [State("cat_page_source", "value"), State("cat_page_category", "value")],
 )
 def update_reviews_by_user_attribute_figure(
-    source: str, category: str, product_type: str, user_attribute: str
+    product_type: str, user_attribute: str, source: str, category: str
 ) -> go.Figure:
     """update_reviews_by_user_attribute_figure [summary]
 
     [extended_summary]
 
     Args:
-        source (str): [description]
-        category (str): [description]
         product_type (str): [description]
         user_attribute (str): [description]
+        source (str): [description]
+        category (str): [description]
 
     Returns:
         go.Figure: [description]
@@ -3693,73 +3984,128 @@ def update_reviews_by_user_attribute_figure(
 
 
 @app.callback(
-    Output("new_ingredients_data_table", "data"),
     [
-        Input("cat_page_source", "value"),
-        Input("cat_page_category", "value"),
+        Output("new_ingredients_data_table", "page_current"),
+        Output("new_products_data_table", "page_current"),
+        Output("top_products_data_table", "page_current"),
+        Output("product_package_data_table", "page_current"),
+    ],
+    [
         Input("cat_page_product_type", "value"),
     ],
+    [State("cat_page_source", "value"), State("cat_page_category", "value")],
+)
+def reset_category_page_tables_page(product_type: str, source: str, category: str):
+    """reset_category_page_tables_page sends the category page tables back to their first page on a new selection."""
+    return 0, 0, 0, 0
+
+
+@app.callback(
+    [
+        Output("new_ingredients_data_table", "data"),
+        Output("new_ingredients_data_table", "page_count"),
+    ],
+    [
+        Input("cat_page_product_type", "value"),
+        Input("new_ingredients_data_table", "page_current"),
+        Input("new_ingredients_data_table", "page_size"),
+        Input("new_ingredients_data_table", "sort_by"),
+        Input("new_ingredients_data_table", "filter_query"),
+    ],
+    [State("cat_page_source", "value"), State("cat_page_category", "value")],
 )
 def filter_new_ingredients_data_table(
-    source: str, category: str, product_type: str
-) -> pd.DataFrame:
+    product_type: str,
+    page_current: int,
+    page_size: int,
+    sort_by: list,
+    filter_query: str,
+    source: str,
+    category: str,
+) -> Tuple[list, int]:
     """filter_new_ingredients_data_table [summary]
 
     [extended_summary]
 
     Args:
+        product_type (str): [description]
+        page_current (int): page the table is on.
+        page_size (int): rows per page.
+        sort_by (list): columns the user sorted by.
+        filter_query (str): filter typed into the table.
         source (str): [description]
         category (str): [description]
-        product_type (str): [description]
 
     Returns:
-        pd.DataFrame: [description]
+        Tuple[list, int]: records of the page and page count.
     """
-    new_ingredients_df = (
-        cat_page_new_ingredients_df[
-            (cat_page_new_ingredients_df.source == source)
-            & (cat_page_new_ingredients_df.category == category)
-            & (cat_page_new_ingredients_df.product_type == product_type)
-        ]
-        .sort_values(by="adjusted_rating", ascending=False)[
-            [
-                "brand",
-                "product_name",
-                "ingredient",
-                "ingredient_type",
-                "ban_flag",
-            ]
-        ]
-        .reset_index(drop=True)
+    new_ingredients_df = select_rows(
+        cat_page_new_ingredients_df,
+        cat_page_new_ingredients_index,
+        (source, category, product_type),
+        [
+            "brand",
+            "product_name",
+            "ingredient",
+            "ingredient_type",
+            "ban_flag",
+            "adjusted_rating",
+        ],
+    ).sort_values(by="adjusted_rating", ascending=False)
+
+    data, page_count, _ = page_table(
+        new_ingredients_df.drop(columns="adjusted_rating"),
+        page_current,
+        page_size,
+        sort_by,
+        filter_query,
     )
-
-    return new_ingredients_df.to_dict("records")
+    return data, page_count
 
 
 @app.callback(
-    Output("new_products_data_table", "data"),
     [
-        Input("cat_page_source", "value"),
-        Input("cat_page_category", "value"),
+        Output("new_products_data_table", "data"),
+        Output("new_products_data_table", "page_count"),
+    ],
+    [
         Input("cat_page_product_type", "value"),
+        Input("new_products_data_table", "page_current"),
+        Input("new_products_data_table", "page_size"),
+        Input("new_products_data_table", "sort_by"),
+        Input("new_products_data_table", "filter_query"),
     ],
+    [State("cat_page_source", "value"), State("cat_page_category", "value")],
 )
 def filter_new_products_data_table(
-    source: str, category: str, product_type: str
-) -> pd.DataFrame:
+    product_type: str,
+    page_current: int,
+    page_size: int,
+    sort_by: list,
+    filter_query: str,
+    source: str,
+    category: str,
+) -> Tuple[list, int]:
     """filter_new_products_data_table [summary]
 
     [extended_summary]
 
     Args:
+        product_type (str): [description]
+        page_current (int): page the table is on.
+        page_size (int): rows per page.
+        sort_by (list): columns the user sorted by.
+        filter_query (str): filter typed into the table.
         source (str): [description]
         category (str): [description]
-        product_type (str): [description]
 
     Returns:
-        pd.DataFrame: [description]
+        Tuple[list, int]: records of the page and page count.
     """
-    new_products_detail_df = cat_page_new_products_details_df[
+    new_products_detail_df = select_rows(
+        cat_page_new_products_details_df,
+        cat_page_new_products_details_index,
+        (source, category, product_type),
         [
             "brand",
             "product_name",
@@ -3768,44 +4114,58 @@ def filter_new_products_data_table(
             "reviews",
             "positive_reviews",
             "negative_reviews",
-        ]
-    ][
-        (cat_page_new_products_details_df.source == source)
-        & (cat_page_new_products_details_df.category == category)
-        & (cat_page_new_products_details_df.product_type == product_type)
-    ]
+        ],
+    ).sort_values(by="adjusted_rating", ascending=False)
 
-    new_products_detail_df.sort_values(
-        by="adjusted_rating", inplace=True, ascending=False
+    data, page_count, _ = page_table(
+        new_products_detail_df, page_current, page_size, sort_by, filter_query
     )
-
-    return new_products_detail_df.to_dict("records")
+    return data, page_count
 
 
 @app.callback(
-    Output("top_products_data_table", "data"),
     [
-        Input("cat_page_source", "value"),
-        Input("cat_page_category", "value"),
+        Output("top_products_data_table", "data"),
+        Output("top_products_data_table", "page_count"),
+    ],
+    [
         Input("cat_page_product_type", "value"),
+        Input("top_products_data_table", "page_current"),
+        Input("top_products_data_table", "page_size"),
+        Input("top_products_data_table", "sort_by"),
+        Input("top_products_data_table", "filter_query"),
     ],
+    [State("cat_page_source", "value"), State("cat_page_category", "value")],
 )
 def filter_top_products_data_table(
-    source: str, category: str, product_type: str
-) -> pd.DataFrame:
+    product_type: str,
+    page_current: int,
+    page_size: int,
+    sort_by: list,
+    filter_query: str,
+    source: str,
+    category: str,
+) -> Tuple[list, int]:
     """filter_product_packaging_data_table [summary]
 
     [extended_summary]
 
     Args:
+        product_type (str): [description]
+        page_current (int): page the table is on.
+        page_size (int): rows per page.
+        sort_by (list): columns the user sorted by.
+        filter_query (str): filter typed into the table.
         source (str): [description]
         category (str): [description]
-        product_type (str): [description]
 
     Returns:
-        pd.DataFrame: [description]
+        Tuple[list, int]: records of the page and page count.
     """
-    top_products_df = cat_page_top_products_df[
+    top_products_df = select_rows(
+        cat_page_top_products_df,
+        cat_page_top_products_index,
+        (source, category, product_type),
         [
             "brand",
             "product_name",
@@ -3814,80 +4174,88 @@ def filter_top_products_data_table(
             "reviews",
             "positive_reviews",
             "negative_reviews",
-        ]
-    ][
-        (cat_page_top_products_df.source == source)
-        & (cat_page_top_products_df.category == category)
-        & (cat_page_top_products_df.product_type == product_type)
-    ]
-
-    top_products_df.sort_values(
-        by="adjusted_rating", inplace=True, ascending=False)
+        ],
+    ).sort_values(by="adjusted_rating", ascending=False)
 
-    return top_products_df.to_dict("records")
+    data, page_count, _ = page_table(
+        top_products_df, page_current, page_size, sort_by, filter_query
+    )
+    return data, page_count
 
 
 @app.callback(
-    Output("product_package_data_table", "data"),
     [
-        Input("cat_page_source", "value"),
-        Input("cat_page_category", "value"),
+        Output("product_package_data_table", "data"),
+        Output("product_package_data_table", "page_count"),
+    ],
+    [
         Input("cat_page_product_type", "value"),
+        Input("product_package_data_table", "page_current"),
+        Input("product_package_data_table", "page_size"),
+        Input("product_package_data_table", "sort_by"),
+        Input("product_package_data_table", "filter_query"),
     ],
+    [State("cat_page_source", "value"), State("cat_page_category", "value")],
 )
 def filter_product_packaging_data_table(
-    source: str, category: str, product_type: str
-) -> pd.DataFrame:
+    product_type: str,
+    page_current: int,
+    page_size: int,
+    sort_by: list,
+    filter_query: str,
+    source: str,
+    category: str,
+) -> Tuple[list, int]:
     """filter_product_packaging_data_table [summary]
 
     [extended_summary]
 
     Args:
+        product_type (str): [description]
+        page_current (int): page the table is on.
+        page_size (int): rows per page.
+        sort_by (list): columns the user sorted by.
+        filter_query (str): filter typed into the table.
         source (str): [description]
         category (str): [description]
-        product_type (str): [description]
 
     Returns:
-        pd.DataFrame: [description]
+        Tuple[list, int]: records of the page and page count.
     """
-    packaging_filtered_df = cat_page_item_package_oz_df[
-        ["item_size", "product_count", "avg_price"]
-    ][
-        (cat_page_item_package_oz_df.source == source)
-        & (cat_page_item_package_oz_df.category == category)
-        & (cat_page_item_package_oz_df.product_type == product_type)
-    ]
-
-    packaging_filtered_df.sort_values(
-        by="product_count", inplace=True, ascending=False)
-
-    return packaging_filtered_df.to_dict("records")
+    packaging_filtered_df = select_rows(
+        cat_page_item_package_oz_df,
+        cat_page_item_package_oz_index,
+        (source, category, product_type),
+        ["item_size", "product_count", "avg_price"],
+    ).sort_values(by="product_count", ascending=False)
+
+    data, page_count, _ = page_table(
+        packaging_filtered_df, page_current, page_size, sort_by, filter_query
+    )
+    return data, page_count
 
 
 @app.callback(
-    Output("cat_page_product_type", "options"),
+    [
+        Output("cat_page_product_type", "options"),
+        Output("cat_page_product_type", "value"),
+    ],
     [Input("cat_page_source", "value"), Input("cat_page_category", "value")],
 )
-def set_category_page_product_type_options(source: str, category: str):
-    return [
+def set_category_page_product_type_options_and_value(source: str, category: str):
+    """set_category_page_product_type_options_and_value sets the product types of the selection and picks the first.
+
+    Options and value are produced together, so the category page figures and tables
+    (which read source and category as State) fire once per consistent selection.
+    """
+    options = [
         {"label": i, "value": i}
         for i in cat_page_pricing_analytics_df.product_type[
             (cat_page_pricing_analytics_df.source == source)
             & (cat_page_pricing_analytics_df.category == category)
         ].unique()
     ]
-
-
-@app.callback(
-    Output("cat_page_product_type", "value"),
-    [
-        Input("cat_page_source", "value"),
-        Input("cat_page_category", "value"),
-        Input("cat_page_product_type", "options"),
-    ],
-)
-def set_category_page_product_type_value(source, category, available_options):
-    return available_options[0]["value"]
+    return options, options[0]["value"]
 
 
 @app.callback(
@@ -3898,22 +4266,21 @@ def set_category_page_product_type_value(source, category, available_options):
         Output("new_products_text", "children"),
     ],
     [
-        Input("cat_page_source", "value"),
-        Input("cat_page_category", "value"),
         Input("cat_page_product_type", "value"),
     ],
+    [State("cat_page_source", "value"), State("cat_page_category", "value")],
 )
 def update_product_analysis_text(
-    source: str, category: str, product_type: str
+    product_type: str, source: str, category: str
 ) -> Tuple[str, str, str, str]:
     """update_text [summary]
 
     [extended_summary]
 
     Args:
+        product_type (str): [description]
         source (str): [description]
         category (str): [description]
-        product_type (str): [description]
 
     Returns:
         Tuple[str, str, str, str]: [description]
@@ -3956,22 +4323,21 @@ def update_product_analysis_text(
         Output("avg_item_price_text", "children"),
     ],
     [
-        Input("cat_page_source", "value"),
-        Input("cat_page_category", "value"),
         Input("cat_page_product_type", "value"),
     ],
+    [State("cat_page_source", "value"), State("cat_page_category", "value")],
 )
 def update_pricing_analysis_text(
-    source: str, category: str, product_type: str
+    product_type: str, source: str, category: str
 ) -> Tuple[str, str, str, str]:
     """update_text [summary]
 
     [extended_summary]
 
     Args:
+        product_type (str): [description]
         source (str): [description]
         category (str): [description]
-        product_type (str): [description]
 
     Returns:
         Tuple[str, str, str, str]: [description]
@@ -4007,14 +4373,79 @@ def update_pricing_analysis_text(
 
 
 # Market Trend Page Callbacks
-@app.callback(
-    Output("category_trend", "figure"),
-    inputs=[
-        Input("source", "value"),
-        Input("category", "value"),
+def render_whole_date_range(update_figure, categories: list, *selection) -> go.Figure:
+    """render_whole_date_range renders a market trend figure for all categories and the whole date range."""
+    return update_figure(
+        *selection,
+        *([categories] if categories is not None else []),
+        MARKET_TREND_MIN_DATE,
+        dt.today().strftime("%Y-%m-%d"),
+    )
+
+
+def market_trend_figure_callback(
+    figure_id: str, selection_inputs: list, categories: list = None, is_heavy=None
+):
+    """market_trend_figure_callback registers a market trend figure callback for MARKET_TREND_FILTER_MODE.
+
+    In 'server' mode the figure is rendered on the server for every selection and date range change.
+    In 'client' mode the server renders the figure once per selection for the whole date range into the
+    '<figure_id>_store' dcc.Store, and the bte.filterFigure clientside function cuts the stored traces
+    down to the picked date range, so changing the date range does not reach the server.
+
+    Args:
+        figure_id (str): id of the dcc.Graph.
+        selection_inputs (list): inputs the figure is rendered for, besides the date range.
+        categories (list, optional): all categories of the figure data. When given, the category dropdown
+            is applied by dropping traces in the browser (client mode) instead of re-rendering. Defaults to None.
+        is_heavy (Callable, optional): takes the selection, tells if the figure is rendered as a background
+            job (with BACKGROUND_JOBS, see background_job_callback). Defaults to None (never).
+
+    Returns:
+        Callable: decorator registering the update function, which is returned unchanged.
+    """
+    date_inputs = [
         Input("review_month_range", "start_date"),
         Input("review_month_range", "end_date"),
-    ],
+    ]
+    category_inputs = [Input("category", "value")] if categories is not None else []
+
+    def register(update_figure):
+        # analysts opening the market trend page together share one rendering per selection.
+        shared_update_figure = single_flight(update_figure, name=figure_id)
+        if MARKET_TREND_FILTER_MODE != "client":
+            output = Output(figure_id, "figure")
+            inputs = selection_inputs + category_inputs + date_inputs
+            job_func, inline_func = update_figure, shared_update_figure
+        else:
+            output = Output(f"{figure_id}_store", "data")
+            inputs = selection_inputs
+            # partials of module level functions, so background jobs can pickle them.
+            job_func = partial(render_whole_date_range, update_figure, categories)
+            inline_func = partial(render_whole_date_range, shared_update_figure, categories)
+
+        if is_heavy is not None:
+            background_job_callback(
+                figure_id, output, inputs, is_heavy=is_heavy, inline_func=inline_func
+            )(job_func)
+        else:
+            app.callback(output, inputs)(inline_func)
+        if MARKET_TREND_FILTER_MODE != "client":
+            return update_figure
+
+        app.clientside_callback(
+            ClientsideFunction(namespace="bte", function_name="filterFigure"),
+            Output(figure_id, "figure"),
+            [Input(f"{figure_id}_store", "data")] + date_inputs + category_inputs,
+        )
+        return update_figure
+
+    return register
+
+
+@market_trend_figure_callback(
+    "category_trend",
+    [Input("source", "value"), Input("category", "value")],
 )
 def update_category_review_trend_figure(
     source: str, category: list, start_date: str, end_date: str
@@ -4056,14 +4487,9 @@ def update_category_review_trend_figure(
     return fig
 
 
-@app.callback(
-    Output("influenced_category_trend", "figure"),
-    inputs=[
-        Input("source", "value"),
-        Input("category", "value"),
-        Input("review_month_range", "start_date"),
-        Input("review_month_range", "end_date"),
-    ],
+@market_trend_figure_callback(
+    "influenced_category_trend",
+    [Input("source", "value"), Input("category", "value")],
 )
 def update_category_influenced_review_trend_figure(
     source: str, category: list, start_date: str, end_date: str
@@ -4104,63 +4530,108 @@ def update_category_influenced_review_trend_figure(
     return fig
 
 
-@app.callback(
+app.clientside_callback(
+    ClientsideFunction(namespace="bte", function_name="selectedCategory"),
     Output("influenced_category_name", "children"),
-    [
-        Input("influenced_category_trend", "clickData"),
-    ],
+    [Input("influenced_category_trend", "clickData")],
 )
-def influenced_display_click_data(clickData) -> str:
-    """influenced_display_click_data [summary]
 
-    [extended_summary]
+app.clientside_callback(
+    ClientsideFunction(namespace="bte", function_name="selectedCategory"),
+    Output("category_name", "children"),
+    [Input("category_trend", "clickData")],
+)
 
-    Args:
-        clickData ([type]): [description]
 
-    Returns:
-        str: [description]
-    """
-    if clickData is not None:
-        return f"Selected Category: {clickData['points'][0]['customdata'][0]}"
-    else:
-        return ""
+def product_type_review_trend_product_types(
+    source: str, clickData, data: pd.DataFrame = review_trend_product_type_df
+) -> list:
+    """product_type_review_trend_product_types lists the product types (facets) of the clicked category."""
+    if clickData is None:
+        return []
+    category = clickData["points"][0]["customdata"][0]
+    return (
+        data[(data.category == category) & (data.source == source)]
+        .product_type.unique()
+        .tolist()
+    )
 
 
-@app.callback(
-    Output("category_name", "children"),
-    [
-        Input("category_trend", "clickData"),
-    ],
-)
-def display_click_data(clickData) -> str:
-    """display_click_data [summary]
+def product_type_review_trend_facet_count(source: str, clickData, page: int = 0) -> int:
+    """product_type_review_trend_facet_count counts the facets drawn for a page of the clicked category."""
+    return len(
+        product_type_facet_page(
+            product_type_review_trend_product_types(source, clickData),
+            page,
+            PRODUCT_TYPE_FACETS_PER_PAGE,
+        )
+    )
 
-    [extended_summary]
 
-    Args:
-        clickData ([type]): [description]
+def product_type_facet_page_options(product_types: list) -> list:
+    """product_type_facet_page_options labels the facet pages of a small multiples grid."""
+    total = len(product_types)
+    return [
+        {
+            "label": f"Product types {start + 1}-"
+            f"{min(start + PRODUCT_TYPE_FACETS_PER_PAGE, total)} of {total}",
+            "value": page,
+        }
+        for page, start in enumerate(range(0, total, PRODUCT_TYPE_FACETS_PER_PAGE))
+    ]
 
-    Returns:
-        str: [description]
-    """
-    if clickData is not None:
-        return f"Selected Category: {clickData['points'][0]['customdata'][0]}"
-    else:
-        return ""
 
+if PRODUCT_TYPE_FACETS_PER_PAGE:
 
-@app.callback(
-    Output("subcategory_trend", "figure"),
+    @app.callback(
+        [
+            Output("subcategory_trend_page", "options"),
+            Output("subcategory_trend_page", "value"),
+        ],
+        [Input("source", "value"), Input("category_trend", "clickData")],
+    )
+    def set_subcategory_trend_page_options(source: str, clickData):
+        """set_subcategory_trend_page_options lists the facet pages of the clicked category and goes back to the first one."""
+        return (
+            product_type_facet_page_options(
+                product_type_review_trend_product_types(source, clickData)
+            ),
+            0,
+        )
+
+    @app.callback(
+        [
+            Output("influenced_subcategory_trend_page", "options"),
+            Output("influenced_subcategory_trend_page", "value"),
+        ],
+        [Input("source", "value"), Input("influenced_category_trend", "clickData")],
+    )
+    def set_influenced_subcategory_trend_page_options(source: str, clickData):
+        """set_influenced_subcategory_trend_page_options lists the facet pages of the clicked category and goes back to the first one."""
+        return (
+            product_type_facet_page_options(
+                product_type_review_trend_product_types(
+                    source, clickData, influenced_review_trend_product_type_df
+                )
+            ),
+            0,
+        )
+
+
+@market_trend_figure_callback(
+    "subcategory_trend",
     [
         Input("source", "value"),
         Input("category_trend", "clickData"),
-        Input("review_month_range", "start_date"),
-        Input("review_month_range", "end_date"),
+        Input("subcategory_trend_page", "value"),
     ],
+    is_heavy=lambda source, clickData, page, *date_range: product_type_review_trend_facet_count(
+        source, clickData, page
+    )
+    > BACKGROUND_MIN_PRODUCT_TYPE_FACETS,
 )
 def update_product_type_review_trend_figure(
-    source: str, clickData, start_date: str, end_date: str
+    source: str, clickData, page: int, start_date: str, end_date: str
 ) -> go.Figure:
     """update_product_type_review_trend_figure [summary]
 
@@ -4169,6 +4640,7 @@ def update_product_type_review_trend_figure(
     Args:
         source (str): [description]
         clickData ([type]): [description]
+        page (int): page of the product type small multiples (with PRODUCT_TYPE_FACETS_PER_PAGE).
         start_date (str): [description]
         end_date (str): [description]
 
@@ -4193,12 +4665,12 @@ def update_product_type_review_trend_figure(
 
         # pt_df = review_trend_product_type_df[(review_trend_product_type_df.category==category)
         #                               review_trend_product_type_df.source==source]
-        product_type_count = len(
-            review_trend_product_type_df[
-                (review_trend_product_type_df.category == category)
-                & (review_trend_product_type_df.source == source)
-            ].product_type.unique()
+        product_types = product_type_facet_page(
+            product_type_review_trend_product_types(source, clickData),
+            page,
+            PRODUCT_TYPE_FACETS_PER_PAGE,
         )
+        product_type_count = len(product_types)
         if product_type_count <= 10:
             height = 600
         elif product_type_count <= 20:
@@ -4210,6 +4682,7 @@ def update_product_type_review_trend_figure(
         else:
             height = 2600
 
+        report_progress(0.2, f"rendering {product_type_count} product types")
         fig = create_product_type_review_trend_figure(
             data=review_trend_product_type_df,
             source=source,
@@ -4217,23 +4690,24 @@ def update_product_type_review_trend_figure(
             height=height,
             start_date=start_date_string,
             end_date=end_date_string,
+            product_types=product_types,
+            shared_yaxis=PRODUCT_TYPE_FACETS_SHARED_YAXIS,
         )
         return fig
     else:
         return {}
 
 
-@app.callback(
-    Output("influenced_subcategory_trend", "figure"),
+@market_trend_figure_callback(
+    "influenced_subcategory_trend",
     [
         Input("source", "value"),
         Input("influenced_category_trend", "clickData"),
-        Input("review_month_range", "start_date"),
-        Input("review_month_range", "end_date"),
+        Input("influenced_subcategory_trend_page", "value"),
     ],
 )
 def update_product_type_influenced_review_trend_figure(
-    source: str, clickData, start_date: str, end_date: str
+    source: str, clickData, page: int, start_date: str, end_date: str
 ) -> go.Figure:
     """update_product_type_influenced_review_trend_figure
 
@@ -4242,6 +4716,7 @@ def update_product_type_influenced_review_trend_figure(
     Args:
         source (str): [description]
         clickData ([type]): [description]
+        page (int): page of the product type small multiples (with PRODUCT_TYPE_FACETS_PER_PAGE).
         start_date (str): [description]
         end_date (str): [description]
 
@@ -4266,12 +4741,14 @@ def update_product_type_influenced_review_trend_figure(
 
         # pt_df = review_trend_product_type_df[(review_trend_product_type_df.category==category)
         #                               review_trend_product_type_df.source==source]
-        product_type_count = len(
-            influenced_review_trend_product_type_df[
-                (influenced_review_trend_product_type_df.category == category)
-                & (influenced_review_trend_product_type_df.source == source)
-            ].product_type.unique()
+        product_types = product_type_facet_page(
+            product_type_review_trend_product_types(
+                source, clickData, influenced_review_trend_product_type_df
+            ),
+            page,
+            PRODUCT_TYPE_FACETS_PER_PAGE,
         )
+        product_type_count = len(product_types)
         if product_type_count <= 10:
             height = 600
         elif product_type_count <= 20:
@@ -4290,42 +4767,18 @@ def update_product_type_influenced_review_trend_figure(
             height=height,
             start_date=start_date_string,
             end_date=end_date_string,
+            product_types=product_types,
+            shared_yaxis=PRODUCT_TYPE_FACETS_SHARED_YAXIS,
         )
         return fig
     else:
         return {}
 
 
-@app.callback(
-    dash.dependencies.Output("output-container-date-picker-range", "children"),
-    [
-        dash.dependencies.Input("review_month_range", "start_date"),
-        dash.dependencies.Input("review_month_range", "end_date"),
-    ],
-)
-def date_selection_text(start_date: str, end_date: str) -> str:
-    """date_selection_text [summary]
-
-    [extended_summary]
-
-    Args:
-        start_date (str): [description]
-        end_date (str): [description]
-
-    Returns:
-        str: [description]
-    """
-    return "Minimum start date is 12/01/2008. \n You can write in MM/DD/YYYY format in the date box to filter."
-
-
-@app.callback(
-    Output("product_launch_trend_category", "figure"),
-    inputs=[
-        Input("source", "value"),
-        Input("category", "value"),
-        Input("review_month_range", "start_date"),
-        Input("review_month_range", "end_date"),
-    ],
+@market_trend_figure_callback(
+    "product_launch_trend_category",
+    [Input("source", "value")],
+    categories=meta_product_launch_trend_category_df.category.unique().tolist(),
 )
 def update_category_product_launch_figure(
     source: str, category: list, start_date: str, end_date: str
@@ -4366,37 +4819,16 @@ def update_category_product_launch_figure(
     return fig
 
 
-@app.callback(
+app.clientside_callback(
+    ClientsideFunction(namespace="bte", function_name="selectedCategoryOrBathBody"),
     Output("product_trend_category_name", "children"),
-    [
-        Input("product_launch_trend_category", "clickData"),
-    ],
+    [Input("product_launch_trend_category", "clickData")],
 )
-def display_click_data_product_trend(clickData) -> str:
-    """display_click_data_product_trend [summary]
-
-    [extended_summary]
-
-    Args:
-        clickData ([type]): [description]
-
-    Returns:
-        str: [description]
-    """
-    if clickData is not None:
-        return f"Selected Category: {clickData['points'][0]['customdata'][0]}"
-    else:
-        return "Selected Category: bath-body"
 
 
-@app.callback(
-    Output("product_launch_trend_subcategory", "figure"),
-    [
-        Input("source", "value"),
-        Input("product_launch_trend_category", "clickData"),
-        Input("review_month_range", "start_date"),
-        Input("review_month_range", "end_date"),
-    ],
+@market_trend_figure_callback(
+    "product_launch_trend_subcategory",
+    [Input("source", "value"), Input("product_launch_trend_category", "clickData")],
 )
 def update_product_type_product_launch_figure(
     source: str, clickData, start_date: str, end_date: str
@@ -4442,14 +4874,10 @@ def update_product_type_product_launch_figure(
     return fig
 
 
-@app.callback(
-    Output("product_launch_intensity_category", "figure"),
-    inputs=[
-        Input("source", "value"),
-        Input("category", "value"),
-        Input("review_month_range", "start_date"),
-        Input("review_month_range", "end_date"),
-    ],
+@market_trend_figure_callback(
+    "product_launch_intensity_category",
+    [Input("source", "value")],
+    categories=product_launch_intensity_category_df.category.unique().tolist(),
 )
 def update_product_launch_intensity_figure(
     source: str, category: list, start_date: str, end_date: str
@@ -4490,14 +4918,10 @@ def update_product_launch_intensity_figure(
     return fig
 
 
-@app.callback(
-    Output("ingredient_launch_trend_category", "figure"),
-    inputs=[
-        Input("source", "value"),
-        Input("category", "value"),
-        Input("review_month_range", "start_date"),
-        Input("review_month_range", "end_date"),
-    ],
+@market_trend_figure_callback(
+    "ingredient_launch_trend_category",
+    [Input("source", "value")],
+    categories=new_ingredient_trend_category_df.category.unique().tolist(),
 )
 def update_category_new_ingredient_trend_figure(
     source: str, category: list, start_date: str, end_date: str
@@ -4538,37 +4962,16 @@ def update_category_new_ingredient_trend_figure(
     return fig
 
 
-@app.callback(
+app.clientside_callback(
+    ClientsideFunction(namespace="bte", function_name="selectedCategoryOrBathBody"),
     Output("ingredient_trend_category_name", "children"),
-    [
-        Input("ingredient_launch_trend_category", "clickData"),
-    ],
+    [Input("ingredient_launch_trend_category", "clickData")],
 )
-def display_click_data_ingredient_trend(clickData) -> str:
-    """display_click_data_product_trend [summary]
-
-    [extended_summary]
-
-    Args:
-        clickData ([type]): [description]
-
-    Returns:
-        str: [description]
-    """
-    if clickData is not None:
-        return f"Selected Category: {clickData['points'][0]['customdata'][0]}"
-    else:
-        return "Selected Category: bath-body"
 
 
-@app.callback(
-    Output("ingredient_launch_trend_subcategory", "figure"),
-    [
-        Input("source", "value"),
-        Input("ingredient_launch_trend_category", "clickData"),
-        Input("review_month_range", "start_date"),
-        Input("review_month_range", "end_date"),
-    ],
+@market_trend_figure_callback(
+    "ingredient_launch_trend_subcategory",
+    [Input("source", "value"), Input("ingredient_launch_trend_category", "clickData")],
 )
 def update_product_type_new_ingredient_trend_figure(
     source: str, clickData, start_date: str, end_date: str
@@ -4623,37 +5026,25 @@ def update_product_type_new_ingredient_trend_figure(
 # )
 
 
-@app.callback(
+app.clientside_callback(
+    ClientsideFunction(namespace="bte", function_name="toggleNavbarCollapse"),
     Output("navbar-collapse", "is_open"),
     [Input("navbar-toggler", "n_clicks")],
     [State("navbar-collapse", "is_open")],
 )
-def toggle_navbar_collapse(n, is_open):
-    if n:
-        return not is_open
-    return is_open
 
-
-@app.callback(
+app.clientside_callback(
+    ClientsideFunction(namespace="bte", function_name="toggleSidebarClassname"),
     Output("sidebar", "className"),
     [Input("sidebar-toggle", "n_clicks")],
     [State("sidebar", "className")],
 )
-def toggle_classname(n, classname):
-    if n and classname == "":
-        return "collapsed"
-    return ""
-
 
-@app.callback(
+app.clientside_callback(
+    ClientsideFunction(namespace="bte", function_name="toggleActiveLinks"),
     [Output(f"page-{i}-link", "active") for i in range(1, 6)],
     [Input("url", "pathname")],
 )
-def toggle_active_links(pathname):
-    if pathname == "/":
-        # Treat page 1 as the homepage / index
-        return True, False, False, False, False
-    return [pathname == f"/page-{i}" for i in range(1, 6)]
 
 
 @app.callback(Output("page-content", "children"), [Input("url", "pathname")])
@@ -4685,6 +5076,17 @@ def render_page_content(pathname):
     )
 
 
+if MEMORY_ACCOUNTING:
+    # still in the process loading the data, before gunicorn forks the workers (see bte_memory_accounting).
+    memory_accounting.register_namespace(globals())
+    memory_accounting.measure(market_trend_data_version)
+if CALLBACK_TIMING:
+    instrument_callbacks(app, callback_timings, SLOW_CALLBACK_MS)
+if PROFILER:
+    wrap_callbacks(app, callback_profiler)
+
 if __name__ == "__main__":
+    if PROFILER:
+        install_profile_signal(PROFILE_DIR, PROFILE_SIGNAL_SECONDS)
     app.run_server()
     # app.run_server(debug=True, port=2000)
@@ -10,3 +10,101 @@ S3_PREFIX =
 S3_REGION = 
 AWS_ACCESS_KEY_ID = os.environ.get("AWS_ACCESS_KEY_ID")
 AWS_SECRET_ACCESS_KEY = os.environ.get("AWS_SECRET_ACCESS_KEY")
+
+# figure builders: "go" builds plain figure dicts straight from arrays, "px" goes through plotly.express.
+FIGURE_ENGINE = os.environ.get("BTE_FIGURE_ENGINE", "go")
+# validate "go" figures with graph_objects (slow, for development only).
+VALIDATE_FIGURES = os.environ.get("BTE_VALIDATE_FIGURES", "0") == "1"
+# rows per page of the server side paged DataTables.
+DATATABLE_PAGE_SIZE = int(os.environ.get("BTE_DATATABLE_PAGE_SIZE", "15"))
+# market trend page date range/category filtering: "server" re-renders the figures on every change,
+# "client" sends each figure once for the whole date range and filters it in the browser.
+MARKET_TREND_FILTER_MODE = os.environ.get("BTE_MARKET_TREND_FILTER_MODE", "server")
+# number of products (and product/date range pairs) whose product page data slices are kept in memory.
+PRODUCT_CONTEXT_CACHE_SIZE = int(os.environ.get("BTE_PRODUCT_CONTEXT_CACHE_SIZE", "64"))
+# count the callback requests per output and serve the counts at /_bte/request-counts.
+CALLBACK_REQUEST_COUNTS = os.environ.get("BTE_CALLBACK_REQUEST_COUNTS", "0") == "1"
+# run heavy callbacks (large faceted figures, big tables) as background jobs on a process pool,
+# polled from the browser with a progress bar.
+BACKGROUND_JOBS = os.environ.get("BTE_BACKGROUND_JOBS", "0") == "1"
+BACKGROUND_JOB_WORKERS = int(os.environ.get("BTE_BACKGROUND_JOB_WORKERS", "2"))
+# state, progress and results of the background jobs, shared by all server workers (any of them answers a poll).
+BACKGROUND_JOB_DIR = os.environ.get("BTE_BACKGROUND_JOB_DIR", "/tmp/bte_background_jobs")
+# how often (milliseconds) the browser polls a running background job.
+BACKGROUND_JOB_POLL_INTERVAL = int(os.environ.get("BTE_BACKGROUND_JOB_POLL_INTERVAL", "500"))
+# product type trend small multiples: facets per page (0 draws all product types of a category in one grid),
+# and whether the facets share one review count scale.
+PRODUCT_TYPE_FACETS_PER_PAGE = int(os.environ.get("BTE_PRODUCT_TYPE_FACETS_PER_PAGE", "0"))
+PRODUCT_TYPE_FACETS_SHARED_YAXIS = os.environ.get("BTE_PRODUCT_TYPE_FACETS_SHARED_YAXIS", "0") == "1"
+# product page review/price time series: "exact" draws every point as spline, "adaptive" downsamples
+# (LTTB) to TIMESERIES_POINTS_PER_PIXEL points per pixel of chart width per trace, and uses WebGL
+# traces above WEBGL_MIN_POINTS points; zooming re-samples the visible window.
+TIMESERIES_RENDERING = os.environ.get("BTE_TIMESERIES_RENDERING", "exact")
+TIMESERIES_POINTS_PER_PIXEL = float(os.environ.get("BTE_TIMESERIES_POINTS_PER_PIXEL", "1"))
+WEBGL_MIN_POINTS = int(os.environ.get("BTE_WEBGL_MIN_POINTS", "1000"))
+# slim the figures of every callback response (rounded floats, no redundant customdata, shared axis styles)
+# and report the bytes before/after per callback at /_bte/payload-sizes.
+FIGURE_PAYLOAD_SLIMMING = os.environ.get("BTE_FIGURE_PAYLOAD_SLIMMING", "0") == "1"
+FIGURE_SIGNIFICANT_DIGITS = int(os.environ.get("BTE_FIGURE_SIGNIFICANT_DIGITS", "6"))
+# base64 typed arrays need plotly.js >= 2.28 (dash >= 2.15); the dash pinned in requirements.txt bundles an older one.
+FIGURE_TYPED_ARRAYS = os.environ.get("BTE_FIGURE_TYPED_ARRAYS", "0") == "1"
+# compress responses of at least COMPRESS_MIN_SIZE bytes with the first of COMPRESS_ALGORITHMS the browser accepts
+# ("br" needs the brotli package).
+COMPRESSION = os.environ.get("BTE_COMPRESSION", "1") == "1"
+COMPRESS_ALGORITHMS = os.environ.get("BTE_COMPRESS_ALGORITHMS", "br,gzip").split(",")
+COMPRESS_MIN_SIZE = int(os.environ.get("BTE_COMPRESS_MIN_SIZE", "1024"))
+# serve the assets under content-hash urls with immutable cache headers.
+STATIC_ASSET_FINGERPRINTS = os.environ.get("BTE_STATIC_ASSET_FINGERPRINTS", "1") == "1"
+# the bootstrap theme, dash base styles and font awesome are served from assets/vendor once downloaded with
+# `python bte_static.py` (not in git), from their CDNs otherwise. "1" (production builds, after the download)
+# refuses to start the app while a file is missing.
+SELF_HOSTED_ASSETS = os.environ.get("BTE_SELF_HOSTED_ASSETS", "0") == "1"
+# store repetitive string columns of the web-app data as categoricals (shared copy-on-write by forked workers)
+# when their distinct values to rows ratio is at most CATEGORICAL_MAX_RATIO.
+CATEGORICAL_COLUMNS = os.environ.get("BTE_CATEGORICAL_COLUMNS", "1") == "1"
+CATEGORICAL_MAX_RATIO = float(os.environ.get("BTE_CATEGORICAL_MAX_RATIO", "0.5"))
+# production server (gunicorn --config gunicorn.conf.py wsgi:server): bind address, worker processes and threads.
+WSGI_BIND = os.environ.get("BTE_WSGI_BIND", "0.0.0.0:8050")
+WSGI_WORKERS = int(os.environ.get("BTE_WSGI_WORKERS", "4"))
+WSGI_THREADS = int(os.environ.get("BTE_WSGI_THREADS", "4"))
+# keep the largest frames (review sentiment, ingredients) as Arrow tables in POSIX shared memory, read zero-copy
+# by all server workers; only the rows a request selects become pandas frames.
+SHARED_DATASETS = os.environ.get("BTE_SHARED_DATASETS", "0") == "1"
+# time every callback (wall/cpu time, response size, data slices), serve rolling percentiles at /_bte/callback-timings
+# and print a json line for every call slower than SLOW_CALLBACK_MS milliseconds.
+CALLBACK_TIMING = os.environ.get("BTE_CALLBACK_TIMING", "0") == "1"
+SLOW_CALLBACK_MS = float(os.environ.get("BTE_SLOW_CALLBACK_MS", "500"))
+CALLBACK_TIMING_WINDOW = int(os.environ.get("BTE_CALLBACK_TIMING_WINDOW", "1000"))
+# serve prometheus metrics (request latency histograms, caches, datasets, snapshot, process memory) at /metrics.
+METRICS = os.environ.get("BTE_METRICS", "0") == "1"
+# every server worker writes its request, cache and single-flight counters here, /metrics reports their sum.
+METRICS_DIR = os.environ.get("BTE_METRICS_DIR", "/tmp/bte_metrics")
+# sampling profiler of the live workers: /_bte/profile for the basic auth users in PROFILER_ADMIN_USERS, and
+# SIGUSR2 (kill -USR2 <worker pid>) writes a PROFILE_SIGNAL_SECONDS profile to PROFILE_DIR.
+PROFILER = os.environ.get("BTE_PROFILER", "0") == "1"
+PROFILER_ADMIN_USERS = os.environ.get("BTE_PROFILER_ADMIN_USERS", "").split(",")
+PROFILE_DIR = os.environ.get("BTE_PROFILE_DIR", "/tmp")
+PROFILE_SIGNAL_SECONDS = float(os.environ.get("BTE_PROFILE_SIGNAL_SECONDS", "30"))
+# read (and write) the web-app data from this local directory, laid out like the s3 bucket, instead of s3,
+# e.g. a synthetic snapshot written by bte_synthetic_data.py.
+LOCAL_DATA_DIR = os.environ.get("BTE_LOCAL_DATA_DIR", "")
+# trace the startup (module imports, data download/decode, dtype conversion, row indexes, initial figures): wsgi.py
+# prints a report after importing main and writes a chrome trace-event json file to STARTUP_TRACE_FILE, if set.
+STARTUP_TRACE = os.environ.get("BTE_STARTUP_TRACE", "0") == "1"
+STARTUP_TRACE_FILE = os.environ.get("BTE_STARTUP_TRACE_FILE", "")
+# account the deep memory of every data frame, dataset, row index, dropdown option list and initial figure once loaded,
+# compare it with the previous data load kept in MEMORY_ACCOUNTING_FILE and serve it at /_bte/memory/structures (and
+# /metrics). A structure is flagged when it grew by more than MEMORY_GROWTH_RATIO and MEMORY_GROWTH_MIN_BYTES, beyond
+# what its number of rows explains.
+MEMORY_ACCOUNTING = os.environ.get("BTE_MEMORY_ACCOUNTING", "0") == "1"
+MEMORY_ACCOUNTING_FILE = os.environ.get("BTE_MEMORY_ACCOUNTING_FILE", "/tmp/bte_memory_accounting.json")
+MEMORY_GROWTH_RATIO = float(os.environ.get("BTE_MEMORY_GROWTH_RATIO", "0.25"))
+MEMORY_GROWTH_MIN_BYTES = int(os.environ.get("BTE_MEMORY_GROWTH_MIN_BYTES", str(2 ** 20)))
+# read these datasets (comma separated file names: prod_page_review_sentiment_influence, ing_page_ing_data) from hive
+# partitioned parquet (<file name>.parquet/source=<source>/category=<category>/ under WebAppData) instead of their
+# feather file: a worker reads the partition of a selection when it is first selected and keeps it, selections across
+# partitions read only the matching rows of the partitions not kept, with the filter pushed down to the parquet files.
+PARTITIONED_DATASETS = [name for name in os.environ.get("BTE_PARTITIONED_DATASETS", "").split(",") if name]
+# number of selections across partitions (e.g. an ingredient in every category) whose rows read from the partitions
+# not kept are kept per worker.
+PARTITION_SCAN_CACHE_SIZE = int(os.environ.get("BTE_PARTITION_SCAN_CACHE_SIZE", "32"))
@@ -0,0 +1,24 @@
+"""production entry point of the web-app.
+
+    cd meiyume_trend_engine
+    gunicorn --config gunicorn.conf.py wsgi:server
+
+gunicorn.conf.py preloads this module in the master process: the data is downloaded and
+prepared once (repetitive string columns as categoricals, read_file_s3 applies bte_utils.categorize_columns)
+and the workers forked afterwards share it copy-on-write instead of each holding a copy.
+The memory every worker holds on its own is served at /_bte/memory.
+With BTE_STARTUP_TRACE=1 a report of where the import of main spent its time is printed
+(see bte_startup_trace).
+"""
+import gc
+
+# first: with BTE_STARTUP_TRACE=1 it starts tracing the imports below.
+from bte_startup_trace import finish_startup_trace
+
+from main import app, server
+
+finish_startup_trace()
+
+# everything loaded so far is moved out of the garbage collector's generations, so collections
+# in the workers do not write to (and un-share) the pages of the preloaded objects.
+gc.freeze()
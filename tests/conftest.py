@@ -0,0 +1,35 @@
+"""shared test setup: the app modules are imported from meiyume_trend_engine, main on a small synthetic snapshot.
+
+The environment is set before any test module imports settings, so no test reads from s3.
+"""
+import atexit
+import importlib
+import os
+import shutil
+import sys
+import tempfile
+
+import pytest
+
+APP_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "meiyume_trend_engine")
+
+# after the paths already set, so a settings module on PYTHONPATH takes precedence.
+if APP_DIR not in sys.path:
+    sys.path.append(APP_DIR)
+
+DATA_DIR = tempfile.mkdtemp(prefix="bte_synthetic_data_")
+atexit.register(shutil.rmtree, DATA_DIR, ignore_errors=True)
+os.environ["BTE_LOCAL_DATA_DIR"] = DATA_DIR
+# the tests serve no page, the stylesheets may stay on their CDNs.
+os.environ.setdefault("BTE_SELF_HOSTED_ASSETS", "0")
+# served at /_bte/request-counts, see test_request_counts.py.
+os.environ["BTE_CALLBACK_REQUEST_COUNTS"] = "1"
+
+
+@pytest.fixture(scope="session")
+def main():
+    """main imports the app on a synthetic snapshot (see bte_synthetic_data.py)."""
+    from bte_synthetic_data import SyntheticSnapshot, write_snapshot
+
+    write_snapshot(SyntheticSnapshot(scale=0.05, seed=0).generate(), DATA_DIR)
+    return importlib.import_module("main")
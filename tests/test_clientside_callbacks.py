@@ -0,0 +1,41 @@
+"""the presentation-only callbacks run in the browser, not on the server.
+
+Imports main on a small synthetic snapshot (the main fixture, see conftest.py), so the test needs no s3 access.
+"""
+
+# outputs of the click-to-text and navigation callbacks, by the clientside function (namespace 'bte') setting them.
+CLIENTSIDE_OUTPUTS = {
+    "ing_page_click_data_text.children": "selectedIngredientCategory",
+    "influenced_category_name.children": "selectedCategory",
+    "category_name.children": "selectedCategory",
+    "product_trend_category_name.children": "selectedCategoryOrBathBody",
+    "ingredient_trend_category_name.children": "selectedCategoryOrBathBody",
+    "navbar-collapse.is_open": "toggleNavbarCollapse",
+    "sidebar.className": "toggleSidebarClassname",
+    "..page-1-link.active...page-2-link.active...page-3-link.active...page-4-link.active...page-5-link.active..": (
+        "toggleActiveLinks"
+    ),
+}
+# the date range texts are set in the layout, they have no callback at all.
+REMOVED_OUTPUTS = [
+    "output-container-date-picker-range.children",
+    "prod-page-output-container-date-picker-range.children",
+]
+
+
+def test_clientside_outputs_have_no_server_callback(main):
+    for output in CLIENTSIDE_OUTPUTS:
+        # dash keeps clientside callbacks in callback_map too, without a server function.
+        assert "callback" not in main.app.callback_map.get(output, {}), output
+    for output in REMOVED_OUTPUTS:
+        assert output not in main.app.callback_map, output
+
+
+def test_clientside_outputs_are_registered_clientside(main):
+    clientside = {
+        callback["output"]: callback["clientside_function"]
+        for callback in main.app._callback_list
+        if callback.get("clientside_function")
+    }
+    for output, function_name in CLIENTSIDE_OUTPUTS.items():
+        assert clientside.get(output) == {"namespace": "bte", "function_name": function_name}, output
@@ -0,0 +1,136 @@
+"""the dataset kinds of bte_dataset_store.py answer the same row selections from the same rows."""
+import numpy as np
+import pandas as pd
+import pytest
+
+from bte_dataset_store import ArrowDataset, FrameDataset, PartitionedDataset
+from bte_utils import read_partitioned_dataset, read_partitioned_dataset_index, write_partitioned_dataset
+
+# indexed columns (bte_utils.PARTITION_INDEX_COLUMNS): product_type and ingredient.
+FILENAME = "ing_page_ing_data"
+PRODUCTS = ["serum", "toner", None, "mask"]
+INGREDIENTS = ["water", "glycerin", "niacinamide", "retinol", None, "squalane"]
+
+
+def _rows() -> pd.DataFrame:
+    rng = np.random.default_rng(0)
+    n = 120
+    data = pd.DataFrame(
+        {
+            "row": np.arange(n),
+            "source": rng.choice(["us", "uk"], n),
+            "category": rng.choice(["skincare", "haircare"], n),
+            # dictionary encoded (categorical) with nulls.
+            "product_type": pd.Categorical(rng.choice(np.array(PRODUCTS, dtype=object), n)),
+            "ingredient": rng.choice(np.array(INGREDIENTS, dtype=object), n),
+            "price": rng.integers(1, 100, n).astype(float),
+        }
+    )
+    # retinol only in one partition, so selecting it prunes the other three.
+    data.loc[data.ingredient == "retinol", ["source", "category"]] = ["uk", "haircare"]
+    data.loc[data.row == 0, "ingredient"] = "retinol"
+    data.loc[data.row == 0, ["source", "category"]] = ["uk", "haircare"]
+    return data
+
+
+@pytest.fixture(scope="module")
+def datasets(tmp_path_factory):
+    data = _rows()
+    prefix = f"equivalence-{tmp_path_factory.mktemp('partitioned').name}"
+    write_partitioned_dataset(data, FILENAME, prefix=prefix)
+    partitioned = PartitionedDataset(
+        "equivalence",
+        read_partitioned_dataset(FILENAME, prefix=prefix),
+        read_partitioned_dataset_index(FILENAME, prefix=prefix),
+    )
+    assert partitioned.indexed.keys() == {"product_type", "ingredient"}
+    return {
+        "frame": FrameDataset("equivalence", data),
+        "arrow": ArrowDataset.publish("equivalence", data),
+        "partitioned": partitioned,
+    }
+
+
+def _comparable(rows: pd.DataFrame, ordered: bool = False) -> list:
+    # categoricals, arrow strings and object columns alike; nulls as None, rows in the order of the row column.
+    if not ordered and "row" in rows:
+        rows = rows.sort_values("row")
+    rows = rows.astype(object)
+    return rows.where(rows.notna(), None).to_dict("records")
+
+
+SELECTIONS = [
+    {},
+    {"source": "us"},
+    # one partition, read whole.
+    {"source": "uk", "category": "haircare"},
+    {"source": "uk", "category": "haircare", "ingredient": "retinol"},
+    # across partitions, through the value index.
+    {"ingredient": "retinol"},
+    {"ingredient": "water", "category": "skincare"},
+    {"product_type": "toner"},
+    {"product_type": "toner", "ingredient": "glycerin", "source": "us"},
+    {"price": 42.0},
+    # no such value, in the index or the rows.
+    {"ingredient": "mercury"},
+    {"product_type": "serum", "source": "fr"},
+]
+
+
+@pytest.mark.parametrize("equals", SELECTIONS, ids=lambda equals: ",".join(f"{k}={v}" for k, v in equals.items()) or "all")
+@pytest.mark.parametrize("columns", [None, ["row", "product_type", "ingredient"]])
+def test_where_selects_the_same_rows(datasets, equals, columns):
+    expected = _comparable(datasets["frame"].where(columns, **equals))
+    assert expected or "mercury" in str(equals) or "fr" in str(equals)
+    for kind in ("arrow", "partitioned"):
+        rows = datasets[kind].where(columns, **equals)
+        assert _comparable(rows) == expected, kind
+        if columns is None:
+            # all columns; a partitioned dataset puts the partition columns last.
+            assert set(rows.columns) == set(datasets["frame"].data.columns), kind
+        else:
+            assert list(rows.columns) == columns, kind
+
+
+def test_where_prunes_partitions_through_the_value_index(datasets, monkeypatch):
+    partitioned = datasets["partitioned"]
+    scanned = []
+    scan = partitioned._scan
+
+    def spy(keys, *args, **kwargs):
+        scanned.append(sorted(keys))
+        return scan(keys, *args, **kwargs)
+
+    monkeypatch.setattr(partitioned, "_scan", spy)
+    monkeypatch.setattr(partitioned, "partitions", {})
+    partitioned._scanned.cache_clear()
+
+    partitioned.where(ingredient="retinol")
+    assert scanned == [[("uk", "haircare")]]
+    scanned.clear()
+    assert partitioned.where(ingredient="mercury").empty
+    assert scanned == []
+
+
+@pytest.mark.parametrize("positions", [[5, 0, 119, 5], [], list(range(0, 120, 7))])
+def test_take_selects_the_same_rows(datasets, positions):
+    columns = ["row", "product_type", "price"]
+    expected = datasets["frame"].take(np.array(positions, dtype=int), columns)
+    assert expected.row.tolist() == positions
+    rows = datasets["arrow"].take(np.array(positions, dtype=int), columns)
+    assert _comparable(rows, ordered=True) == _comparable(expected, ordered=True)
+
+
+@pytest.mark.parametrize("column", ["source", "category", "product_type", "ingredient", "price"])
+def test_value_counts_and_unique_agree(datasets, column):
+    def counts(dataset):
+        values = dataset.value_counts(column)
+        # categoricals count their unused categories too.
+        return {str(value): int(n) for value, n in values.items() if n}
+
+    expected = counts(datasets["frame"])
+    assert sum(expected.values()) == datasets["frame"].data[column].notna().sum()
+    for kind in ("arrow", "partitioned"):
+        assert counts(datasets[kind]) == expected, kind
+        # nulls are values of the rows but not of the (partitioned) index.
+        assert {str(v) for v in datasets[kind].unique(column) if pd.notna(v)} == set(expected), kind
@@ -0,0 +1,96 @@
+"""the server side filtering, sorting and paging of the DataTables (bte_datatable.py) follows dash_table's syntax."""
+import numpy as np
+import pandas as pd
+import pytest
+
+from bte_datatable import filter_rows, page_table, sort_rows, split_filter_query
+
+DATA = pd.DataFrame(
+    {
+        "brand": ["Aa", "bb", "c c", "Bb"],
+        "price": [5.0, 10.5, 20.0, np.nan],
+        "launch": ["2020-01-15", "2020-02-01", "2021-03-01", "2020-01-31"],
+    }
+)
+
+
+@pytest.mark.parametrize(
+    "filter_query, clauses",
+    [
+        ("{brand} = Aa", [("brand", "eq", True, "Aa")]),
+        ('{brand} = "c c"', [("brand", "eq", True, "c c")]),
+        ("{brand} eq 'c c'", [("brand", "eq", True, "c c")]),
+        ('{brand} = "say \\"hi\\""', [("brand", "eq", True, 'say "hi"')]),
+        ("{brand} icontains b", [("brand", "contains", False, "b")]),
+        ("{brand} scontains b", [("brand", "contains", True, "b")]),
+        ("{price} >= 10 && {price} < 20", [("price", "ge", True, "10"), ("price", "lt", True, "20")]),
+        ("{Packaging Size} != 5", [("Packaging Size", "ne", True, "5")]),
+        # incomplete clauses are ignored, as the table ignores an invalid filter.
+        ("{price} >", []),
+        ("brand = Aa", []),
+        ("", []),
+        (None, []),
+    ],
+)
+def test_split_filter_query(filter_query, clauses):
+    assert split_filter_query(filter_query) == clauses
+
+
+@pytest.mark.parametrize(
+    "filter_query, rows",
+    [
+        ("{brand} = Aa", [0]),
+        ('{brand} = "c c"', [2]),
+        ("{brand} contains b", [1, 3]),
+        ("{brand} contains B", [3]),
+        ("{brand} icontains B", [1, 3]),
+        ("{brand} ieq bb", [1, 3]),
+        ("{price} > 10", [1, 2]),
+        ("{price} >= 10.5", [1, 2]),
+        ("{price} lt 10.5", [0]),
+        ("{price} = 20", [2]),
+        ("{price} != 10.5", [0, 2, 3]),
+        ("{price} contains 5", [0, 1]),
+        ("{launch} datestartswith 2020-01", [0, 3]),
+        ("{price} > 5 && {brand} contains c", [2]),
+        # a column the table does not have filters nothing.
+        ("{unknown} = x", [0, 1, 2, 3]),
+        ("{unknown} = x && {brand} = bb", [1]),
+        ("", [0, 1, 2, 3]),
+    ],
+)
+def test_filter_rows(filter_query, rows):
+    assert filter_rows(DATA, filter_query).index.tolist() == rows
+
+
+@pytest.mark.parametrize(
+    "sort_by, rows",
+    [
+        ([{"column_id": "price", "direction": "asc"}], [0, 1, 2, 3]),
+        ([{"column_id": "price", "direction": "desc"}], [2, 1, 0, 3]),
+        ([{"column_id": "launch", "direction": "desc"}], [2, 1, 3, 0]),
+        ([{"column_id": "unknown", "direction": "asc"}], [0, 1, 2, 3]),
+        ([], [0, 1, 2, 3]),
+        (None, [0, 1, 2, 3]),
+    ],
+)
+def test_sort_rows(sort_by, rows):
+    assert sort_rows(DATA, sort_by).index.tolist() == rows
+
+
+@pytest.mark.parametrize(
+    "data, page_current, page_size, filter_query, brands, page_count, total",
+    [
+        (DATA, 0, 2, "", ["Aa", "bb"], 2, 4),
+        (DATA, 1, 2, "", ["c c", "Bb"], 2, 4),
+        # a page past the end shows the last page.
+        (DATA, 5, 3, "", ["Bb"], 2, 4),
+        (DATA, 0, 2, "{brand} = none", [], 1, 0),
+        (DATA.iloc[:0], 0, 2, "", [], 1, 0),
+        (DATA, None, None, "", ["Aa", "bb", "c c", "Bb"], 1, 4),
+    ],
+)
+def test_page_table(data, page_current, page_size, filter_query, brands, page_count, total):
+    records, count, matching = page_table(data, page_current, page_size, [], filter_query)
+    assert [record["brand"] for record in records] == brands
+    assert (count, matching) == (page_count, total)
@@ -0,0 +1,103 @@
+"""background jobs (bte_jobs.py) submitted by one server worker are polled, picked up and cancelled by any other.
+
+Two JobManager instances on the same directory stand in for two gunicorn workers.
+"""
+import os
+import time
+
+import pytest
+
+from bte_jobs import JobManager, JobNotFound, report_progress
+
+
+def add(a: int, b: int) -> int:
+    return a + b
+
+
+def count_until_cancelled(marker: str) -> int:
+    # runs until cancelled, after signalling that it is running.
+    open(marker, "w").close()
+    for step in range(1000):
+        report_progress(step / 1000, f"step {step}")
+        time.sleep(0.01)
+    return step
+
+
+def fail(message: str):
+    raise ValueError(message)
+
+
+@pytest.fixture
+def workers(tmp_path):
+    first, second = JobManager(str(tmp_path), 1), JobManager(str(tmp_path), 1)
+    yield first, second
+    first.shutdown()
+    second.shutdown()
+
+
+def _wait_for_state(manager: JobManager, job_id: str, states: tuple, timeout: float = 30) -> dict:
+    deadline = time.monotonic() + timeout
+    while True:
+        status = manager.status(job_id)
+        if status["state"] in states:
+            return status
+        assert time.monotonic() < deadline, status
+        time.sleep(0.01)
+
+
+def test_job_ids_are_unique_across_workers(workers):
+    first, second = workers
+    ids = {worker.run_inline(add, 1, i) for worker in workers for i in range(20)}
+    assert len(ids) == 40
+    assert all(job_id.startswith(f"job-{os.getpid()}-") for job_id in ids)
+
+
+def test_another_worker_polls_and_picks_up_a_job(workers):
+    first, second = workers
+    job_id = first.submit(add, 2, 3)
+    assert second.status(job_id)["state"] in ("pending", "running", "done")
+    assert _wait_for_state(second, job_id, ("done",))["progress"] == 1.0
+    assert second.result(job_id) == 5
+
+
+def test_another_worker_cancels_a_running_job(workers, tmp_path):
+    first, second = workers
+    marker = str(tmp_path / "running.marker")
+    job_id = first.submit(count_until_cancelled, marker)
+    status = _wait_for_state(second, job_id, ("running",))
+    assert status["message"].startswith("step") or status["message"] == "started"
+    while not os.path.exists(marker):
+        time.sleep(0.01)
+    second.cancel(job_id)
+    _wait_for_state(first, job_id, ("cancelled",))
+    with pytest.raises(JobNotFound):
+        second.result(job_id)
+
+
+def test_the_error_of_a_job_reaches_another_worker(workers):
+    first, second = workers
+    for job_id in (first.run_inline(fail, "inline"), first.submit(fail, "pooled")):
+        _wait_for_state(second, job_id, ("error",))
+        with pytest.raises(ValueError):
+            second.result(job_id)
+
+
+def test_identical_jobs_of_a_worker_are_shared(workers, tmp_path):
+    first, second = workers
+    marker = str(tmp_path / "running.marker")
+    job_id = first.submit(count_until_cancelled, marker)
+    assert first.submit(count_until_cancelled, marker) == job_id
+    # the job keeps running until both requests gave it up.
+    first.cancel(job_id)
+    assert first.status(job_id)["state"] in ("pending", "running")
+    first.cancel(job_id)
+    _wait_for_state(second, job_id, ("cancelled",))
+
+
+def test_unknown_jobs(workers):
+    first, _ = workers
+    assert first.status("job-1")["state"] == "unknown"
+    with pytest.raises(JobNotFound):
+        first.result("job-1")
+    # nothing to cancel.
+    first.cancel("job-1")
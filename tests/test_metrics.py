@@ -0,0 +1,97 @@
+"""prometheus metrics (bte_metrics.py): the counters of every server process are summed at scrape time."""
+import multiprocessing
+import os
+import re
+import time
+from functools import lru_cache
+
+import pytest
+from flask import Flask
+
+import bte_metrics
+from bte_metrics import archive_process_metrics, flush_process_metrics, install_metrics
+
+
+@lru_cache(maxsize=8)
+def square(x):
+    return x * x
+
+
+# single-flight counters of the process.
+calls = {"calls": 0, "coalesced": 0}
+
+
+def _sample(text: str, name: str, **labels) -> float:
+    selector = ",".join(f'{k}="{v}"' for k, v in labels.items())
+    match = re.search(rf"^{re.escape(name)}{{{re.escape(selector)}[^}}]*}} (\S+)$", text, re.M)
+    assert match, f"{name} {labels} not in /metrics"
+    return float(match.group(1))
+
+
+@pytest.fixture
+def server(tmp_path, monkeypatch):
+    monkeypatch.setattr(bte_metrics, "FLUSH_SECONDS", 0.05)
+    # counters of a previous run are dropped when the app is loaded.
+    (tmp_path / "worker_1.json").write_text('{"routes": {"/hello": [[100, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0], 1.0]}}')
+    square.cache_clear()
+    calls.update(calls=0, coalesced=0)
+    server = Flask(__name__)
+
+    @server.route("/hello/<int:x>")
+    def hello(x):
+        calls["calls"] += 1
+        return str(square(x))
+
+    install_metrics(
+        server,
+        caches=lambda: [square],
+        single_flight_stats=lambda: {"functions": {"f": dict(calls)}},
+        directory=str(tmp_path),
+    )
+    assert not (tmp_path / "worker_1.json").exists()
+    return server
+
+
+def _worker(server, requests):
+    # a forked gunicorn worker: answers requests, writes its counts when it exits (worker_exit).
+    client = server.test_client()
+    for x in requests:
+        client.get(f"/hello/{x}")
+    flush_process_metrics()
+
+
+def test_metrics_sum_all_processes(server, tmp_path):
+    client = server.test_client()
+    for x in (1, 1):
+        client.get(f"/hello/{x}")
+    context = multiprocessing.get_context("fork")
+    exited = context.Process(target=_worker, args=(server, [1, 2, 3]))
+    running = context.Process(target=_worker, args=(server, [4, 4, 4, 5]))
+    for worker in (exited, running):
+        worker.start()
+        worker.join()
+        assert worker.exitcode == 0
+    # the master folds the exited worker's file into exited.json (child_exit); the other one stays.
+    archive_process_metrics(str(tmp_path), exited.pid)
+    assert not (tmp_path / f"worker_{exited.pid}.json").exists()
+    assert (tmp_path / f"worker_{running.pid}.json").exists()
+
+    text = client.get("/metrics").get_data(as_text=True)
+    # the forked workers do not count the requests and cache calls they inherited.
+    assert _sample(text, "bte_http_request_duration_seconds_count", route="/hello/<int:x>") == 2 + 3 + 4
+    assert _sample(text, "bte_single_flight_calls_total", function="f") == 2 + 3 + 4
+    assert _sample(text, "bte_cache_hits_total", cache="square") == 1 + 1 + 2
+    assert _sample(text, "bte_cache_misses_total", cache="square") == 1 + 2 + 2
+    # entries held by the running processes only.
+    assert _sample(text, "bte_cache_entries", cache="square") == 1 + 3
+    assert "pid=" not in text.split("bte_process_")[0]
+
+
+def test_counters_are_written_after_requests(server, tmp_path):
+    server.test_client().get("/hello/7")
+    path = tmp_path / f"worker_{os.getpid()}.json"
+    deadline = time.time() + 5
+    while not path.exists() and time.time() < deadline:
+        time.sleep(0.01)
+    assert path.exists()
+    assert bte_metrics.merge_process_metrics(str(tmp_path))["caches"]["square"]["misses"] == 1
@@ -0,0 +1,175 @@
+"""figure payload slimming (bte_payload.py): customdata, shared axis styles and float rounding."""
+import copy
+import json
+import math
+
+import pytest
+from flask import Flask, jsonify
+
+from bte_payload import (
+    _dedupe_axis_styles,
+    _drop_constant_customdata,
+    install_payload_slimming,
+    slim_figure,
+)
+
+
+def _trace(customdata, hovertemplate):
+    return {"type": "scatter", "x": [1, 2, 3], "y": [4, 5, 6], "customdata": customdata, "hovertemplate": hovertemplate}
+
+
+@pytest.mark.parametrize(
+    "customdata, hovertemplate, expected_customdata, expected_hovertemplate",
+    [
+        # column 0 (the trace's category) is constant, column 2 moves down to 1.
+        (
+            [["moisturizers", 10, "a"], ["moisturizers", 20, "b"], ["moisturizers", 30, "c"]],
+            "category=%{customdata[0]}<br>reviews=%{customdata[1]}<br>brand=%{customdata[2]}",
+            [[10, "a"], [20, "b"], [30, "c"]],
+            "category=moisturizers<br>reviews=%{customdata[0]}<br>brand=%{customdata[1]}",
+        ),
+        # a constant column between varying ones; formats are kept on renumbered refs.
+        (
+            [[1.5, "us", "x"], [2.5, "us", "y"], [3.5, "us", "z"]],
+            "%{customdata[0]:.1f} %{customdata[1]} %{customdata[2]}",
+            [[1.5, "x"], [2.5, "y"], [3.5, "z"]],
+            "%{customdata[0]:.1f} us %{customdata[1]}",
+        ),
+        # all columns constant: customdata is dropped.
+        ([["us", 7]] * 3, "%{customdata[0]}/%{customdata[1]}", None, "us/7"),
+        # a constant column with a number format stays, plotly.js formats it.
+        (
+            [[0.123456, "a"], [0.123456, "b"], [0.123456, "c"]],
+            "%{customdata[0]:.2%} %{customdata[1]}",
+            [[0.123456, "a"], [0.123456, "b"], [0.123456, "c"]],
+            "%{customdata[0]:.2%} %{customdata[1]}",
+        ),
+        # nothing constant.
+        ([["a", 1], ["b", 2], ["c", 3]], "%{customdata[0]} %{customdata[1]}", [["a", 1], ["b", 2], ["c", 3]], "%{customdata[0]} %{customdata[1]}"),
+    ],
+)
+def test_drop_constant_customdata_renumbers_the_hovertemplate(
+    customdata, hovertemplate, expected_customdata, expected_hovertemplate
+):
+    trace = _trace(customdata, hovertemplate)
+    _drop_constant_customdata(trace)
+    assert trace.get("customdata") == expected_customdata
+    assert trace["hovertemplate"] == expected_hovertemplate
+
+
+@pytest.mark.parametrize(
+    "customdata, hovertemplate",
+    [
+        ([["a", 1], ["a"], ["a", 3]], "%{customdata[0]}"),  # ragged rows
+        ([1, 1, 1], "%{customdata}"),  # not a 2d array
+        ([["a"], ["a"], ["a"]], None),  # no hovertemplate
+    ],
+)
+def test_drop_constant_customdata_leaves_other_shapes_alone(customdata, hovertemplate):
+    trace = _trace(customdata, hovertemplate)
+    before = copy.deepcopy(trace)
+    _drop_constant_customdata(trace)
+    assert trace == before
+
+
+def _faceted_layout():
+    style = {"showgrid": False, "tickangle": 45, "tickfont": {"size": 9}}
+    return {
+        "xaxis": {**style, "anchor": "y", "domain": [0, 0.45], "title": {"text": "date"}},
+        "xaxis2": {**style, "anchor": "y2", "domain": [0.55, 1], "matches": "x"},
+        "yaxis": {"showgrid": True, "anchor": "x", "domain": [0, 1]},
+        "yaxis2": {"showgrid": True, "anchor": "x2", "domain": [0, 1], "showticklabels": False},
+        "template": {"layout": {"xaxis": {"gridcolor": "white"}, "font": {"size": 12}}},
+    }
+
+
+def test_dedupe_axis_styles_moves_what_it_removes():
+    layout = _faceted_layout()
+    before = copy.deepcopy(layout)
+    _dedupe_axis_styles(layout)
+
+    template = layout["template"]["layout"]
+    for letter in ("xaxis", "yaxis"):
+        axis_keys = [key for key in before if key.startswith(letter)]
+        moved = {
+            key: value
+            for key, value in template[letter].items()
+            if key not in before["template"]["layout"].get(letter, {})
+        }
+        for key in axis_keys:
+            removed = {k: v for k, v in before[key].items() if k not in layout[key]}
+            assert removed == moved
+            # what stays on the axis is unchanged.
+            assert layout[key] == {k: v for k, v in before[key].items() if k not in removed}
+    assert template["xaxis"] == {"gridcolor": "white", "showgrid": False, "tickangle": 45, "tickfont": {"size": 9}}
+    assert template["yaxis"] == {"showgrid": True}
+    assert template["font"] == {"size": 12}
+    # the placement keys never move, even when every axis has the same value.
+    assert layout["yaxis"]["domain"] == layout["yaxis2"]["domain"] == [0, 1]
+
+
+def test_dedupe_axis_styles_leaves_a_single_axis_alone():
+    layout = {"xaxis": {"showgrid": False}, "yaxis": {"showgrid": False}}
+    _dedupe_axis_styles(layout)
+    assert layout == {"xaxis": {"showgrid": False}, "yaxis": {"showgrid": False}}
+
+
+def test_slim_figure_rounds_floats_and_keeps_non_finite_arrays():
+    figure = {
+        "data": [
+            {"type": "bar", "x": ["a", "b"], "y": [0.123456789, 1234567.891], "marker": {"opacity": 0.87654321}},
+            {"type": "bar", "x": ["a", "b"], "y": [0.123456789, float("nan")]},
+            {"type": "bar", "x": ["a", "b"], "y": [1.0, float("inf")]},
+            {"type": "bar", "x": ["a", "b"], "y": [3, 4]},
+        ],
+        "layout": {},
+    }
+    slim = slim_figure(figure, digits=4, typed_arrays=False)
+    assert slim["data"][0]["y"] == [0.1235, 1235000]
+    assert slim["data"][0]["marker"]["opacity"] == 0.8765
+    assert slim["data"][1]["y"][0] == 0.123456789 and math.isnan(slim["data"][1]["y"][1])
+    assert slim["data"][2]["y"] == [1.0, float("inf")]
+    assert slim["data"][3]["y"] == [3, 4]
+    # non-finite arrays stay plain lists with typed arrays too.
+    typed = slim_figure(figure, digits=4, typed_arrays=True)
+    assert typed["data"][0]["y"]["dtype"] == "f8"
+    assert typed["data"][2]["y"] == [1.0, float("inf")]
+
+
+def test_slim_figure_does_not_change_its_input():
+    figure = {
+        "data": [_trace([["us", 1.23456789]] * 3, "%{customdata[0]} %{customdata[1]}")],
+        "layout": _faceted_layout(),
+    }
+    before = copy.deepcopy(figure)
+    slim_figure(figure, keep_customdata=False)
+    assert figure == before
+
+
+def _figure():
+    return {
+        "data": [_trace([["us", 1], ["us", 2], ["us", 3]], "%{customdata[0]} %{customdata[1]}")],
+        "layout": {},
+    }
+
+
+def test_slimming_keeps_the_customdata_of_clicked_graphs():
+    server = Flask(__name__)
+
+    @server.route("/_dash-update-component", methods=["POST"])
+    def update():
+        return jsonify({"response": {"clicked_graph": {"figure": _figure()}, "other_graph": {"figure": _figure()}}})
+
+    sizes = install_payload_slimming(server, lambda: {"clicked_graph"})
+    response = server.test_client().post("/_dash-update-component", json={"output": "graphs"})
+    payload = json.loads(response.get_data())["response"]
+
+    clicked = payload["clicked_graph"]["figure"]["data"][0]
+    assert clicked["customdata"] == [["us", 1], ["us", 2], ["us", 3]]
+    assert clicked["hovertemplate"] == "%{customdata[0]} %{customdata[1]}"
+    other = payload["other_graph"]["figure"]["data"][0]
+    assert other["customdata"] == [[1], [2], [3]]
+    assert other["hovertemplate"] == "us %{customdata[0]}"
+
+    graphs = sizes.snapshot()["callbacks"]["graphs"]
+    assert graphs["calls"] == 1 and graphs["bytes_after"] == len(response.get_data())
@@ -0,0 +1,165 @@
+"""a source or category change fires every downstream callback of the page once, with a consistent selection.
+
+The dropdown's options and value come from one callback, the callbacks below it take the product type as
+Input and the source and category as State. The requests a browser sends are replayed with the flask test
+client and counted by the app (BTE_CALLBACK_REQUEST_COUNTS, /_bte/request-counts).
+
+Replayed on the tree before the options and value callbacks were merged, a category or a source change sent
+10 requests (cat_page_product_type.options and .value separately), now 9: one per callback of the page.
+"""
+import base64
+
+import pytest
+
+# the callbacks (callback_map keys) of the category page below the source and category dropdowns.
+CATEGORY_PAGE_CALLBACKS = [
+    "..cat_page_product_type.options...cat_page_product_type.value..",
+    "cat_page_reviews_by_attribute.figure",
+    "..new_ingredients_data_table.page_current...new_products_data_table.page_current"
+    "...top_products_data_table.page_current...product_package_data_table.page_current..",
+    "..new_ingredients_data_table.data...new_ingredients_data_table.page_count..",
+    "..new_products_data_table.data...new_products_data_table.page_count..",
+    "..top_products_data_table.data...top_products_data_table.page_count..",
+    "..product_package_data_table.data...product_package_data_table.page_count..",
+    "..distinct_brands_text.children...distinct_products_text.children...product_variations_text.children"
+    "...new_products_text.children..",
+    "..min_price_text.children...max_price_text.children...avg_low_price_text.children"
+    "...avg_high_price_text.children...avg_item_price_text.children..",
+]
+PRODUCT_ANALYSIS_TEXT = CATEGORY_PAGE_CALLBACKS[7]
+
+
+def _prop_ids(dependencies: list) -> list:
+    return [f"{d['id']}.{d['property']}" for d in dependencies]
+
+
+class Browser:
+    """Browser fires the server callbacks of a page layout on a change the way the dash renderer does.
+
+    A changed property triggers the callbacks reading it as Input; a callback waits until none of the
+    other triggered callbacks can still set one of its inputs, then fires once with the current values.
+    """
+
+    def __init__(self, main, layout):
+        self.client = main.app.server.test_client()
+        user, password = main.USERNAME_PASSWORD_PAIRS[0]
+        self.headers = {"Authorization": "Basic " + base64.b64encode(f"{user}:{password}".encode()).decode()}
+        self.props = {}
+        components = set()
+        for component in layout._traverse():
+            component_id = getattr(component, "id", None)
+            if component_id is None:
+                continue
+            components.add(component_id)
+            for prop, value in component.to_plotly_json()["props"].items():
+                self.props[f"{component_id}.{prop}"] = value
+        # the server callbacks whose components are all on the page.
+        self.callbacks = {
+            key: spec
+            for key, spec in main.app.callback_map.items()
+            if "callback" in spec
+            and all(d["id"] in components for d in spec["inputs"] + spec["state"])
+        }
+        self.requests = []
+
+    @staticmethod
+    def outputs(key: str) -> list:
+        return key.strip(".").split("...")
+
+    def _downstream(self, changed: set) -> list:
+        found, props = [], set(changed)
+        while True:
+            new = [
+                key
+                for key, spec in self.callbacks.items()
+                if key not in found and props.intersection(_prop_ids(spec["inputs"]))
+            ]
+            if not new:
+                return found
+            found += new
+            for key in new:
+                props.update(self.outputs(key))
+
+    def _fire(self, key: str, changed: set) -> dict:
+        spec = self.callbacks[key]
+
+        def values(dependencies):
+            return [dict(d, value=self.props.get(f"{d['id']}.{d['property']}")) for d in dependencies]
+
+        outputs = [dict(zip(("id", "property"), o.rsplit(".", 1))) for o in self.outputs(key)]
+        body = {
+            "output": key,
+            "outputs": outputs if key.startswith("..") else outputs[0],
+            "inputs": values(spec["inputs"]),
+            "state": values(spec["state"]),
+            "changedPropIds": [p for p in _prop_ids(spec["inputs"]) if p in changed],
+        }
+        self.requests.append(body)
+        response = self.client.post("/_dash-update-component", json=body, headers=self.headers)
+        assert response.status_code in (200, 204), (key, response.status_code)
+        if response.status_code == 204:
+            return {}
+        return {
+            f"{component_id}.{prop}": value
+            for component_id, props in response.get_json()["response"].items()
+            for prop, value in props.items()
+        }
+
+    def change(self, **props) -> None:
+        changed = {prop.replace("__", "."): value for prop, value in props.items()}
+        self.props.update(changed)
+        changed = set(changed)
+        pending = self._downstream(changed)
+        while pending:
+            key = next(
+                key
+                for key in pending
+                if not any(
+                    set(_prop_ids(self.callbacks[key]["inputs"])).intersection(self.outputs(other))
+                    for other in pending
+                    if other != key
+                )
+            )
+            pending.remove(key)
+            if not changed.intersection(_prop_ids(self.callbacks[key]["inputs"])):
+                continue
+            updates = self._fire(key, changed)
+            self.props.update(updates)
+            changed.update(updates)
+
+
+@pytest.fixture
+def browser(main):
+    browser = Browser(main, main.category_page_layout())
+    browser.client.get("/_bte/request-counts?reset=1", headers=browser.headers)
+    return browser
+
+
+def request_counts(browser) -> dict:
+    return browser.client.get("/_bte/request-counts?reset=1", headers=browser.headers).get_json()["counts"]
+
+
+def test_category_change_fires_each_category_page_callback_once(browser):
+    categories = [o["value"] for o in browser.props["cat_page_category.options"]]
+    category = next(c for c in categories if c != browser.props["cat_page_category.value"])
+    browser.change(cat_page_category__value=category)
+    assert request_counts(browser) == {key: 1 for key in CATEGORY_PAGE_CALLBACKS}
+
+
+def test_source_change_fires_each_category_page_callback_once(browser):
+    sources = [o["value"] for o in browser.props["cat_page_source.options"]]
+    source = next(s for s in sources if s != browser.props["cat_page_source.value"])
+    browser.change(cat_page_source__value=source)
+    assert request_counts(browser) == {key: 1 for key in CATEGORY_PAGE_CALLBACKS}
+
+
+def test_product_analysis_text_gets_a_product_type_of_the_selected_category(main, browser):
+    categories = [o["value"] for o in browser.props["cat_page_category.options"]]
+    category = next(c for c in categories if c != browser.props["cat_page_category.value"])
+    browser.change(cat_page_category__value=category)
+    (body,) = [body for body in browser.requests if body["output"] == PRODUCT_ANALYSIS_TEXT]
+    product_type = body["inputs"][0]["value"]
+    source, selected = (state["value"] for state in body["state"])
+    assert selected == category
+    pricing = main.cat_page_pricing_analytics_df
+    assert product_type in set(pricing[(pricing.source == source) & (pricing.category == category)].product_type)
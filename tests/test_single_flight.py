@@ -0,0 +1,129 @@
+"""concurrent identical computations run once (bte_single_flight.py)."""
+import threading
+import time
+
+import pytest
+
+from bte_single_flight import SingleFlight, single_flight
+
+WAITERS = 8
+
+
+def _wait_for(condition, timeout: float = 5.0) -> None:
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "timed out"
+        time.sleep(0.001)
+
+
+def _run_concurrently(call, count: int = WAITERS) -> list:
+    """_run_concurrently starts count threads calling call, their results (or exceptions) fill the list in order."""
+    outcomes = [None] * count
+
+    def run(i):
+        try:
+            outcomes[i] = call()
+        except Exception as ex:
+            outcomes[i] = ex
+
+    threads = [threading.Thread(target=run, args=(i,)) for i in range(count)]
+    for thread in threads:
+        thread.start()
+    return threads, outcomes
+
+
+def _blocking(release: threading.Event, result=None, error: Exception = None):
+    calls = []
+
+    def func(*args):
+        calls.append(args)
+        release.wait(5)
+        if error is not None:
+            raise error
+        return result
+
+    return func, calls
+
+
+def test_concurrent_identical_calls_run_once_and_share_the_result():
+    flight, release = SingleFlight("test_shared_result"), threading.Event()
+    func, calls = _blocking(release, result={"rows": 3})
+    threads, outcomes = _run_concurrently(lambda: flight.do("key", func, "key"))
+    # every thread joined the computation before it finishes.
+    _wait_for(lambda: flight.stats()["calls"] == WAITERS)
+    release.set()
+    for thread in threads:
+        thread.join()
+    assert calls == [("key",)]
+    assert all(outcome is outcomes[0] for outcome in outcomes) and outcomes[0] == {"rows": 3}
+    assert flight.stats() == {
+        "calls": WAITERS, "computations": 1, "coalesced": WAITERS - 1, "errors": 0, "in_flight": 0
+    }
+
+
+def test_an_exception_reaches_every_waiter():
+    flight, release = SingleFlight("test_error"), threading.Event()
+    error = ValueError("no data")
+    func, calls = _blocking(release, error=error)
+    threads, outcomes = _run_concurrently(lambda: flight.do("key", func))
+    _wait_for(lambda: flight.stats()["calls"] == WAITERS)
+    release.set()
+    for thread in threads:
+        thread.join()
+    assert len(calls) == 1
+    assert all(outcome is error for outcome in outcomes)
+    assert flight.stats()["errors"] == 1 and flight.stats()["in_flight"] == 0
+    # the failed computation is not kept, the next call runs again.
+    with pytest.raises(ValueError):
+        flight.do("key", func)
+    assert len(calls) == 2
+
+
+def test_different_keys_run_separately():
+    flight = SingleFlight("test_keys")
+    assert [flight.do(key, lambda k: k * 2, key) for key in (1, 2)] == [2, 4]
+    assert flight.stats()["computations"] == 2
+
+
+def _make_function(result, release: threading.Event, calls: list):
+    # two functions with the same module and qualified name, as a factory (or a redefinition) makes them.
+    @single_flight
+    def selection(source: str):
+        calls.append(result)
+        release.wait(5)
+        return result
+
+    return selection
+
+
+def test_functions_sharing_a_name_are_never_coalesced():
+    release, calls = threading.Event(), []
+    first = _make_function("first", release, calls)
+    second = _make_function("second", release, calls)
+    assert first.single_flight is second.single_flight
+    threads, outcomes = _run_concurrently(lambda: first("us"), 1)
+    other_threads, other_outcomes = _run_concurrently(lambda: second("us"), 1)
+    # both are computing at the same time, with the same arguments.
+    _wait_for(lambda: len(calls) == 2)
+    release.set()
+    for thread in threads + other_threads:
+        thread.join()
+    assert outcomes == ["first"] and other_outcomes == ["second"]
+
+
+def test_list_and_dict_arguments_are_coalesced_by_value():
+    release, calls = threading.Event(), []
+
+    @single_flight(name="test_single_flight.by_value")
+    def figure(categories: list, click: dict):
+        calls.append(categories)
+        release.wait(5)
+        return len(categories)
+
+    group = figure.single_flight
+    threads, outcomes = _run_concurrently(lambda: figure(["skincare", "makeup"], {"points": [1]}), 4)
+    _wait_for(lambda: group.stats()["calls"] == 4)
+    release.set()
+    for thread in threads:
+        thread.join()
+    assert outcomes == [2] * 4 and len(calls) == 1
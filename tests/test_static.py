@@ -0,0 +1,98 @@
+"""fingerprinted static assets (bte_static.py): cached bodies and hashes, rebuilt when a file changes."""
+import hashlib
+import os
+
+import pytest
+
+import bte_static
+from bte_static import StaticAssets
+
+
+def _write(folder, path, body: bytes, mtime_ns: int):
+    full = os.path.join(folder, path)
+    os.makedirs(os.path.dirname(full), exist_ok=True)
+    with open(full, "wb") as f:
+        f.write(body)
+    # explicit mtimes: two writes within the file system's timestamp resolution still differ.
+    os.utime(full, ns=(mtime_ns, mtime_ns))
+
+
+@pytest.fixture
+def assets(tmp_path):
+    _write(tmp_path, "fonts/a.woff", b"font a", 1)
+    _write(tmp_path, "styles.css", b"@font-face{src:url('fonts/a.woff#x') url(fonts/b.woff)}", 1)
+    return StaticAssets(str(tmp_path))
+
+
+@pytest.fixture
+def hashes(monkeypatch):
+    hashed = []
+    original = hashlib.sha256
+
+    def sha256(body):
+        hashed.append(body)
+        return original(body)
+
+    monkeypatch.setattr(bte_static.hashlib, "sha256", sha256)
+    return hashed
+
+
+def test_stylesheet_references_are_fingerprinted(assets):
+    font = assets.fingerprint("fonts/a.woff")
+    assert font == hashlib.sha256(b"font a").hexdigest()[:12]
+    # b.woff does not exist (yet), its reference is left as is.
+    assert assets.content("styles.css") == f"@font-face{{src:url('fonts/a.woff?v={font}#x') url(fonts/b.woff)}}".encode()
+    assert assets.url("styles.css") == "/assets/styles.css?v=" + assets.fingerprint("styles.css")
+    assert assets.url("missing.css") == "/assets/missing.css"
+
+
+def test_fingerprints_are_hashed_once(assets, hashes):
+    for _ in range(3):
+        assets.url("styles.css")
+        assets.fingerprint_links('<link href="/assets/styles.css"><img src="/assets/fonts/a.woff">')
+    assert len(hashes) == 2
+
+
+def test_a_changed_file_moves_its_stylesheet(tmp_path, assets, hashes):
+    before = assets.url("styles.css")
+    hashes.clear()
+    _write(tmp_path, "fonts/a.woff", b"font A", 2)
+    after = assets.url("styles.css")
+    assert after != before
+    assert assets.content("styles.css").count(assets.fingerprint("fonts/a.woff").encode()) == 1
+    # the new font and the stylesheet referencing it.
+    assert len(hashes) == 2
+
+    _write(tmp_path, "fonts/b.woff", b"font b", 1)
+    assert assets.url("styles.css") != after
+    assert b"fonts/b.woff?v=" in assets.content("styles.css")
+
+
+def test_stylesheet_import_cycles_end(tmp_path):
+    _write(tmp_path, "a.css", b"@import url(b.css);", 1)
+    _write(tmp_path, "b.css", b"@import url(a.css);", 1)
+    assets = StaticAssets(str(tmp_path))
+    b = assets.content("b.css")
+    assert b.startswith(b"@import url(a.css?v=")
+    # within the cycle b.css is hashed as written.
+    inner_b = hashlib.sha256(b"@import url(a.css);").hexdigest()[:12]
+    assert assets.content("a.css") == f"@import url(b.css?v={inner_b});".encode()
+    # which is not cached in place of the top level b.css.
+    assert assets.content("b.css") == b
+
+
+def test_serve_uses_the_cached_fingerprint(tmp_path, assets, hashes):
+    from flask import Flask
+
+    server = Flask(__name__)
+    server.add_url_rule("/assets/<path:filename>", view_func=assets.serve)
+    client = server.test_client()
+    fingerprint = assets.fingerprint("styles.css")
+
+    response = client.get(f"/assets/styles.css?v={fingerprint}")
+    assert response.headers["Cache-Control"] == bte_static.IMMUTABLE
+    assert response.get_data() == assets.content("styles.css")
+    response = client.get("/assets/styles.css", headers={"If-None-Match": f'"{fingerprint}"'})
+    assert response.status_code == 304
+    assert client.get("/assets/missing.css").status_code == 404
+    assert len(hashes) == 2
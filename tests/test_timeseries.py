@@ -0,0 +1,88 @@
+"""adaptive time series rendering (bte_timeseries.py): LTTB downsampling and the zoom window of relayoutData."""
+import numpy as np
+import pandas as pd
+import pytest
+
+from bte_timeseries import downsample, is_x_relayout, lttb, relayout_x_range
+
+
+@pytest.mark.parametrize("n, threshold", [(10, 3), (100, 10), (1000, 999), (1001, 7), (5000, 1000), (7, 6)])
+def test_lttb_keeps_the_endpoints_and_the_budget(n, threshold):
+    rng = np.random.default_rng(n)
+    x = np.sort(rng.choice(10 * n, n, replace=False))
+    kept = lttb(x, rng.normal(size=n), threshold)
+    assert len(kept) == threshold
+    assert kept[0] == 0 and kept[-1] == n - 1
+    # distinct positions, ascending.
+    assert (np.diff(kept) > 0).all()
+
+
+@pytest.mark.parametrize("n, threshold", [(10, 10), (10, 20), (1, 5), (0, 5), (10, 2)])
+def test_lttb_keeps_everything_at_or_below_the_budget(n, threshold):
+    assert lttb(np.arange(n), np.zeros(n), threshold).tolist() == list(range(n))
+
+
+def test_lttb_keeps_a_spike():
+    y = np.zeros(1000)
+    y[537] = 100
+    assert 537 in lttb(np.arange(1000), y, 20)
+
+
+def _series(days: int, traces=("positive", "negative")) -> pd.DataFrame:
+    dates = pd.date_range("2020-01-01", periods=days, freq="D").strftime("%Y-%m-%d")
+    frames = [
+        pd.DataFrame({"review_date": dates, "sentiment": trace, "reviews": np.arange(days) % (7 + i)})
+        for i, trace in enumerate(traces)
+    ]
+    # interleaved, the order plotly express sees.
+    return pd.concat(frames).sort_values("review_date", kind="mergesort").reset_index(drop=True)
+
+
+def test_downsample_reduces_every_trace_to_the_budget():
+    data = _series(500)
+    kept = downsample(data, "review_date", "reviews", color="sentiment", budget=50)
+    assert kept.groupby("sentiment").size().to_dict() == {"positive": 50, "negative": 50}
+    for _, trace in kept.groupby("sentiment"):
+        assert trace.review_date.iloc[0] == "2020-01-01"
+        assert trace.review_date.iloc[-1] == data.review_date.iloc[-1]
+    # rows in their original order.
+    assert kept.index.is_monotonic_increasing
+
+
+def test_downsample_leaves_data_at_or_below_the_budget_unchanged():
+    data = _series(50)
+    pd.testing.assert_frame_equal(downsample(data, "review_date", "reviews", color="sentiment", budget=50), data)
+    pd.testing.assert_frame_equal(downsample(data.iloc[:0], "review_date", "reviews", budget=10), data.iloc[:0])
+
+
+def test_downsample_cuts_the_visible_window():
+    data = _series(500, traces=("positive",))
+    kept = downsample(
+        data, "review_date", "reviews", budget=1000, x_range=("2020-02-01 00:00:00", "2020-02-29 12:00")
+    )
+    assert kept.review_date.tolist() == pd.date_range("2020-02-01", "2020-02-29").strftime("%Y-%m-%d").tolist()
+
+
+@pytest.mark.parametrize(
+    "relayout_data, x_relayout, x_range",
+    [
+        # zoom (box select) and pan send both ends.
+        (
+            {"xaxis.range[0]": "2020-02-01 06:00:00", "xaxis.range[1]": "2020-03-01"},
+            True,
+            ("2020-02-01 06:00:00", "2020-03-01"),
+        ),
+        ({"xaxis.range": ["2020-02-01", "2020-03-01"]}, True, ("2020-02-01", "2020-03-01")),
+        # a double click resets the axis.
+        ({"xaxis.autorange": True}, True, None),
+        ({"xaxis.autorange": True, "yaxis.autorange": True}, True, None),
+        # y axis only, resizes and the initial event leave the x window alone.
+        ({"yaxis.range[0]": 0, "yaxis.range[1]": 10}, False, None),
+        ({"autosize": True}, False, None),
+        ({}, False, None),
+        (None, False, None),
+    ],
+)
+def test_relayout_x_range(relayout_data, x_relayout, x_range):
+    assert is_x_relayout(relayout_data) == x_relayout
+    assert relayout_x_range(relayout_data) == x_range